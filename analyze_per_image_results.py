@@ -0,0 +1,101 @@
+
+import numpy as np
+
+from os import path, makedirs
+
+from util.file_management import read_table_of_results, export_ranking, parse_boolean
+from util.leaderboard_criteria import sort_by_score
+from util.per_image_results import load_per_image_results
+from util.image_difficulty import get_metric_values, get_image_difficulty, get_team_correlations, get_outlier_teams, DIFFICULTY_COLUMNS, OUTLIER_COLUMNS, OUTLIER_Z
+
+
+def get_metric_name(field):
+    '''
+    Get the name used in the output files for a metric (e.g. 'cup_dice' for 'Cup-Dice')
+    '''
+    return field.lower().replace('-', '_').replace(' ', '_')
+
+
+
+def analyze_per_image_results(results_table_filename, uncompressed_files_folder, output_path, consensus=0.5, z_threshold=OUTLIER_Z, use_cache=True):
+    '''
+    Analyze the results per image of all the teams together: the difficulty of each image, the images where most
+    teams fail, the teams that deviate from the others and the correlations between teams
+
+    Input:
+        results_table_filename: full path and filename to the CSV file with the results
+        uncompressed_files_folder: folder with the uncompressed submissions, including the tables with the results per image
+        output_path: output path
+        [consensus]: fraction of the teams that must fail on an image to consider it a consensus failure
+        [z_threshold]: robust z-score beyond which the result of a team on an image is an outlier
+        [use_cache]: a boolean indicating if a binary copy of the results per image should be kept in the output path,
+                     so the next analyses memory-map it instead of parsing the tables of all the teams
+    '''
+
+    # read the teams and their results per image, as (teams x images x fields) arrays
+    _, teams, _ = read_table_of_results(results_table_filename)
+    per_image_results = load_per_image_results(uncompressed_files_folder, teams, output_path if use_cache else None)
+
+    # failure rates of each image, for all the metrics
+    all_images = sorted(set([ key for task in per_image_results.keys() for key in per_image_results[task]['images'] ]))
+    image_indices = dict(zip(all_images, range(len(all_images))))
+    metric_values = get_metric_values(per_image_results)
+    failure_rates = np.full((len(all_images), len(metric_values)), np.nan)
+    consensus_failures = np.zeros(len(all_images))
+
+    for k in range(len(metric_values)):
+        task, field, images, values = metric_values[k]
+        metric_name = get_metric_name(field)
+        values = np.asarray(values, dtype=float)
+
+        # difficulty of each image, from the hardest to the easiest
+        difficulty = get_image_difficulty(values, field, consensus)
+        sorted_indices = sort_by_score(difficulty[:,0])
+        export_ranking(path.join(output_path, metric_name + '_image_difficulty.csv'), ['Image'] + DIFFICULTY_COLUMNS,
+                       [ images[i] for i in sorted_indices ], difficulty[sorted_indices,:])
+        current_indices = [ image_indices[key] for key in images ]
+        failure_rates[current_indices, k] = difficulty[:, DIFFICULTY_COLUMNS.index('Failure rate')]
+        consensus_failures[current_indices] += np.nan_to_num(difficulty[:, DIFFICULTY_COLUMNS.index('Consensus failure')])
+
+        # teams that deviate from the others, from the most to the least deviating
+        correlations = get_team_correlations(values)
+        outliers = get_outlier_teams(values, field, z_threshold, correlations)
+        sorted_indices = sort_by_score(-outliers[:, OUTLIER_COLUMNS.index('Mean robust z')])
+        export_ranking(path.join(output_path, metric_name + '_team_outliers.csv'), ['Team'] + OUTLIER_COLUMNS,
+                       [ teams[i] for i in sorted_indices ], outliers[sorted_indices,:])
+
+        # correlations between the results per image of each pair of teams
+        export_ranking(path.join(output_path, metric_name + '_team_correlations.csv'), ['Team'] + teams, teams, correlations)
+
+        # print a summary
+        n_consensus = int(np.nansum(difficulty[:, DIFFICULTY_COLUMNS.index('Consensus failure')]))
+        print('{} ({}): {} images, {} consensus failures{}'.format(field, task.replace('_', ' '), len(images), n_consensus,
+              '' if len(sorted_indices) == 0 else ', most deviating team: {}'.format(teams[sorted_indices[0]])))
+
+    # failure rates of each image for all the metrics, from the image with the most consensus failures
+    sorted_indices = np.argsort(-consensus_failures, kind='mergesort')
+    export_ranking(path.join(output_path, 'image_failure_rates.csv'), ['Image', 'Consensus failures'] + [ metric[1] for metric in metric_values ],
+                   [ all_images[i] for i in sorted_indices ], np.concatenate((consensus_failures[sorted_indices,np.newaxis], failure_rates[sorted_indices,:]), axis=1))
+
+
+
+import argparse
+import sys
+
+if __name__ == '__main__':
+
+    # create an argument parser to control the input parameters
+    parser = argparse.ArgumentParser()
+    parser.add_argument("results_table_filename", help="full path and filename to the CSV file with the results", type=str)
+    parser.add_argument("uncompressed_files_folder", help="folder with the uncompressed submissions, as generated by evaluate_multiple_submissions", type=str)
+    parser.add_argument("output_path", help="output path", type=str)
+    parser.add_argument("--consensus", help="fraction of the teams that must fail on an image to consider it a consensus failure", type=float, default=0.5)
+    parser.add_argument("--outlier_z", help="robust z-score beyond which the result of a team on an image is an outlier", type=float, default=OUTLIER_Z)
+    parser.add_argument("--use_cache", help="a boolean indicating if a binary copy of the results per image should be kept in the output path (and updated when it is outdated)", type=str, default='True')
+    args = parser.parse_args()
+
+    if not path.exists(args.output_path):
+        makedirs(args.output_path)
+
+    # call the "main" function
+    analyze_per_image_results(args.results_table_filename, args.uncompressed_files_folder, args.output_path, args.consensus, args.outlier_z, parse_boolean(args.use_cache))
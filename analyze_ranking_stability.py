@@ -0,0 +1,78 @@
+
+import numpy as np
+
+from os import path, makedirs
+
+from util.file_management import read_table_of_results, export_ranking
+from util.leaderboard_criteria import CRITERIA, TIE_POLICIES, compile_criterion, rank_values, sort_by_score
+from util.per_image_results import load_per_image_results
+from util.ranking_stability import bootstrap_rankings, summarize_rankings
+
+
+def analyze_ranking_stability(results_table_filename, uncompressed_files_folder, output_path, criteria_names, n_resamples=1000, seed=None, n_jobs=1, confidence=0.95, ties='min'):
+    '''
+    Analyze how stable the leaderboards are when the test images are resampled with bootstrap
+
+    Input:
+        results_table_filename: full path and filename to the CSV file with the results
+        uncompressed_files_folder: folder with the uncompressed submissions, including the tables with the results per image
+        output_path: output path
+        criteria_names: a list with the names of the criteria to analyze (keys of util.leaderboard_criteria.CRITERIA)
+        [n_resamples]: number of bootstrap resamples
+        [seed]: seed for the random number generator
+        [n_jobs]: number of batches of resamples processed in parallel
+        [confidence]: confidence level of the band of ranks
+        [ties]: policy for tied values (see util.leaderboard_criteria.rank_values)
+    '''
+
+    # read the table of results and the results per image of all the teams
+    metrics, teams, results = read_table_of_results(results_table_filename)
+    per_image_results = load_per_image_results(uncompressed_files_folder, teams)
+
+    # rank the teams on all the resamples
+    criteria = dict([ (name, CRITERIA[name]) for name in criteria_names ])
+    ranks = bootstrap_rankings(metrics, per_image_results, criteria, n_resamples, seed, n_jobs, ties=ties)
+
+    for name in criteria_names:
+
+        # original ranking, for reference
+        scores, _ = compile_criterion(criteria[name], metrics, ties)(results)
+        original_ranks = rank_values(scores, higher_is_better=False, ties=ties)
+
+        # summarize the distribution of the ranks
+        statistics, header, distribution = summarize_rankings(ranks[name], confidence)
+        sorted_indices = sort_by_score(original_ranks)
+        sorted_teams = [ teams[i] for i in sorted_indices ]
+
+        # export the statistics and the distribution of the ranks
+        export_ranking(path.join(output_path, name + '_ranking_stability.csv'), ['Team', 'Rank'] + header,
+                       sorted_teams, np.concatenate((original_ranks[sorted_indices, np.newaxis], statistics[sorted_indices, :]), axis=1))
+        export_ranking(path.join(output_path, name + '_rank_distribution.csv'), ['Team'] + [ 'Rank {}'.format(i + 1) for i in range(len(teams)) ],
+                       sorted_teams, distribution[sorted_indices, :])
+
+
+
+import argparse
+import sys
+
+if __name__ == '__main__':
+
+    # create an argument parser to control the input parameters
+    parser = argparse.ArgumentParser()
+    parser.add_argument("results_table_filename", help="full path and filename to the CSV file with the results", type=str)
+    parser.add_argument("uncompressed_files_folder", help="folder with the uncompressed submissions, as generated by evaluate_multiple_submissions", type=str)
+    parser.add_argument("output_path", help="output path", type=str)
+    parser.add_argument("--criteria", help="comma separated list of criteria to analyze", type=str, default='segmentation,classification,fovea_location,final')
+    parser.add_argument("--n_resamples", help="number of bootstrap resamples", type=int, default=1000)
+    parser.add_argument("--seed", help="seed for the random number generator", type=int, default=None)
+    parser.add_argument("--n_jobs", help="number of batches of resamples processed in parallel", type=int, default=1)
+    parser.add_argument("--confidence", help="confidence level of the band of ranks", type=float, default=0.95)
+    parser.add_argument("--ties", help="policy to rank tied values", type=str, choices=TIE_POLICIES, default='min')
+    args = parser.parse_args()
+
+    if not path.exists(args.output_path):
+        makedirs(args.output_path)
+
+    # call the "main" function
+    analyze_ranking_stability(args.results_table_filename, args.uncompressed_files_folder, args.output_path, args.criteria.split(','),
+                              args.n_resamples, args.seed, args.n_jobs, args.confidence, args.ties)
@@ -0,0 +1,59 @@
+
+from os import path, makedirs
+
+from util.file_management import read_table_of_results, export_ranking
+from util.leaderboard_criteria import CRITERIA, TIE_POLICIES, sample_criterion_weights, weight_sensitivity, sort_by_score
+
+
+def analyze_weight_sensitivity(results_table_filename, output_filename, criterion, n_samples=10000, concentration=None, seed=None, ties='min'):
+    '''
+    Analyze how stable a leaderboard is when the weights of its criterion change
+
+    Input:
+        results_table_filename: full path and filename to the CSV file with the results
+        output_filename: full path and filename of the output CSV file with the statistics per team
+        criterion: the declarative criterion (as in util.leaderboard_criteria.SEGMENTATION_CRITERION)
+        [n_samples]: number of random weight vectors to evaluate
+        [concentration]: concentration of the weights around the default ones. If not provided, they are sampled uniformly
+        [seed]: seed for the random number generator
+        [ties]: policy for tied values (see util.leaderboard_criteria.rank_values)
+    '''
+
+    # read the table of results
+    metrics, teams, results = read_table_of_results(results_table_filename)
+
+    # draw the weights and evaluate all of them at once
+    weights = sample_criterion_weights(criterion, n_samples, concentration, seed)
+    statistics, header = weight_sensitivity(criterion, metrics, results, weights, ties)
+
+    # sort the teams according to their rank with the default weights
+    sorted_indices = sort_by_score(statistics[:,0])
+
+    # export the statistics
+    export_ranking(output_filename, ['Team'] + header, [ teams[i] for i in sorted_indices ], statistics[sorted_indices,:])
+
+
+
+import argparse
+import sys
+
+if __name__ == '__main__':
+
+    # create an argument parser to control the input parameters
+    parser = argparse.ArgumentParser()
+    parser.add_argument("results_table_filename", help="full path and filename to the CSV file with the results", type=str)
+    parser.add_argument("output_path", help="output path", type=str)
+    parser.add_argument("--criteria", help="comma separated list of criteria to analyze", type=str, default='segmentation,final')
+    parser.add_argument("--n_samples", help="number of random weight vectors to evaluate", type=int, default=10000)
+    parser.add_argument("--concentration", help="concentration of the weights around the default ones. If not provided, they are sampled uniformly", type=float, default=None)
+    parser.add_argument("--seed", help="seed for the random number generator", type=int, default=None)
+    parser.add_argument("--ties", help="policy to rank tied values", type=str, choices=TIE_POLICIES, default='min')
+    args = parser.parse_args()
+
+    if not path.exists(args.output_path):
+        makedirs(args.output_path)
+
+    # call the "main" function for each criterion
+    for criterion_name in args.criteria.split(','):
+        analyze_weight_sensitivity(args.results_table_filename, path.join(args.output_path, criterion_name + '_weight_sensitivity.csv'), CRITERIA[criterion_name],
+                                   args.n_samples, args.concentration, args.seed, args.ties)
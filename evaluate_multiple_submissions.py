@@ -1,40 +1,161 @@
 
+import time
+
+import numpy as np
+
 from os import path, makedirs
 
 from shutil import rmtree
 
-from evaluate_single_submission import evaluate_single_submission
-from util.file_management import unzip_submission, get_filenames, parse_boolean, export_table_of_results, export_table_of_results
+from evaluate_single_submission import evaluate_single_submission, evaluate_submission_on_gt_sets
+from generate_leaderboards import generate_leaderboards
+from util.file_management import unzip_submission, get_filenames, parse_boolean, parse_gt_sets, export_table_of_results, export_table_of_results, save_csv_validation_report
+from util.submission_validation import build_gt_index, merge_gt_indexes, validate_submission, get_valid_tasks, print_validation_report
+from util.work_queue import initialize_work_queue, claim_submission, write_results_shard, is_queue_complete, merge_results_shards
+from util.resource_management import check_archive_limits, run_and_measure, run_with_resource_limits
+from util.archive_extraction import extract_submission, DEFAULT_EXTRACTION_THREADS
+from evaluation_metrics.segmentation_kernels import SEGMENTATION_BACKENDS
+from util.progress import create_progress_stream, emit_event, create_running_means, update_running_means
+
+
+# results of each submission whose running means are reported in the progress events
+SUBMISSION_PROGRESS_VALUES = ['Cup-Dice', 'Disc-Dice', 'AE-CDR', 'AUC', 'Reference Sensitivity', 'Euclidean distance']
+
+
+
+def evaluate_submission_file(submission_file, results_folder, gt_folder, is_training, team_name, tasks, progress=None, backend='numpy', tile_rows=None, set_results_folders=None,
+                             extraction_threads=None, keep_extracted=True):
+    '''
+    Unzip a submission and evaluate it
+
+    Input:
+        submission_file: full path and filename of the .zip file
+        results_folder: folder where the submission will be uncompressed and the results will be saved
+        gt_folder: full path to the ground truth files, or a list of (name, full path) pairs with several ground truth sets
+        is_training: a boolean value indicating if the evaluation is performed on training data or not
+        team_name: name of the team
+        tasks: a list with the tasks to evaluate, or None to evaluate all of them
+        [progress]: a stream (see util.progress.create_progress_stream) where the progress of the evaluation is reported
+        [backend]: the backend that counts the pixels of the segmentations
+        [tile_rows]: if given, the segmentations are streamed in bands of this number of rows
+        [set_results_folders]: a list with the folder where the results of each ground truth set will be saved, if there are several sets
+        [extraction_threads]: if given, the members of the zip file are inflated concurrently by this number of threads
+                              (see util.archive_extraction.extract_submission)
+        [keep_extracted]: a boolean value indicating if the BMP segmentations are extracted to disk. If not, they are decoded in
+                          memory and handed to the evaluation (only with a single ground truth set)
+    Output:
+        segmentation_performance, classification_performance, fovea_location_performance: as retrieved by evaluate_single_submission
+        (or a dictionary mapping the name of each set to them, if there are several sets)
+    '''
+
+    # unzip the submission
+    decoded_segmentations = None
+    if extraction_threads is None and keep_extracted:
+        unzip_submission(submission_file, results_folder)
+    else:
+        # the segmentations of several sets are routed from the files on disk
+        keep_segmentations = keep_extracted or isinstance(gt_folder, list)
+        decoded_segmentations = extract_submission(submission_file, results_folder, DEFAULT_EXTRACTION_THREADS if extraction_threads is None else extraction_threads,
+                                                   keep_segmentations)
 
+    # get current results on each set, decoding the predictions only once
+    if isinstance(gt_folder, list):
+        return evaluate_submission_on_gt_sets(results_folder, gt_folder, set_results_folders, export_table=True, is_training=is_training, tasks=tasks,
+                                              progress=progress, backend=backend, tile_rows=tile_rows)
 
+    # get current results
+    return evaluate_single_submission(results_folder, gt_folder, output_path=results_folder, export_table=True, is_training=is_training, team_name=team_name, tasks=tasks, progress=progress, backend=backend, tile_rows=tile_rows,
+                                      decoded_segmentations=decoded_segmentations)
 
-def evaluate_multiple_submissions(submissions_folder, gt_folder, uncompressed_files_folder, output_path, is_training=False):
+
+
+def evaluate_multiple_submissions(submissions_folder, gt_folder, uncompressed_files_folder, output_path, is_training=False, queue_folder=None, validate=True,
+                                  isolate=True, timeout=None, max_memory=None, max_uncompressed_size=None, max_files=None,
+                                  progress_filename=None, progress_callback=None, progress_interval=1.0, backend='numpy', tile_rows=None, leaderboards=False,
+                                  extraction_threads=None, keep_extracted=True):
     '''
     Input:
         submissions_folder:
-        gt_folder:
+        gt_folder: full path to the ground truth files, or a list of (name, full path) pairs to evaluate the submissions against
+                   several ground truth sets in a single pass (see util.file_management.parse_gt_sets). In that case, the table of results of each
+                   set is saved in output_path/<name>, and the results of each team in output_path/<name>/teams/<team>
         [is_training]:
+        [queue_folder]: a folder shared by several workers. If provided, the current process will act as one of
+                        the workers, evaluating only the submissions that were not claimed by the others
+        [validate]: a boolean value indicating if the format of each submission should be validated before unzipping it.
+                    Tasks with format errors are not evaluated
+        [isolate]: a boolean value indicating if each submission should be evaluated in its own worker process
+        [timeout]: maximum time (in seconds) to evaluate a submission. Only used if isolate is True
+        [max_memory]: maximum memory (in MB) of the worker that evaluates a submission. Only used if isolate is True
+        [max_uncompressed_size]: maximum size (in MB) of the uncompressed submission
+        [max_files]: maximum number of files in the submission
+        [progress_filename]: a JSON lines file where the progress events are appended (see util.progress). The events include
+                             the results of each image, the speed and the remaining time of each submission and of the
+                             whole batch, and the results of each submission as soon as it is evaluated
+        [progress_callback]: a function that receives each progress event. The events of the isolated workers are not
+                             passed to it, only saved in progress_filename
+        [progress_interval]: minimum time (in seconds) between two progress events of the images of a submission
+        [backend]: the backend that counts the pixels of the segmentations ('numpy', 'numba' or 'auto', see
+                   evaluation_metrics.segmentation_kernels.get_segmentation_kernel)
+        [tile_rows]: if given, the segmentations are streamed in bands of this number of rows, so the memory used by
+                     each worker does not depend on the height of the images
+        [leaderboards]: a boolean value indicating if the leaderboards (and the significance of the differences between
+                        the teams) should be generated from the table of results of each set
+        [extraction_threads]: if given, the members of each zip file are inflated concurrently by this number of threads,
+                              instead of extracting them one after the other
+        [keep_extracted]: a boolean value indicating if the BMP segmentations are extracted to uncompressed_files_folder. If not,
+                          they are inflated and decoded in memory and handed to the evaluation, without writing them to disk.
+                          The rest of the files (and the results) are saved with the same layout in both cases
     '''
 
     # identify all the zip files in the submissions folder
     submission_files = get_filenames(submissions_folder, 'zip')
 
+    # names of the ground truth sets (a single set without name if gt_folder is a folder)
+    gt_sets = gt_folder if isinstance(gt_folder, list) else None
+    set_names = [ None ] if gt_sets is None else [ name for name, _ in gt_sets ]
+    if not (gt_sets is None) and not (queue_folder is None):
+        raise ValueError('Several ground truth sets can not be evaluated with a queue folder.')
+
     # initialize the list of teams
     teams = []
-    # initialize the lists of results
-    segmentation_results = []
-    classification_results = []
-    fovea_detection_results = []
+    # initialize the lists of results of each set
+    segmentation_results = dict([ (name, []) for name in set_names ])
+    classification_results = dict([ (name, []) for name in set_names ])
+    fovea_detection_results = dict([ (name, []) for name in set_names ])
+    resource_usages = []
     # initialize the output folders
-    if path.exists(uncompressed_files_folder):
-        rmtree(uncompressed_files_folder)
-    makedirs(uncompressed_files_folder)
+    if queue_folder is None:
+        if path.exists(uncompressed_files_folder):
+            rmtree(uncompressed_files_folder)
+        makedirs(uncompressed_files_folder)
+    else:
+        # other workers might be using the same folder, so we don't remove it
+        initialize_work_queue(queue_folder)
+        if not path.exists(uncompressed_files_folder):
+            makedirs(uncompressed_files_folder, exist_ok=True)
     if not path.exists(output_path):
-        makedirs(output_path)
+        makedirs(output_path, exist_ok=True)
+
+    # index the ground truth once, to validate all the submissions (the submissions of several sets must include the images of all of them)
+    if validate and gt_sets is None:
+        gt_index = build_gt_index(gt_folder, is_training)
+    elif validate:
+        gt_index = merge_gt_indexes([ build_gt_index(set_folder, is_training) for _, set_folder in gt_sets ])
+
+    # start reporting the progress of the batch
+    progress = create_progress_stream(progress_filename, progress_callback, progress_interval)
+    emit_event(progress, 'batch_started', n_submissions=len(submission_files))
+    start_time = time.time()
+    running_means = dict([ (name, create_running_means(len(SUBMISSION_PROGRESS_VALUES))) for name in set_names ])
 
     # iterate for each submission file
     for i in range(len(submission_files)):
 
+        # skip the submissions that are being evaluated by other workers
+        if not (queue_folder is None) and not claim_submission(queue_folder, submission_files[i]):
+            continue
+
         # get current team name
         current_team_name = submission_files[i]
         current_team_name = current_team_name[:-4]
@@ -42,25 +163,109 @@ def evaluate_multiple_submissions(submissions_folder, gt_folder, uncompressed_fi
         print('-------------------------------')
         # generate a new output path for the current submission
         current_results_folder = path.join(uncompressed_files_folder, current_team_name)
+        if not (queue_folder is None) and path.exists(current_results_folder):
+            # remove the leftovers of a previous worker that didn't finish
+            rmtree(current_results_folder)
         if not path.exists(current_results_folder):
             makedirs(current_results_folder)
-        
-        # unzip the submission
-        unzip_submission(path.join(submissions_folder, submission_files[i]), current_results_folder)
+        # and for the results of each set
+        set_results_folders = None if gt_sets is None else [ path.join(output_path, name, 'teams', current_team_name) for name in set_names ]
 
-        # get current results
-        current_segmentation_perf, current_classification_perf, current_fovea_location_perf = evaluate_single_submission(current_results_folder, gt_folder, 
-                                                                                                                         output_path=current_results_folder, export_table=True, is_training=is_training, team_name=current_team_name)
+        # validate the format of the submission without unzipping it
+        tasks = None
+        if validate:
+            report = validate_submission(path.join(submissions_folder, submission_files[i]), gt_index)
+            print_validation_report(report)
+            save_csv_validation_report(path.join(current_results_folder, 'validation_report.csv'), report)
+            tasks = get_valid_tasks(report)
+
+        # check the size of the submission before unzipping it
+        error = None
+        if (not validate or report['is_zip']) and (not (max_uncompressed_size is None) or not (max_files is None)):
+            error = check_archive_limits(path.join(submissions_folder, submission_files[i]), max_uncompressed_size, max_files)
+
+        current_performance = None
+        current_resource_usage = { 'cpu_seconds': np.nan, 'peak_rss_mb': np.nan, 'bytes_read': np.nan }
+        if error is None and not (validate and len(tasks) == 0):
+            # evaluate the submission, measuring the resources used
+            # the workers report their own progress (callbacks can't be sent to another process)
+            current_progress = None
+            if not (progress is None):
+                current_progress = create_progress_stream(progress_filename, None if isolate else progress_callback, progress_interval, team=current_team_name)
+            arguments = (path.join(submissions_folder, submission_files[i]), current_results_folder, gt_folder, is_training, current_team_name, tasks, current_progress, backend, tile_rows, set_results_folders,
+                         extraction_threads, keep_extracted)
+            if isolate:
+                current_performance, current_resource_usage, error = run_with_resource_limits(evaluate_submission_file, arguments, timeout=timeout, max_memory=max_memory)
+            else:
+                current_performance, current_resource_usage, error = run_and_measure(evaluate_submission_file, arguments)
+        if not (error is None):
+            print('> *** There was an error processing this submission: ' + error)
+        # collect the performance on each set
+        if gt_sets is None:
+            current_performances = { None: current_performance }
+        else:
+            current_performances = current_performance if not (current_performance is None) else dict()
+        for name in set_names:
+            if current_performances.get(name) is None:
+                # there is nothing to evaluate, or the evaluation failed
+                current_performances[name] = [ np.nan, np.nan, np.nan ], [ np.nan, np.nan ], np.nan
+
+        # save the results in the shared folder
+        if not (queue_folder is None):
+            current_segmentation_perf, current_classification_perf, current_fovea_location_perf = current_performances[None]
+            write_results_shard(queue_folder, submission_files[i], current_team_name,
+                                current_segmentation_perf, current_classification_perf, current_fovea_location_perf, current_resource_usage)
+
+        # report the results of the submission on each set, with the speed and the remaining time of the batch
+        if not (progress is None):
+            elapsed_time = time.time() - start_time
+            # (the submissions skipped because other workers claimed them don't count for the speed)
+            n_evaluated = len(teams) + 1
+            for name in set_names:
+                current_segmentation_perf, current_classification_perf, current_fovea_location_perf = current_performances[name]
+                current_values = np.concatenate((np.ravel(current_segmentation_perf), np.ravel(current_classification_perf), np.ravel(current_fovea_location_perf)))
+                means = update_running_means(running_means[name], current_values)
+                fields = { 'team': current_team_name, 'index': i, 'n_submissions': len(submission_files), 'error': error,
+                           'submissions_per_second': n_evaluated / elapsed_time, 'eta_seconds': (len(submission_files) - i - 1) * elapsed_time / n_evaluated }
+                if not (name is None):
+                    fields['gt_set'] = name
+                for j in range(len(SUBMISSION_PROGRESS_VALUES)):
+                    fields[SUBMISSION_PROGRESS_VALUES[j]] = current_values[j]
+                    fields['Mean ' + SUBMISSION_PROGRESS_VALUES[j]] = means[j]
+                emit_event(progress, 'submission_done', **fields)
 
         # attach everything to the arrays
         teams = teams + [ current_team_name ]
-        segmentation_results = segmentation_results + [ current_segmentation_perf ]
-        classification_results = classification_results + [ current_classification_perf ]
-        fovea_detection_results = fovea_detection_results + [ current_fovea_location_perf ]
+        for name in set_names:
+            current_segmentation_perf, current_classification_perf, current_fovea_location_perf = current_performances[name]
+            segmentation_results[name] = segmentation_results[name] + [ current_segmentation_perf ]
+            classification_results[name] = classification_results[name] + [ current_classification_perf ]
+            fovea_detection_results[name] = fovea_detection_results[name] + [ current_fovea_location_perf ]
+        resource_usages = resource_usages + [ current_resource_usage ]
+
+    emit_event(progress, 'batch_done', n_evaluated=len(teams), elapsed_seconds=time.time() - start_time)
+
+    if queue_folder is None:
+        # export a table of results (unordered) for each set
+        for name in set_names:
+            set_output_path = output_path if name is None else path.join(output_path, name)
+            if not path.exists(set_output_path):
+                makedirs(set_output_path)
+            export_table_of_results(path.join(set_output_path, 'table_of_results.csv'),
+                                    teams, segmentation_results[name], classification_results[name], fovea_detection_results[name], resource_usages)
+    elif is_queue_complete(queue_folder, submission_files):
+        # the last worker merges the shards of all the workers
+        merge_results_shards(queue_folder, path.join(output_path, 'table_of_results.csv'))
+    else:
+        print('\n> Some submissions are still being evaluated by other workers. Run again with --merge_only True when they finish.')
+        return
 
-    # export a table of results (unordered)
-    export_table_of_results(path.join(output_path, 'table_of_results.csv'),
-                            teams, segmentation_results, classification_results, fovea_detection_results)
+    # generate the leaderboards of each set
+    if leaderboards:
+        for name in set_names:
+            set_output_path = output_path if name is None else path.join(output_path, name)
+            generate_leaderboards(path.join(set_output_path, 'table_of_results.csv'), set_output_path,
+                                  uncompressed_files_folder=uncompressed_files_folder if name is None else path.join(set_output_path, 'teams'))
 
 
 
@@ -72,11 +277,38 @@ if __name__ == '__main__':
     # create an argument parser to control the input parameters
     parser = argparse.ArgumentParser()
     parser.add_argument("submissions_folder", help="full path to the submitted results", type=str)
-    parser.add_argument("gt_folder", help="full path to the ground truth files", type=str)
+    parser.add_argument("gt_folder", help="full path to the ground truth files, or comma separated name=folder pairs to evaluate the submissions against several ground truth sets in a single pass", type=str)
     parser.add_argument("uncompressed_files_folder", help="temporary folder for saving the uncompressed results", type=str)
     parser.add_argument("output_path", help="a folder where the results will be saved", type=str)
     parser.add_argument("--is_training", help="a boolean value indicating if the evaluation is performed on training data or not", type=str, default='False')
+    parser.add_argument("--queue_folder", help="a folder shared by several workers. If provided, this process will evaluate only the submissions that were not claimed by other workers", type=str, default=None)
+    parser.add_argument("--validate", help="a boolean value indicating if the format of the submissions should be validated before evaluating them", type=str, default='True')
+    parser.add_argument("--isolate", help="a boolean value indicating if each submission should be evaluated in its own worker process", type=str, default='True')
+    parser.add_argument("--timeout", help="maximum time (in seconds) to evaluate a submission", type=float, default=None)
+    parser.add_argument("--max_memory", help="maximum memory (in MB) of the worker that evaluates a submission", type=float, default=None)
+    parser.add_argument("--max_uncompressed_size", help="maximum size (in MB) of an uncompressed submission", type=float, default=None)
+    parser.add_argument("--max_files", help="maximum number of files in a submission", type=int, default=None)
+    parser.add_argument("--progress_file", help="a JSON lines file where the progress of the evaluation (per image and per submission results, speed, remaining time and running means) is appended", type=str, default=None)
+    parser.add_argument("--progress_interval", help="minimum time (in seconds) between two progress events of the images of a submission", type=float, default=1.0)
+    parser.add_argument("--backend", help="backend that counts the pixels of the segmentations (numpy, numba or auto)", type=str, default='numpy', choices=SEGMENTATION_BACKENDS)
+    parser.add_argument("--tile_rows", help="if provided, the segmentations are streamed in bands of this number of rows, with a fixed memory footprint", type=int, default=None)
+    parser.add_argument("--leaderboards", help="a boolean value indicating if the leaderboards of each ground truth set should be generated after the evaluation", type=str, default='False')
+    parser.add_argument("--extraction_threads", help="if provided, the members of each zip file are inflated concurrently by this number of threads", type=int, default=None)
+    parser.add_argument("--keep_extracted", help="a boolean value indicating if the BMP segmentations should be extracted to the uncompressed files folder, or only decoded in memory", type=str, default='True')
+    parser.add_argument("--merge_only", help="a boolean value indicating if the shards in queue_folder should be merged into the table of results without evaluating anything", type=str, default='False')
     args = parser.parse_args()
 
-    # call the "main" function
-    evaluate_multiple_submissions(args.submissions_folder, args.gt_folder, args.uncompressed_files_folder, args.output_path, parse_boolean(args.is_training))
+    if parse_boolean(args.merge_only):
+        # merge the results of all the workers
+        if args.queue_folder is None:
+            parser.error('--merge_only requires --queue_folder')
+        if not path.exists(args.output_path):
+            makedirs(args.output_path)
+        merge_results_shards(args.queue_folder, path.join(args.output_path, 'table_of_results.csv'))
+    else:
+        # call the "main" function
+        evaluate_multiple_submissions(args.submissions_folder, parse_gt_sets(args.gt_folder), args.uncompressed_files_folder, args.output_path, parse_boolean(args.is_training), args.queue_folder, parse_boolean(args.validate),
+                                     parse_boolean(args.isolate), args.timeout, args.max_memory, args.max_uncompressed_size, args.max_files,
+                                     progress_filename=args.progress_file, progress_interval=args.progress_interval, backend=args.backend,
+                                     tile_rows=args.tile_rows, leaderboards=parse_boolean(args.leaderboards), extraction_threads=args.extraction_threads,
+                                     keep_extracted=parse_boolean(args.keep_extracted))
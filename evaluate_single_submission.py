@@ -1,15 +1,33 @@
 
 import csv
+import io
+import sys
+import threading
 
 import numpy as np
 
 from os import path, makedirs, listdir
 
 from evaluation_metrics import evaluation_metrics_for_segmentation, evaluation_metrics_for_classification, evaluation_metrics_for_fovea_location
-from util.file_management import parse_boolean
+from util.file_management import parse_boolean, FOVEA_HEATMAP_FILENAMES
+from evaluation_metrics.segmentation_kernels import SEGMENTATION_BACKENDS
+from evaluation_metrics.evaluation_metrics_for_fovea_location import HEATMAP_PEAK_METHODS
+from util.progress import create_progress_stream, emit_event
+from util.rle_masks import SEGMENTATION_RLE_FILENAMES
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 
+# names of the tasks of the challenge
+TASK_NAMES = ['segmentation', 'classification', 'fovea_location']
+# performance assigned to a task when it can't be evaluated
+NAN_PERFORMANCE = { 'segmentation': [ np.nan, np.nan, np.nan ], 'classification': [ np.nan, np.nan ], 'fovea_location': np.nan }
 
-def evaluate_single_submission(results_folder, gt_folder, output_path=None, export_table=False, is_training=False, team_name=None):
+
+def evaluate_single_submission(results_folder, gt_folder, output_path=None, export_table=False, is_training=False, team_name=None, tasks=None, parallel=True, boundary_metrics=False,
+                               quick=False, quick_images=20, quick_block_size=4, progress=None, backend='numpy', annotators_folder=None, tile_rows=None,
+                               heatmap_peak='centroid', decoded_segmentations=None):
     '''
     Evaluate the results of a single submission
 
@@ -20,6 +38,24 @@ def evaluate_single_submission(results_folder, gt_folder, output_path=None, expo
         [export_table]: a boolean value indicating if the table will be exported or not
         [is_training]: a boolean value indicating if the evaluation is performed on training data or not
         [team_name]: name of the team, it could be used in case of a wrong organization of the folders
+        [tasks]: a list with the tasks to evaluate ('segmentation', 'classification', 'fovea_location'). If not provided, all of them are evaluated
+        [parallel]: a boolean value indicating if the tasks should be evaluated concurrently
+        [boundary_metrics]: a boolean value indicating if the boundary distances of the segmentations (HD95 and ASSD) will be computed or not
+        [quick]: a boolean value indicating if the segmentations should be quickly estimated instead of evaluated
+                 (see evaluation_metrics_for_segmentation.quick_evaluate_segmentation_results)
+        [quick_images]: number of images evaluated in the quick mode
+        [quick_block_size]: size of the blocks used to downsample the masks in the quick mode
+        [progress]: a stream (see util.progress.create_progress_stream) where the progress of the evaluation is reported
+        [backend]: the backend that counts the pixels of the segmentations ('numpy', 'numba' or 'auto', see
+                   evaluation_metrics.segmentation_kernels.get_segmentation_kernel)
+        [annotators_folder]: full path to a folder with a subfolder of annotations per annotator. If given, the segmentations are
+                             also evaluated with respect to each annotator (see evaluation_metrics_for_segmentation.evaluate_segmentation_results)
+        [tile_rows]: if given, the BMP segmentations are streamed in bands of this number of rows, with a fixed memory footprint
+                     (see evaluation_metrics_for_segmentation.evaluate_tiled_segmentation)
+        [heatmap_peak]: the method used to locate the fovea in the heatmaps, if they are submitted instead of the coordinates
+                        ('argmax' or 'centroid', see evaluation_metrics_for_fovea_location.get_heatmap_peaks)
+        [decoded_segmentations]: the BMP segmentations already decoded from the submission file, instead of the files in the
+                                 segmentation folder (see util.archive_extraction.extract_submission)
     Output:
         mean_cup_dice: the mean Dice coefficient for the optic cups
         mean_disc_dice: the mean Dice coefficient for the optic disc
@@ -28,101 +64,470 @@ def evaluate_single_submission(results_folder, gt_folder, output_path=None, expo
     '''
 
     # correct results folder in case of a wrong organization of the folders
+    results_folder = find_results_root(results_folder)
+
+    # identify the tasks to evaluate
+    task_functions = dict()
+
+    # check if there are segmentation results (BMP files, run-length encoded masks or probability maps)
+    if ( path.exists(path.join(results_folder, 'segmentation')) or path.exists(path.join(results_folder, SEGMENTATION_RLE_FILENAMES[0])) or
+            path.exists(path.join(results_folder, 'segmentation_probabilities')) ) and (tasks is None or 'segmentation' in tasks):
+        task_functions['segmentation'] = partial(evaluate_segmentation_task, boundary_metrics=boundary_metrics,
+                                                 quick=quick, quick_images=quick_images, quick_block_size=quick_block_size,
+                                                 progress=progress, backend=backend, annotators_folder=annotators_folder,
+                                                 tile_rows=tile_rows, decoded_segmentations=decoded_segmentations)
+
+    # check if there are classification results
+    if path.exists(path.join(results_folder, 'classification_results.csv')) and (tasks is None or 'classification' in tasks):
+        task_functions['classification'] = evaluate_classification_task
+
+    # check if there are fovea location results
+    if ( path.exists(path.join(results_folder, 'fovea_location_results.csv')) or path.exists(path.join(results_folder, 'fovea_localization_results.csv')) or
+            path.exists(path.join(results_folder, FOVEA_HEATMAP_FILENAMES[0])) ) and (tasks is None or 'fovea_location' in tasks):
+        task_functions['fovea_location'] = partial(evaluate_fovea_location_task, heatmap_peak=heatmap_peak)
+
+    # create the output folder before running the tasks, so they don't compete to create it
+    if not (output_path is None) and not path.exists(output_path):
+        makedirs(output_path)
+
+    # evaluate all the tasks
+    task_outputs = run_evaluation_tasks(task_functions, (results_folder, gt_folder, output_path, export_table, is_training), parallel)
+
+    # report the results and the errors of each task
+    for task in TASK_NAMES:
+        if task in task_outputs:
+            emit_event(progress, 'task_done', task=task, performance=task_outputs[task][0], error=task_outputs[task][1])
+        if (task in task_outputs) and not (task_outputs[task][1] is None):
+            print('> *** There was an error processing the {} results of this submission ({}). Please, check the format instructions!'.format(task.replace('_', ' '), task_outputs[task][1]))
+
+    # collect the performance of each task, or NaN if it was not evaluated
+    segmentation_performance = task_outputs['segmentation'][0] if 'segmentation' in task_outputs else [ np.nan, np.nan, np.nan ]
+    classification_performance = task_outputs['classification'][0] if 'classification' in task_outputs else [ np.nan, np.nan ]
+    fovea_location_performance = task_outputs['fovea_location'][0] if 'fovea_location' in task_outputs else np.nan
+
+    return segmentation_performance, classification_performance, fovea_location_performance
+
+
+
+def evaluate_submission_on_gt_sets(results_folder, gt_sets, output_paths, export_table=False, is_training=False, tasks=None, parallel=True, boundary_metrics=False,
+                                   progress=None, backend='numpy', tile_rows=None):
+    '''
+    Evaluate the results of a single submission against several ground truth sets (e.g. the validation and the test sets).
+    Each prediction is evaluated against every set that includes its image, and the BMP or run-length encoded
+    segmentations are decoded only once (see evaluation_metrics_for_segmentation.evaluate_segmentation_results_on_gt_sets)
+
+    Input:
+        results_folder: full path to the submitted results
+        gt_sets: a list of (name, gt_folder) pairs with the name and the full path to the ground truth files of each set
+        output_paths: a list with the folder where the results of each set will be saved
+        [export_table], [is_training], [tasks], [parallel], [boundary_metrics], [progress], [backend], [tile_rows]: see evaluate_single_submission
+    Output:
+        performances: a dictionary mapping the name of each set to a tuple (segmentation_performance, classification_performance,
+                      fovea_location_performance), as retrieved by evaluate_single_submission
+    '''
+
+    # correct results folder in case of a wrong organization of the folders
+    results_folder = find_results_root(results_folder)
+    gt_folders = [ gt_folder for _, gt_folder in gt_sets ]
+
+    # identify the tasks to evaluate
+    task_functions = dict()
+    if ( path.exists(path.join(results_folder, 'segmentation')) or path.exists(path.join(results_folder, SEGMENTATION_RLE_FILENAMES[0])) or
+            path.exists(path.join(results_folder, 'segmentation_probabilities')) ) and (tasks is None or 'segmentation' in tasks):
+        task_functions['segmentation'] = partial(evaluate_segmentation_task_on_gt_sets, boundary_metrics=boundary_metrics, progress=progress, backend=backend, tile_rows=tile_rows)
+    if path.exists(path.join(results_folder, 'classification_results.csv')) and (tasks is None or 'classification' in tasks):
+        task_functions['classification'] = partial(evaluate_task_on_gt_sets, 'classification', evaluate_classification_task)
+    if ( path.exists(path.join(results_folder, 'fovea_location_results.csv')) or path.exists(path.join(results_folder, 'fovea_localization_results.csv')) or
+            path.exists(path.join(results_folder, FOVEA_HEATMAP_FILENAMES[0])) ) and (tasks is None or 'fovea_location' in tasks):
+        task_functions['fovea_location'] = partial(evaluate_task_on_gt_sets, 'fovea_location', evaluate_fovea_location_task)
+
+    # create the output folders before running the tasks, so they don't compete to create them
+    for output_path in output_paths:
+        if not path.exists(output_path):
+            makedirs(output_path)
+
+    # evaluate all the tasks, on all the sets
+    task_outputs = run_evaluation_tasks(task_functions, (results_folder, gt_folders, output_paths, export_table, is_training), parallel)
+
+    # report the errors of each task
+    for task in TASK_NAMES:
+        if task in task_outputs:
+            emit_event(progress, 'task_done', task=task, performance=task_outputs[task][0], error=task_outputs[task][1])
+        if (task in task_outputs) and not (task_outputs[task][1] is None):
+            print('> *** There was an error processing the {} results of this submission ({}). Please, check the format instructions!'.format(task.replace('_', ' '), task_outputs[task][1]))
+
+    # collect the performance of each task and each set, or NaN if it was not evaluated
+    performances = dict()
+    for k in range(len(gt_sets)):
+        set_performance = []
+        for task in TASK_NAMES:
+            if (task in task_outputs) and task_outputs[task][1] is None:
+                set_performance.append(task_outputs[task][0][k])
+            else:
+                set_performance.append(NAN_PERFORMANCE[task])
+        performances[gt_sets[k][0]] = tuple(set_performance)
+
+    return performances
+
+
+
+def evaluate_segmentation_task_on_gt_sets(results_folder, gt_folders, output_paths, export_table=False, is_training=False, boundary_metrics=False,
+                                          progress=None, backend='numpy', tile_rows=None):
+    '''
+    Evaluate the segmentation results of a single submission against several ground truth sets
+
+    Input:
+        results_folder: full path to the submitted results
+        gt_folders: a list with the full path to the ground truth files of each set
+        output_paths: a list with the folder where the results of each set will be saved
+        [export_table], [is_training], [boundary_metrics], [progress], [backend], [tile_rows]: see evaluate_segmentation_task
+    Output:
+        segmentation_performances: a list with the segmentation performance of each set (see evaluate_segmentation_task)
+    '''
+
+    print('> Evaluating segmentation results')
+
+    # prepare the segmentation folder (or the file with the run-length encoded masks, if there are no BMP files)
+    segmentation_folder = path.join(results_folder, 'segmentation')
+    if not path.exists(segmentation_folder):
+        segmentation_folder = path.join(results_folder, SEGMENTATION_RLE_FILENAMES[0])
+    # prepare the gt labels folder of each set
+    gt_segmentation_folders = [ path.join(gt_folder, 'Disc_Cup_Masks') for gt_folder in gt_folders ]
+
+    # the probability maps are evaluated at all the thresholds, once for each set
+    probability_folder = path.join(results_folder, 'segmentation_probabilities')
+    if not path.exists(segmentation_folder) and path.exists(probability_folder):
+        segmentation_performances = []
+        for k in range(len(gt_folders)):
+            gt_filenames = evaluation_metrics_for_segmentation.get_gt_segmentation_filenames(gt_segmentation_folders[k], is_training)
+            try:
+                mean_cup_dice, mean_disc_dice, mae_cdr, _ = evaluation_metrics_for_segmentation.evaluate_probability_segmentation_results(probability_folder, gt_segmentation_folders[k],
+                                                                                                                                         output_path=output_paths[k],
+                                                                                                                                         export_table=export_table,
+                                                                                                                                         is_training=is_training,
+                                                                                                                                         progress=progress,
+                                                                                                                                         image_filenames=gt_filenames)
+                segmentation_performances.append([ mean_cup_dice, mean_disc_dice, mae_cdr ])
+            except ValueError:
+                # none of the probability maps is in this set
+                segmentation_performances.append(NAN_PERFORMANCE['segmentation'])
+        return segmentation_performances
+
+    # evaluate the segmentations against all the sets
+    return evaluation_metrics_for_segmentation.evaluate_segmentation_results_on_gt_sets(segmentation_folder, gt_segmentation_folders, output_paths,
+                                                                                       export_table=export_table,
+                                                                                       is_training=is_training,
+                                                                                       boundary_metrics=boundary_metrics,
+                                                                                       progress=progress,
+                                                                                       backend=backend,
+                                                                                       tile_rows=tile_rows)
+
+
+
+def evaluate_task_on_gt_sets(task, task_function, results_folder, gt_folders, output_paths, export_table=False, is_training=False):
+    '''
+    Evaluate a task (classification or fovea location) against several ground truth sets, ignoring the predictions of the
+    images that are not in each set. The CSV files are small, so they are simply read again for each set
+
+    Input:
+        task: the name of the task
+        task_function: the function that evaluates the task against a single set (e.g. evaluate_classification_task)
+        results_folder: full path to the submitted results
+        gt_folders: a list with the full path to the ground truth files of each set
+        output_paths: a list with the folder where the results of each set will be saved
+        [export_table]: a boolean value indicating if the tables will be exported or not
+        [is_training]: a boolean value indicating if the evaluation is performed on training data or not
+    Output:
+        performances: a list with the performance of each set (NaN for the sets where the task can't be evaluated)
+    '''
+
+    performances = []
+    for k in range(len(gt_folders)):
+        # the errors of a set (e.g. a set without labels for this task) don't affect the others
+        try:
+            performances.append(task_function(results_folder, gt_folders[k], output_paths[k], export_table, is_training, ignore_unknown_images=True))
+        except Exception as e:
+            print('> *** The {} results could not be evaluated against {} ({})'.format(task.replace('_', ' '), gt_folders[k], str(e)))
+            performances.append(NAN_PERFORMANCE[task])
+
+    return performances
+
+
+
+def find_results_root(results_folder):
+    '''
+    Find the folder with the results of a submission, which might be inside another folder if the zip file
+    was created compressing the folder instead of the files
+
+    Input:
+        results_folder: full path to the submitted results
+    Output:
+        results_folder: full path to the folder with the results
+    '''
+
     inside_results_folder = listdir(results_folder)
     if '__MACOSX' in inside_results_folder: 
         inside_results_folder.remove('__MACOSX')
     if ( ( not (path.exists(path.join(results_folder, 'segmentation'))) and path.exists(path.join(results_folder, inside_results_folder[0], 'segmentation')) ) or 
+            ( not (path.exists(path.join(results_folder, SEGMENTATION_RLE_FILENAMES[0]))) and path.exists(path.join(results_folder, inside_results_folder[0], SEGMENTATION_RLE_FILENAMES[0])) ) or 
+            ( not (path.exists(path.join(results_folder, 'segmentation_probabilities'))) and path.exists(path.join(results_folder, inside_results_folder[0], 'segmentation_probabilities')) ) or 
             ( not (path.exists(path.join(results_folder, 'classification_results.csv'))) and path.exists(path.join(results_folder, inside_results_folder[0], 'classification_results.csv')) ) or 
             ( not (path.exists(path.join(results_folder, 'fovea_localization_results.csv'))) and path.exists(path.join(results_folder, inside_results_folder[0], 'fovea_localization_results.csv')) ) or
-            ( not (path.exists(path.join(results_folder, 'fovea_location_results.csv'))) and path.exists(path.join(results_folder, inside_results_folder[0], 'fovea_location_results.csv')) ) ):
+            ( not (path.exists(path.join(results_folder, 'fovea_location_results.csv'))) and path.exists(path.join(results_folder, inside_results_folder[0], 'fovea_location_results.csv')) ) or
+            ( not (path.exists(path.join(results_folder, FOVEA_HEATMAP_FILENAMES[0]))) and path.exists(path.join(results_folder, inside_results_folder[0], FOVEA_HEATMAP_FILENAMES[0])) ) ):
         results_folder = path.join(results_folder, inside_results_folder[0])
 
-    # evaluate the segmentation results -----------------
+    return results_folder
+
+
 
-    # prepare the segmentation folder
+def evaluate_segmentation_task(results_folder, gt_folder, output_path=None, export_table=False, is_training=False, boundary_metrics=False,
+                               quick=False, quick_images=20, quick_block_size=4, progress=None, backend='numpy', annotators_folder=None, tile_rows=None,
+                               decoded_segmentations=None):
+    '''
+    Evaluate the segmentation results of a single submission
+
+    Input:
+        results_folder: full path to the submitted results
+        gt_folder: full path to the ground truth files
+        [output_path]: a folder where the results will be saved. If not provided, the results are not saved
+        [export_table]: a boolean value indicating if the table will be exported or not
+        [is_training]: a boolean value indicating if the evaluation is performed on training data or not
+        [boundary_metrics]: a boolean value indicating if the boundary distances (HD95 and ASSD) will be computed or not
+        [quick]: a boolean value indicating if the results should be quickly estimated instead of evaluated
+        [quick_images]: number of images evaluated in the quick mode
+        [quick_block_size]: size of the blocks used to downsample the masks in the quick mode
+        [progress]: a stream (see util.progress.create_progress_stream) where the results of each image are reported
+        [backend]: the backend that counts the pixels of the segmentations
+        [annotators_folder]: full path to a folder with a subfolder of annotations per annotator, or None
+        [tile_rows]: number of rows of the bands in which the segmentations are streamed, or None to read the full images
+        [decoded_segmentations]: the BMP segmentations already decoded from the submission file, or None to read them from the segmentation folder
+    Output:
+        segmentation_performance: a list with the mean cup Dice, the mean disc Dice and the MAE of the vertical cup to disc ratio
+                                  (estimated values in the quick mode)
+    '''
+
+    print('> Evaluating segmentation results')
+
+    # prepare the segmentation folder (or the file with the run-length encoded masks, if there are no BMP files)
     segmentation_folder = path.join(results_folder, 'segmentation')
+    if not path.exists(segmentation_folder):
+        segmentation_folder = path.join(results_folder, SEGMENTATION_RLE_FILENAMES[0])
+    # prepare the gt labels folder for segmentation
+    gt_segmentation_folder = path.join(gt_folder, 'Disc_Cup_Masks')
 
-    # check if there are segmentation results
-    if path.exists(segmentation_folder):
-        print('> Evaluating segmentation results')
-        # prepare the gt labels folder for segmentation
-        gt_segmentation_folder = path.join(gt_folder, 'Disc_Cup_Masks')
+    # evaluate the probability maps at all the thresholds, if there are no binary segmentations
+    probability_folder = path.join(results_folder, 'segmentation_probabilities')
+    if not path.exists(segmentation_folder) and path.exists(probability_folder):
+        mean_cup_dice, mean_disc_dice, mae_cdr, _ = evaluation_metrics_for_segmentation.evaluate_probability_segmentation_results(probability_folder, gt_segmentation_folder,
+                                                                                                                                 output_path=output_path,
+                                                                                                                                 export_table=export_table,
+                                                                                                                                 is_training=is_training,
+                                                                                                                                 progress=progress)
+        return [ mean_cup_dice, mean_disc_dice, mae_cdr ]
 
-        # evaluate the segmentation results
-        try:
-            mean_cup_dice, mean_disc_dice, mae_cdr = evaluation_metrics_for_segmentation.evaluate_segmentation_results(segmentation_folder, gt_segmentation_folder, 
-                                                                                                                    output_path=output_path, 
-                                                                                                                    export_table=export_table,
-                                                                                                                    is_training=is_training)
-            # initialize a tuple with all the results for segmentation
-            segmentation_performance = [ mean_cup_dice, mean_disc_dice, mae_cdr ]
-        except:
-            print('> *** There was an error processing this submission. Please, check the format instructions!')
-            segmentation_performance = [ np.nan, np.nan, np.nan ]
-    else:
-        segmentation_performance = [ np.nan, np.nan, np.nan ]
+    # the run-length encoded masks are fast enough to be fully evaluated
+    if quick and path.isfile(segmentation_folder):
+        print('> The segmentations are run-length encoded, so all of them are evaluated instead of quickly estimated')
+        quick = False
+    # and the decoded masks are not on disk
+    if quick and not (decoded_segmentations is None):
+        print('> The segmentations are decoded from the submission file, so all of them are evaluated instead of quickly estimated')
+        quick = False
 
+    # estimate the segmentation results on a subset of downsampled masks
+    if quick:
+        estimates, _, _ = evaluation_metrics_for_segmentation.quick_evaluate_segmentation_results(segmentation_folder, gt_segmentation_folder,
+                                                                                                  output_path=output_path,
+                                                                                                  is_training=is_training,
+                                                                                                  n_images=quick_images,
+                                                                                                  block_size=quick_block_size)
+        return estimates.tolist()
+
+    # evaluate the segmentation results
+    mean_cup_dice, mean_disc_dice, mae_cdr = evaluation_metrics_for_segmentation.evaluate_segmentation_results(segmentation_folder, gt_segmentation_folder, 
+                                                                                                            output_path=output_path, 
+                                                                                                            export_table=export_table,
+                                                                                                            is_training=is_training,
+                                                                                                            boundary_metrics=boundary_metrics,
+                                                                                                            progress=progress,
+                                                                                                            backend=backend,
+                                                                                                            annotators_folder=annotators_folder,
+                                                                                                            tile_rows=tile_rows,
+                                                                                                            decoded_segmentations=decoded_segmentations)
+
+    return [ mean_cup_dice, mean_disc_dice, mae_cdr ]
+
+
+
+def evaluate_classification_task(results_folder, gt_folder, output_path=None, export_table=False, is_training=False, ignore_unknown_images=False):
+    '''
+    Evaluate the classification results of a single submission
+
+    Input:
+        results_folder: full path to the submitted results
+        gt_folder: full path to the ground truth files
+        [output_path]: a folder where the results will be saved. If not provided, the results are not saved
+        [export_table]: a boolean value indicating if the table will be exported or not
+        [is_training]: a boolean value indicating if the evaluation is performed on training data or not
+        [ignore_unknown_images]: a boolean value indicating if the images without ground truth are ignored
+    Output:
+        classification_performance: a list with the AUC and the reference sensitivity
+    '''
 
-    # evaluate the classification results -----------------
+    print('> Evaluating classification results')
 
     # prepare the path to the classification results
     classification_filename = path.join(results_folder, 'classification_results.csv')
-
-    # check if there are classification results
-    if path.exists(classification_filename):
-        print('> Evaluating classification results')
-        # prepare the gt labels folder for classification
-        if is_training:
-            gt_classification_folder = path.join(gt_folder, 'Disc_Cup_Masks')
-        else:
-            gt_classification_folder = gt_folder
-        # get the AUC and the reference sensitivity values
-        try:
-            auc, reference_sensitivity = evaluation_metrics_for_classification.evaluate_classification_results(classification_filename, gt_classification_folder, 
-                                                                                                            output_path=output_path,
-                                                                                                            is_training=is_training)
-            # initialize a tuple with all the results for classification
-            classification_performance = [ auc, reference_sensitivity ]
-        except:
-            print('> *** There was an error processing this submission. Please, check the format instructions!')
-            classification_performance = [ np.nan, np.nan ]
+    # prepare the gt labels folder for classification
+    if is_training:
+        gt_classification_folder = path.join(gt_folder, 'Disc_Cup_Masks')
     else:
-        classification_performance = [ np.nan, np.nan ]
+        gt_classification_folder = gt_folder
+
+    # get the AUC and the reference sensitivity values
+    auc, reference_sensitivity = evaluation_metrics_for_classification.evaluate_classification_results(classification_filename, gt_classification_folder, 
+                                                                                                    output_path=output_path,
+                                                                                                    is_training=is_training,
+                                                                                                    export_table=export_table,
+                                                                                                    ignore_unknown_images=ignore_unknown_images)
 
+    return [ auc, reference_sensitivity ]
+
+
+
+def evaluate_fovea_location_task(results_folder, gt_folder, output_path=None, export_table=False, is_training=False, ignore_unknown_images=False, heatmap_peak='centroid'):
+    '''
+    Evaluate the fovea location results of a single submission
+
+    Input:
+        results_folder: full path to the submitted results
+        gt_folder: full path to the ground truth files
+        [output_path]: a folder where the results will be saved. If not provided, the results are not saved
+        [export_table]: not used, kept for compatibility with the other tasks
+        [is_training]: a boolean value indicating if the evaluation is performed on training data or not
+        [ignore_unknown_images]: a boolean value indicating if the images without ground truth are ignored
+        [heatmap_peak]: the method used to locate the fovea in the heatmaps, if there are no coordinates
+    Output:
+        fovea_location_performance: the mean Euclidean distance
+    '''
 
-    # evaluate the fovea location results -----------------
+    print('> Evaluating fovea location results')
 
     # prepare the path to the fovea location results
     fovea_location_filename = path.join(results_folder, 'fovea_location_results.csv')
     if not path.exists(fovea_location_filename):
         fovea_location_filename = path.join(results_folder, 'fovea_localization_results.csv')
-
-    # check if there are fovea location results
-    if path.exists(fovea_location_filename):
-        print('> Evaluating fovea location results')
-        # prepare the filename to the fovea location gt
-        try:
-            if is_training:
-                gt_filename = path.join(gt_folder, 'Fovea_location.xlsx')
-            else:
-                gt_filename = path.join(gt_folder, 'Fovea_locations.xlsx')
-            # get the mean euclidean distance
-            fovea_location_performance = evaluation_metrics_for_fovea_location.evaluate_fovea_location_results(fovea_location_filename, gt_filename,
-                                                                                                            output_path=output_path,
-                                                                                                            is_training=is_training)
-        except:
-            print('> *** There was an error processing this submission. Please, check the format instructions!')
-            fovea_location_performance = np.nan
+    # or to the heatmaps, if there are no coordinates
+    if not path.exists(fovea_location_filename) and path.exists(path.join(results_folder, FOVEA_HEATMAP_FILENAMES[0])):
+        fovea_location_filename = path.join(results_folder, FOVEA_HEATMAP_FILENAMES[0])
+    # prepare the filename to the fovea location gt
+    if is_training:
+        gt_filename = path.join(gt_folder, 'Fovea_location.xlsx')
     else:
-        fovea_location_performance = np.nan
+        gt_filename = path.join(gt_folder, 'Fovea_locations.xlsx')
 
+    # get the mean euclidean distance
+    return evaluation_metrics_for_fovea_location.evaluate_fovea_location_results(fovea_location_filename, gt_filename,
+                                                                                output_path=output_path,
+                                                                                is_training=is_training,
+                                                                                ignore_unknown_images=ignore_unknown_images,
+                                                                                heatmap_peak=heatmap_peak)
 
-    return segmentation_performance, classification_performance, fovea_location_performance
 
 
+class ThreadRoutedStream(object):
+    '''
+    A replacement of sys.stdout that keeps the text printed by each registered thread in its own buffer, and
+    writes the text of the rest of the threads to the original stream
+    '''
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = dict()
+
+    def write(self, text):
+        return self.buffers.get(threading.get_ident(), self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+
+def run_task_with_buffered_output(routed_stream, task_function, arguments):
+    '''
+    Run a task in the current thread, printing all its messages at once when it finishes, so the messages of the
+    tasks that run concurrently are not interleaved
+
+    Input:
+        routed_stream: the ThreadRoutedStream that replaces sys.stdout
+        task_function: the function that evaluates the task
+        arguments: a tuple with the arguments for the task function
+    Output:
+        the output of task_function
+    '''
+
+    thread_id = threading.get_ident()
+    routed_stream.buffers[thread_id] = io.StringIO()
+    try:
+        return task_function(*arguments)
+    finally:
+        routed_stream.stream.write(routed_stream.buffers.pop(thread_id).getvalue())
+        routed_stream.stream.flush()
+
+
+
+def run_evaluation_tasks(task_functions, arguments, parallel=True):
+    '''
+    Run the evaluation of several tasks, concurrently or one after the other. The tasks share no state, so
+    the total time is close to the time of the slowest one. When they run concurrently, the messages of each
+    task are printed together when it finishes.
+
+    Input:
+        task_functions: a dictionary mapping the name of each task to the function that evaluates it
+        arguments: a tuple with the arguments for the task functions
+        [parallel]: a boolean value indicating if the tasks should run concurrently
+    Output:
+        task_outputs: a dictionary mapping the name of each task to a (performance, error) tuple, with error
+                      being None if the task succeeded or a string with the error message otherwise
+    '''
+
+    task_outputs = dict()
+
+    if parallel and len(task_functions) > 1:
+        # buffer the messages of each task
+        original_stdout = sys.stdout
+        routed_stdout = ThreadRoutedStream(original_stdout)
+        sys.stdout = routed_stdout
+        try:
+            # dispatch all the tasks at the same time
+            with ThreadPoolExecutor(max_workers=len(task_functions)) as executor:
+                futures = dict()
+                for task in task_functions.keys():
+                    futures[task] = executor.submit(run_task_with_buffered_output, routed_stdout, task_functions[task], arguments)
+                # gather the outputs and the errors of each task
+                for task in futures.keys():
+                    try:
+                        task_outputs[task] = (futures[task].result(), None)
+                    except Exception as e:
+                        task_outputs[task] = (NAN_PERFORMANCE[task], str(e))
+        finally:
+            sys.stdout = original_stdout
+    else:
+        # run the tasks one after the other
+        for task in task_functions.keys():
+            try:
+                task_outputs[task] = (task_functions[task](*arguments), None)
+            except Exception as e:
+                task_outputs[task] = (NAN_PERFORMANCE[task], str(e))
+
+    return task_outputs
+
 
 import argparse
-import sys
 
 if __name__ == '__main__':
 
@@ -133,10 +538,25 @@ if __name__ == '__main__':
     parser.add_argument("--output_path", help="a folder where the results will be saved. If not provided, the results are not saved", type=str, default=None)
     parser.add_argument("--export_table", help="a boolean value indicating if the table will be exported or not", type=str, default='False')
     parser.add_argument("--is_training", help="a boolean value indicating if the evaluation is performed on training data or not", type=str, default='False')
+    parser.add_argument("--parallel", help="a boolean value indicating if the tasks should be evaluated concurrently", type=str, default='True')
+    parser.add_argument("--quick", help="a boolean value indicating if the segmentations should be quickly estimated on a subset of downsampled masks, with error bounds", type=str, default='False')
+    parser.add_argument("--quick_images", help="number of images evaluated in the quick mode", type=int, default=20)
+    parser.add_argument("--quick_block_size", help="size (in pixels) of the blocks used to downsample the masks in the quick mode", type=int, default=4)
+    parser.add_argument("--boundary_metrics", help="a boolean value indicating if the boundary distances of the segmentations (HD95 and ASSD) will be computed or not", type=str, default='False')
+    parser.add_argument("--backend", help="backend that counts the pixels of the segmentations (numpy, numba or auto)", type=str, default='numpy', choices=SEGMENTATION_BACKENDS)
+    parser.add_argument("--progress_file", help="a JSON lines file where the progress of the evaluation (per image results, speed, remaining time and running means) is appended", type=str, default=None)
+    parser.add_argument("--progress_interval", help="minimum time (in seconds) between two progress events of the same task", type=float, default=1.0)
+    parser.add_argument("--annotators_folder", help="a folder with a subfolder of annotations per annotator. If provided, the segmentations are also evaluated with respect to each annotator", type=str, default=None)
+    parser.add_argument("--tile_rows", help="if provided, the segmentations are streamed in bands of this number of rows, with a fixed memory footprint", type=int, default=None)
+    parser.add_argument("--fovea_peak", help="method used to locate the fovea in the heatmaps, if they are submitted instead of the coordinates (argmax or centroid)", type=str, default='centroid', choices=HEATMAP_PEAK_METHODS)
     args = parser.parse_args()
 
     # call the "main" function
-    evaluate_single_submission(args.results_folder, args.gt_folder, args.output_path, parse_boolean(args.export_table), parse_boolean(args.is_training))
+    evaluate_single_submission(args.results_folder, args.gt_folder, args.output_path, parse_boolean(args.export_table), parse_boolean(args.is_training), parallel=parse_boolean(args.parallel),
+                               boundary_metrics=parse_boolean(args.boundary_metrics), quick=parse_boolean(args.quick),
+                               quick_images=args.quick_images, quick_block_size=args.quick_block_size,
+                               progress=create_progress_stream(args.progress_file, min_interval=args.progress_interval), backend=args.backend,
+                               annotators_folder=args.annotators_folder, tile_rows=args.tile_rows, heatmap_peak=args.fovea_peak)
     
     
     
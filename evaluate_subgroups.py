@@ -0,0 +1,90 @@
+
+from os import path, makedirs
+
+from generate_leaderboards import generate_leaderboards
+from util.file_management import read_table_of_results, read_subgroup_spec, export_table_of_results, export_ranking, parse_boolean
+from util.leaderboard_criteria import LEADERBOARDS, LEADERBOARD_NAMES, TIE_POLICIES
+from util.per_image_results import load_per_image_results
+from util.subgroups import get_subgroups, get_subgroup_results, get_group_folder_name, SUBGROUP_SIZE_COLUMNS
+
+
+def evaluate_subgroups(results_table_filename, uncompressed_files_folder, output_path, subgroups_filename=None, label_groups=True,
+                       leaderboards=True, leaderboard_names=LEADERBOARD_NAMES, ties='min', use_cache=True):
+    '''
+    Evaluate all the teams on subgroups of the images (e.g. the glaucomatous and the healthy images, or the images of each
+    acquisition device), from the results per image that were already computed by evaluate_multiple_submissions
+
+    Input:
+        results_table_filename: full path and filename to the CSV file with the results
+        uncompressed_files_folder: folder with the uncompressed submissions, including the tables with the results per image
+        output_path: output path. The results of each subgroup are saved in a folder with its name
+        [subgroups_filename]: a CSV file with the tags of each image (see util.file_management.read_subgroup_spec)
+        [label_groups]: a boolean indicating if the glaucomatous and the healthy images are evaluated as subgroups too
+        [leaderboards]: a boolean indicating if the leaderboards of each subgroup are generated
+        [leaderboard_names]: a list with the names of the leaderboards to generate (see util.leaderboard_criteria.LEADERBOARDS)
+        [ties]: policy for tied values (see util.leaderboard_criteria.rank_values)
+        [use_cache]: a boolean indicating if a binary copy of the results per image should be kept in the output path
+                     (see util.per_image_results.load_per_image_results)
+    '''
+
+    # read the teams and their results per image
+    _, teams, _ = read_table_of_results(results_table_filename)
+    per_image_results = load_per_image_results(uncompressed_files_folder, teams, output_path if use_cache else None)
+
+    # collect the images of each subgroup
+    image_tags = None if subgroups_filename is None else read_subgroup_spec(subgroups_filename)
+    groups = get_subgroups(per_image_results, image_tags, label_groups)
+    folder_names = [ get_group_folder_name(name) for name, _ in groups ]
+    if len(set(folder_names)) != len(folder_names):
+        raise ValueError('The names of some subgroups are only different in their special characters.')
+
+    # compute the metrics of all the subgroups
+    results, sizes = get_subgroup_results(per_image_results, groups)
+    export_ranking(path.join(output_path, 'subgroup_sizes.csv'), ['Subgroup'] + SUBGROUP_SIZE_COLUMNS, [ name for name, _ in groups ], sizes)
+
+    for g in range(len(groups)):
+        print('> Subgroup {}: {} images'.format(groups[g][0], len(groups[g][1])))
+
+        # save the table of results of the subgroup, with the same format than the one of all the images
+        group_folder = path.join(output_path, folder_names[g])
+        if not path.exists(group_folder):
+            makedirs(group_folder)
+        table_filename = path.join(group_folder, 'table_of_results.csv')
+        export_table_of_results(table_filename, teams, results[g, :, 0:3], results[g, :, 3:5], results[g, :, 5])
+
+        # and rank the teams on the subgroup
+        if leaderboards:
+            generate_leaderboards(table_filename, group_folder, leaderboard_names, ties)
+
+
+
+import argparse
+import sys
+
+if __name__ == '__main__':
+
+    # create an argument parser to control the input parameters
+    parser = argparse.ArgumentParser()
+    parser.add_argument("results_table_filename", help="full path and filename to the CSV file with the results", type=str)
+    parser.add_argument("uncompressed_files_folder", help="folder with the uncompressed submissions, as generated by evaluate_multiple_submissions", type=str)
+    parser.add_argument("output_path", help="output path", type=str)
+    parser.add_argument("--subgroups", help="CSV file with a header, the image filename in the first column and its tags (subgroups) in the rest of the columns", type=str, default=None)
+    parser.add_argument("--label_groups", help="a boolean indicating if the glaucomatous and the healthy images are evaluated as subgroups too", type=str, default='True')
+    parser.add_argument("--leaderboards", help="a boolean indicating if the leaderboards of each subgroup are generated", type=str, default='True')
+    parser.add_argument("--leaderboard_names", help="comma separated list of leaderboards to generate for each subgroup", type=str, default=','.join(LEADERBOARD_NAMES))
+    parser.add_argument("--ties", help="policy to rank tied values", type=str, choices=TIE_POLICIES, default='min')
+    parser.add_argument("--use_cache", help="a boolean indicating if a binary copy of the results per image should be kept in the output path (and updated when it is outdated)", type=str, default='True')
+    args = parser.parse_args()
+
+    # check the names of the leaderboards before evaluating anything
+    leaderboard_names = args.leaderboard_names.split(',')
+    for name in leaderboard_names:
+        if not (name in LEADERBOARDS):
+            parser.error('Unknown leaderboard "{}". Choose among {}.'.format(name, ', '.join(LEADERBOARD_NAMES)))
+
+    if not path.exists(args.output_path):
+        makedirs(args.output_path)
+
+    # call the "main" function
+    evaluate_subgroups(args.results_table_filename, args.uncompressed_files_folder, args.output_path, args.subgroups, parse_boolean(args.label_groups),
+                       parse_boolean(args.leaderboards), leaderboard_names, args.ties, parse_boolean(args.use_cache))
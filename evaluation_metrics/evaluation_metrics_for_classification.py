@@ -1,30 +1,31 @@
 
 import numpy as np
 
-from util.file_management import read_csv_classification_results, sort_scores_by_filename, get_labels_from_training_data, save_roc_curve, save_csv_classification_performance, read_gt_labels
+from util.file_management import read_csv_classification_results, sort_scores_by_filename, get_labels_from_training_data, save_roc_curve, save_csv_classification_performance, read_gt_labels, save_csv_classification_table
 
 from sklearn.metrics import roc_auc_score, roc_curve
 from os import path, makedirs
 from scipy.interpolate import interp1d
 
 
-def get_roc_curve(predicted_scores, gt_labels):
+def get_roc_curve(predicted_scores, gt_labels, sample_weight=None):
     '''
     Computes the ROC curve and the area under it (AUC)
 
     Input:
         predicted_scores: a 1D numpy array with the scores as provided in the CSV file
         gt_labels: a 1D numpy array with the gt labels (0: healthy, 1: glaucomatous)
+        [sample_weight]: a 1D numpy array with the number of images of each score and label, if they are aggregated
     Output:
         auc: the area under the ROC curve
 
     '''
 
     # compute the ROC curve
-    fpr, tpr, _ = roc_curve(gt_labels, predicted_scores)
+    fpr, tpr, _ = roc_curve(gt_labels, predicted_scores, sample_weight=sample_weight)
 
     # compute the area under the ROC curve
-    auc = roc_auc_score(gt_labels, predicted_scores)
+    auc = roc_auc_score(gt_labels, predicted_scores, sample_weight=sample_weight)
 
     return tpr, fpr, auc
 
@@ -51,7 +52,38 @@ def get_sensitivity_at_given_specificity(sensitivity, specificity, specificity_r
 
 
 
-def evaluate_classification_results(prediction_filename, gt_folder, output_path=None, is_training=False):
+def get_classification_performance(image_filenames, predicted_scores, gt_filenames, gt_labels):
+    '''
+    Compute the ROC curve, the AUC and the reference sensitivity of the classification results
+
+    Input:
+        image_filenames: a list with the names of the images with predicted scores
+        predicted_scores: a 1D numpy array with the predicted score of each image
+        gt_filenames: a list with the names of the images with gt labels (case is ignored)
+        gt_labels: a numpy array with the gt label of each image (0: healthy, 1: glaucomatous)
+    Output:
+        sensitivity, fpr: the sensitivity and the false positive rate of each point of the ROC curve
+        auc: the area under the ROC curve
+        sensitivity_at_reference_value: the sensitivity at the reference specificity
+        gt_labels: the gt labels sorted in the same order than image_filenames
+    '''
+
+    # sort the gt filenames using the same order as predicted
+    gt_labels = sort_scores_by_filename(image_filenames, gt_filenames, gt_labels)
+
+    # compute the ROC curve
+    sensitivity, fpr, auc = get_roc_curve(predicted_scores, gt_labels)
+    # compute specificity
+    specificity = 1 - fpr
+
+    # get sensitivity at reference value
+    sensitivity_at_reference_value = get_sensitivity_at_given_specificity(sensitivity, specificity)
+
+    return sensitivity, fpr, auc, sensitivity_at_reference_value, gt_labels
+
+
+
+def evaluate_classification_results(prediction_filename, gt_folder, output_path=None, is_training=False, export_table=False, ignore_unknown_images=False):
     '''
     Evaluate the results of a classification algorithm
 
@@ -60,6 +92,9 @@ def evaluate_classification_results(prediction_filename, gt_folder, output_path=
         gt_folder: folder where the ground truth labels are given. If is_training, it should be the path to the Glaucoma / Non-Glaucoma labels
         [output_path]: a folder where the results will be saved. If not provided, the results are not saved
         [is_training]: a boolean value indicating if the evaluation is performed on training data or not
+        [export_table]: a boolean value indicating if the table with the score and the label of each image will be exported or not
+        [ignore_unknown_images]: a boolean value indicating if the images without gt label are ignored (e.g. when the
+                                 predictions are evaluated against several ground truth sets). Otherwise, they raise an error
     '''
 
     # read the prediction filename
@@ -72,19 +107,20 @@ def evaluate_classification_results(prediction_filename, gt_folder, output_path=
     else:
         # get the filenames and the labels
         gt_filenames, gt_labels = read_gt_labels(path.join(gt_folder, 'GT.xlsx'))
-    
-    # sort the gt filenames using the same order as predicted
-    gt_labels = sort_scores_by_filename(image_filenames, gt_filenames, gt_labels)
-    
-    # compute the ROC curve
-    sensitivity, fpr, auc = get_roc_curve(predicted_scores, gt_labels)
-    # compute specificity
-    specificity = 1 - fpr
+
+    # keep only the images with gt label
+    if ignore_unknown_images:
+        upper_gt_filenames = set([ filename.upper() for filename in gt_filenames ])
+        is_known = np.array([ filename.upper() in upper_gt_filenames for filename in image_filenames ], dtype=bool)
+        image_filenames = [ image_filenames[i] for i in np.flatnonzero(is_known) ]
+        predicted_scores = predicted_scores[is_known]
+        if len(image_filenames) == 0:
+            raise ValueError('None of the classified images has a ground truth label.')
+
+    # compute the ROC curve, the AUC and the sensitivity at reference value
+    sensitivity, fpr, auc, sensitivity_at_reference_value, gt_labels = get_classification_performance(image_filenames, predicted_scores, gt_filenames, gt_labels)
     # print the auc
     print('AUC = {}'.format(str(auc)))
-
-    # get sensitivity at reference value
-    sensitivity_at_reference_value = get_sensitivity_at_given_specificity(sensitivity, specificity)
     # print the value
     print('Reference Sensitivity = {}'.format(str(sensitivity_at_reference_value)))
 
@@ -101,4 +137,8 @@ def evaluate_classification_results(prediction_filename, gt_folder, output_path=
         # save a CSV file with the reference metrics
         save_csv_classification_performance(path.join(output_path, 'evaluation_classification.csv'), auc, sensitivity_at_reference_value)
 
+        # save a CSV file with the score and the label of each image
+        if export_table:
+            save_csv_classification_table(path.join(output_path, 'evaluation_table_classification.csv'), image_filenames, predicted_scores, gt_labels)
+
     return auc, sensitivity_at_reference_value
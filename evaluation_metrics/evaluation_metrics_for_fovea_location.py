@@ -2,9 +2,15 @@ import numpy as np
 
 from os import path, makedirs
 
-from util.file_management import read_fovea_location_results, read_gt_fovea_location, sort_coordinates_by_filename, save_csv_fovea_location_table, save_csv_fovea_location_performance
+from util.file_management import read_fovea_location_results, read_gt_fovea_location, sort_coordinates_by_filename, save_csv_fovea_location_table, save_csv_fovea_location_performance, read_fovea_heatmaps, save_csv_fovea_location_results
 
 
+# methods to locate the fovea in a heatmap: the position of the maximum, or the centroid of the values around it (with sub-pixel precision)
+HEATMAP_PEAK_METHODS = ['argmax', 'centroid']
+# radius (in pixels) of the square window around the maximum where the centroid is computed
+HEATMAP_CENTROID_RADIUS = 7
+# maximum number of pixels of the heatmaps loaded at once
+HEATMAP_CHUNK_PIXELS = 2 ** 25
 
 def euclidean_distance(gt_coordinates, fovea_coordinates):
     '''
@@ -24,27 +30,117 @@ def euclidean_distance(gt_coordinates, fovea_coordinates):
 
 
 
-def evaluate_fovea_location_results(prediction_filename, gt_filename, output_path=None, is_training=False):
+def get_heatmap_peaks(heatmaps, method='centroid', radius=HEATMAP_CENTROID_RADIUS, chunk_pixels=HEATMAP_CHUNK_PIXELS):
+    '''
+    Locate the fovea in a stack of heatmaps. The maps are processed in chunks of several images, with vectorized operations
+    on each chunk, so a memory-mapped stack of thousands of full resolution maps is read only once with a bounded memory
+
+    Input:
+        heatmaps: a (images x height x width) numpy array (e.g. memory-mapped) with a heatmap per image
+        [method]: 'argmax' (the position of the maximum, the first one in case of ties) or 'centroid' (the centroid of the
+                  values in a window around the maximum, relative to the minimum of the window)
+        [radius]: radius (in pixels) of the square window used by the centroid
+        [chunk_pixels]: maximum number of pixels loaded at once
+    Output:
+        coordinates: a 2D numpy array with the (x,y) coordinates of the fovea in each image, in pixels
+    '''
+
+    if not (method in HEATMAP_PEAK_METHODS):
+        raise ValueError('Unknown heatmap peak method "{}". Use one of {}'.format(method, HEATMAP_PEAK_METHODS))
+
+    n_images, height, width = heatmaps.shape
+    coordinates = np.zeros((n_images, 2))
+    if height * width == 0:
+        raise ValueError('The fovea heatmaps are empty.')
+    chunk_size = max(1, chunk_pixels // (height * width))
+
+    # offsets of the pixels of the window, with respect to the maximum
+    offset_rows, offset_columns = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    offset_rows, offset_columns = offset_rows.ravel(), offset_columns.ravel()
+
+    for first_image in range(0, n_images, chunk_size):
+        # load a chunk of maps and find the maximum of each of them
+        chunk = np.asarray(heatmaps[first_image:first_image + chunk_size])
+        peaks = np.argmax(chunk.reshape((chunk.shape[0], -1)), axis=1)
+        peak_rows, peak_columns = peaks // width, peaks % width
+        if method == 'argmax':
+            coordinates[first_image:first_image + chunk.shape[0], :] = np.stack((peak_columns, peak_rows), axis=1)
+            continue
+
+        # gather the window around each maximum (the pixels outside the image are ignored)
+        rows = peak_rows[:,np.newaxis] + offset_rows[np.newaxis,:]
+        columns = peak_columns[:,np.newaxis] + offset_columns[np.newaxis,:]
+        is_inside = (rows >= 0) & (rows < height) & (columns >= 0) & (columns < width)
+        windows = chunk[np.arange(chunk.shape[0])[:,np.newaxis], np.clip(rows, 0, height - 1), np.clip(columns, 0, width - 1)].astype(float)
+        # the weights are relative to the minimum of the window, so a constant background doesn't pull the centroid to the window center
+        weights = np.where(is_inside, windows - np.min(np.where(is_inside, windows, np.inf), axis=1)[:,np.newaxis], 0.0)
+        total_weights = np.sum(weights, axis=1)
+
+        # the flat windows keep the position of the maximum
+        has_weights = total_weights > 0
+        total_weights[np.logical_not(has_weights)] = 1.0
+        coordinates[first_image:first_image + chunk.shape[0], 0] = np.where(has_weights, np.sum(weights * columns, axis=1) / total_weights, peak_columns)
+        coordinates[first_image:first_image + chunk.shape[0], 1] = np.where(has_weights, np.sum(weights * rows, axis=1) / total_weights, peak_rows)
+
+    return coordinates
+
+
+
+def get_fovea_location_distances(image_filenames, predicted_coordinates, gt_image_filenames, gt_coordinates):
+    '''
+    Measure the Euclidean distance between the predicted and the gt fovea coordinates of each image
+
+    Input:
+        image_filenames: a list with the names of the images with predicted coordinates
+        predicted_coordinates: a 2D numpy array with the (x,y) coordinates predicted for each image
+        gt_image_filenames: a list with the names of the images with gt coordinates
+        gt_coordinates: a 2D numpy array with the (x,y) gt coordinates of each image
+    Output:
+        euclidean_distances: a 1D numpy array with the Euclidean distance of each image, in the order of image_filenames
+    '''
+
+    # sort the gt filenames using the same order as predicted
+    gt_coordinates = sort_coordinates_by_filename(image_filenames, gt_image_filenames, gt_coordinates)
+
+    # get the distance between the gt and the predicted coordinates
+    return euclidean_distance(gt_coordinates, predicted_coordinates)
+
+
+
+def evaluate_fovea_location_results(prediction_filename, gt_filename, output_path=None, is_training=False, ignore_unknown_images=False, heatmap_peak='centroid'):
     '''
     Evaluate the results of a fovea location algorithm
 
     Input:
-        prediction_filename: full path with file name to a .csv file with the fovea location gt annotations
+        prediction_filename: full path with file name to a .csv file with the fovea location gt annotations, or to a .npy
+                             file with a stack of fovea heatmaps (see util.file_management.read_fovea_heatmaps)
         gt_filename: full path with file name to a .csv file with the fovea location results of an automated algorithm
         [output_path]: a folder where the results will be saved. If not provided, the results are not saved
         [is_training]: a boolean indicating whether we are using training data or not
+        [ignore_unknown_images]: a boolean value indicating if the images without gt coordinates are ignored (e.g. when the
+                                 predictions are evaluated against several ground truth sets). Otherwise, they raise an error
+        [heatmap_peak]: the method used to locate the fovea in the heatmaps (see get_heatmap_peaks)
     '''
 
-    # read the prediction filename
-    image_filenames, predicted_coordinates = read_fovea_location_results(prediction_filename)
+    # read the prediction filename (locating the fovea in each heatmap, if they are given)
+    is_heatmap = prediction_filename.endswith('.npy')
+    if is_heatmap:
+        image_filenames, heatmaps = read_fovea_heatmaps(prediction_filename)
+        predicted_coordinates = get_heatmap_peaks(heatmaps, heatmap_peak)
+    else:
+        image_filenames, predicted_coordinates = read_fovea_location_results(prediction_filename)
     # read the gt filename
     gt_image_filenames, gt_coordinates = read_gt_fovea_location(gt_filename, is_training)
-
-    # sort the gt filenames using the same order as predicted
-    gt_coordinates = sort_coordinates_by_filename(image_filenames, gt_image_filenames, gt_coordinates)
+    # keep only the images with gt coordinates
+    if ignore_unknown_images:
+        is_known = np.array([ filename in gt_image_filenames for filename in image_filenames ], dtype=bool)
+        image_filenames = [ image_filenames[i] for i in np.flatnonzero(is_known) ]
+        predicted_coordinates = predicted_coordinates[is_known]
+        if len(image_filenames) == 0:
+            raise ValueError('None of the images with fovea location results has ground truth coordinates.')
 
     # get the distance between the gt and the predicted coordinates
-    euclidean_distances = euclidean_distance(gt_coordinates, predicted_coordinates)
+    euclidean_distances = get_fovea_location_distances(image_filenames, predicted_coordinates, gt_image_filenames, gt_coordinates)
 
     # get the mean value
     mean_euclidean_distances = np.mean(euclidean_distances)
@@ -66,4 +162,8 @@ def evaluate_fovea_location_results(prediction_filename, gt_filename, output_pat
         fovea_location_results_filename = path.join(output_path, 'evaluation_fovea_location.csv')
         save_csv_fovea_location_performance(fovea_location_results_filename, mean_euclidean_distances)
 
+        # save the coordinates found in the heatmaps, so they can be checked
+        if is_heatmap:
+            save_csv_fovea_location_results(path.join(output_path, 'fovea_location_from_heatmaps.csv'), image_filenames, predicted_coordinates)
+
     return mean_euclidean_distances
\ No newline at end of file
@@ -1,13 +1,29 @@
 
 import numpy as np
 
-from scipy import misc
-from os import path, makedirs
+from scipy import ndimage, stats
+from os import path, makedirs, listdir
 
-from util.file_management import get_filenames, save_csv_mean_segmentation_performance, save_csv_segmentation_table
+from util.file_management import get_filenames, save_csv_mean_segmentation_performance, save_csv_segmentation_table, save_csv_quick_segmentation_performance, save_csv_segmentation_threshold_curves, save_csv_cdr_threshold_grid, save_csv_annotator_segmentation_performance, save_csv_annotator_segmentation_table
+from util.progress import start_task_progress, report_item_progress
+from evaluation_metrics.segmentation_kernels import get_segmentation_kernel, count_segmentation_pixels_numpy, count_multi_reference_pixels, get_band_kernel, get_counts_from_columns
+from util.image_io import read_image, read_image_header, can_read_bmp_bands, read_bmp_bands, read_bmp_rows
+from util.rle_masks import get_mask_runs, count_rle_segmentation_pixels, decode_rle_mask, read_csv_rle_segmentations
 
 
 EPS = 1e-7
+# values of each image reported in the progress events
+SEGMENTATION_PROGRESS_VALUES = ['Cup-Dice', 'Disc-Dice', 'AE-CDR']
+# name of the consensus ground truth when it is evaluated together with the annotators
+CONSENSUS_REFERENCE = 'Consensus'
+# subfolders with the probability maps of the optic cup and disc
+PROBABILITY_MAP_FOLDERS = ['cup', 'disc']
+# threshold used to binarize the probability maps for the reported performance (a pixel belongs to a structure if its value is at or above it)
+SOFT_SEGMENTATION_THRESHOLD = 128
+# number of columns whose joint histograms of the probability maps are accumulated at once
+PROBABILITY_COLUMNS_BLOCK = 16
+# default number of rows of the bands read by the tiled evaluation
+DEFAULT_TILE_ROWS = 256
 
 
 def dice_coefficient(binary_segmentation, binary_gt_label):
@@ -23,8 +39,8 @@ def dice_coefficient(binary_segmentation, binary_gt_label):
     '''
 
     # turn all variables to booleans, just in case
-    binary_segmentation = np.asarray(binary_segmentation, dtype=np.bool)
-    binary_gt_label = np.asarray(binary_gt_label, dtype=np.bool)
+    binary_segmentation = np.asarray(binary_segmentation, dtype=bool)
+    binary_gt_label = np.asarray(binary_gt_label, dtype=bool)
 
     # compute the intersection
     intersection = np.logical_and(binary_segmentation, binary_gt_label)
@@ -56,7 +72,7 @@ def vertical_diameter(binary_segmentation):
     '''
 
     # turn the variable to boolean, just in case
-    binary_segmentation = np.asarray(binary_segmentation, dtype=np.bool)
+    binary_segmentation = np.asarray(binary_segmentation, dtype=bool)
     
     # get the sum of the pixels in the vertical axis
     vertical_axis_diameter = np.sum(binary_segmentation, axis=0)
@@ -104,32 +120,321 @@ def absolute_error(predicted, reference):
 
 
 
-def evaluate_binary_segmentation(segmentation, gt_label):
+def get_boundary_crop(binary_segmentation, binary_gt_label):
+    '''
+    Get a tight crop around the two structures, with a margin of one pixel so their contours can be computed
+    as in the full image. The closest contour pixels of each structure are always inside the crop, so the
+    distances computed on it are exactly the same than on the full image.
+
+    Input:
+        binary_segmentation: binary 2D numpy array representing the region of interest as segmented by the algorithm
+        binary_gt_label: binary 2D numpy array representing the region of interest as provided in the database
+    Output:
+        cropped_segmentation: the cropped segmentation, padded with background if the crop reaches the border of the image
+        cropped_gt_label: the cropped ground truth, padded in the same way
+    '''
+
+    # bounding box of the union of the two structures, from the projections on each axis
+    union = np.logical_or(binary_segmentation, binary_gt_label)
+    rows = np.nonzero(np.any(union, axis=1))[0]
+    columns = np.nonzero(np.any(union, axis=0))[0]
+    bounding_box = (slice(rows[0], rows[-1] + 1), slice(columns[0], columns[-1] + 1))
+
+    # crop and add a margin of background
+    cropped_segmentation = np.pad(binary_segmentation[bounding_box], 1, 'constant', constant_values=False)
+    cropped_gt_label = np.pad(binary_gt_label[bounding_box], 1, 'constant', constant_values=False)
+
+    return cropped_segmentation, cropped_gt_label
+
+
+
+def get_contour(binary_segmentation):
+    '''
+    Get the contour of a binary structure (the pixels of the structure that touch the background)
+
+    Input:
+        binary_segmentation: binary 2D numpy array representing a region of interest
+    Output:
+        contour: binary 2D numpy array with the contour pixels
+    '''
+
+    return np.logical_and(binary_segmentation, np.logical_not(ndimage.binary_erosion(binary_segmentation, border_value=0)))
+
+
+
+def boundary_distances(binary_segmentation, binary_gt_label, image_shape=None):
+    '''
+    Compute the 95th percentile of the Hausdorff distance and the average symmetric surface distance between two binary
+    structures, in pixels. The distance transforms are computed only on a tight crop around both structures.
+    If one of the structures is missing, both distances are the length of the diagonal of the image.
+
+    Input:
+        binary_segmentation: binary 2D numpy array representing the region of interest as segmented by the algorithm
+        binary_gt_label: binary 2D numpy array representing the region of interest as provided in the database
+        [image_shape]: shape of the full image, if the arrays are already cropped. If not provided, the shape of the arrays is used
+    Output:
+        hd95: 95th percentile of the distances between the contours
+        assd: average symmetric surface distance
+    '''
+
+    # turn all variables to booleans, just in case
+    binary_segmentation = np.asarray(binary_segmentation, dtype=bool)
+    binary_gt_label = np.asarray(binary_gt_label, dtype=bool)
+
+    # handle the missing structures
+    has_segmentation = np.any(binary_segmentation)
+    has_gt_label = np.any(binary_gt_label)
+    if not (has_segmentation or has_gt_label):
+        return 0.0, 0.0
+    if not (has_segmentation and has_gt_label):
+        if image_shape is None:
+            image_shape = binary_segmentation.shape
+        diagonal = float(np.sqrt(image_shape[0] ** 2 + image_shape[1] ** 2))
+        return diagonal, diagonal
+
+    # get the contours of both structures inside a tight crop
+    cropped_segmentation, cropped_gt_label = get_boundary_crop(binary_segmentation, binary_gt_label)
+    segmentation_contour = get_contour(cropped_segmentation)
+    gt_label_contour = get_contour(cropped_gt_label)
+
+    # distance from each contour pixel to the closest pixel of the other contour
+    segmentation_to_gt = ndimage.distance_transform_edt(np.logical_not(gt_label_contour))[segmentation_contour]
+    gt_to_segmentation = ndimage.distance_transform_edt(np.logical_not(segmentation_contour))[gt_label_contour]
+    distances = np.concatenate((segmentation_to_gt, gt_to_segmentation))
+
+    return float(np.percentile(distances, 95)), float(np.mean(distances))
+
+
+
+def get_segmentation_metrics_from_counts(counts):
+    '''
+    Compute the evaluation metrics of the REFUGE challenge from the pixel counts of a segmentation and its ground truth
+
+    Input:
+        counts: the areas of the optic cups and discs and of their intersections, and their vertical diameters
+                (see segmentation_kernels.SEGMENTATION_COUNTS)
+    Output:
+        cup_dice: Dice coefficient for the optic cup
+        disc_dice: Dice coefficient for the optic disc
+        cdr: absolute error between the vertical cup to disc ratio as estimated from the segmentation vs. the gt_label
+    '''
+
+    counts = [ float(count) for count in counts ]
+    cup_intersection, cup_pixels, gt_cup_pixels, disc_intersection, disc_pixels, gt_disc_pixels = counts[:6]
+    cup_diameter, disc_diameter, gt_cup_diameter, gt_disc_diameter = counts[6:]
+
+    # compute the Dice coefficient for the optic cup (as in dice_coefficient)
+    cup_dice = 2 * cup_intersection / (cup_pixels + gt_cup_pixels)
+    # compute the Dice coefficient for the optic disc
+    disc_dice = 2 * disc_intersection / (disc_pixels + gt_disc_pixels)
+    # compute the absolute error between the cup to disc ratio estimated from the segmentation vs. the gt label (as in vertical_cup_to_disc_ratio)
+    cdr = absolute_error(cup_diameter / (disc_diameter + EPS), gt_cup_diameter / (gt_disc_diameter + EPS))
+
+    return cup_dice, disc_dice, cdr
+
+
+
+def evaluate_binary_segmentation(segmentation, gt_label, boundary_metrics=False, backend='numpy'):
     '''
     Compute the evaluation metrics of the REFUGE challenge by comparing the segmentation with the ground truth
 
     Input:
         segmentation: binary 2D numpy array representing the segmentation, with 0: optic cup, 128: optic disc, 255: elsewhere.
         gt_label: binary 2D numpy array representing the ground truth annotation, with the same format
+        [boundary_metrics]: a boolean value indicating if the boundary distances (see boundary_distances) will be computed or not
+        [backend]: the backend that counts the pixels of the optic cup and disc (see segmentation_kernels.get_segmentation_kernel)
     Output:
         cup_dice: Dice coefficient for the optic cup
         disc_dice: Dice coefficient for the optic disc
         cdr: absolute error between the vertical cup to disc ratio as estimated from the segmentation vs. the gt_label, in pixels
+        If boundary_metrics is True, the following values are also returned:
+        cup_hd95, cup_assd: 95th percentile of the Hausdorff distance and average symmetric surface distance for the optic cup
+        disc_hd95, disc_assd: same for the optic disc
     '''
 
-    # compute the Dice coefficient for the optic cup
-    cup_dice = dice_coefficient(segmentation==0, gt_label==0)
-    # compute the Dice coefficient for the optic disc
-    disc_dice = dice_coefficient(segmentation<255, gt_label<255)
-    # compute the absolute error between the cup to disc ratio estimated from the segmentation vs. the gt label
-    cdr = absolute_error(vertical_cup_to_disc_ratio(segmentation), vertical_cup_to_disc_ratio(gt_label))
+    # count the areas and the vertical diameters of the optic cups and discs, and their intersections
+    cup_dice, disc_dice, cdr = get_segmentation_metrics_from_counts(get_segmentation_kernel(backend)(segmentation, gt_label))
 
-    return cup_dice, disc_dice, cdr
+    if not boundary_metrics:
+        return cup_dice, disc_dice, cdr
+
+    # the optic cups are inside the optic discs, so both label maps can be cropped around the discs first
+    disc_union = np.logical_or(segmentation<255, gt_label<255)
+    rows = np.nonzero(np.any(disc_union, axis=1))[0]
+    columns = np.nonzero(np.any(disc_union, axis=0))[0]
+    if len(rows) > 0:
+        bounding_box = (slice(rows[0], rows[-1] + 1), slice(columns[0], columns[-1] + 1))
+        cropped_segmentation, cropped_gt_label = segmentation[bounding_box], gt_label[bounding_box]
+    else:
+        cropped_segmentation, cropped_gt_label = segmentation, gt_label
+
+    # compute the boundary distances for the optic cup and the optic disc
+    cup_hd95, cup_assd = boundary_distances(cropped_segmentation==0, cropped_gt_label==0, segmentation.shape)
+    disc_hd95, disc_assd = boundary_distances(cropped_segmentation<255, cropped_gt_label<255, segmentation.shape)
+
+    return cup_dice, disc_dice, cdr, cup_hd95, cup_assd, disc_hd95, disc_assd
+
+
+
+
+def read_segmentation_and_gt(image_filename, segmentation_folder, gt_folder, is_training=False):
+    '''
+    Read a segmentation and its ground truth annotation
+
+    Input:
+        image_filename: name of the image
+        segmentation_folder: a string representing the full path to the folder where the segmentation files are
+        gt_folder: a string representing the full path to the folder where the ground truth annotation files are
+        is_training: a boolean value indicating if the evaluation is performed on training data or not
+    Output:
+        segmentation: 2D numpy array with the segmentation, with 0: optic cup, 128: optic disc, 255: elsewhere.
+        gt_label: 2D numpy array with the ground truth annotation, with the same format
+    '''
+
+    # read the segmentation
+    segmentation = read_image(path.join(segmentation_folder, image_filename))
+    if len(segmentation.shape) > 2:
+        segmentation = segmentation[:,:,0]
+
+    return segmentation, read_gt_segmentation(image_filename, gt_folder, is_training)
+
+
+
+def read_gt_segmentation(image_filename, gt_folder, is_training=False):
+    '''
+    Read the ground truth annotation of an image
+
+    Input:
+        image_filename: name of the image
+        gt_folder: a string representing the full path to the folder where the ground truth annotation files are
+        is_training: a boolean value indicating if the evaluation is performed on training data or not
+    Output:
+        gt_label: 2D numpy array with the ground truth annotation, with 0: optic cup, 128: optic disc, 255: elsewhere.
+    '''
+
+    # read the gt
+    return read_image(get_gt_segmentation_filename(image_filename, gt_folder, is_training))
+
+
+
+def get_gt_segmentation_filename(image_filename, gt_folder, is_training=False):
+    '''
+    Find the file with the ground truth annotation of an image
+
+    Input:
+        image_filename: name of the image
+        gt_folder: a string representing the full path to the folder where the ground truth annotation files are
+        is_training: a boolean value indicating if the evaluation is performed on training data or not
+    Output:
+        gt_filename: full path to the ground truth annotation
+    '''
 
+    if is_training:
+        gt_filename = path.join(gt_folder, 'Glaucoma', image_filename)
+        if not path.exists(gt_filename):
+            gt_filename = path.join(gt_folder, 'Non-Glaucoma', image_filename)
+            if not path.exists(gt_filename):
+                raise ValueError('Unable to find {} in your training folder. Make sure that you have the folder organized as provided in our website.'.format(image_filename))
+    else:
+        gt_filename = path.join(gt_folder, image_filename)
+        if not path.exists(gt_filename):
+            raise ValueError('Unable to find {} in your ground truth folder. If you are using training data, make sure to use the parameter is_training in True.'.format(image_filename))
 
+    return gt_filename
 
 
-def generate_table_of_results(image_filenames, segmentation_folder, gt_folder, is_training=False):
+
+def evaluate_tiled_segmentation(segmentation_filename, gt_filename, boundary_metrics=False, tile_rows=DEFAULT_TILE_ROWS, backend='numpy'):
+    '''
+    Evaluate a segmentation streaming horizontal bands of both BMP files, so the memory used depends on the width of
+    the images but not on their height. The counts of each column are accumulated across the bands, so the results
+    are exactly the same than evaluate_binary_segmentation on the full images
+
+    Input:
+        segmentation_filename: full path to the BMP file with the segmentation
+        gt_filename: full path to the BMP file with the ground truth annotation
+        [boundary_metrics]: a boolean value indicating if the boundary distances will be computed or not. If so, only
+                            the rows and columns around the optic discs are read again
+        [tile_rows]: number of rows of each band
+        [backend]: the backend that counts the pixels of each band (see segmentation_kernels.get_band_kernel)
+    Output:
+        same as evaluate_binary_segmentation, or None if any of the files can't be read by bands (see util.image_io.can_read_bmp_bands)
+    '''
+
+    results = evaluate_tiled_segmentation_on_references(segmentation_filename, [ gt_filename ], boundary_metrics, tile_rows, backend)
+
+    return None if results is None else results[0]
+
+
+
+def evaluate_tiled_segmentation_on_references(segmentation_filename, gt_filenames, boundary_metrics=False, tile_rows=DEFAULT_TILE_ROWS, backend='numpy'):
+    '''
+    Evaluate a segmentation against several ground truth annotations (e.g. the ones of several ground truth sets) streaming
+    horizontal bands of the BMP files (see evaluate_tiled_segmentation). Each band of the segmentation is read only once,
+    and compared with the same band of every annotation
+
+    Input:
+        segmentation_filename: full path to the BMP file with the segmentation
+        gt_filenames: a list with the full path to the BMP file of each ground truth annotation
+        [boundary_metrics], [tile_rows], [backend]: see evaluate_tiled_segmentation
+    Output:
+        results: a list with the results for each annotation (see evaluate_binary_segmentation), or None if any of the files
+                 can't be read by bands (see util.image_io.can_read_bmp_bands)
+    '''
+
+    # check that all the files can be streamed
+    _, segmentation_header = read_image_header(segmentation_filename)
+    gt_headers = [ read_image_header(gt_filename)[1] for gt_filename in gt_filenames ]
+    if not all([ can_read_bmp_bands(header) for header in [ segmentation_header ] + gt_headers ]):
+        return None
+    width, height = segmentation_header['width'], segmentation_header['height']
+    for gt_header in gt_headers:
+        if (gt_header['width'], gt_header['height']) != (width, height):
+            raise ValueError('The segmentation {} is {}x{} instead of {}x{}.'.format(path.basename(segmentation_filename), width, height, gt_header['width'], gt_header['height']))
+
+    # accumulate the counts of each band for each annotation, and the rows with any optic disc
+    band_kernel = get_band_kernel(backend)
+    intersections = np.zeros((len(gt_filenames), 2), dtype=np.int64)
+    column_counts = np.zeros((len(gt_filenames), 4, width), dtype=np.int64)
+    disc_rows = [ [] for gt_filename in gt_filenames ]
+    gt_bands = [ read_bmp_bands(gt_filenames[k], tile_rows, gt_headers[k]) for k in range(len(gt_filenames)) ]
+    for first_row, segmentation_band in read_bmp_bands(segmentation_filename, tile_rows, segmentation_header):
+        segmentation_rows = np.any(segmentation_band<255, axis=1)
+        for k in range(len(gt_filenames)):
+            _, gt_band = next(gt_bands[k])
+            band_intersections, band_column_counts = band_kernel(segmentation_band, gt_band)
+            intersections[k] += band_intersections
+            column_counts[k] += band_column_counts
+            rows = np.nonzero(np.logical_or(segmentation_rows, np.any(gt_band<255, axis=1)))[0]
+            if len(rows) > 0:
+                disc_rows[k] = [ first_row + rows[0] if len(disc_rows[k]) == 0 else disc_rows[k][0], first_row + rows[-1] + 1 ]
+
+    results = []
+    for k in range(len(gt_filenames)):
+        # compute the metrics from the accumulated counts
+        cup_dice, disc_dice, cdr = get_segmentation_metrics_from_counts(get_counts_from_columns(intersections[k], column_counts[k]))
+        if not boundary_metrics:
+            results.append((cup_dice, disc_dice, cdr))
+            continue
+
+        # read only the bounding box of the optic discs (as in evaluate_binary_segmentation)
+        if len(disc_rows[k]) > 0:
+            columns = np.nonzero(np.logical_or(column_counts[k,1]>0, column_counts[k,3]>0))[0]
+            cropped_segmentation = read_bmp_rows(segmentation_filename, disc_rows[k][0], disc_rows[k][1], segmentation_header)[:, columns[0]:columns[-1] + 1]
+            cropped_gt_label = read_bmp_rows(gt_filenames[k], disc_rows[k][0], disc_rows[k][1], gt_headers[k])[:, columns[0]:columns[-1] + 1]
+        else:
+            cropped_segmentation = cropped_gt_label = np.zeros((0, 0), dtype=np.uint8)
+
+        # compute the boundary distances for the optic cup and the optic disc
+        cup_hd95, cup_assd = boundary_distances(cropped_segmentation==0, cropped_gt_label==0, (height, width))
+        disc_hd95, disc_assd = boundary_distances(cropped_segmentation<255, cropped_gt_label<255, (height, width))
+        results.append((cup_dice, disc_dice, cdr, cup_hd95, cup_assd, disc_hd95, disc_assd))
+
+    return results
+
+
+
+def generate_table_of_results(image_filenames, segmentation_folder, gt_folder, is_training=False, boundary_metrics=False, progress=None, backend='numpy', tile_rows=None, segmentations=None):
     '''
     Generates a table with image_filename, cup_dice, disc_dice and cdr values
 
@@ -138,54 +443,325 @@ def generate_table_of_results(image_filenames, segmentation_folder, gt_folder, i
         segmentation_folder: a string representing the full path to the folder where the segmentation files are
         gt_folder: a string representing the full path to the folder where the ground truth annotation files are
         is_training: a boolean value indicating if the evaluation is performed on training data or not
+        [boundary_metrics]: a boolean value indicating if the boundary distances will be computed or not
+        [progress]: a stream (see util.progress.create_progress_stream) where the results of each image are reported
+        [backend]: the backend that counts the pixels of the segmentations (see segmentation_kernels.get_segmentation_kernel)
+        [tile_rows]: if given, the images are streamed in bands of this number of rows (see evaluate_tiled_segmentation),
+                     with a fixed memory footprint. The files that can't be read by bands are fully read
+        [segmentations]: an iterator of (image filename, segmentation) pairs, in the same order than image_filenames, with the
+                         segmentations already decoded (see util.archive_extraction.extract_submission). If given, the
+                         segmentation folder is not read and tile_rows is ignored
     Output:
         image_filenames: same as the input parameter
         cup_dices: a numpy array with the same length than the image_filenames list, with the Dice coefficient for each optic cup
         disc_dices: a numpy array with the same length than the image_filenames list, with the Dice coefficient for each optic disc
         ae_cdrs: a numpy array with the same length than the image_filenames list, with the absolute error of the vertical cup to disc ratio
+        If boundary_metrics is True, the following value is also returned:
+        distances: a (images x 4) numpy matrix with the HD95 and the ASSD of the optic cup, and the HD95 and the ASSD of the optic disc
     '''
 
     # initialize an array for the Dice coefficients of the optic cups
-    cup_dices = np.zeros(len(image_filenames), dtype=np.float)
+    cup_dices = np.zeros(len(image_filenames), dtype=float)
     # initialize an array for the Dice coefficients of the optic discs
-    disc_dices = np.zeros(len(image_filenames), dtype=np.float)
+    disc_dices = np.zeros(len(image_filenames), dtype=float)
     # initialize an array for the absolute errors of the vertical cup to disc ratios
-    ae_cdrs = np.zeros(len(image_filenames), dtype=np.float)
+    ae_cdrs = np.zeros(len(image_filenames), dtype=float)
+    # initialize a matrix for the boundary distances
+    if boundary_metrics:
+        distances = np.zeros((len(image_filenames), 4))
+    # start reporting the progress
+    start_task_progress(progress, 'segmentation', len(image_filenames), SEGMENTATION_PROGRESS_VALUES)
 
     # iterate for each image filename
     for i in range(len(image_filenames)):
 
-        # read the segmentation
-        segmentation = misc.imread(path.join(segmentation_folder, image_filenames[i]))
-        if len(segmentation.shape) > 2:
-            segmentation = segmentation[:,:,0]
-        # read the gt
-        if is_training:
-            gt_filename = path.join(gt_folder, 'Glaucoma', image_filenames[i])
-            if path.exists(gt_filename):
-                gt_label = misc.imread(gt_filename)
-            else:
-                gt_filename = path.join(gt_folder, 'Non-Glaucoma', image_filenames[i])
-                if path.exists(gt_filename):
-                    gt_label = misc.imread(gt_filename)
-                else:
-                    raise ValueError('Unable to find {} in your training folder. Make sure that you have the folder organized as provided in our website.'.format(image_filenames[i]))
-        else:
-            gt_filename = path.join(gt_folder, image_filenames[i])
-            if path.exists(gt_filename):
-                gt_label = misc.imread(gt_filename)
-            else:
-                raise ValueError('Unable to find {} in your ground truth folder. If you are using training data, make sure to use the parameter is_training in True.'.format(image_filenames[i]))
+        # take the segmentation already decoded, if given
+        results = None
+        if not (segmentations is None):
+            current_filename, segmentation = next(segmentations)
+            if current_filename != image_filenames[i]:
+                raise ValueError('The decoded segmentations are not in the order of the images ({} instead of {}).'.format(current_filename, image_filenames[i]))
+            results = evaluate_binary_segmentation(segmentation, read_gt_segmentation(image_filenames[i], gt_folder, is_training), boundary_metrics, backend)
+        # stream the segmentation and the gt by bands, if possible
+        elif not (tile_rows is None):
+            results = evaluate_tiled_segmentation(path.join(segmentation_folder, image_filenames[i]), get_gt_segmentation_filename(image_filenames[i], gt_folder, is_training),
+                                                  boundary_metrics, tile_rows, backend)
+        # otherwise, read the segmentation and the gt
+        if results is None:
+            segmentation, gt_label = read_segmentation_and_gt(image_filenames[i], segmentation_folder, gt_folder, is_training)
+            results = evaluate_binary_segmentation(segmentation, gt_label, boundary_metrics, backend)
+
+        # assign the results to the corresponding row in the table
+        cup_dices[i], disc_dices[i], ae_cdrs[i] = results[:3]
+        if boundary_metrics:
+            distances[i,:] = results[3:]
+        # report the results of the image, with the running means
+        report_item_progress(progress, 'segmentation', image_filenames[i], i, [ cup_dices[i], disc_dices[i], ae_cdrs[i] ])
+
+    # return the colums of the table
+    if boundary_metrics:
+        return image_filenames, cup_dices, disc_dices, ae_cdrs, distances
+    return image_filenames, cup_dices, disc_dices, ae_cdrs
 
-        # evaluate the results and assign to the corresponding row in the table
-        cup_dices[i], disc_dices[i], ae_cdrs[i] = evaluate_binary_segmentation(segmentation, gt_label)
+
+
+def evaluate_rle_segmentation(height, width, cup_runs, disc_runs, gt_label, boundary_metrics=False):
+    '''
+    Compute the evaluation metrics of a run-length encoded segmentation, without expanding it to a full image
+    (except for the boundary distances)
+
+    Input:
+        height, width: the size of the image
+        cup_runs, disc_runs: tuples (starts, ends) with the runs of the segmented optic cup and disc (see util.rle_masks.read_csv_rle_segmentations)
+        gt_label: 2D numpy array with the ground truth annotation, with 0: optic cup, 128: optic disc, 255: elsewhere.
+        [boundary_metrics]: a boolean value indicating if the boundary distances will be computed or not
+    Output:
+        same as evaluate_binary_segmentation
+    '''
+
+    # count the pixels from the runs of the segmentation and the gt
+    counts = count_rle_segmentation_pixels(cup_runs, disc_runs, get_mask_runs(gt_label==0), get_mask_runs(gt_label<255), height, width)
+    cup_dice, disc_dice, cdr = get_segmentation_metrics_from_counts(counts)
+    if not boundary_metrics:
+        return cup_dice, disc_dice, cdr
+
+    # the boundaries need the full label map
+    segmentation = np.full((height, width), 255, dtype=np.uint8)
+    segmentation[decode_rle_mask(disc_runs[0], disc_runs[1], height, width)] = 128
+    segmentation[decode_rle_mask(cup_runs[0], cup_runs[1], height, width)] = 0
+
+    return (cup_dice, disc_dice, cdr) + tuple(evaluate_binary_segmentation(segmentation, gt_label, True)[3:])
+
+
+
+def generate_rle_table_of_results(image_filenames, segmentations, gt_folder, is_training=False, boundary_metrics=False, progress=None):
+    '''
+    Generates a table with image_filename, cup_dice, disc_dice and cdr values from run-length encoded segmentations.
+    The segmentations are evaluated from their runs, without expanding them to full images (except for the
+    boundary distances), and the results are the same than for the BMP files
+
+    Input:
+        image_filenames: a list of strings with the names of the images.
+        segmentations: a dictionary mapping each image filename to its runs, as retrieved by util.rle_masks.read_csv_rle_segmentations
+        gt_folder: a string representing the full path to the folder where the ground truth annotation files are
+        is_training: a boolean value indicating if the evaluation is performed on training data or not
+        [boundary_metrics]: a boolean value indicating if the boundary distances will be computed or not
+        [progress]: a stream (see util.progress.create_progress_stream) where the results of each image are reported
+    Output:
+        same as generate_table_of_results
+    '''
+
+    # initialize the columns of the table
+    cup_dices = np.zeros(len(image_filenames))
+    disc_dices = np.zeros(len(image_filenames))
+    ae_cdrs = np.zeros(len(image_filenames))
+    if boundary_metrics:
+        distances = np.zeros((len(image_filenames), 4))
+    # start reporting the progress
+    start_task_progress(progress, 'segmentation', len(image_filenames), SEGMENTATION_PROGRESS_VALUES)
+
+    # iterate for each image filename
+    for i in range(len(image_filenames)):
+
+        # read the gt, and check that the size of the segmentation is the same
+        height, width, cup_runs, disc_runs = segmentations[image_filenames[i]]
+        gt_label = read_gt_segmentation(image_filenames[i], gt_folder, is_training)
+        if gt_label.shape[:2] != (height, width):
+            raise ValueError('The segmentation of {} is {}x{} instead of {}x{}.'.format(image_filenames[i], width, height, gt_label.shape[1], gt_label.shape[0]))
+
+        # evaluate the results from the runs of the segmentation and the gt
+        results = evaluate_rle_segmentation(height, width, cup_runs, disc_runs, gt_label, boundary_metrics)
+        cup_dices[i], disc_dices[i], ae_cdrs[i] = results[:3]
+        if boundary_metrics:
+            distances[i,:] = results[3:]
+        # report the results of the image, with the running means
+        report_item_progress(progress, 'segmentation', image_filenames[i], i, [ cup_dices[i], disc_dices[i], ae_cdrs[i] ])
 
     # return the colums of the table
+    if boundary_metrics:
+        return image_filenames, cup_dices, disc_dices, ae_cdrs, distances
     return image_filenames, cup_dices, disc_dices, ae_cdrs
 
 
 
 
+def get_annotator_names(annotators_folder):
+    '''
+    Get the names of the annotators of a multi-annotator ground truth, which has a subfolder per annotator with
+    a BMP label map per image (with the same filenames than the segmentations)
+
+    Input:
+        annotators_folder: full path to the folder with the annotations of each annotator
+    Output:
+        annotator_names: a sorted list with the names of the subfolders
+    '''
+
+    annotator_names = sorted([ name for name in listdir(annotators_folder) if path.isdir(path.join(annotators_folder, name)) ])
+    if len(annotator_names) == 0:
+        raise ValueError('There are no annotator subfolders in {}.'.format(annotators_folder))
+
+    return annotator_names
+
+
+
+def read_annotator_segmentations(image_filename, annotators_folder, annotator_names):
+    '''
+    Read the label maps of all the annotators of an image
+
+    Input:
+        image_filename: name of the image
+        annotators_folder: full path to the folder with the annotations of each annotator
+        annotator_names: a list with the names of the annotators, as retrieved by get_annotator_names
+    Output:
+        gt_labels: a (annotators x height x width) numpy array with the label map of each annotator, with 0: optic cup, 128: optic disc, 255: elsewhere.
+    '''
+
+    gt_labels = []
+    for annotator_name in annotator_names:
+        gt_filename = path.join(annotators_folder, annotator_name, image_filename)
+        if not path.exists(gt_filename):
+            raise ValueError('Unable to find {} in the annotations of {}.'.format(image_filename, annotator_name))
+        gt_label = read_image(gt_filename)
+        if len(gt_label.shape) > 2:
+            gt_label = gt_label[:,:,0]
+        if len(gt_labels) > 0 and gt_label.shape != gt_labels[0].shape:
+            raise ValueError('The annotation of {} by {} does not have the same size than the other annotations.'.format(image_filename, annotator_name))
+        gt_labels.append(gt_label)
+
+    return np.stack(gt_labels)
+
+
+
+def evaluate_multi_reference_segmentation(segmentation, gt_labels, backend='numpy'):
+    '''
+    Compute the evaluation metrics of the REFUGE challenge with respect to several references at once (see
+    segmentation_kernels.count_multi_reference_pixels). Each row is the same than evaluate_binary_segmentation for that reference
+
+    Input:
+        segmentation: 2D numpy array representing the segmentation, with 0: optic cup, 128: optic disc, 255: elsewhere.
+        gt_labels: a (references x height x width) numpy array with the label map of each reference, with the same format
+        [backend]: the backend that counts the pixels (see segmentation_kernels.get_segmentation_kernel). The numpy backend
+                   counts all the references in a single pass, and the other ones run their kernel once per reference
+    Output:
+        results: a (references x 3) numpy matrix with the cup Dice, the disc Dice and the absolute error of the vertical cup to disc ratio
+    '''
+
+    kernel = get_segmentation_kernel(backend)
+    if kernel is count_segmentation_pixels_numpy:
+        reference_counts = count_multi_reference_pixels(segmentation, gt_labels)
+    else:
+        reference_counts = [ kernel(segmentation, gt_label) for gt_label in gt_labels ]
+
+    return np.array([ get_segmentation_metrics_from_counts(counts) for counts in reference_counts ])
+
+
+
+def generate_multi_reference_table_of_results(image_filenames, segmentation_folder, gt_folder, annotators_folder, is_training=False, boundary_metrics=False, progress=None, backend='numpy'):
+    '''
+    Generates a table with the results of each image with respect to the consensus ground truth and to each annotator.
+    Each segmentation is read and decoded only once, and compared with all the references in the same pass
+
+    Input:
+        image_filenames: a list of strings with the names of the images.
+        segmentation_folder: a string representing the full path to the folder where the segmentation files are
+        gt_folder: a string representing the full path to the folder where the ground truth annotation files are
+        annotators_folder: full path to the folder with the annotations of each annotator (see get_annotator_names)
+        is_training: a boolean value indicating if the evaluation is performed on training data or not
+        [boundary_metrics]: a boolean value indicating if the boundary distances will be computed or not (only for the consensus)
+        [progress]: a stream (see util.progress.create_progress_stream) where the results of each image are reported
+        [backend]: the backend that counts the pixels of the segmentations (see evaluate_multi_reference_segmentation)
+    Output:
+        image_filenames: same as the input parameter
+        reference_names: a list with the names of the references, starting with CONSENSUS_REFERENCE followed by the annotators
+        results: a (images x references x 3) numpy matrix with the cup Dice, the disc Dice and the absolute error of the vertical cup to disc ratio
+        If boundary_metrics is True, the following value is also returned:
+        distances: a (images x 4) numpy matrix with the boundary distances with respect to the consensus (see generate_table_of_results)
+    '''
+
+    annotator_names = get_annotator_names(annotators_folder)
+    reference_names = [ CONSENSUS_REFERENCE ] + annotator_names
+
+    # initialize the table of results
+    results = np.zeros((len(image_filenames), len(reference_names), 3))
+    if boundary_metrics:
+        distances = np.zeros((len(image_filenames), 4))
+    # start reporting the progress
+    start_task_progress(progress, 'segmentation', len(image_filenames), SEGMENTATION_PROGRESS_VALUES)
+
+    # iterate for each image filename
+    for i in range(len(image_filenames)):
+
+        # read the segmentation and all the references
+        segmentation, gt_label = read_segmentation_and_gt(image_filenames[i], segmentation_folder, gt_folder, is_training)
+        gt_labels = np.concatenate((gt_label[np.newaxis], read_annotator_segmentations(image_filenames[i], annotators_folder, annotator_names)))
+        if segmentation.shape != gt_labels.shape[1:]:
+            raise ValueError('The segmentation of {} is {}x{} instead of {}x{}.'.format(image_filenames[i], segmentation.shape[1], segmentation.shape[0], gt_labels.shape[2], gt_labels.shape[1]))
+
+        # evaluate the results with respect to every reference
+        results[i] = evaluate_multi_reference_segmentation(segmentation, gt_labels, backend)
+        if boundary_metrics:
+            distances[i,:] = evaluate_binary_segmentation(segmentation, gt_label, True, backend)[3:]
+        # report the results of the image with respect to the consensus, with the running means
+        report_item_progress(progress, 'segmentation', image_filenames[i], i, results[i,0].tolist())
+
+    if boundary_metrics:
+        return image_filenames, reference_names, results, distances
+    return image_filenames, reference_names, results
+
+
+
+def evaluate_inter_rater_agreement(annotators_folder, gt_folder=None, output_path=None, is_training=False):
+    '''
+    Evaluate the annotation of each annotator as if it was a segmentation, with respect to every other annotator
+    (and to the consensus ground truth, if given). These are the baselines to interpret the per-annotator results.
+    The comparison of an annotator with itself is trivial, so it is NaN
+
+    Input:
+        annotators_folder: full path to the folder with the annotations of each annotator (see get_annotator_names)
+        [gt_folder]: full path to the folder with the consensus ground truth. If not provided, only the annotators are compared
+        [output_path]: a folder where the results will be saved (evaluation_inter_rater.csv). If not provided, they are not saved
+        [is_training]: a boolean value indicating if the evaluation is performed on training data or not
+    Output:
+        annotator_names: a list with the names of the annotators
+        reference_names: a list with the names of the references (CONSENSUS_REFERENCE first, if the consensus is given)
+        agreement: a (annotators x references x 3) numpy matrix with the mean cup Dice, the mean disc Dice and the MAE of the vertical cup to disc ratio
+                   (NaN for the annotator itself)
+    '''
+
+    annotator_names = get_annotator_names(annotators_folder)
+    reference_names = ([] if gt_folder is None else [ CONSENSUS_REFERENCE ]) + annotator_names
+    # the images are the ones annotated by the first annotator
+    image_filenames = get_filenames(path.join(annotators_folder, annotator_names[0]), 'bmp')
+    if len(image_filenames) == 0:
+        raise ValueError('The annotations of {} do not include any bmp file.'.format(annotator_names[0]))
+
+    results = np.zeros((len(image_filenames), len(annotator_names), len(reference_names), 3))
+    for i in range(len(image_filenames)):
+        image_filename = image_filenames[i]
+        # read all the references of the image
+        gt_labels = read_annotator_segmentations(image_filename, annotators_folder, annotator_names)
+        if not (gt_folder is None):
+            gt_label = read_gt_segmentation(image_filename, gt_folder, is_training)
+            if gt_label.shape != gt_labels.shape[1:]:
+                raise ValueError('The annotations of {} do not have the same size than its ground truth.'.format(image_filename))
+            gt_labels = np.concatenate((gt_label[np.newaxis], gt_labels))
+        # compare each annotation with all the references, except itself
+        first_annotator = len(reference_names) - len(annotator_names)
+        for k in range(len(annotator_names)):
+            results[i,k] = evaluate_multi_reference_segmentation(gt_labels[first_annotator + k], gt_labels)
+            results[i,k,first_annotator + k,:] = np.nan
+
+    agreement = np.mean(results, axis=0)
+    # save the results in the output path
+    if not (output_path is None):
+        if not path.exists(output_path):
+            makedirs(output_path)
+        save_csv_annotator_segmentation_performance(path.join(output_path, 'evaluation_inter_rater.csv'), annotator_names, agreement, reference_names)
+
+    return annotator_names, reference_names, agreement
+
+
+
 def get_mean_values_from_table(cup_dices, disc_dices, ae_cdrs):
     '''
     Compute the mean evaluation metrics for the segmentation task.
@@ -210,50 +786,819 @@ def get_mean_values_from_table(cup_dices, disc_dices, ae_cdrs):
 
 
 
-def evaluate_segmentation_results(segmentation_folder, gt_folder, output_path=None, export_table=False, is_training=False):
+def report_segmentation_results(image_filenames, cup_dices, disc_dices, ae_cdrs, distances=None, output_path=None, export_table=False):
     '''
-    Evaluate the segmentation results of a single submission
+    Compute the mean values of a table of segmentation results, print them and save them (and the table) in the output path
 
     Input:
-        segmentation_folder: full path to the segmentation files
-        gt_folder: full path to the ground truth files
+        image_filenames, cup_dices, disc_dices, ae_cdrs: the columns of the table (see generate_table_of_results)
+        [distances]: a (images x 4) numpy matrix with the boundary distances, or None if they were not computed
         [output_path]: a folder where the results will be saved. If not provided, the results are not saved
         [export_table]: a boolean value indicating if the table will be exported or not
-        [is_training]: a boolean value indicating if the evaluation is performed on training data or not
     Output:
         mean_cup_dice: the mean Dice coefficient for the optic cups
         mean_disc_dice: the mean Dice coefficient for the optic disc
         mae_cdr: the mean absolute error for the vertical cup to disc ratio
     '''
 
-    # get all the image filenames
-    image_filenames = get_filenames(segmentation_folder, 'bmp')
-    if len(image_filenames)==0:
-        print('** The segmentation folder does not include any bmp file. Check the files extension and resubmit your results.')
-        raise ValueError()
-    # create output path if it does not exist
-    if not (output_path is None) and not (path.exists(output_path)):
-        makedirs(output_path)
-
-    # generate a table of results
-    _, cup_dices, disc_dices, ae_cdrs = generate_table_of_results(image_filenames, segmentation_folder, gt_folder, is_training)
     # if we need to save the table
     if not(output_path is None) and (export_table):
         # initialize the table filename
         table_filename = path.join(output_path, 'evaluation_table_segmentation.csv')
-        # save the table        
-        save_csv_segmentation_table(table_filename, image_filenames, cup_dices, disc_dices, ae_cdrs)
+        # save the table
+        save_csv_segmentation_table(table_filename, image_filenames, cup_dices, disc_dices, ae_cdrs, distances)
 
     # compute the mean values
     mean_cup_dice, mean_disc_dice, mae_cdr = get_mean_values_from_table(cup_dices, disc_dices, ae_cdrs)
+    mean_distances = None if distances is None else np.mean(distances, axis=0)
     # print the results on screen
     print('Dice Optic Cup = {}\nDice Optic Disc = {}\nMAE CDR = {}'.format(str(mean_cup_dice), str(mean_disc_dice), str(mae_cdr)))
+    if not (distances is None):
+        print('HD95 Optic Cup = {}\nASSD Optic Cup = {}\nHD95 Optic Disc = {}\nASSD Optic Disc = {}'.format(*[ str(value) for value in mean_distances ]))
     # save the mean values in the output path
     if not(output_path is None):
         # initialize the output filename
         output_filename = path.join(output_path, 'evaluation_segmentation.csv')
         # save the results
-        save_csv_mean_segmentation_performance(output_filename, mean_cup_dice, mean_disc_dice, mae_cdr)
+        save_csv_mean_segmentation_performance(output_filename, mean_cup_dice, mean_disc_dice, mae_cdr, mean_distances)
+
+    return mean_cup_dice, mean_disc_dice, mae_cdr
+
+
+
+def evaluate_segmentation_results(segmentation_folder, gt_folder, output_path=None, export_table=False, is_training=False, boundary_metrics=False, progress=None, backend='numpy', annotators_folder=None, tile_rows=None,
+                                  decoded_segmentations=None):
+    '''
+    Evaluate the segmentation results of a single submission
+
+    Input:
+        segmentation_folder: full path to the folder with the segmentation files, or to a CSV file with
+                             run-length encoded segmentations (see util.rle_masks.read_csv_rle_segmentations)
+        gt_folder: full path to the ground truth files
+        [output_path]: a folder where the results will be saved. If not provided, the results are not saved
+        [export_table]: a boolean value indicating if the table will be exported or not
+        [is_training]: a boolean value indicating if the evaluation is performed on training data or not
+        [boundary_metrics]: a boolean value indicating if the boundary distances (HD95 and ASSD) will be computed or not.
+                            If so, they are printed and saved as extra columns, but not returned
+        [progress]: a stream (see util.progress.create_progress_stream) where the results of each image are reported
+        [backend]: the backend that counts the pixels of the segmentations (see segmentation_kernels.get_segmentation_kernel)
+        [annotators_folder]: full path to the folder with the annotations of each annotator (see get_annotator_names). If given,
+                             the BMP segmentations are also evaluated with respect to each annotator, in the same pass, and the
+                             results are printed and saved in evaluation_segmentation_annotators.csv (but not returned)
+        [tile_rows]: if given, the BMP segmentations are streamed in bands of this number of rows (see evaluate_tiled_segmentation)
+        [decoded_segmentations]: a pair (image filenames, iterator of (image filename, segmentation) pairs) with the BMP segmentations
+                                 already decoded from the submission (see util.archive_extraction.extract_submission). If given,
+                                 they are evaluated instead of the files in segmentation_folder
+    Output:
+        mean_cup_dice: the mean Dice coefficient for the optic cups
+        mean_disc_dice: the mean Dice coefficient for the optic disc
+        mae_cdr: the mean absolute error for the vertical cup to disc ratio
+    '''
+
+    # the annotators are only compared with the BMP files
+    if not (annotators_folder is None) and path.isfile(segmentation_folder):
+        print('> The segmentations are run-length encoded, so they are only evaluated with respect to the consensus ground truth')
+        annotators_folder = None
+    if not (annotators_folder is None) and not (decoded_segmentations is None):
+        print('> The segmentations are decoded from the submission file, so they are only evaluated with respect to the consensus ground truth')
+        annotators_folder = None
+
+    # get all the image filenames
+    segmentations = None
+    if not (decoded_segmentations is None):
+        image_filenames, segmentations = decoded_segmentations
+    elif path.isfile(segmentation_folder):
+        segmentations = read_csv_rle_segmentations(segmentation_folder)
+        image_filenames = list(segmentations.keys())
+    else:
+        image_filenames = get_filenames(segmentation_folder, 'bmp')
+    if len(image_filenames)==0:
+        print('** The segmentation folder does not include any bmp file. Check the files extension and resubmit your results.')
+        raise ValueError('The segmentation folder does not include any bmp file.')
+    # create output path if it does not exist
+    if not (output_path is None) and not (path.exists(output_path)):
+        makedirs(output_path)
+
+    # generate a table of results
+    distances = None
+    if not (annotators_folder is None):
+        table = generate_multi_reference_table_of_results(image_filenames, segmentation_folder, gt_folder, annotators_folder, is_training, boundary_metrics, progress, backend)
+        reference_names, annotator_results = table[1], table[2]
+        cup_dices, disc_dices, ae_cdrs = annotator_results[:,0,0], annotator_results[:,0,1], annotator_results[:,0,2]
+        if boundary_metrics:
+            distances = table[3]
+    elif decoded_segmentations is None and path.isfile(segmentation_folder) and boundary_metrics:
+        _, cup_dices, disc_dices, ae_cdrs, distances = generate_rle_table_of_results(image_filenames, segmentations, gt_folder, is_training, True, progress)
+    elif decoded_segmentations is None and path.isfile(segmentation_folder):
+        _, cup_dices, disc_dices, ae_cdrs = generate_rle_table_of_results(image_filenames, segmentations, gt_folder, is_training, progress=progress)
+    elif boundary_metrics:
+        _, cup_dices, disc_dices, ae_cdrs, distances = generate_table_of_results(image_filenames, segmentation_folder, gt_folder, is_training, True, progress, backend, tile_rows, segmentations)
+    else:
+        _, cup_dices, disc_dices, ae_cdrs = generate_table_of_results(image_filenames, segmentation_folder, gt_folder, is_training, progress=progress, backend=backend, tile_rows=tile_rows,
+                                                                      segmentations=segmentations)
+    # save and print the results
+    mean_cup_dice, mean_disc_dice, mae_cdr = report_segmentation_results(image_filenames, cup_dices, disc_dices, ae_cdrs, distances, output_path, export_table)
+    # save the table with the results per annotator
+    if not (output_path is None) and export_table and not (annotators_folder is None):
+        save_csv_annotator_segmentation_table(path.join(output_path, 'evaluation_table_segmentation_annotators.csv'), image_filenames, reference_names[1:], annotator_results[:,1:,:])
+
+    # print and save the mean values with respect to each annotator
+    if not (annotators_folder is None):
+        annotator_performance = np.stack([ get_mean_values_from_table(annotator_results[:,k,0], annotator_results[:,k,1], annotator_results[:,k,2]) for k in range(1, len(reference_names)) ])
+        for k in range(len(reference_names) - 1):
+            print('{}: Dice Optic Cup = {}, Dice Optic Disc = {}, MAE CDR = {}'.format(reference_names[k + 1], *[ str(value) for value in annotator_performance[k] ]))
+        if not(output_path is None):
+            save_csv_annotator_segmentation_performance(path.join(output_path, 'evaluation_segmentation_annotators.csv'), reference_names[1:], annotator_performance)
 
     # return the average performance
     return mean_cup_dice, mean_disc_dice, mae_cdr
+
+
+
+def get_gt_segmentation_filenames(gt_folder, is_training=False):
+    '''
+    Get the names of the images with a ground truth annotation
+
+    Input:
+        gt_folder: a string representing the full path to the folder where the ground truth annotation files are
+        [is_training]: a boolean value indicating if the evaluation is performed on training data or not
+    Output:
+        gt_filenames: a set with the filenames of the annotations (empty if the folder does not exist)
+    '''
+
+    if is_training:
+        gt_folders = [ path.join(gt_folder, 'Glaucoma'), path.join(gt_folder, 'Non-Glaucoma') ]
+    else:
+        gt_folders = [ gt_folder ]
+
+    return set([ filename for folder in gt_folders if path.exists(folder) for filename in get_filenames(folder, 'bmp') ])
+
+
+
+def generate_routed_table_of_results(image_filenames, segmentation_folder, gt_folders, is_training=False, boundary_metrics=False, progress=None, backend='numpy', tile_rows=None,
+                                     rle_segmentations=None):
+    '''
+    Generates a table of results for each of several ground truth sets. Each segmentation is read (or streamed by bands,
+    or decoded from its runs) only once, and evaluated against every ground truth set that includes its image
+
+    Input:
+        image_filenames: a list of strings with the names of the images.
+        segmentation_folder: full path to the folder with the segmentation files, or to a CSV file with run-length encoded segmentations
+        gt_folders: a list with the full path to the ground truth annotation files of each set
+        [is_training]: a boolean value indicating if the evaluation is performed on training data or not
+        [boundary_metrics]: a boolean value indicating if the boundary distances will be computed or not
+        [progress]: a stream (see util.progress.create_progress_stream) where the results of each image are reported (for the first set that includes it)
+        [backend]: the backend that counts the pixels of the segmentations (see segmentation_kernels.get_segmentation_kernel)
+        [tile_rows]: if given, the BMP files are streamed in bands of this number of rows (see evaluate_tiled_segmentation_on_references)
+        [rle_segmentations]: the run-length encoded segmentations already parsed from segmentation_folder (see util.rle_masks.read_csv_rle_segmentations).
+                             If not given and segmentation_folder is a file, it is parsed here
+    Output:
+        tables: a list with a table for each ground truth set, as retrieved by generate_table_of_results (with the images of the set only)
+    '''
+
+    # images of each set
+    gt_filenames = [ get_gt_segmentation_filenames(gt_folder, is_training) for gt_folder in gt_folders ]
+    if rle_segmentations is None and path.isfile(segmentation_folder):
+        rle_segmentations = read_csv_rle_segmentations(segmentation_folder)
+    # initialize the rows of each table
+    routed_filenames = [ [] for gt_folder in gt_folders ]
+    routed_results = [ [] for gt_folder in gt_folders ]
+    # start reporting the progress
+    start_task_progress(progress, 'segmentation', len(image_filenames), SEGMENTATION_PROGRESS_VALUES)
+
+    # iterate for each image filename
+    n_unrouted = 0
+    for i in range(len(image_filenames)):
+
+        # sets that include the image
+        targets = [ k for k in range(len(gt_folders)) if image_filenames[i] in gt_filenames[k] ]
+        if len(targets) == 0:
+            n_unrouted += 1
+            continue
+
+        # evaluate the segmentation against the gt of each set, decoding it (or streaming its bands) only once
+        gt_filenames_of_image = [ get_gt_segmentation_filename(image_filenames[i], gt_folders[k], is_training) for k in targets ]
+        image_results = None
+        if not (rle_segmentations is None):
+            height, width, cup_runs, disc_runs = rle_segmentations[image_filenames[i]]
+            image_results = []
+            for gt_filename in gt_filenames_of_image:
+                gt_label = read_image(gt_filename)
+                if gt_label.shape[:2] != (height, width):
+                    raise ValueError('The segmentation of {} is {}x{} instead of {}x{}.'.format(image_filenames[i], width, height, gt_label.shape[1], gt_label.shape[0]))
+                image_results.append(evaluate_rle_segmentation(height, width, cup_runs, disc_runs, gt_label, boundary_metrics))
+        elif not (tile_rows is None):
+            image_results = evaluate_tiled_segmentation_on_references(path.join(segmentation_folder, image_filenames[i]), gt_filenames_of_image, boundary_metrics, tile_rows, backend)
+        if image_results is None:
+            segmentation = read_image(path.join(segmentation_folder, image_filenames[i]))
+            if len(segmentation.shape) > 2:
+                segmentation = segmentation[:,:,0]
+            image_results = [ evaluate_binary_segmentation(segmentation, read_image(gt_filename), boundary_metrics, backend) for gt_filename in gt_filenames_of_image ]
+        for k, results in zip(targets, image_results):
+            routed_filenames[k].append(image_filenames[i])
+            routed_results[k].append(results)
+        # report the results of the image, with the running means
+        report_item_progress(progress, 'segmentation', image_filenames[i], i, list(routed_results[targets[0]][-1][:3]))
+
+    if n_unrouted > 0:
+        print('> {} segmentations are not included in any ground truth set, so they were not evaluated'.format(n_unrouted))
+
+    # collect the columns of each table
+    tables = []
+    for k in range(len(gt_folders)):
+        results = np.asarray(routed_results[k], dtype=float).reshape((len(routed_filenames[k]), 7 if boundary_metrics else 3))
+        table = (routed_filenames[k], results[:,0], results[:,1], results[:,2])
+        if boundary_metrics:
+            table = table + (results[:,3:],)
+        tables.append(table)
+
+    return tables
+
+
+
+def evaluate_segmentation_results_on_gt_sets(segmentation_folder, gt_folders, output_paths, export_table=False, is_training=False, boundary_metrics=False,
+                                             progress=None, backend='numpy', tile_rows=None):
+    '''
+    Evaluate the segmentation results of a single submission against several ground truth sets in a single pass
+    (see generate_routed_table_of_results). The results of each set are printed and saved as in evaluate_segmentation_results
+
+    Input:
+        segmentation_folder: full path to the folder with the segmentation files, or to a CSV file with run-length encoded segmentations
+        gt_folders: a list with the full path to the ground truth files of each set
+        output_paths: a list with the folder where the results of each set will be saved (or None to not save them)
+        [export_table], [is_training], [boundary_metrics], [progress], [backend], [tile_rows]: see evaluate_segmentation_results
+    Output:
+        performances: a list with the mean cup Dice, the mean disc Dice and the MAE of the vertical cup to disc ratio of each set
+                      (NaN if the set does not include any of the segmented images)
+    '''
+
+    # get all the image filenames (the run-length encoded segmentations are parsed only once)
+    rle_segmentations = None
+    if path.isfile(segmentation_folder):
+        rle_segmentations = read_csv_rle_segmentations(segmentation_folder)
+        image_filenames = list(rle_segmentations.keys())
+    else:
+        image_filenames = get_filenames(segmentation_folder, 'bmp')
+    if len(image_filenames)==0:
+        print('** The segmentation folder does not include any bmp file. Check the files extension and resubmit your results.')
+        raise ValueError('The segmentation folder does not include any bmp file.')
+
+    # generate a table of results for each set
+    tables = generate_routed_table_of_results(image_filenames, segmentation_folder, gt_folders, is_training, boundary_metrics, progress, backend, tile_rows, rle_segmentations)
+
+    performances = []
+    for k in range(len(gt_folders)):
+        if len(tables[k][0]) == 0:
+            print('> None of the segmented images is in the ground truth set {}'.format(gt_folders[k]))
+            performances.append([ np.nan, np.nan, np.nan ])
+            continue
+        # create output path if it does not exist
+        if not (output_paths[k] is None) and not (path.exists(output_paths[k])):
+            makedirs(output_paths[k])
+        print('> Ground truth set {}'.format(gt_folders[k]))
+        performances.append(list(report_segmentation_results(tables[k][0], tables[k][1], tables[k][2], tables[k][3], tables[k][4] if boundary_metrics else None,
+                                                             output_paths[k], export_table)))
+
+    return performances
+
+
+
+def get_block_counts(binary_segmentation, block_size):
+    '''
+    Count the pixels of a binary structure in each block of a regular grid (i.e. downsample it without losing its area)
+
+    Input:
+        binary_segmentation: binary 2D numpy array representing a region of interest
+        block_size: size (in pixels) of the side of the blocks
+    Output:
+        counts: a 2D numpy array with the number of pixels of the structure in each block
+        block_heights: a 1D numpy array with the height of each row of blocks (the last ones can be smaller)
+        block_widths: a 1D numpy array with the width of each column of blocks
+    '''
+
+    # first pixel of each row and column of blocks
+    row_starts = np.arange(0, binary_segmentation.shape[0], block_size)
+    column_starts = np.arange(0, binary_segmentation.shape[1], block_size)
+
+    # sum the pixels inside each block
+    counts = np.add.reduceat(np.add.reduceat(binary_segmentation.astype(np.int32), row_starts, axis=0), column_starts, axis=1)
+
+    block_heights = np.diff(np.append(row_starts, binary_segmentation.shape[0]))
+    block_widths = np.diff(np.append(column_starts, binary_segmentation.shape[1]))
+
+    return counts, block_heights, block_widths
+
+
+
+def dice_coefficient_bounds(segmentation_counts, gt_label_counts, block_areas):
+    '''
+    Estimate the Dice coefficient from the pixel counts per block, with rigorous bounds. The area of both structures is exact,
+    and the intersection in each block is bounded by max(0, p + g - area) and min(p, g).
+
+    Input:
+        segmentation_counts: pixels of the segmented structure in each block, as retrieved by get_block_counts
+        gt_label_counts: pixels of the ground truth structure in each block
+        block_areas: number of pixels of each block
+    Output:
+        estimate: the Dice coefficient assuming that the pixels of both structures overlap in proportion to their counts in
+                  each block (p * g / area), which is exact for the blocks fully inside or outside any of them and always
+                  lies between the bounds
+        lower_bound: the lowest possible Dice coefficient
+        upper_bound: the highest possible Dice coefficient
+    '''
+
+    segmentation_counts = segmentation_counts.astype(float)
+    gt_label_counts = gt_label_counts.astype(float)
+
+    # total area of both structures
+    total = np.sum(segmentation_counts) + np.sum(gt_label_counts)
+    if total == 0:
+        return np.nan, np.nan, np.nan
+
+    # bounds and estimate of the intersection
+    lower_intersection = np.sum(np.maximum(0, segmentation_counts + gt_label_counts - block_areas))
+    upper_intersection = np.sum(np.minimum(segmentation_counts, gt_label_counts))
+    estimated_intersection = np.sum(segmentation_counts * gt_label_counts / block_areas)
+
+    return 2 * estimated_intersection / total, 2 * lower_intersection / total, 2 * upper_intersection / total
+
+
+
+def vertical_diameter_bounds(counts, block_heights, block_widths):
+    '''
+    Bound the vertical diameter of a structure from its pixel counts per block. In each column of blocks, the thickest
+    column of pixels has at least the mean number of pixels per column, and at most the pixels that fit in each block.
+
+    Input:
+        counts: pixels of the structure in each block, as retrieved by get_block_counts
+        block_heights: height of each row of blocks
+        block_widths: width of each column of blocks
+    Output:
+        lower_bound: the lowest possible vertical diameter
+        upper_bound: the highest possible vertical diameter
+    '''
+
+    lower_bound = np.max(np.ceil(np.sum(counts, axis=0) / block_widths.astype(float)))
+    upper_bound = np.max(np.sum(np.minimum(counts, block_heights[:, np.newaxis]), axis=0))
+
+    return float(lower_bound), float(upper_bound)
+
+
+
+def vertical_cup_to_disc_ratio_bounds(cup_counts, disc_counts, block_heights, block_widths):
+    '''
+    Bound the vertical cup-to-disc ratio of a labelling map from the pixel counts per block of its cup and its disc
+
+    Input:
+        cup_counts: pixels of the optic cup in each block, as retrieved by get_block_counts
+        disc_counts: pixels of the optic disc (including the cup) in each block
+        block_heights: height of each row of blocks
+        block_widths: width of each column of blocks
+    Output:
+        lower_bound: the lowest possible vertical cup to disc ratio
+        upper_bound: the highest possible vertical cup to disc ratio
+    '''
+
+    # bound the diameters of the cup and the disc
+    lower_cup, upper_cup = vertical_diameter_bounds(cup_counts, block_heights, block_widths)
+    lower_disc, upper_disc = vertical_diameter_bounds(disc_counts, block_heights, block_widths)
+
+    return lower_cup / (upper_disc + EPS), upper_cup / (lower_disc + EPS)
+
+
+
+def evaluate_downsampled_segmentation(segmentation, gt_label, block_size):
+    '''
+    Estimate the evaluation metrics of the REFUGE challenge from block-downsampled versions of the segmentation
+    and the ground truth, with rigorous bounds of the exact values (the estimates are not bounds themselves)
+
+    Input:
+        segmentation: binary 2D numpy array representing the segmentation, with 0: optic cup, 128: optic disc, 255: elsewhere.
+        gt_label: binary 2D numpy array representing the ground truth annotation, with the same format
+        block_size: size (in pixels) of the side of the blocks
+    Output:
+        estimates: a 1D numpy array with the estimated cup Dice, disc Dice and absolute error of the vertical cup to disc ratio
+        lower_bounds: a 1D numpy array with the lowest possible values
+        upper_bounds: a 1D numpy array with the highest possible values
+    '''
+
+    # count the pixels of each structure per block
+    segmentation_cup, block_heights, block_widths = get_block_counts(segmentation==0, block_size)
+    gt_label_cup, _, _ = get_block_counts(gt_label==0, block_size)
+    segmentation_disc, _, _ = get_block_counts(segmentation<255, block_size)
+    gt_label_disc, _, _ = get_block_counts(gt_label<255, block_size)
+    block_areas = np.outer(block_heights, block_widths).astype(float)
+
+    # bound the Dice coefficients
+    cup_dice = dice_coefficient_bounds(segmentation_cup, gt_label_cup, block_areas)
+    disc_dice = dice_coefficient_bounds(segmentation_disc, gt_label_disc, block_areas)
+
+    # bound the cup to disc ratios
+    lower_cdr, upper_cdr = [], []
+    for cup_counts, disc_counts in [ (segmentation_cup, segmentation_disc), (gt_label_cup, gt_label_disc) ]:
+        lower_bound, upper_bound = vertical_cup_to_disc_ratio_bounds(cup_counts, disc_counts, block_heights, block_widths)
+        lower_cdr.append(lower_bound)
+        upper_cdr.append(upper_bound)
+
+    # bound the absolute error: the difference of the ratios lies in [lowest - highest, highest - lowest]
+    lower_difference = lower_cdr[0] - upper_cdr[1]
+    upper_difference = upper_cdr[0] - lower_cdr[1]
+    upper_error = max(abs(lower_difference), abs(upper_difference))
+    lower_error = 0.0 if lower_difference <= 0 <= upper_difference else min(abs(lower_difference), abs(upper_difference))
+    # estimate it from the midpoints of the ratios
+    estimated_error = absolute_error((lower_cdr[0] + upper_cdr[0]) / 2.0, (lower_cdr[1] + upper_cdr[1]) / 2.0)
+
+    estimates = np.asarray([ cup_dice[0], disc_dice[0], estimated_error ])
+    lower_bounds = np.asarray([ cup_dice[1], disc_dice[1], lower_error ])
+    upper_bounds = np.asarray([ cup_dice[2], disc_dice[2], upper_error ])
+
+    return estimates, lower_bounds, upper_bounds
+
+
+
+def select_stratified_subset(image_filenames, n_images, seed=None):
+    '''
+    Select a random subset of the images, keeping the proportion of each group of images. The groups are identified
+    by the letters at the beginning of the filenames (e.g. g0001.bmp for glaucomatous and n0001.bmp for healthy images)
+
+    Input:
+        image_filenames: a list of strings with the names of the images
+        n_images: number of images to select
+        [seed]: seed for the random number generator
+    Output:
+        selected_filenames: a sorted list with the names of the selected images
+        strata: a list with the group of each selected image
+        strata_sizes: a dictionary with the number of images of each group in image_filenames
+    '''
+
+    # group the images by the prefix of their names
+    groups = dict()
+    for filename in sorted(image_filenames):
+        prefix = filename[:len(filename) - len(filename.lstrip('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'))].lower()
+        groups.setdefault(prefix, []).append(filename)
+    strata_sizes = dict([ (prefix, len(groups[prefix])) for prefix in groups.keys() ])
+
+    # allocate the images proportionally to the size of each group (at least one per group)
+    n_images = min(n_images, len(image_filenames))
+    random_state = np.random.RandomState(seed)
+    selected_filenames, strata = [], []
+    for prefix in sorted(groups.keys()):
+        n_selected = min(len(groups[prefix]), max(1, int(round(n_images * len(groups[prefix]) / float(len(image_filenames))))))
+        for index in sorted(random_state.choice(len(groups[prefix]), n_selected, replace=False)):
+            selected_filenames.append(groups[prefix][index])
+            strata.append(prefix)
+
+    return selected_filenames, strata, strata_sizes
+
+
+
+def stratified_mean_confidence(values, strata, strata_sizes, confidence=0.95):
+    '''
+    Estimate the mean value over all the images from the values of a stratified subset, with a confidence interval
+    (Student's t approximation, with finite population correction)
+
+    Input:
+        values: a 1D numpy array with the value of each selected image
+        strata: a list with the group of each selected image
+        strata_sizes: a dictionary with the number of images of each group
+        [confidence]: confidence level of the interval
+    Output:
+        mean: the estimated mean value
+        half_width: the half width of the confidence interval
+    '''
+
+    strata = np.asarray(strata)
+    n_total = float(sum(strata_sizes.values()))
+    # the variance of the groups with a single image is taken from all the selected images
+    pooled_variance = np.var(values, ddof=1) if len(values) > 1 else 0.0
+
+    mean, variance = 0.0, 0.0
+    for prefix in strata_sizes.keys():
+        group_values = values[strata == prefix]
+        if len(group_values) == 0:
+            continue
+        weight = strata_sizes[prefix] / n_total
+        group_variance = np.var(group_values, ddof=1) if len(group_values) > 1 else pooled_variance
+        mean += weight * np.mean(group_values)
+        variance += weight ** 2 * group_variance / len(group_values) * (1 - len(group_values) / float(strata_sizes[prefix]))
+
+    # the interval is wider when only a few images are evaluated
+    quantile = stats.t.ppf((1 + confidence) / 2.0, max(len(values) - 1, 1))
+
+    return mean, quantile * np.sqrt(variance)
+
+
+
+def quick_evaluate_segmentation_results(segmentation_folder, gt_folder, output_path=None, is_training=False, n_images=20, block_size=4, seed=0):
+    '''
+    Quickly estimate the segmentation results of a single submission, evaluating a stratified subset of the images
+    on block-downsampled masks. If all the images are evaluated, the limits of the mean values are the rigorous bounds of
+    the downsampling. Otherwise, they are those bounds widened with a 95% confidence interval for the images that were
+    not evaluated, so they are not guaranteed to include the exact values.
+
+    Input:
+        segmentation_folder: full path to the segmentation files
+        gt_folder: full path to the ground truth files
+        [output_path]: a folder where the results will be saved. If not provided, the results are not saved
+        [is_training]: a boolean value indicating if the evaluation is performed on training data or not
+        [n_images]: number of images to evaluate. If None, all the images are evaluated
+        [block_size]: size (in pixels) of the side of the blocks. If 1, the masks are evaluated at full resolution
+        [seed]: seed for the random selection of the images
+    Output:
+        estimates: a 1D numpy array with the estimated mean cup Dice, mean disc Dice and MAE of the vertical cup to disc ratio
+        lower_bounds: a 1D numpy array with the lower limits of the mean values
+        upper_bounds: a 1D numpy array with the upper limits of the mean values
+    '''
+
+    # get all the image filenames
+    image_filenames = get_filenames(segmentation_folder, 'bmp')
+    if len(image_filenames)==0:
+        print('** The segmentation folder does not include any bmp file. Check the files extension and resubmit your results.')
+        raise ValueError('The segmentation folder does not include any bmp file.')
+
+    # select the images to evaluate
+    if n_images is None:
+        n_images = len(image_filenames)
+    selected_filenames, strata, strata_sizes = select_stratified_subset(image_filenames, n_images, seed)
+
+    # evaluate each of them at low resolution
+    estimates = np.zeros((len(selected_filenames), 3))
+    lower_bounds = np.zeros((len(selected_filenames), 3))
+    upper_bounds = np.zeros((len(selected_filenames), 3))
+    for i in range(len(selected_filenames)):
+        segmentation, gt_label = read_segmentation_and_gt(selected_filenames[i], segmentation_folder, gt_folder, is_training)
+        estimates[i,:], lower_bounds[i,:], upper_bounds[i,:] = evaluate_downsampled_segmentation(segmentation, gt_label, block_size)
+
+    # extrapolate to all the images (the confidence interval vanishes if all of them were evaluated)
+    is_rigorous = len(selected_filenames) == len(image_filenames)
+    mean_estimates, mean_lower_bounds, mean_upper_bounds = np.zeros(3), np.zeros(3), np.zeros(3)
+    for j in range(3):
+        mean_estimates[j], half_width = stratified_mean_confidence(estimates[:,j], strata, strata_sizes)
+        mean_lower_bounds[j] = stratified_mean_confidence(lower_bounds[:,j], strata, strata_sizes)[0] - half_width
+        mean_upper_bounds[j] = stratified_mean_confidence(upper_bounds[:,j], strata, strata_sizes)[0] + half_width
+    # the Dice coefficients are between 0 and 1, and the absolute errors are positive
+    mean_lower_bounds = np.maximum(mean_lower_bounds, 0)
+    mean_upper_bounds[:2] = np.minimum(mean_upper_bounds[:2], 1)
+
+    # print the results on screen
+    print('Quick evaluation on {} of {} images, with blocks of {}x{} pixels'.format(len(selected_filenames), len(image_filenames), block_size, block_size))
+    print('Estimates with {}'.format('rigorous bounds' if is_rigorous else 'bounds widened with a 95% confidence interval (not guaranteed)'))
+    for name, j in [ ('Dice Optic Cup', 0), ('Dice Optic Disc', 1), ('MAE CDR', 2) ]:
+        print('{} ~ {} [{}, {}]'.format(name, str(mean_estimates[j]), str(mean_lower_bounds[j]), str(mean_upper_bounds[j])))
+    # save the estimates and the bounds in the output path
+    if not(output_path is None):
+        if not path.exists(output_path):
+            makedirs(output_path)
+        save_csv_quick_segmentation_performance(path.join(output_path, 'evaluation_segmentation_quick.csv'), mean_estimates, mean_lower_bounds, mean_upper_bounds, is_rigorous)
+
+    return mean_estimates, mean_lower_bounds, mean_upper_bounds
+
+
+
+def get_probability_map_counts(probability_map, binary_gt_label):
+    '''
+    Count the pixels of a probability map at or above each of the 256 possible thresholds, in a single pass over the image.
+    A histogram of the values of each column (split by the gt label) is accumulated from the highest value to the lowest
+
+    Input:
+        probability_map: 8-bit 2D numpy array with the probability of each pixel to belong to the structure (0 to 255)
+        binary_gt_label: binary 2D numpy array representing the structure as provided in the database
+    Output:
+        areas: a 1D numpy array with the number of pixels at or above each threshold
+        intersections: a 1D numpy array with the number of those pixels that are also in the ground truth
+        diameters: a 1D numpy array with the vertical diameter (see vertical_diameter) of the pixels at or above each threshold
+    '''
+
+    probability_map = np.asarray(probability_map)
+    if probability_map.dtype != np.uint8:
+        raise ValueError('The probability maps must be 8-bit images.')
+    width = probability_map.shape[1]
+
+    # position of each pixel in a (column, value, gt label) histogram
+    indices = (np.arange(width, dtype=np.int64)[np.newaxis,:] * 256 + probability_map) * 2 + np.asarray(binary_gt_label, dtype=np.int64)
+    histogram = np.bincount(indices.ravel(), minlength=width * 512).reshape((width, 256, 2))
+
+    # number of pixels at or above each threshold, in each column
+    column_counts = np.cumsum(histogram[:,::-1,:], axis=1)[:,::-1,:]
+
+    return np.sum(column_counts, axis=(0, 2)), np.sum(column_counts[:,:,1], axis=0), np.max(np.sum(column_counts, axis=2), axis=0)
+
+
+
+def count_below_thresholds(joint_histograms):
+    '''
+    Count the pixels below each pair of thresholds from joint histograms of the values of two 8-bit maps
+
+    Input:
+        joint_histograms: a (... x 256 x 256) numpy array with the number of pixels with each (cup value, disc value) pair
+    Output:
+        below: a numpy array with the same shape and type, with the number of pixels whose cup value is below the cup
+               threshold (second to last axis) and whose disc value is below the disc threshold (last axis)
+    '''
+
+    # the contiguous axis is accumulated first, which is faster
+    below = np.zeros(joint_histograms.shape, dtype=joint_histograms.dtype)
+    below[...,1:,1:] = np.cumsum(np.cumsum(joint_histograms[...,:-1,:-1], axis=-1), axis=-2)
+
+    return below
+
+
+
+def get_probability_map_union_counts(cup_probabilities, disc_probabilities, binary_gt_label):
+    '''
+    Count the pixels of the optic disc of the segmentations binarized from the probability maps at each pair of the
+    256 possible cup and disc thresholds. As the cup is painted over the disc, a pixel belongs to the disc if any of
+    the maps is at or above its threshold, so the pixels out of the disc are counted from a (cup value, disc value)
+    histogram accumulated from the lowest values. The histograms of the columns are only accumulated once for the
+    columns with the same values (e.g. the ones that are far from the disc)
+
+    Input:
+        cup_probabilities: 8-bit 2D numpy array with the probability of each pixel to be in the optic cup
+        disc_probabilities: 8-bit 2D numpy array with the probability of each pixel to be in the optic disc
+        binary_gt_label: binary 2D numpy array representing the optic disc as provided in the database
+    Output:
+        areas: a (cup thresholds x disc thresholds) numpy matrix with the number of pixels of the disc at each pair of thresholds
+        intersections: a (cup thresholds x disc thresholds) numpy matrix with the number of those pixels that are also in the ground truth
+        diameters: a (cup thresholds x disc thresholds) numpy matrix with the vertical diameter (see vertical_diameter) of the disc
+    '''
+
+    disc_probabilities = np.asarray(disc_probabilities)
+    if disc_probabilities.dtype != np.uint8:
+        raise ValueError('The probability maps must be 8-bit images.')
+    binary_gt_label = np.asarray(binary_gt_label, dtype=bool)
+    height = disc_probabilities.shape[0]
+
+    # position of each pixel in a (cup value, disc value) histogram
+    joint_values = np.asarray(cup_probabilities, dtype=np.uint16) * 256 + disc_probabilities
+
+    # pixels out of the disc in the whole image, and in the ground truth
+    below = count_below_thresholds(np.bincount(joint_values.ravel(), minlength=65536).reshape((256, 256)))
+    gt_below = count_below_thresholds(np.bincount(joint_values[binary_gt_label], minlength=65536).reshape((256, 256)))
+    areas = joint_values.size - below
+    intersections = int(np.sum(binary_gt_label)) - gt_below
+
+    # the diameter is given by the column with the fewest pixels out of the disc, and the columns with the same values
+    # are found by comparing the bytes of their sorted values (much faster than numpy.unique along an axis)
+    columns = np.ascontiguousarray(np.sort(joint_values.T, axis=1))
+    _, unique_indices = np.unique(columns.view(np.dtype((np.void, columns.strides[0]))).ravel(), return_index=True)
+    columns = columns[unique_indices,:]
+    min_below = np.full((256, 256), height, dtype=np.int64)
+    for first_column in range(0, columns.shape[0], PROBABILITY_COLUMNS_BLOCK):
+        block = columns[first_column:first_column + PROBABILITY_COLUMNS_BLOCK,:]
+        indices = np.arange(block.shape[0], dtype=np.int64)[:,np.newaxis] * 65536 + block
+        # the counts of a column fit in 32 bits, which halves the memory traffic of the accumulation
+        histograms = np.bincount(indices.ravel(), minlength=block.shape[0] * 65536).reshape((block.shape[0], 256, 256)).astype(np.int32)
+        min_below = np.minimum(min_below, np.min(count_below_thresholds(histograms), axis=0))
+    diameters = height - min_below
+
+    return areas, intersections, diameters
+
+
+
+def evaluate_probability_segmentation(cup_probabilities, disc_probabilities, gt_label):
+    '''
+    Compute the evaluation metrics of the REFUGE challenge for the probability maps of the optic cup and disc,
+    binarized at each of the 256 possible thresholds (a pixel belongs to the structure if its value is at or above
+    the threshold). As in the binarized segmentations, the cup is painted over the disc, so the disc is the union of
+    both binarized maps and its metrics depend on both thresholds. The results are the same than evaluating the
+    binarized maps with evaluate_binary_segmentation
+
+    Input:
+        cup_probabilities: 8-bit 2D numpy array with the probability of each pixel to be in the optic cup
+        disc_probabilities: 8-bit 2D numpy array with the probability of each pixel to be in the optic disc (including the cup)
+        gt_label: 2D numpy array representing the ground truth annotation, with 0: optic cup, 128: optic disc, 255: elsewhere.
+    Output:
+        cup_dices: a 1D numpy array with the Dice coefficient for the optic cup at each threshold
+        disc_dices: a (cup thresholds x disc thresholds) numpy matrix with the Dice coefficient for the optic disc
+        ae_cdrs: a (cup thresholds x disc thresholds) numpy matrix with the absolute error of the vertical cup to disc ratio
+    '''
+
+    gt_cup = gt_label==0
+    gt_disc = gt_label<255
+
+    # count the pixels of the cup at all the thresholds, and the ones of the disc at all the pairs of thresholds
+    cup_areas, cup_intersections, cup_diameters = get_probability_map_counts(cup_probabilities, gt_cup)
+    disc_areas, disc_intersections, disc_diameters = get_probability_map_union_counts(cup_probabilities, disc_probabilities, gt_disc)
+
+    # compute the Dice coefficients (NaN if both structures are empty)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cup_dices = 2.0 * cup_intersections / (cup_areas + float(np.sum(gt_cup)))
+        disc_dices = 2.0 * disc_intersections / (disc_areas + float(np.sum(gt_disc)))
+    # compute the absolute error of the cup to disc ratio for each pair of thresholds
+    ae_cdrs = np.abs(cup_diameters[:,np.newaxis] / (disc_diameters + EPS) - vertical_cup_to_disc_ratio(gt_label))
+
+    return cup_dices, disc_dices, ae_cdrs
+
+
+
+def read_probability_maps(image_filename, probability_folder):
+    '''
+    Read the probability maps of the optic cup and disc of an image
+
+    Input:
+        image_filename: name of the image
+        probability_folder: full path to the folder with the probability maps, with the subfolders 'cup' and 'disc'
+    Output:
+        cup_probabilities, disc_probabilities: 8-bit 2D numpy arrays with the probability maps
+    '''
+
+    probability_maps = []
+    for structure in PROBABILITY_MAP_FOLDERS:
+        probability_map = read_image(path.join(probability_folder, structure, image_filename))
+        if len(probability_map.shape) > 2:
+            probability_map = probability_map[:,:,0]
+        probability_maps.append(probability_map)
+
+    return probability_maps[0], probability_maps[1]
+
+
+
+def evaluate_probability_segmentation_results(probability_folder, gt_folder, output_path=None, export_table=False, is_training=False, progress=None, image_filenames=None):
+    '''
+    Evaluate the probability maps of a single submission at all the thresholds. The curves of the mean values
+    and the best thresholds are reported, and the mean values at SOFT_SEGMENTATION_THRESHOLD are returned
+
+    Input:
+        probability_folder: full path to the folder with the probability maps, with the subfolders 'cup' and 'disc'
+        gt_folder: full path to the ground truth files
+        [output_path]: a folder where the results will be saved. If not provided, the results are not saved
+        [export_table]: a boolean value indicating if the table (at SOFT_SEGMENTATION_THRESHOLD) will be exported or not
+        [is_training]: a boolean value indicating if the evaluation is performed on training data or not
+        [progress]: a stream (see util.progress.create_progress_stream) where the results of each image are reported
+        [image_filenames]: a list with the names of the images to evaluate (e.g. the ones of a ground truth set). If not
+                           provided, all the probability maps are evaluated
+    Output:
+        mean_cup_dice: the mean Dice coefficient for the optic cups at SOFT_SEGMENTATION_THRESHOLD
+        mean_disc_dice: the mean Dice coefficient for the optic disc at SOFT_SEGMENTATION_THRESHOLD
+        mae_cdr: the mean absolute error for the vertical cup to disc ratio at SOFT_SEGMENTATION_THRESHOLD
+        best_thresholds: a dictionary mapping 'Cup-Dice' and 'Disc-Dice' to their (best threshold, mean value), and
+                         'AE-CDR' to ((best cup threshold, best disc threshold), mean value). The threshold of the disc
+                         is applied to both maps, since the binarized cup is part of the disc
+    '''
+
+    # get all the image filenames
+    probability_filenames = get_filenames(path.join(probability_folder, PROBABILITY_MAP_FOLDERS[0]), 'bmp')
+    if not (image_filenames is None):
+        probability_filenames = [ filename for filename in probability_filenames if filename in image_filenames ]
+    image_filenames = probability_filenames
+    if len(image_filenames)==0:
+        print('** The probability maps folder does not include any bmp file. Check the files extension and resubmit your results.')
+        raise ValueError('The probability maps folder does not include any bmp file.')
+    # create output path if it does not exist
+    if not (output_path is None) and not (path.exists(output_path)):
+        makedirs(output_path)
+
+    # evaluate each image at all the thresholds
+    cup_dices = np.zeros((len(image_filenames), 256))
+    disc_dices = np.zeros((len(image_filenames), 256))
+    sum_ae_cdrs = np.zeros((256, 256))
+    default_ae_cdrs = np.zeros(len(image_filenames))
+    start_task_progress(progress, 'segmentation', len(image_filenames), SEGMENTATION_PROGRESS_VALUES)
+    for i in range(len(image_filenames)):
+        cup_probabilities, disc_probabilities = read_probability_maps(image_filenames[i], probability_folder)
+        gt_label = read_gt_segmentation(image_filenames[i], gt_folder, is_training)
+        if cup_probabilities.shape != gt_label.shape[:2] or disc_probabilities.shape != gt_label.shape[:2]:
+            raise ValueError('The probability maps of {} do not have the size of the ground truth.'.format(image_filenames[i]))
+        cup_dices[i,:], disc_dice_grid, ae_cdrs = evaluate_probability_segmentation(cup_probabilities, disc_probabilities, gt_label)
+        # the curve of the disc uses the same threshold for both maps
+        disc_dices[i,:] = np.diag(disc_dice_grid)
+        # the mean absolute errors of the grid are accumulated, to avoid keeping a grid per image
+        sum_ae_cdrs += ae_cdrs
+        default_ae_cdrs[i] = ae_cdrs[SOFT_SEGMENTATION_THRESHOLD, SOFT_SEGMENTATION_THRESHOLD]
+        report_item_progress(progress, 'segmentation', image_filenames[i], i, [ cup_dices[i,SOFT_SEGMENTATION_THRESHOLD], disc_dices[i,SOFT_SEGMENTATION_THRESHOLD], default_ae_cdrs[i] ])
+
+    # mean curves
+    mean_cup_dices = np.mean(cup_dices, axis=0)
+    mean_disc_dices = np.mean(disc_dices, axis=0)
+    mean_ae_cdrs = sum_ae_cdrs / len(image_filenames)
+
+    # best thresholds (the lowest one in case of ties)
+    best_cup_threshold = int(np.nanargmax(mean_cup_dices))
+    best_disc_threshold = int(np.nanargmax(mean_disc_dices))
+    best_cdr_thresholds = np.unravel_index(np.nanargmin(mean_ae_cdrs), mean_ae_cdrs.shape)
+    best_thresholds = { 'Cup-Dice': (best_cup_threshold, mean_cup_dices[best_cup_threshold]),
+                        'Disc-Dice': (best_disc_threshold, mean_disc_dices[best_disc_threshold]),
+                        'AE-CDR': ((int(best_cdr_thresholds[0]), int(best_cdr_thresholds[1])), mean_ae_cdrs[best_cdr_thresholds]) }
+
+    # mean values at the default threshold (as for the binary segmentations)
+    mean_cup_dice, mean_disc_dice, mae_cdr = get_mean_values_from_table(cup_dices[:,SOFT_SEGMENTATION_THRESHOLD], disc_dices[:,SOFT_SEGMENTATION_THRESHOLD], default_ae_cdrs)
+
+    # print the results on screen
+    print('Probability maps binarized at {}:'.format(SOFT_SEGMENTATION_THRESHOLD))
+    print('Dice Optic Cup = {}\nDice Optic Disc = {}\nMAE CDR = {}'.format(str(mean_cup_dice), str(mean_disc_dice), str(mae_cdr)))
+    print('Best thresholds:')
+    print('Dice Optic Cup = {} (threshold {})'.format(str(best_thresholds['Cup-Dice'][1]), best_cup_threshold))
+    print('Dice Optic Disc = {} (threshold {})'.format(str(best_thresholds['Disc-Dice'][1]), best_disc_threshold))
+    print('MAE CDR = {} (cup threshold {}, disc threshold {})'.format(str(best_thresholds['AE-CDR'][1]), best_thresholds['AE-CDR'][0][0], best_thresholds['AE-CDR'][0][1]))
+
+    # save the results in the output path
+    if not(output_path is None):
+        thresholds = np.arange(256)
+        save_csv_segmentation_threshold_curves(path.join(output_path, 'evaluation_segmentation_thresholds.csv'), thresholds, mean_cup_dices, mean_disc_dices, np.diag(mean_ae_cdrs))
+        save_csv_cdr_threshold_grid(path.join(output_path, 'evaluation_segmentation_cdr_thresholds.csv'), thresholds, mean_ae_cdrs)
+        save_csv_mean_segmentation_performance(path.join(output_path, 'evaluation_segmentation.csv'), mean_cup_dice, mean_disc_dice, mae_cdr)
+        if export_table:
+            save_csv_segmentation_table(path.join(output_path, 'evaluation_table_segmentation.csv'), image_filenames,
+                                        cup_dices[:,SOFT_SEGMENTATION_THRESHOLD], disc_dices[:,SOFT_SEGMENTATION_THRESHOLD], default_ae_cdrs)
+
+    return mean_cup_dice, mean_disc_dice, mae_cdr, best_thresholds
@@ -0,0 +1,214 @@
+
+import numpy as np
+
+from os import path
+
+from evaluation_metrics.evaluation_metrics_for_segmentation import evaluate_binary_segmentation, read_gt_segmentation, get_mean_values_from_table
+from evaluation_metrics.evaluation_metrics_for_classification import get_classification_performance
+from evaluation_metrics.evaluation_metrics_for_fovea_location import get_fovea_location_distances
+from util.file_management import get_filenames, get_labels_from_training_data, read_gt_labels, read_gt_fovea_location
+
+
+# tasks whose ground truth can be loaded in memory
+GROUND_TRUTH_TASKS = ['segmentation', 'classification', 'fovea_location']
+
+
+def load_ground_truth(gt_folder, is_training=False, tasks=None):
+    '''
+    Load the ground truth of the challenge in memory, so the results can be evaluated many times (e.g. after
+    each epoch of a training loop) without reading any file
+
+    Input:
+        gt_folder: full path to the ground truth files
+        [is_training]: a boolean value indicating if the evaluation is performed on training data or not
+        [tasks]: a list with the tasks whose ground truth is loaded. If not provided, all of them are loaded
+    Output:
+        gt: a dictionary with the following fields (None if the ground truth of the task is not available or not requested):
+            segmentation: a dictionary mapping each mask filename to its label map (0: optic cup, 128: optic disc, 255: elsewhere)
+            classification: a tuple (image_filenames, labels)
+            fovea_location: a tuple (image_filenames, coordinates)
+    '''
+
+    gt = { 'segmentation': None, 'classification': None, 'fovea_location': None }
+    tasks = GROUND_TRUTH_TASKS if tasks is None else tasks
+
+    # load the segmentation masks
+    gt_segmentation_folder = path.join(gt_folder, 'Disc_Cup_Masks')
+    if is_training:
+        gt_segmentation_folders = [ path.join(gt_segmentation_folder, 'Glaucoma'), path.join(gt_segmentation_folder, 'Non-Glaucoma') ]
+    else:
+        gt_segmentation_folders = [ gt_segmentation_folder ]
+    if 'segmentation' in tasks and all([ path.exists(folder) for folder in gt_segmentation_folders ]):
+        gt['segmentation'] = dict()
+        for folder in gt_segmentation_folders:
+            for filename in get_filenames(folder, 'bmp'):
+                gt['segmentation'][filename] = read_gt_segmentation(filename, gt_segmentation_folder, is_training)
+
+    # load the classification labels
+    if 'classification' in tasks:
+        try:
+            if is_training:
+                gt['classification'] = get_labels_from_training_data(gt_segmentation_folder)
+            else:
+                gt['classification'] = read_gt_labels(path.join(gt_folder, 'GT.xlsx'))
+        except (IOError, OSError):
+            pass
+
+    # load the fovea location labels
+    if 'fovea_location' in tasks:
+        try:
+            if is_training:
+                gt['fovea_location'] = read_gt_fovea_location(path.join(gt_folder, 'Fovea_location.xlsx'), is_training)
+            else:
+                gt['fovea_location'] = read_gt_fovea_location(path.join(gt_folder, 'Fovea_locations.xlsx'), is_training)
+        except (IOError, OSError):
+            pass
+
+    return gt
+
+
+
+def get_named_predictions(predictions, names=None):
+    '''
+    Iterate over the predictions of several images, given in any of the supported forms
+
+    Input:
+        predictions: a dictionary mapping each image filename to its prediction, an iterable of (image filename, prediction)
+                     pairs, or a sequence of predictions (e.g. a 3D numpy array with a label map per image) if names is given
+        [names]: a list with the filename of each prediction, if they are not included in predictions
+    Output:
+        pairs: an iterable of (image filename, prediction) pairs
+    '''
+
+    if not (names is None):
+        return zip(names, predictions)
+    if isinstance(predictions, dict):
+        return predictions.items()
+    return predictions
+
+
+
+def check_ground_truth(gt, task):
+    '''
+    Check that the ground truth of a task is loaded
+
+    Input:
+        gt: the ground truth, as retrieved by load_ground_truth
+        task: the name of the task
+    '''
+
+    if gt[task] is None:
+        raise ValueError('The ground truth for the {} task is not loaded.'.format(task.replace('_', ' ')))
+
+
+
+def evaluate_segmentation_arrays(predictions, gt, names=None, boundary_metrics=False, backend='numpy'):
+    '''
+    Evaluate segmentations given as numpy arrays, with the same metrics than evaluate_segmentation_results
+
+    Input:
+        predictions: the label map of each image (0: optic cup, 128: optic disc, 255: elsewhere), in any of the forms
+                     supported by get_named_predictions. They are evaluated one by one, so they can be generated on the fly
+        gt: the ground truth, as retrieved by load_ground_truth
+        [names]: a list with the filename of each prediction, if they are not included in predictions
+        [boundary_metrics]: a boolean value indicating if the boundary distances (HD95 and ASSD) will be computed or not
+        [backend]: the backend that counts the pixels of the segmentations (see segmentation_kernels.get_segmentation_kernel)
+    Output:
+        mean_cup_dice: the mean Dice coefficient for the optic cups
+        mean_disc_dice: the mean Dice coefficient for the optic disc
+        mae_cdr: the mean absolute error for the vertical cup to disc ratio
+        table: a tuple with the results per image, as retrieved by evaluation_metrics_for_segmentation.generate_table_of_results
+    '''
+
+    check_ground_truth(gt, 'segmentation')
+
+    image_filenames = []
+    results = []
+    # iterate for each prediction
+    for image_filename, segmentation in get_named_predictions(predictions, names):
+
+        # find the gt (the extension of the filename is optional)
+        if not (image_filename in gt['segmentation']) and (image_filename + '.bmp') in gt['segmentation']:
+            image_filename = image_filename + '.bmp'
+        if not (image_filename in gt['segmentation']):
+            raise ValueError('There is no ground truth for {}.'.format(image_filename))
+        gt_label = gt['segmentation'][image_filename]
+
+        # use only the first channel, as in the BMP files
+        segmentation = np.asarray(segmentation)
+        if len(segmentation.shape) > 2:
+            segmentation = segmentation[:,:,0]
+        if segmentation.shape != gt_label.shape[:2]:
+            raise ValueError('The segmentation of {} is {}x{} instead of {}x{}.'.format(image_filename, segmentation.shape[1], segmentation.shape[0], gt_label.shape[1], gt_label.shape[0]))
+
+        # evaluate the results
+        image_filenames.append(image_filename)
+        results.append(evaluate_binary_segmentation(segmentation, gt_label, boundary_metrics, backend))
+
+    # collect the columns of the table
+    results = np.asarray(results, dtype=float).reshape((len(image_filenames), 7 if boundary_metrics else 3))
+    table = (image_filenames, results[:,0], results[:,1], results[:,2])
+    if boundary_metrics:
+        table = table + (results[:,3:],)
+
+    # compute the mean values
+    mean_cup_dice, mean_disc_dice, mae_cdr = get_mean_values_from_table(results[:,0], results[:,1], results[:,2])
+
+    return mean_cup_dice, mean_disc_dice, mae_cdr, table
+
+
+
+def evaluate_classification_scores(predictions, gt, names=None):
+    '''
+    Evaluate classification scores given in memory, with the same metrics than evaluate_classification_results
+
+    Input:
+        predictions: the glaucoma score of each image, in any of the forms supported by get_named_predictions
+        gt: the ground truth, as retrieved by load_ground_truth
+        [names]: a list with the filename of each prediction, if they are not included in predictions
+    Output:
+        auc: the area under the ROC curve
+        reference_sensitivity: the sensitivity at the reference specificity
+        table: a tuple (image_filenames, scores, labels) with the results per image
+    '''
+
+    check_ground_truth(gt, 'classification')
+
+    # collect the scores
+    pairs = list(get_named_predictions(predictions, names))
+    image_filenames = [ pair[0] for pair in pairs ]
+    predicted_scores = np.asarray([ pair[1] for pair in pairs ], dtype=float).ravel()
+
+    # compute the performance
+    gt_filenames, gt_labels = gt['classification']
+    _, _, auc, reference_sensitivity, gt_labels = get_classification_performance(image_filenames, predicted_scores, gt_filenames, gt_labels)
+
+    return auc, reference_sensitivity, (image_filenames, predicted_scores, np.ravel(gt_labels))
+
+
+
+def evaluate_fovea_location_coordinates(predictions, gt, names=None):
+    '''
+    Evaluate fovea locations given in memory, with the same metric than evaluate_fovea_location_results
+
+    Input:
+        predictions: the (x,y) coordinates of the fovea in each image, in any of the forms supported by get_named_predictions
+        gt: the ground truth, as retrieved by load_ground_truth
+        [names]: a list with the filename of each prediction, if they are not included in predictions
+    Output:
+        mean_euclidean_distance: the mean Euclidean distance
+        table: a tuple (image_filenames, distances) with the results per image
+    '''
+
+    check_ground_truth(gt, 'fovea_location')
+
+    # collect the coordinates
+    pairs = list(get_named_predictions(predictions, names))
+    image_filenames = [ pair[0] for pair in pairs ]
+    predicted_coordinates = np.asarray([ pair[1] for pair in pairs ], dtype=float).reshape((len(pairs), 2))
+
+    # compute the distances
+    gt_image_filenames, gt_coordinates = gt['fovea_location']
+    euclidean_distances = get_fovea_location_distances(image_filenames, predicted_coordinates, gt_image_filenames, gt_coordinates)
+
+    return np.mean(euclidean_distances), (image_filenames, euclidean_distances)
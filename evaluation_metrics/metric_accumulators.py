@@ -0,0 +1,220 @@
+
+import math
+import numpy as np
+
+from evaluation_metrics.evaluation_metrics_for_classification import get_roc_curve, get_sensitivity_at_given_specificity
+
+
+# values accumulated for the segmentation task, in order
+SEGMENTATION_ACCUMULATOR_VALUES = ['Cup-Dice', 'Disc-Dice', 'AE-CDR']
+# boundary distances accumulated for the segmentation task (see evaluation_metrics_for_segmentation.boundary_distances)
+BOUNDARY_ACCUMULATOR_VALUES = ['Cup-HD95', 'Cup-ASSD', 'Disc-HD95', 'Disc-ASSD']
+
+
+def add_exact(partials, values):
+    '''
+    Add values to an exact sum, represented by non-overlapping partial sums (Shewchuk's algorithm, as in math.fsum).
+    The result does not depend on the order of the values, so sums of different shards can be merged exactly
+
+    Input:
+        partials: a list of floats with the partial sums
+        values: an iterable of floats to add
+    Output:
+        partials: a new list of partial sums, whose exact sum is the sum of all the values
+    '''
+
+    partials = list(partials)
+    for x in values:
+        x = float(x)
+        i = 0
+        for y in partials:
+            if abs(x) < abs(y):
+                x, y = y, x
+            high = x + y
+            low = y - (high - x)
+            if low:
+                partials[i] = low
+                i += 1
+            x = high
+        partials[i:] = [x]
+
+    return partials
+
+
+
+def create_segmentation_accumulator(boundary_metrics=False):
+    '''
+    Create an accumulator of segmentation results, that can be updated with batches of images and merged with
+    the accumulators of other shards
+
+    Input:
+        [boundary_metrics]: a boolean value indicating if the boundary distances are accumulated too
+    Output:
+        accumulator: a dictionary with the task, the names of the values, the number of images and the partial sums of each value
+    '''
+
+    names = SEGMENTATION_ACCUMULATOR_VALUES + (BOUNDARY_ACCUMULATOR_VALUES if boundary_metrics else [])
+
+    return { 'task': 'segmentation', 'names': names, 'count': 0, 'partials': [ [] for name in names ] }
+
+
+
+def update_segmentation_accumulator(accumulator, cup_dices, disc_dices, ae_cdrs, distances=None):
+    '''
+    Add a batch of segmentation results to an accumulator
+
+    Input:
+        accumulator: an accumulator, as retrieved by create_segmentation_accumulator
+        cup_dices, disc_dices, ae_cdrs: 1D numpy arrays with the results of each image of the batch
+        [distances]: a (images x 4) numpy matrix with the boundary distances, if the accumulator includes them
+    '''
+
+    columns = [ np.ravel(cup_dices), np.ravel(disc_dices), np.ravel(ae_cdrs) ]
+    if len(accumulator['names']) > len(SEGMENTATION_ACCUMULATOR_VALUES):
+        if distances is None:
+            raise ValueError('The accumulator needs the boundary distances of the images.')
+        distances = np.asarray(distances, dtype=float).reshape((len(columns[0]), len(BOUNDARY_ACCUMULATOR_VALUES)))
+        columns = columns + [ distances[:,j] for j in range(distances.shape[1]) ]
+
+    accumulator['count'] += len(columns[0])
+    accumulator['partials'] = [ add_exact(accumulator['partials'][j], columns[j]) for j in range(len(columns)) ]
+
+
+
+def create_classification_accumulator():
+    '''
+    Create an accumulator of classification results. The scores are aggregated in a histogram with the number of
+    glaucomatous and healthy images of each distinct score, which is enough to compute the ROC curve exactly
+
+    Output:
+        accumulator: a dictionary with the task, the sorted distinct scores, and the number of positives and negatives of each of them
+    '''
+
+    return { 'task': 'classification', 'scores': np.zeros(0), 'positives': np.zeros(0, dtype=np.int64), 'negatives': np.zeros(0, dtype=np.int64) }
+
+
+
+def aggregate_scores(scores, positives, negatives):
+    '''
+    Aggregate the counts of the repeated scores
+
+    Input:
+        scores: a 1D numpy array of scores
+        positives, negatives: 1D numpy arrays with the number of positives and negatives of each score
+    Output:
+        scores, positives, negatives: the same counts, for the sorted distinct scores
+    '''
+
+    unique_scores, inverse = np.unique(scores, return_inverse=True)
+    positives = np.bincount(inverse, weights=positives, minlength=len(unique_scores)).astype(np.int64)
+    negatives = np.bincount(inverse, weights=negatives, minlength=len(unique_scores)).astype(np.int64)
+
+    return unique_scores, positives, negatives
+
+
+
+def update_classification_accumulator(accumulator, scores, labels):
+    '''
+    Add a batch of classification results to an accumulator
+
+    Input:
+        accumulator: an accumulator, as retrieved by create_classification_accumulator
+        scores: a 1D numpy array with the predicted score of each image of the batch
+        labels: a 1D numpy array with the gt label of each image (0: healthy, 1: glaucomatous)
+    '''
+
+    scores = np.asarray(scores, dtype=float).ravel()
+    is_positive = np.ravel(labels) > 0
+
+    accumulator['scores'], accumulator['positives'], accumulator['negatives'] = aggregate_scores(
+        np.concatenate((accumulator['scores'], scores)),
+        np.concatenate((accumulator['positives'], is_positive.astype(np.int64))),
+        np.concatenate((accumulator['negatives'], np.logical_not(is_positive).astype(np.int64))))
+
+
+
+def create_fovea_location_accumulator():
+    '''
+    Create an accumulator of fovea location results
+
+    Output:
+        accumulator: a dictionary with the task, the number of images and the partial sums of the Euclidean distances
+    '''
+
+    return { 'task': 'fovea_location', 'names': ['Euclidean distance'], 'count': 0, 'partials': [ [] ] }
+
+
+
+def update_fovea_location_accumulator(accumulator, distances):
+    '''
+    Add a batch of fovea location results to an accumulator
+
+    Input:
+        accumulator: an accumulator, as retrieved by create_fovea_location_accumulator
+        distances: a 1D numpy array with the Euclidean distance of each image of the batch
+    '''
+
+    distances = np.ravel(distances)
+    accumulator['count'] += len(distances)
+    accumulator['partials'] = [ add_exact(accumulator['partials'][0], distances) ]
+
+
+
+def merge_accumulators(accumulator, other_accumulator):
+    '''
+    Merge the accumulators of two shards of the same task. The result is exactly the same than accumulating all the
+    images in a single accumulator, in any order
+
+    Input:
+        accumulator, other_accumulator: two accumulators of the same task (and with the same values)
+    Output:
+        merged_accumulator: a new accumulator with the results of both
+    '''
+
+    if accumulator['task'] != other_accumulator['task'] or accumulator.get('names') != other_accumulator.get('names'):
+        raise ValueError('Only accumulators of the same task and values can be merged.')
+
+    if accumulator['task'] == 'classification':
+        merged_accumulator = { 'task': 'classification' }
+        merged_accumulator['scores'], merged_accumulator['positives'], merged_accumulator['negatives'] = aggregate_scores(
+            np.concatenate((accumulator['scores'], other_accumulator['scores'])),
+            np.concatenate((accumulator['positives'], other_accumulator['positives'])),
+            np.concatenate((accumulator['negatives'], other_accumulator['negatives'])))
+        return merged_accumulator
+
+    return { 'task': accumulator['task'], 'names': list(accumulator['names']), 'count': accumulator['count'] + other_accumulator['count'],
+             'partials': [ add_exact(accumulator['partials'][j], other_accumulator['partials'][j]) for j in range(len(accumulator['partials'])) ] }
+
+
+
+def compute_accumulator(accumulator):
+    '''
+    Compute the metrics of the results collected by an accumulator
+
+    Input:
+        accumulator: an accumulator of any task
+    Output:
+        For the segmentation: a list with the mean cup Dice, the mean disc Dice and the MAE of the vertical cup to disc ratio
+                              (followed by the mean boundary distances, if they are accumulated)
+        For the classification: a list with the AUC and the reference sensitivity
+        For the fovea location: the mean Euclidean distance
+        (NaN if there are no images)
+    '''
+
+    if accumulator['task'] == 'classification':
+        n_positives, n_negatives = np.sum(accumulator['positives']), np.sum(accumulator['negatives'])
+        if n_positives == 0 or n_negatives == 0:
+            return [ np.nan, np.nan ]
+        # each distinct score appears once as positive and once as negative, weighted by its number of images
+        scores = np.concatenate((accumulator['scores'], accumulator['scores']))
+        labels = np.concatenate((np.ones(len(accumulator['scores'])), np.zeros(len(accumulator['scores']))))
+        weights = np.concatenate((accumulator['positives'], accumulator['negatives']))
+        sensitivity, fpr, auc = get_roc_curve(scores[weights > 0], labels[weights > 0], weights[weights > 0])
+        return [ auc, get_sensitivity_at_given_specificity(sensitivity, 1 - fpr) ]
+
+    # correctly rounded means
+    means = [ math.fsum(partials) / accumulator['count'] if accumulator['count'] > 0 else np.nan for partials in accumulator['partials'] ]
+    if accumulator['task'] == 'fovea_location':
+        return means[0]
+
+    return means
@@ -0,0 +1,240 @@
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    # numba is optional, the numpy backend is used instead
+    numba = None
+
+
+# backends available to count the pixels of the segmentations ('auto' picks numba if it is installed)
+SEGMENTATION_BACKENDS = ['numpy', 'numba', 'auto']
+# values computed by the kernels, in order
+SEGMENTATION_COUNTS = ['cup_intersection', 'cup_segmentation', 'cup_gt', 'disc_intersection', 'disc_segmentation', 'disc_gt',
+                       'cup_segmentation_diameter', 'disc_segmentation_diameter', 'cup_gt_diameter', 'disc_gt_diameter']
+# number of columns processed by each thread of the numba kernel
+NUMBA_COLUMN_BLOCK = 64
+
+
+def count_segmentation_pixels_numpy(segmentation, gt_label):
+    '''
+    Count the pixels needed to evaluate a segmentation (see SEGMENTATION_COUNTS), using numpy
+
+    Input:
+        segmentation: 2D numpy array representing the segmentation, with 0: optic cup, 128: optic disc, 255: elsewhere.
+        gt_label: 2D numpy array representing the ground truth annotation, with the same format
+    Output:
+        counts: a 1D numpy array of integers with the areas of the optic cups and discs and of their intersections,
+                and their vertical diameters (the maximum number of pixels in a column)
+    '''
+
+    return get_counts_from_columns(*count_band_pixels(segmentation, gt_label))
+
+
+
+def count_band_pixels(segmentation_band, gt_band):
+    '''
+    Count the pixels of a horizontal band of a segmentation and its ground truth. The counts of all the bands of an
+    image can be added, and the vertical diameters obtained at the end from the counts of each column
+
+    Input:
+        segmentation_band: 2D numpy array with some rows of the segmentation, with 0: optic cup, 128: optic disc, 255: elsewhere.
+        gt_band: 2D numpy array with the same rows of the ground truth annotation
+    Output:
+        intersections: a 1D numpy array with the number of pixels in the intersection of the optic cups and of the optic discs
+        column_counts: a (4 x width) numpy matrix with the number of pixels of the segmented cup and disc and of the gt cup and disc in each column
+    '''
+
+    # binary maps of the optic cup and disc
+    segmentation_cup = segmentation_band == 0
+    segmentation_disc = segmentation_band < 255
+    gt_cup = gt_band == 0
+    gt_disc = gt_band < 255
+
+    # number of pixels of each structure in each column
+    column_counts = np.stack((np.sum(segmentation_cup, axis=0), np.sum(segmentation_disc, axis=0),
+                              np.sum(gt_cup, axis=0), np.sum(gt_disc, axis=0))).astype(np.int64)
+    intersections = np.array([ np.sum(np.logical_and(segmentation_cup, gt_cup)), np.sum(np.logical_and(segmentation_disc, gt_disc)) ], dtype=np.int64)
+
+    return intersections, column_counts
+
+
+
+def get_counts_from_columns(intersections, column_counts):
+    '''
+    Collect the counts of SEGMENTATION_COUNTS from the intersections and the counts of each column (see count_band_pixels)
+
+    Input:
+        intersections: a 1D numpy array with the number of pixels in the intersection of the optic cups and of the optic discs
+        column_counts: a (4 x width) numpy matrix with the number of pixels of each structure in each column
+    Output:
+        counts: same as count_segmentation_pixels_numpy
+    '''
+
+    return np.array([ intersections[0], np.sum(column_counts[0]), np.sum(column_counts[2]),
+                      intersections[1], np.sum(column_counts[1]), np.sum(column_counts[3]),
+                      np.max(column_counts[0]), np.max(column_counts[1]), np.max(column_counts[2]), np.max(column_counts[3]) ], dtype=np.int64)
+
+
+
+if not (numba is None):
+
+    @numba.njit(parallel=True, cache=True)
+    def count_band_pixels_compiled(segmentation_band, gt_band, column_block):
+        '''
+        Count the pixels of a band of a segmentation and its ground truth in a single pass (see count_band_pixels).
+        Each thread processes its own block of columns, so there are no conflicts between threads
+        '''
+
+        height, width = segmentation_band.shape
+        n_blocks = (width + column_block - 1) // column_block
+
+        # intersections of each block of columns, and number of pixels of each structure in each column
+        block_intersections = np.zeros((n_blocks, 2), dtype=np.int64)
+        column_counts = np.zeros((4, width), dtype=np.int64)
+
+        for block in numba.prange(n_blocks):
+            first_column = block * column_block
+            last_column = min(width, first_column + column_block)
+            # the rows are traversed in the outer loop, following the order of the pixels in memory
+            for i in range(height):
+                for j in range(first_column, last_column):
+                    segmentation_cup = segmentation_band[i, j] == 0
+                    segmentation_disc = segmentation_band[i, j] < 255
+                    gt_cup = gt_band[i, j] == 0
+                    gt_disc = gt_band[i, j] < 255
+                    if segmentation_cup:
+                        column_counts[0, j] += 1
+                        if gt_cup:
+                            block_intersections[block, 0] += 1
+                    if segmentation_disc:
+                        column_counts[1, j] += 1
+                        if gt_disc:
+                            block_intersections[block, 1] += 1
+                    if gt_cup:
+                        column_counts[2, j] += 1
+                    if gt_disc:
+                        column_counts[3, j] += 1
+
+        # collect the intersections of all the blocks
+        intersections = np.zeros(2, dtype=np.int64)
+        for block in range(n_blocks):
+            intersections[0] += block_intersections[block, 0]
+            intersections[1] += block_intersections[block, 1]
+
+        return intersections, column_counts
+
+
+
+def count_band_pixels_numba(segmentation_band, gt_band):
+    '''
+    Count the pixels of a horizontal band of a segmentation and its ground truth (see count_band_pixels), with a
+    compiled kernel that reads each pixel only once and processes blocks of columns in parallel
+
+    Input:
+        segmentation_band: 2D numpy array with some rows of the segmentation, with 0: optic cup, 128: optic disc, 255: elsewhere.
+        gt_band: 2D numpy array with the same rows of the ground truth annotation
+    Output:
+        same as count_band_pixels
+    '''
+
+    # the numpy kernel is used for the bands without pixels
+    if np.asarray(segmentation_band).size == 0:
+        return count_band_pixels(segmentation_band, gt_band)
+
+    return count_band_pixels_compiled(np.ascontiguousarray(segmentation_band), np.ascontiguousarray(gt_band), NUMBA_COLUMN_BLOCK)
+
+
+
+def count_segmentation_pixels_numba(segmentation, gt_label):
+    '''
+    Count the pixels needed to evaluate a segmentation (see SEGMENTATION_COUNTS), with a compiled kernel
+    that reads each pixel only once and processes blocks of columns in parallel
+
+    Input:
+        segmentation: 2D numpy array representing the segmentation, with 0: optic cup, 128: optic disc, 255: elsewhere.
+        gt_label: 2D numpy array representing the ground truth annotation, with the same format
+    Output:
+        counts: same as count_segmentation_pixels_numpy
+    '''
+
+    # the numpy kernel is used for the images without pixels (the maximum of an empty array is undefined)
+    if np.asarray(segmentation).size == 0:
+        return count_segmentation_pixels_numpy(segmentation, gt_label)
+
+    return get_counts_from_columns(*count_band_pixels_numba(segmentation, gt_label))
+
+
+
+def count_multi_reference_pixels(segmentation, gt_labels):
+    '''
+    Count the pixels needed to evaluate a segmentation against several references (e.g. the annotations of several
+    graders). The segmentation is scanned only once, and each reference adds a joint histogram of both label maps
+
+    Input:
+        segmentation: 2D numpy array representing the segmentation, with 0: optic cup, 128: optic disc, 255: elsewhere.
+        gt_labels: a (references x height x width) numpy array with the label map of each reference, with the same format
+    Output:
+        counts: a (references x 10) numpy matrix of integers with the counts of each reference (see SEGMENTATION_COUNTS)
+    '''
+
+    gt_labels = np.asarray(gt_labels)
+    n_references = gt_labels.shape[0]
+
+    # code of each pixel of the segmentation (0: elsewhere, 1: optic disc rim, 2: optic cup), already shifted for the joint histogram
+    segmentation_codes = 3 * ((segmentation < 255).astype(np.int64) + (segmentation == 0)).ravel()
+    # vertical diameters of the segmentation
+    cup_diameter = np.max(np.sum(segmentation == 0, axis=0))
+    disc_diameter = np.max(np.sum(segmentation < 255, axis=0))
+
+    counts = np.zeros((n_references, len(SEGMENTATION_COUNTS)), dtype=np.int64)
+    for k in range(n_references):
+        # joint histogram of the codes of the segmentation and the reference
+        gt_codes = ((gt_labels[k] < 255).astype(np.int64) + (gt_labels[k] == 0)).ravel()
+        joint = np.bincount(segmentation_codes + gt_codes, minlength=9).reshape((3, 3))
+        counts[k,:] = [ joint[2,2], np.sum(joint[2,:]), np.sum(joint[:,2]),
+                        np.sum(joint[1:,1:]), np.sum(joint[1:,:]), np.sum(joint[:,1:]),
+                        cup_diameter, disc_diameter, np.max(np.sum(gt_labels[k] == 0, axis=0)), np.max(np.sum(gt_labels[k] < 255, axis=0)) ]
+
+    return counts
+
+
+
+def get_segmentation_kernel(backend='numpy'):
+    '''
+    Get the function that counts the pixels of the segmentations
+
+    Input:
+        [backend]: 'numpy', 'numba' or 'auto' (numba if it is installed, numpy otherwise). If numba is requested
+                   but not installed, the numpy backend is used instead
+    Output:
+        kernel: a function with the same inputs and outputs than count_segmentation_pixels_numpy
+    '''
+
+    if not (backend in SEGMENTATION_BACKENDS):
+        raise ValueError('Unknown segmentation backend "{}". Use one of {}'.format(backend, SEGMENTATION_BACKENDS))
+
+    if backend == 'numpy' or numba is None:
+        if backend == 'numba':
+            print('> numba is not installed, using the numpy backend instead')
+        return count_segmentation_pixels_numpy
+
+    return count_segmentation_pixels_numba
+
+
+
+def get_band_kernel(backend='numpy'):
+    '''
+    Get the function that counts the pixels of the horizontal bands of the segmentations (see count_band_pixels)
+
+    Input:
+        [backend]: same as get_segmentation_kernel
+    Output:
+        kernel: a function with the same inputs and outputs than count_band_pixels
+    '''
+
+    if get_segmentation_kernel(backend) is count_segmentation_pixels_numpy:
+        return count_band_pixels
+
+    return count_band_pixels_numba
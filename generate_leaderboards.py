@@ -1,11 +1,35 @@
 
-from os import path
+from os import path, makedirs
 
-from util.file_management import read_table_of_results, export_ranking
-from util.leaderboard_criteria import segmentation_leaderboard, classification_leaderboard, fovea_location_leaderboard, final_leaderboard
+from util.file_management import read_table_of_results, export_ranking, parse_boolean
+from util.leaderboard_criteria import LEADERBOARDS, LEADERBOARD_NAMES, TIE_POLICIES, SELECTION_POLICIES, team_leaderboard
+from util.team_index import build_team_index
+from util.per_image_results import load_per_image_results
+from util.significance import SIGNIFICANCE_TESTS, leaderboard_significance
 
 
-def generate_leaderboard(results_table_filename, leaderboard_filename, criterion):
+def export_leaderboard(metrics, teams, results, leaderboard_filename, criterion, ties='min'):
+    '''
+    Export a leaderboard based on a given criterion, from a table of results already loaded in memory
+
+    Input:
+        metrics: a list of the metrics in results, in the same order than the columns of results
+        teams: a list of strings with the names of the teams
+        results: a 2D numpy matrix with all the evaluation metrics
+        leaderboard_filename: full path and filename of the output CSV leaderboard filename
+        criterion: the leaderboard criterion (as retrieved from util.leaderboard_criteria)
+        [ties]: policy for tied values (see util.leaderboard_criteria.rank_values)
+    '''
+
+    # sort according to the provided criterion
+    sorted_teams, sorted_results, header = criterion(metrics, teams, results, ties=ties)
+
+    # export the ranking
+    export_ranking(leaderboard_filename, header, sorted_teams, sorted_results)
+
+
+
+def generate_leaderboard(results_table_filename, leaderboard_filename, criterion, ties='min', use_binary=False):
     '''
     Generate a leaderboard based on a given criterion
     
@@ -13,16 +37,93 @@ def generate_leaderboard(results_table_filename, leaderboard_filename, criterion
         results_table_filename: full path and filename to the CSV file with the results
         leaderboard_filename: full path and filename of the output CSV leaderboard filename
         criterion: the leaderboard criterion (as retrieved from util.leaderboard_criteria)
+        [ties]: policy for tied values (see util.leaderboard_criteria.rank_values)
+        [use_binary]: a boolean indicating if the binary copy of the table of results should be used (see util.file_management.read_table_of_results)
     '''
 
     # read the table of results
-    metrics, teams, results = read_table_of_results(results_table_filename)
+    metrics, teams, results = read_table_of_results(results_table_filename, use_binary)
 
-    # sort according to the provided criterion
-    sorted_teams, sorted_results, header = criterion(metrics, teams, results)
+    # export the leaderboard
+    export_leaderboard(metrics, teams, results, leaderboard_filename, criterion, ties)
 
-    # export the ranking
-    export_ranking(leaderboard_filename, header, sorted_teams, sorted_results)
+
+
+def export_significance(output_path, leaderboard_name, sorted_teams, per_image_results, rows, test='wilcoxon', n_permutations=10000, seed=None, n_jobs=1):
+    '''
+    Export the p-values of the comparison of all the pairs of teams of a leaderboard, as one matrix per metric
+
+    Input:
+        output_path: output path. Each matrix is saved as <leaderboard_name>_significance_<metric>.csv
+        leaderboard_name: name of the leaderboard
+        sorted_teams: the names of the teams, in the order of the leaderboard
+        per_image_results: the results per image, as retrieved by util.per_image_results.load_per_image_results
+        rows: a list with the row of per_image_results of each team, in the order of the leaderboard
+        [test], [n_permutations], [seed], [n_jobs]: parameters of the paired test (see util.significance.paired_significance)
+    '''
+
+    for suffix, p_values in leaderboard_significance(leaderboard_name, per_image_results, rows, test, n_permutations, seed, n_jobs):
+        export_ranking(path.join(output_path, '{}_significance_{}.csv'.format(leaderboard_name, suffix)), ['Team'] + sorted_teams, sorted_teams, p_values)
+
+
+
+def generate_leaderboards(results_table_filename, output_path, leaderboard_names=LEADERBOARD_NAMES, ties='min', use_binary=False,
+                          team_manifest=None, team_separator=None, selection='best',
+                          uncompressed_files_folder=None, significance_test='wilcoxon', n_permutations=10000, seed=None, n_jobs=1):
+    '''
+    Generate several leaderboards, reading the table of results only once
+
+    Input:
+        results_table_filename: full path and filename to the CSV file with the results
+        output_path: output path. Each leaderboard is saved as <name>_leaderboard.csv
+        [leaderboard_names]: a list with the names of the leaderboards to generate (see util.leaderboard_criteria.LEADERBOARDS)
+        [ties]: policy for tied values (see util.leaderboard_criteria.rank_values)
+        [use_binary]: a boolean indicating if the binary copy of the table of results should be used (see util.file_management.read_table_of_results)
+        [team_manifest]: a CSV file mapping the submissions to the teams (see util.team_index.read_team_manifest)
+        [team_separator]: a separator between the team name and the rest of the submission names (see util.team_index.build_team_index)
+        [selection]: policy to choose the submission of each team, 'best' or 'latest'. Only used when team_manifest or team_separator
+                     are given, in which case the chosen submission of each team is also saved as <name>_selected_submissions.csv
+        [uncompressed_files_folder]: folder with the uncompressed submissions, including the tables with the results per image.
+                                     If given, the significance of the differences between the teams is exported next to each leaderboard
+        [significance_test], [n_permutations], [seed], [n_jobs]: parameters of the paired test (see util.significance.paired_significance)
+    '''
+
+    # read the table of results
+    metrics, submissions, results = read_table_of_results(results_table_filename, use_binary)
+    submission_rows = dict(zip(submissions, range(len(submissions))))
+
+    # read the results per image of all the submissions, if needed
+    per_image_results = None
+    if not (uncompressed_files_folder is None):
+        per_image_results = load_per_image_results(uncompressed_files_folder, submissions)
+
+    # each submission is a team, unless a mapping is given
+    use_teams = not (team_manifest is None and team_separator is None)
+    if use_teams:
+        # index the teams once for all the leaderboards
+        team_names, team_indices, order = build_team_index(submissions, team_manifest, team_separator)
+        team_rows = dict(zip(team_names, range(len(team_names))))
+
+    for name in leaderboard_names:
+
+        if use_teams:
+            # rank the best (or latest) submission of each team
+            sorted_teams, sorted_results, header, selected = team_leaderboard(name, metrics, results, team_names, team_indices, selection, order, ties)
+            chosen_teams = [ i for i in range(len(team_names)) if selected[i] >= 0 ]
+            export_ranking(path.join(output_path, name + '_selected_submissions.csv'), ['Team', 'Submission'],
+                           [ team_names[i] for i in chosen_teams ], [ submissions[selected[i]] for i in chosen_teams ])
+            rows = [ selected[team_rows[team]] for team in sorted_teams ]
+        else:
+            # rank all the submissions
+            sorted_teams, sorted_results, header = LEADERBOARDS[name](metrics, submissions, results, ties=ties)
+            rows = [ submission_rows[team] for team in sorted_teams ]
+
+        # export the ranking
+        export_ranking(path.join(output_path, name + '_leaderboard.csv'), header, sorted_teams, sorted_results)
+
+        # export the significance of the differences between the teams
+        if not (per_image_results is None):
+            export_significance(output_path, name, sorted_teams, per_image_results, rows, significance_test, n_permutations, seed, n_jobs)
 
 
 
@@ -36,10 +137,29 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("results_table_filename", help="full path and filename to the CSV file with the results", type=str)
     parser.add_argument("output_path", help="output path", type=str)
+    parser.add_argument("--ties", help="policy to rank tied values", type=str, choices=TIE_POLICIES, default='min')
+    parser.add_argument("--leaderboards", help="comma separated list of leaderboards to generate", type=str, default=','.join(LEADERBOARD_NAMES))
+    parser.add_argument("--use_binary", help="a boolean indicating if a binary copy of the table of results should be used (and updated when it is outdated)", type=str, default='True')
+    parser.add_argument("--team_manifest", help="CSV file with the columns Submission, Team and (optionally) Timestamp, mapping the submissions to the teams", type=str, default=None)
+    parser.add_argument("--team_separator", help="separator between the team name and the rest of the name of the submissions (e.g. __ for BestTeam__v2.zip)", type=str, default=None)
+    parser.add_argument("--selection", help="submission of each team shown in the leaderboards when several submissions belong to the same team", type=str, choices=SELECTION_POLICIES, default='best')
+    parser.add_argument("--uncompressed_files_folder", help="folder with the uncompressed submissions, as generated by evaluate_multiple_submissions. If given, the significance of the differences between the teams is exported", type=str, default=None)
+    parser.add_argument("--significance_test", help="paired test used to compare the results per image of two teams (the AUC is compared with the DeLong test)", type=str, choices=SIGNIFICANCE_TESTS, default='wilcoxon')
+    parser.add_argument("--n_permutations", help="number of random permutations of the permutation test", type=int, default=10000)
+    parser.add_argument("--seed", help="seed for the random number generator of the permutation test", type=int, default=None)
+    parser.add_argument("--n_jobs", help="number of batches of pairs of teams tested in parallel", type=int, default=1)
     args = parser.parse_args()
 
+    # check the names of the leaderboards before generating anything
+    leaderboard_names = args.leaderboards.split(',')
+    for name in leaderboard_names:
+        if not (name in LEADERBOARDS):
+            parser.error('Unknown leaderboard "{}". Choose among {}.'.format(name, ', '.join(LEADERBOARD_NAMES)))
+
+    if not path.exists(args.output_path):
+        makedirs(args.output_path)
+
     # call the "main" function
-    generate_leaderboard(args.results_table_filename, path.join(args.output_path, 'segmentation_leaderboard.csv'), segmentation_leaderboard)
-    generate_leaderboard(args.results_table_filename, path.join(args.output_path, 'classification_leaderboard.csv'), classification_leaderboard)
-    generate_leaderboard(args.results_table_filename, path.join(args.output_path, 'fovea_location_leaderboard.csv'), fovea_location_leaderboard)
-    generate_leaderboard(args.results_table_filename, path.join(args.output_path, 'final_leaderboard.csv'), final_leaderboard)
\ No newline at end of file
+    generate_leaderboards(args.results_table_filename, args.output_path, leaderboard_names, args.ties, parse_boolean(args.use_binary),
+                          args.team_manifest, args.team_separator, args.selection,
+                          args.uncompressed_files_folder, args.significance_test, args.n_permutations, args.seed, args.n_jobs)
@@ -0,0 +1,7 @@
+
+import sys
+
+from os import path
+
+# the tests import the modules of the repository as the scripts do, from its root folder
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
@@ -0,0 +1,66 @@
+import numpy as np
+
+from evaluation_metrics.segmentation_kernels import count_segmentation_pixels_numpy, get_segmentation_kernel
+
+
+def generate_random_label_map(shape, random_state):
+    '''
+    Generate a random label map with an elliptical optic disc, a cup inside it and some noisy pixels
+
+    Input:
+        shape: a tuple with the height and the width of the label map
+        random_state: a numpy RandomState
+    Output:
+        label_map: a 2D numpy array of uint8, with 0: optic cup, 128: optic disc, 255: elsewhere.
+    '''
+
+    rows, columns = np.mgrid[:shape[0], :shape[1]]
+    center = random_state.rand(2) * shape
+    radii = (random_state.rand(2) * 0.4 + 0.05) * shape
+    distance = ((rows - center[0]) / radii[0]) ** 2 + ((columns - center[1]) / radii[1]) ** 2
+
+    # the cup is missing in some of the maps
+    label_map = np.full(shape, 255, dtype=np.uint8)
+    label_map[distance <= 1] = 128
+    label_map[distance <= random_state.rand() * 0.8 - 0.1] = 0
+    # flip a few random pixels
+    noise = random_state.rand(*shape) < 0.01
+    label_map[noise] = random_state.choice([0, 128, 255], size=np.sum(noise))
+
+    return label_map
+
+
+
+def check_kernel_parity(backend='auto', n_images=100, seed=0, max_size=300):
+    '''
+    Check that a backend gives exactly the same counts than the numpy backend, on random label maps of random
+    sizes (including single rows and columns, and non contiguous arrays)
+
+    Input:
+        [backend]: the backend to check (see get_segmentation_kernel)
+        [n_images]: number of random pairs of segmentations and ground truths
+        [seed]: seed for the random number generator
+        [max_size]: maximum height and width of the label maps
+    Output:
+        mismatches: a list of tuples (index, numpy counts, backend counts), empty if the backends agree on all the images
+    '''
+
+    kernel = get_segmentation_kernel(backend)
+    random_state = np.random.RandomState(seed)
+
+    mismatches = []
+    for i in range(n_images):
+        # random size, including degenerated images
+        shape = tuple(random_state.randint(1, max_size + 1, size=2))
+        segmentation = generate_random_label_map(shape, random_state)
+        gt_label = generate_random_label_map(shape, random_state)
+        # every third pair is a view with a stride, as the crops of the images
+        if i % 3 == 2:
+            segmentation, gt_label = segmentation[:, ::2], gt_label[:, ::2]
+        # compare the counts of both backends
+        reference = count_segmentation_pixels_numpy(segmentation, gt_label)
+        counts = kernel(segmentation, gt_label)
+        if not np.array_equal(reference, counts):
+            mismatches.append((i, reference, counts))
+
+    return mismatches
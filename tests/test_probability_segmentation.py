@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from evaluation_metrics.evaluation_metrics_for_segmentation import evaluate_probability_segmentation, evaluate_binary_segmentation
+from segmentation_helpers import generate_random_label_map
+
+# values of the random probability maps, and the thresholds around them where the binarized maps change
+MAP_VALUES = [0, 1, 77, 128, 200, 254, 255]
+THRESHOLDS = sorted(set([ 0, 255 ] + [ value for value in MAP_VALUES ] + [ min(value + 1, 255) for value in MAP_VALUES ]))
+
+
+def binarize_probability_maps(cup_probabilities, disc_probabilities, cup_threshold, disc_threshold):
+    '''
+    Binarize the probability maps as a team would do it: the disc is painted first and then the cup
+    '''
+
+    segmentation = np.full(cup_probabilities.shape, 255, dtype=np.uint8)
+    segmentation[disc_probabilities >= disc_threshold] = 128
+    segmentation[cup_probabilities >= cup_threshold] = 0
+
+    return segmentation
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('nested', [False, True])
+def test_probability_maps_match_binarized_segmentations(seed, nested):
+    random_state = np.random.RandomState(seed)
+    shape = (23, 31)
+    gt_label = generate_random_label_map(shape, random_state)
+    cup_probabilities = random_state.choice(MAP_VALUES, size=shape).astype(np.uint8)
+    disc_probabilities = random_state.choice(MAP_VALUES, size=shape).astype(np.uint8)
+    # the cup of a consistent model is inside its disc, but the maps don't need to be
+    if nested:
+        disc_probabilities = np.maximum(disc_probabilities, cup_probabilities)
+
+    cup_dices, disc_dices, ae_cdrs = evaluate_probability_segmentation(cup_probabilities, disc_probabilities, gt_label)
+
+    for cup_threshold in THRESHOLDS:
+        for disc_threshold in THRESHOLDS:
+            segmentation = binarize_probability_maps(cup_probabilities, disc_probabilities, cup_threshold, disc_threshold)
+            cup_dice, disc_dice, ae_cdr = evaluate_binary_segmentation(segmentation, gt_label)
+            np.testing.assert_allclose(cup_dices[cup_threshold], cup_dice, equal_nan=True)
+            np.testing.assert_allclose(disc_dices[cup_threshold, disc_threshold], disc_dice, equal_nan=True)
+            np.testing.assert_allclose(ae_cdrs[cup_threshold, disc_threshold], ae_cdr, equal_nan=True)
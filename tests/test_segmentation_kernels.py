@@ -0,0 +1,88 @@
+
+import numpy as np
+import pytest
+
+from evaluation_metrics import segmentation_kernels
+from evaluation_metrics.segmentation_kernels import count_segmentation_pixels_numpy, count_band_pixels, count_multi_reference_pixels, get_segmentation_kernel, get_band_kernel
+from evaluation_metrics.evaluation_metrics_for_segmentation import evaluate_multi_reference_segmentation
+from segmentation_helpers import generate_random_label_map, check_kernel_parity
+
+# the numba backend falls back to numpy if numba is not installed, so the comparison would be trivial
+requires_numba = pytest.mark.skipif(segmentation_kernels.numba is None, reason='numba is not installed')
+
+
+def get_edge_case_pairs():
+    '''
+    Pairs of segmentations and ground truths with degenerated label maps
+    '''
+
+    random_state = np.random.RandomState(1)
+    shape = (37, 53)
+    random_map = generate_random_label_map(shape, random_state)
+    one_cup_pixel = np.full(shape, 255, dtype=np.uint8)
+    one_cup_pixel[17, 29] = 0
+    one_disc_pixel = np.full(shape, 255, dtype=np.uint8)
+    one_disc_pixel[0, 52] = 128
+
+    return [
+        ('empty', np.full(shape, 255, dtype=np.uint8), np.full(shape, 255, dtype=np.uint8)),
+        ('empty segmentation', np.full(shape, 255, dtype=np.uint8), random_map),
+        ('full cup', np.zeros(shape, dtype=np.uint8), random_map),
+        ('full disc', np.full(shape, 128, dtype=np.uint8), random_map),
+        ('single cup pixel', one_cup_pixel, random_map),
+        ('single disc pixel', one_disc_pixel, one_cup_pixel),
+        ('single pixel image', np.zeros((1, 1), dtype=np.uint8), np.full((1, 1), 128, dtype=np.uint8)),
+        ('single row', random_map[:1, :], random_map[1:2, :]),
+        ('single column', random_map[:, :1], random_map[:, 1:2]),
+        ('no pixels', np.zeros((0, 5), dtype=np.uint8), np.zeros((0, 5), dtype=np.uint8)),
+        ('strided columns', random_map[:, ::3], generate_random_label_map(shape, random_state)[:, ::3]),
+        ('strided rows', random_map[::2, :], generate_random_label_map(shape, random_state)[::2, :]),
+        ('transposed', random_map.T, generate_random_label_map(shape, random_state).T),
+        ('wider than a column block', generate_random_label_map((9, 200), random_state), generate_random_label_map((9, 200), random_state)),
+    ]
+
+
+
+@requires_numba
+@pytest.mark.parametrize('name, segmentation, gt_label', get_edge_case_pairs())
+def test_numba_kernel_matches_numpy_on_edge_cases(name, segmentation, gt_label):
+    reference = count_segmentation_pixels_numpy(segmentation, gt_label)
+    counts = get_segmentation_kernel('numba')(segmentation, gt_label)
+    assert np.array_equal(reference, counts)
+
+
+
+@requires_numba
+def test_numba_kernel_matches_numpy_on_random_maps():
+    assert check_kernel_parity('numba', n_images=60, seed=0) == []
+    assert check_kernel_parity('numba', n_images=30, seed=1, max_size=20) == []
+
+
+
+@pytest.mark.parametrize('name, segmentation, gt_label', get_edge_case_pairs())
+def test_multi_reference_kernel_matches_numpy(name, segmentation, gt_label):
+    if segmentation.size == 0:
+        pytest.skip('the multi-reference kernel needs at least one pixel')
+    counts = count_multi_reference_pixels(segmentation, np.stack([ gt_label, segmentation ]))
+    assert np.array_equal(counts[0], count_segmentation_pixels_numpy(segmentation, gt_label))
+    assert np.array_equal(counts[1], count_segmentation_pixels_numpy(segmentation, segmentation))
+
+
+
+@requires_numba
+def test_multi_reference_evaluation_uses_the_backend():
+    random_state = np.random.RandomState(2)
+    segmentation = generate_random_label_map((41, 67), random_state)
+    gt_labels = np.stack([ generate_random_label_map((41, 67), random_state) for _ in range(3) ])
+    reference = evaluate_multi_reference_segmentation(segmentation, gt_labels, 'numpy')
+    assert np.array_equal(evaluate_multi_reference_segmentation(segmentation, gt_labels, 'numba'), reference)
+
+
+
+@requires_numba
+@pytest.mark.parametrize('name, segmentation, gt_label', get_edge_case_pairs())
+def test_numba_band_kernel_matches_numpy_on_edge_cases(name, segmentation, gt_label):
+    intersections, column_counts = count_band_pixels(segmentation, gt_label)
+    band_intersections, band_column_counts = get_band_kernel('numba')(segmentation, gt_label)
+    assert np.array_equal(intersections, band_intersections)
+    assert np.array_equal(column_counts, band_column_counts)
@@ -0,0 +1,36 @@
+import numpy as np
+
+from util.team_index import read_team_manifest, build_team_index
+
+
+def write_manifest(tmp_path, rows):
+    '''
+    Write a team manifest with the given rows (submission, team, timestamp)
+    '''
+
+    manifest_filename = str(tmp_path / 'teams.csv')
+    with open(manifest_filename, 'w') as csv_file:
+        csv_file.write('Submission,Team,Timestamp\n')
+        for row in rows:
+            csv_file.write(','.join(row) + '\n')
+
+    return manifest_filename
+
+
+
+def test_blank_timestamps_are_missing(tmp_path):
+    manifest_filename = write_manifest(tmp_path, [ ('A_1', 'A', '9'), ('A_2', 'A', '10'), ('B_1', 'B', ''), ('B_2', 'B', '  ') ])
+    manifest = read_team_manifest(manifest_filename)
+    assert manifest['A_1'] == ('A', '9')
+    assert manifest['B_1'] == ('B', None)
+    assert manifest['B_2'] == ('B', None)
+
+
+
+def test_mixed_timestamps_keep_the_numeric_order(tmp_path):
+    manifest_filename = write_manifest(tmp_path, [ ('A_1', 'A', '9'), ('A_2', 'A', '10'), ('B_1', 'B', '') ])
+    team_names, team_indices, order = build_team_index(['A_1', 'A_2', 'B_1'], manifest_filename)
+    assert team_names == ['A', 'B']
+    assert team_indices.tolist() == [0, 0, 1]
+    # 10 is later than 9, and the submission without timestamp comes first
+    assert order[1] > order[0] > order[2]
@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+
+from os import path
+
+from util.work_queue import initialize_work_queue, claim_submission, read_claim_owner, remove_claim_of_owner, write_results_shard
+
+
+def get_dead_pid():
+    '''
+    Get the process id of a process that already finished
+    '''
+
+    process = subprocess.Popen([ sys.executable, '-c', 'pass' ])
+    process.wait()
+
+    return process.pid
+
+
+
+def write_stale_claim(queue_folder, submission_file):
+    '''
+    Write the claim of a worker of this machine that is not running anymore
+    '''
+
+    lock_filename = path.join(queue_folder, 'claims', submission_file + '.lock')
+    with open(lock_filename, 'w') as lock_file:
+        lock_file.write('{} {} {}\n'.format(socket.gethostname(), get_dead_pid(), 1.5))
+
+    return lock_filename
+
+
+
+def test_a_submission_is_claimed_once(tmp_path):
+    queue_folder = str(tmp_path)
+    initialize_work_queue(queue_folder)
+    assert claim_submission(queue_folder, 'A.zip')
+    assert not claim_submission(queue_folder, 'A.zip')
+    # the lock is written with its owner, and no temporary file is left
+    assert read_claim_owner(path.join(queue_folder, 'claims', 'A.zip.lock'))[:2] == [ socket.gethostname(), str(os.getpid()) ]
+    assert sorted(os.listdir(path.join(queue_folder, 'claims'))) == [ 'A.zip.lock' ]
+    # the submissions already evaluated are not claimed
+    write_results_shard(queue_folder, 'B.zip', 'B', [ 1, 1, 0 ], [ 1, 1 ], 0)
+    assert not claim_submission(queue_folder, 'B.zip')
+
+
+
+def test_a_stale_claim_is_not_released_twice(tmp_path):
+    queue_folder = str(tmp_path)
+    initialize_work_queue(queue_folder)
+    lock_filename = write_stale_claim(queue_folder, 'A.zip')
+
+    # a second worker reads the stale owner, but the first one releases the claim and claims the submission again
+    stale_owner = read_claim_owner(lock_filename)
+    assert claim_submission(queue_folder, 'A.zip')
+    new_owner = read_claim_owner(lock_filename)
+    # then the second worker tries to release the stale claim it had found: the new claim must be kept
+    assert not remove_claim_of_owner(lock_filename, stale_owner)
+    assert read_claim_owner(lock_filename) == new_owner
+    assert not claim_submission(queue_folder, 'A.zip')
+    assert sorted(os.listdir(path.join(queue_folder, 'claims'))) == [ 'A.zip.lock' ]
+
+
+
+def claim_in_worker(queue_folder, barrier, results):
+    '''
+    Claim a submission in a separate worker, at the same time than the other ones
+    '''
+
+    barrier.wait()
+    results.put(claim_submission(queue_folder, 'A.zip'))
+
+
+
+def test_only_one_worker_claims_a_stale_submission(tmp_path):
+    queue_folder = str(tmp_path)
+    initialize_work_queue(queue_folder)
+    # start the workers from scratch, forking would copy the threads of the compiled kernels
+    context = multiprocessing.get_context('spawn')
+    for attempt in range(5):
+        write_stale_claim(queue_folder, 'A.zip')
+        n_workers = 6
+        barrier = context.Barrier(n_workers)
+        results = context.Queue()
+        workers = [ context.Process(target=claim_in_worker, args=(queue_folder, barrier, results)) for _ in range(n_workers) ]
+        for worker in workers:
+            worker.start()
+        claimed = [ results.get(timeout=60) for _ in range(n_workers) ]
+        for worker in workers:
+            worker.join(60)
+        # all the workers are dead now, so the next attempt starts from a stale claim too
+        assert sum(claimed) == 1
+        os.remove(path.join(queue_folder, 'claims', 'A.zip.lock'))
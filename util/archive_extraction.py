@@ -0,0 +1,208 @@
+
+import io
+import zipfile
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from os import path, makedirs
+
+from util.image_io import read_image, read_bmp_buffer
+from util.submission_validation import find_root_folder
+
+
+# number of threads that inflate the members of a zip file
+DEFAULT_EXTRACTION_THREADS = 4
+# number of bytes inflated at once into the buffer of a member
+EXTRACTION_BLOCK_SIZE = 1 << 20
+
+
+def get_member_path(output_folder, member_name):
+    '''
+    Get the path where a member of a zip file is extracted, removing the absolute paths and the parent folders
+    of its name in the same way than zipfile.ZipFile.extract
+
+    Input:
+        output_folder: folder where the zip file is extracted
+        member_name: the name of the member inside the zip file
+    Output:
+        member_path: full path of the extracted member, or None if its name has no valid component
+    '''
+
+    parts = [ part for part in member_name.replace('\\', '/').split('/') if not (part in ['', '.', '..']) ]
+    # remove the drive letters too
+    parts = [ path.splitdrive(part)[1] for part in parts ]
+    parts = [ part for part in parts if len(part) > 0 ]
+    if len(parts) == 0:
+        return None
+
+    return path.join(output_folder, *parts)
+
+
+
+def read_member(zip_ref, info):
+    '''
+    Inflate a member of a zip file into a buffer allocated once with its uncompressed size. Several members of
+    the same zip file can be read concurrently, and zlib releases the GIL while inflating them
+
+    Input:
+        zip_ref: the opened zip file
+        info: the ZipInfo of the member
+    Output:
+        buffer: a bytearray with the uncompressed member
+    '''
+
+    buffer = bytearray(info.file_size)
+    view = memoryview(buffer)
+    position = 0
+    # fill the buffer by blocks (the CRC of the member is checked when its end is reached)
+    with zip_ref.open(info, 'r') as member_file:
+        while position < len(buffer):
+            n_bytes = member_file.readinto(view[position:position + EXTRACTION_BLOCK_SIZE])
+            if n_bytes == 0:
+                break
+            position += n_bytes
+    view.release()
+    if position != len(buffer):
+        raise ValueError('{} is truncated: {} bytes instead of {}.'.format(info.filename, position, len(buffer)))
+
+    return buffer
+
+
+
+def extract_member(zip_ref, info, output_folder):
+    '''
+    Extract a member of a zip file to the output folder
+
+    Input:
+        zip_ref: the opened zip file
+        info: the ZipInfo of the member
+        output_folder: folder where the zip file is extracted
+    '''
+
+    member_path = get_member_path(output_folder, info.filename)
+    if member_path is None:
+        return
+    # the folders are created but not filled
+    if info.filename.endswith('/'):
+        makedirs(member_path, exist_ok=True)
+        return
+
+    buffer = read_member(zip_ref, info)
+    makedirs(path.dirname(member_path), exist_ok=True)
+    with open(member_path, 'wb') as member_file:
+        member_file.write(buffer)
+
+
+
+def decode_segmentation(buffer):
+    '''
+    Decode a BMP segmentation from a buffer, with the same values than evaluation_metrics_for_segmentation.read_segmentation_and_gt
+
+    Input:
+        buffer: a bytes-like object with the whole image file
+    Output:
+        segmentation: 2D numpy array with the first channel of the image
+    '''
+
+    # the uncompressed files are decoded directly from the buffer
+    segmentation = read_bmp_buffer(buffer)
+    if segmentation is None:
+        segmentation = read_image(io.BytesIO(buffer))
+        if len(segmentation.shape) > 2:
+            segmentation = segmentation[:,:,0]
+
+    return segmentation
+
+
+
+def load_segmentation(zip_ref, info, prefix):
+    '''
+    Inflate and decode a BMP segmentation of a zip file
+
+    Input:
+        zip_ref: the opened zip file
+        info: the ZipInfo of the member
+        prefix: the folder of the segmentations inside the zip file
+    Output:
+        image_filename: the name of the image
+        segmentation: 2D numpy array with the segmentation (see decode_segmentation)
+    '''
+
+    return info.filename[len(prefix):], decode_segmentation(read_member(zip_ref, info))
+
+
+
+def iterate_segmentations(submission_file, infos, prefix, n_threads):
+    '''
+    Inflate and decode the BMP segmentations of a zip file on a pool of threads, yielding them in order. Only a few
+    of them are kept in memory at the same time. The zip file is opened when the first segmentation is requested
+    and closed when the generator ends or is closed, so nothing is left open if the generator is never started
+
+    Input:
+        submission_file: full path and filename of the .zip file
+        infos: a list with the ZipInfo of the segmentations
+        prefix: the folder of the segmentations inside the zip file
+        n_threads: number of threads
+    Output:
+        a generator of (image filename, segmentation) pairs
+    '''
+
+    with zipfile.ZipFile(submission_file, 'r') as zip_ref:
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            # keep the threads busy with the next images while the current one is evaluated
+            pending = deque()
+            for info in infos:
+                pending.append(executor.submit(load_segmentation, zip_ref, info, prefix))
+                if len(pending) > 2 * n_threads:
+                    yield pending.popleft().result()
+            while len(pending) > 0:
+                yield pending.popleft().result()
+
+
+
+def extract_submission(submission_file, output_folder, n_threads=DEFAULT_EXTRACTION_THREADS, keep_segmentations=True):
+    '''
+    Extract a .ZIP file with a submission to REFUGE from a team, inflating its members concurrently. The files are
+    extracted with the same layout than unzip_submission (see util.file_management), except the BMP segmentations
+    if they are not kept: then they are decoded in memory, on the same threads, and handed to the evaluation
+    (see evaluation_metrics_for_segmentation.evaluate_segmentation_results) without being written to disk
+
+    Input:
+        submission_file: full path and filename of the .zip file
+        output_folder: folder where the output will be saved
+        [n_threads]: number of threads that inflate the members
+        [keep_segmentations]: a boolean indicating if the BMP segmentations are extracted to disk too
+    Output:
+        decoded_segmentations: None if the segmentations were extracted (or there are none), or a pair with the list of
+                               the image filenames and an iterator of (image filename, segmentation) pairs, in the same order
+    '''
+
+    # initialize the output folder
+    if not path.exists(output_folder):
+        makedirs(output_folder)
+
+    # open the zip file (its members can be read from several threads at the same time)
+    with zipfile.ZipFile(submission_file, 'r') as zip_ref:
+        infos = zip_ref.infolist()
+
+        # separate the BMP segmentations, if they are decoded in memory
+        segmentation_infos = []
+        if not keep_segmentations:
+            root_folder = find_root_folder([ info.filename for info in infos if not info.filename.startswith('__MACOSX') ])
+            prefix = root_folder + 'segmentation/'
+            segmentation_infos = sorted([ info for info in infos if info.filename.startswith(prefix) and info.filename.endswith('.bmp')
+                                          and not ('/' in info.filename[len(prefix):]) ], key=lambda info: info.filename)
+        segmentation_names = set([ info.filename for info in segmentation_infos ])
+
+        # extract the rest of the members
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            list(executor.map(lambda info: extract_member(zip_ref, info, output_folder), [ info for info in infos if not (info.filename in segmentation_names) ]))
+
+    if len(segmentation_infos) == 0:
+        return None
+
+    # the folder of the segmentations is created anyway, so the results are found in the same way
+    makedirs(get_member_path(output_folder, prefix), exist_ok=True)
+    image_filenames = [ info.filename[len(prefix):] for info in segmentation_infos ]
+
+    return image_filenames, iterate_segmentations(submission_file, segmentation_infos, prefix, n_threads)
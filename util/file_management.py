@@ -1,5 +1,6 @@
 
 import csv
+import os
 import numpy as np
 
 from scipy.io import savemat
@@ -14,6 +15,33 @@ def parse_boolean(input_string):
 
 
 
+def parse_gt_sets(gt_folder):
+    '''
+    Parse the ground truth sets given in the command line, as comma separated name=folder pairs
+    (e.g. validation=data/REFUGE-Validation400/GT,test=data/test_dataset/GT)
+
+    Input:
+        gt_folder: a string with the pairs, or with the full path to a single ground truth folder
+    Output:
+        gt_sets: a list of (name, folder) pairs, or the folder itself if it has no names
+    '''
+
+    if not ('=' in gt_folder):
+        return gt_folder
+
+    gt_sets = []
+    for pair in gt_folder.split(','):
+        name, _, folder = pair.partition('=')
+        if len(name.strip()) == 0 or len(folder.strip()) == 0 or not ('=' in pair):
+            raise ValueError('The ground truth set "{}" is not given as name=folder.'.format(pair))
+        gt_sets.append((name.strip(), folder.strip()))
+    if len(set([ name for name, _ in gt_sets ])) != len(gt_sets):
+        raise ValueError('The names of the ground truth sets are repeated.')
+
+    return gt_sets
+
+
+
 def get_filenames(path_to_files, extension):
     '''
     Get all the files on a given folder with the given extension
@@ -63,7 +91,7 @@ def read_csv_classification_results(csv_filename):
             scores = scores + [ float(row[1]) ]
 
     # turn the list of scores into a numpy array
-    scores = np.asarray(scores, dtype=np.float)
+    scores = np.asarray(scores, dtype=float)
 
     # return the image filenames and the scores
     return image_filenames, scores
@@ -147,7 +175,7 @@ def get_labels_from_training_data(gt_folder):
     image_filenames = glaucoma_filenames + non_glaucoma_filenames
 
     # generate the array of labels
-    labels = np.zeros(len(image_filenames), dtype=np.bool)
+    labels = np.zeros(len(image_filenames), dtype=bool)
     labels[0:len(glaucoma_filenames)] = True
 
     return image_filenames, labels
@@ -211,7 +239,12 @@ def save_csv_fovea_location_performance(output_filename, distance):
 
 
 
-def save_csv_segmentation_table(table_filename, image_filenames, cup_dices, disc_dices, ae_cdrs):
+# names of the columns with the boundary distances of the segmentation task
+BOUNDARY_DISTANCE_COLUMNS = ['Cup-HD95', 'Cup-ASSD', 'Disc-HD95', 'Disc-ASSD']
+
+
+
+def save_csv_segmentation_table(table_filename, image_filenames, cup_dices, disc_dices, ae_cdrs, distances=None):
     '''
     Save the table of segmentation results as a CSV file.
 
@@ -221,6 +254,7 @@ def save_csv_segmentation_table(table_filename, image_filenames, cup_dices, disc
         cup_dices: a numpy array with the same length than the image_filenames list, with the Dice coefficient for each optic cup
         disc_dices: a numpy array with the same length than the image_filenames list, with the Dice coefficient for each optic disc
         ae_cdrs: a numpy array with the same length than the image_filenames list, with the absolute error of the vertical cup to disc ratio
+        [distances]: a (images x 4) numpy matrix with the boundary distances (see BOUNDARY_DISTANCE_COLUMNS). If given, they are saved as extra columns
     '''
 
     # write the data
@@ -228,10 +262,16 @@ def save_csv_segmentation_table(table_filename, image_filenames, cup_dices, disc
         # initialize the writer
         table_writer = csv.writer(csv_file)
         # write the column names
-        table_writer.writerow(['Filename', 'Cup-Dice', 'Disc-Dice', 'AE-CDR'])
+        header = ['Filename', 'Cup-Dice', 'Disc-Dice', 'AE-CDR']
+        if not (distances is None):
+            header = header + BOUNDARY_DISTANCE_COLUMNS
+        table_writer.writerow(header)
         # write each row
         for i in range(len(image_filenames)):
-            table_writer.writerow( [image_filenames[i], str(cup_dices[i]), str(disc_dices[i]), str(ae_cdrs[i])] )
+            row = [image_filenames[i], str(cup_dices[i]), str(disc_dices[i]), str(ae_cdrs[i])]
+            if not (distances is None):
+                row = row + [ str(value) for value in distances[i] ]
+            table_writer.writerow(row)
 
 
 
@@ -257,7 +297,63 @@ def save_csv_fovea_location_table(table_filename, image_filenames, distances):
 
 
 
-def save_csv_mean_segmentation_performance(output_filename, mean_cup_dice, mean_disc_dice, mae_cdrs):
+def save_csv_classification_table(table_filename, image_filenames, scores, labels):
+    '''
+    Save the table of classification scores and labels as a CSV file.
+
+    Input:
+        table_filename: a string with the full path and the table filename (with .csv extension)
+        image_filenames: a list of strings with the names of the images
+        scores: a 1D numpy array with the predicted score for each image
+        labels: a 1D numpy array with the gt label for each image (0: healthy, 1: glaucomatous)
+    '''
+
+    # the labels read from the xlsx file are given as a column vector
+    scores = np.ravel(scores)
+    labels = np.ravel(labels)
+
+    # write the data
+    with open(table_filename, 'w') as csv_file:
+        # initialize the writer
+        table_writer = csv.writer(csv_file)
+        # write the column names
+        table_writer.writerow(['Filename', 'Score', 'Label'])
+        # write each row
+        for i in range(len(image_filenames)):
+            table_writer.writerow( [image_filenames[i], str(scores[i]), str(int(labels[i]))] )
+
+
+
+def read_csv_table(table_filename):
+    '''
+    Read a table of results per image, as saved by save_csv_segmentation_table, save_csv_classification_table
+    or save_csv_fovea_location_table
+
+    Input:
+        table_filename: a string with the full path and the table filename (with .csv extension)
+    Output:
+        header: a list of strings with the names of the columns (without the filename)
+        image_filenames: a list of strings with the names of the images
+        values: a 2D numpy array with a row per image and a column per field
+    '''
+
+    # open the file
+    with open(table_filename, 'r') as csv_file:
+        # initialize the reader
+        csv_reader = csv.reader(csv_file)
+        # get the first row
+        header = next(csv_reader)[1:]
+        # collect the rows
+        rows = [ row for row in csv_reader if len(row) > 0 ]
+
+    image_filenames = [ row[0] for row in rows ]
+    values = np.asarray([ row[1:] for row in rows ], dtype=float).reshape((len(rows), len(header)))
+
+    return header, image_filenames, values
+
+
+
+def save_csv_mean_segmentation_performance(output_filename, mean_cup_dice, mean_disc_dice, mae_cdrs, mean_distances=None):
     '''
     Save a CSV file with the mean performance
 
@@ -266,6 +362,109 @@ def save_csv_mean_segmentation_performance(output_filename, mean_cup_dice, mean_
         mean_cup_dice: average Dice coefficient for the optic cups
         mean_disc_dice: average Dice coefficient for the optic discs
         mae_cdrs: mean absolute error of the vertical cup to disc ratios
+        [mean_distances]: the 4 average boundary distances (see BOUNDARY_DISTANCE_COLUMNS). If given, they are saved as extra columns
+    '''
+
+    # write the data
+    with open(output_filename, 'w') as csv_file:
+        # initialize the writer
+        table_writer = csv.writer(csv_file)
+        # write the column names
+        header = ['Cup-Dice', 'Disc-Dice', 'AE-CDR']
+        row = [ str(mean_cup_dice), str(mean_disc_dice), str(mae_cdrs)]
+        if not (mean_distances is None):
+            header = header + BOUNDARY_DISTANCE_COLUMNS
+            row = row + [ str(value) for value in mean_distances ]
+        table_writer.writerow(header)
+        # write each row
+        table_writer.writerow(row)
+
+
+
+def save_csv_quick_segmentation_performance(output_filename, estimates, lower_bounds, upper_bounds, is_rigorous=True):
+    '''
+    Save a CSV file with the estimated mean performance of a quick evaluation, and its limits
+
+    Input:
+        output_filename: a string with the full path and the table filename (with .csv extension)
+        estimates: the estimated mean cup Dice, mean disc Dice and MAE of the vertical cup to disc ratio
+        lower_bounds: the lower bounds of the same values
+        upper_bounds: the upper bounds of the same values
+        [is_rigorous]: a boolean indicating if the limits are rigorous bounds, or the bounds widened with a confidence interval
+    '''
+
+    limit_names = [ 'Lower bound', 'Upper bound' ] if is_rigorous else [ 'Lower limit (95% confidence)', 'Upper limit (95% confidence)' ]
+
+    # write the data
+    with open(output_filename, 'w') as csv_file:
+        # initialize the writer
+        table_writer = csv.writer(csv_file)
+        # write the column names
+        table_writer.writerow(['Value', 'Cup-Dice', 'Disc-Dice', 'AE-CDR'])
+        # write each row
+        table_writer.writerow( [ 'Estimate' ] + [ str(value) for value in estimates ] )
+        table_writer.writerow( [ limit_names[0] ] + [ str(value) for value in lower_bounds ] )
+        table_writer.writerow( [ limit_names[1] ] + [ str(value) for value in upper_bounds ] )
+
+
+
+def save_csv_segmentation_threshold_curves(output_filename, thresholds, cup_dices, disc_dices, ae_cdrs):
+    '''
+    Save a CSV file with the mean performance of the probability maps at each threshold
+
+    Input:
+        output_filename: a string with the full path and the table filename (with .csv extension)
+        thresholds: a 1D numpy array with the thresholds
+        cup_dices: a 1D numpy array with the mean Dice coefficient of the optic cups at each threshold
+        disc_dices: a 1D numpy array with the mean Dice coefficient of the optic discs at each threshold
+        ae_cdrs: a 1D numpy array with the mean absolute error of the vertical cup to disc ratios, using the same threshold for both maps
+    '''
+
+    # write the data
+    with open(output_filename, 'w') as csv_file:
+        # initialize the writer
+        table_writer = csv.writer(csv_file)
+        # write the column names
+        table_writer.writerow(['Threshold', 'Cup-Dice', 'Disc-Dice', 'AE-CDR'])
+        # write each row
+        for i in range(len(thresholds)):
+            table_writer.writerow( [ str(thresholds[i]), str(cup_dices[i]), str(disc_dices[i]), str(ae_cdrs[i]) ] )
+
+
+
+def save_csv_cdr_threshold_grid(output_filename, thresholds, ae_cdrs):
+    '''
+    Save a CSV file with the mean absolute error of the vertical cup to disc ratios for each pair of thresholds
+
+    Input:
+        output_filename: a string with the full path and the table filename (with .csv extension)
+        thresholds: a 1D numpy array with the thresholds
+        ae_cdrs: a (cup thresholds x disc thresholds) numpy matrix with the mean absolute errors
+    '''
+
+    # write the data
+    with open(output_filename, 'w') as csv_file:
+        # initialize the writer
+        table_writer = csv.writer(csv_file)
+        # write the disc thresholds as column names
+        table_writer.writerow(['Cup threshold / Disc threshold'] + [ str(threshold) for threshold in thresholds ])
+        # write a row for each cup threshold
+        for i in range(len(thresholds)):
+            table_writer.writerow( [ str(thresholds[i]) ] + [ str(value) for value in ae_cdrs[i,:] ] )
+
+
+
+def save_csv_annotator_segmentation_performance(output_filename, annotator_names, performance, reference_names=None):
+    '''
+    Save a CSV file with the mean segmentation performance with respect to each annotator
+
+    Input:
+        output_filename: a string with the full path and the table filename (with .csv extension)
+        annotator_names: a list with the names of the annotators
+        performance: a (annotators x 3) numpy matrix with the mean cup Dice, the mean disc Dice and the MAE of the vertical
+                     cup to disc ratio, or a (annotators x references x 3) numpy matrix if reference_names is given
+        [reference_names]: a list with the names of the references each annotator is compared with (the comparison of
+                           an annotator with itself is not written)
     '''
 
     # write the data
@@ -273,9 +472,43 @@ def save_csv_mean_segmentation_performance(output_filename, mean_cup_dice, mean_
         # initialize the writer
         table_writer = csv.writer(csv_file)
         # write the column names
-        table_writer.writerow(['Cup-Dice', 'Disc-Dice', 'AE-CDR'])
+        if reference_names is None:
+            table_writer.writerow(['Annotator', 'Cup-Dice', 'Disc-Dice', 'AE-CDR'])
+        else:
+            table_writer.writerow(['Annotator', 'Reference', 'Cup-Dice', 'Disc-Dice', 'AE-CDR'])
         # write each row
-        table_writer.writerow( [ str(mean_cup_dice), str(mean_disc_dice), str(mae_cdrs)] )
+        for i in range(len(annotator_names)):
+            if reference_names is None:
+                table_writer.writerow( [ annotator_names[i] ] + [ str(value) for value in performance[i] ] )
+            else:
+                for j in range(len(reference_names)):
+                    if reference_names[j] == annotator_names[i]:
+                        continue
+                    table_writer.writerow( [ annotator_names[i], reference_names[j] ] + [ str(value) for value in performance[i,j] ] )
+
+
+
+def save_csv_annotator_segmentation_table(table_filename, image_filenames, annotator_names, results):
+    '''
+    Save a table in a CSV file with the segmentation performance of each image with respect to each annotator
+
+    Input:
+        table_filename: a string with the full path and the table filename (with .csv extension)
+        image_filenames: a list of strings with the names of the images
+        annotator_names: a list with the names of the annotators
+        results: a (images x annotators x 3) numpy matrix with the cup Dice, the disc Dice and the absolute error of the vertical cup to disc ratio
+    '''
+
+    # write the data
+    with open(table_filename, 'w') as csv_file:
+        # initialize the writer
+        table_writer = csv.writer(csv_file)
+        # write the column names
+        table_writer.writerow(['Filename', 'Annotator', 'Cup-Dice', 'Disc-Dice', 'AE-CDR'])
+        # write each row
+        for i in range(len(image_filenames)):
+            for j in range(len(annotator_names)):
+                table_writer.writerow( [ image_filenames[i], annotator_names[j] ] + [ str(value) for value in results[i,j] ] )
 
 
 
@@ -306,7 +539,7 @@ def read_fovea_location_results(csv_filename):
             # append the filename
             image_filenames = image_filenames + [ row[0] ]
             # append the coordinates
-            current_coordinates = np.asarray( row[1:], dtype=np.float )
+            current_coordinates = np.asarray( row[1:], dtype=float )
             if coordinates is None:
                 coordinates = current_coordinates
             else:
@@ -316,6 +549,103 @@ def read_fovea_location_results(csv_filename):
 
 
 
+# names of the files with the fovea heatmaps of a submission: a (images x height x width) stack of maps, and the filename of each map
+FOVEA_HEATMAP_FILENAMES = ['fovea_location_heatmaps.npy', 'fovea_location_heatmaps.csv']
+# data types of the fovea heatmaps
+FOVEA_HEATMAP_DTYPES = ['uint8', 'uint16']
+
+
+
+def read_fovea_heatmaps(heatmap_filename, names_filename=None):
+    '''
+    Read a stack of fovea heatmaps, memory-mapped so the maps are only loaded when they are processed
+
+    Input:
+        heatmap_filename: full path and filename to a .npy file with a (images x height x width) stack of 8 or 16-bit heatmaps
+        [names_filename]: full path and filename to a CSV file with a header and the filename of each heatmap, in the same order.
+                          If not provided, the .csv file with the same name than the heatmaps is used
+    Output:
+        image_filenames: list of image filenames, as retrieved from the first column of the CSV file
+        heatmaps: a memory-mapped (images x height x width) numpy array
+    '''
+
+    if names_filename is None:
+        names_filename = path.splitext(heatmap_filename)[0] + '.csv'
+
+    # map the stack without reading it
+    heatmaps = np.load(heatmap_filename, mmap_mode='r')
+    if len(heatmaps.shape) != 3 or not (heatmaps.dtype.name in FOVEA_HEATMAP_DTYPES):
+        raise ValueError('The fovea heatmaps must be a (images x height x width) stack of 8 or 16-bit maps, not a {} array of {}.'.format(heatmaps.shape, heatmaps.dtype.name))
+
+    # read the filename of each heatmap, ignoring the header
+    with open(names_filename, 'r') as csv_file:
+        csv_reader = csv.reader(csv_file)
+        next(csv_reader)
+        image_filenames = [ row[0] for row in csv_reader if len(row) > 0 ]
+    if len(image_filenames) != heatmaps.shape[0]:
+        raise ValueError('There are {} fovea heatmaps but {} filenames.'.format(heatmaps.shape[0], len(image_filenames)))
+
+    return image_filenames, heatmaps
+
+
+
+def save_fovea_heatmaps(output_folder, image_filenames, heatmaps):
+    '''
+    Save the fovea heatmaps of several images in the format of the submissions (see FOVEA_HEATMAP_FILENAMES).
+    The maps are written one by one to a memory-mapped file, so they can be generated on the fly
+
+    Input:
+        output_folder: full path to the folder with the results of the submission
+        image_filenames: a list with the names of the images
+        heatmaps: an iterable with the 8 or 16-bit 2D heatmap of each image, in the same order (all of them with the same size)
+    '''
+
+    # create the folder if necessary
+    if not path.exists(output_folder):
+        makedirs(output_folder)
+
+    stack = None
+    for i, heatmap in enumerate(heatmaps):
+        heatmap = np.asarray(heatmap)
+        # the file is created with the size and the type of the first map
+        if stack is None:
+            if not (heatmap.dtype.name in FOVEA_HEATMAP_DTYPES):
+                raise ValueError('The fovea heatmaps must be 8 or 16-bit maps, not {}.'.format(heatmap.dtype.name))
+            stack = np.lib.format.open_memmap(path.join(output_folder, FOVEA_HEATMAP_FILENAMES[0]), mode='w+', dtype=heatmap.dtype,
+                                              shape=(len(image_filenames),) + heatmap.shape)
+        stack[i] = heatmap
+    if not (stack is None):
+        stack.flush()
+
+    # save the names of the images
+    with open(path.join(output_folder, FOVEA_HEATMAP_FILENAMES[1]), 'w') as csv_file:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(['Filename'])
+        for image_filename in image_filenames:
+            csv_writer.writerow([image_filename])
+
+
+
+def save_csv_fovea_location_results(output_filename, image_filenames, coordinates):
+    '''
+    Save the fovea location of each image in the format of the submissions (image filename, x, y)
+
+    Input:
+        output_filename: a string with the full path and the output file name (with .csv extension)
+        image_filenames: a list of strings with the names of the images
+        coordinates: a 2D numpy array with the (x,y) coordinates of the fovea in each image
+    '''
+
+    # open the file
+    with open(output_filename, 'w') as csv_file:
+        # initialize the writer
+        csv_writer = csv.writer(csv_file)
+        # write the column names
+        csv_writer.writerow(['FileName', 'Fovea_X', 'Fovea_Y'])
+        # write each row
+        for i in range(len(image_filenames)):
+            csv_writer.writerow([image_filenames[i], str(coordinates[i,0]), str(coordinates[i,1])])
+
 import openpyxl
 
 def read_gt_fovea_location(xlsx_filename, is_training=False):
@@ -345,9 +675,9 @@ def read_gt_fovea_location(xlsx_filename, is_training=False):
         image_filenames = image_filenames + [ row[1].value ]
         # append the coordinates
         if is_training:
-            current_coordinates = np.asarray( [ float(row[2].value), float(row[3].value) ], dtype=np.float )
+            current_coordinates = np.asarray( [ float(row[2].value), float(row[3].value) ], dtype=float )
         else:
-            current_coordinates = np.asarray( [ float(row[3].value), float(row[4].value) ], dtype=np.float )
+            current_coordinates = np.asarray( [ float(row[3].value), float(row[4].value) ], dtype=float )
         if coordinates is None:
             coordinates = current_coordinates
         else:
@@ -357,6 +687,37 @@ def read_gt_fovea_location(xlsx_filename, is_training=False):
 
 
 
+def read_subgroup_spec(csv_filename):
+    '''
+    Read a CSV file assigning the images to subgroups (e.g. the acquisition device, or any subset of images). It has a
+    header, the image filename in the first column and the tags of the image in the rest of the columns (a cell might
+    have several tags separated by semicolons, and empty cells are ignored)
+
+    Input:
+        csv_filename: full path and filename to the CSV file
+    Output:
+        image_tags: a list of (image filename, list of tags) pairs
+    '''
+
+    image_tags = []
+
+    # open the file
+    with open(csv_filename, 'r') as csv_file:
+        # initialize a reader
+        csv_reader = csv.reader(csv_file)
+        # ignore the first row, that only has the header
+        next(csv_reader)
+        # collect the tags of each image
+        for row in csv_reader:
+            if len(row) == 0 or len(row[0].strip()) == 0:
+                continue
+            tags = [ tag.strip() for cell in row[1:] for tag in cell.split(';') if len(tag.strip()) > 0 ]
+            image_tags.append((row[0].strip(), tags))
+
+    return image_tags
+
+
+
 import openpyxl
 
 def read_gt_labels(xlsx_filename):
@@ -417,7 +778,7 @@ def unzip_submission(submission_file, output_folder):
 
 
 
-def export_table_of_results(table_filename, team_names, segmentation_results, classification_results, fovea_detection_results):
+def export_table_of_results(table_filename, team_names, segmentation_results, classification_results, fovea_detection_results, resource_usages=None):
     '''
     Export a table of results (unsorted) as a CSV
 
@@ -427,6 +788,8 @@ def export_table_of_results(table_filename, team_names, segmentation_results, cl
         segmentation_results: list of segmentation results
         classification_results: list of classification results
         fovea_detection_results: list of fovea detection results
+        [resource_usages]: list of dictionaries with the resources used to evaluate each submission (cpu_seconds, peak_rss_mb, bytes_read).
+                           If provided, they are exported as extra columns
     '''
 
     # write the data
@@ -434,7 +797,10 @@ def export_table_of_results(table_filename, team_names, segmentation_results, cl
         # initialize the writer
         table_writer = csv.writer(csv_file)
         # write the column names
-        table_writer.writerow(['Team name', 'Mean optic cup Dice', 'Mean optic disc Dice', 'MAE cup to disc ratio', 'AUC', 'Reference Sensitivity', 'Mean Euclidean distance'])
+        header = ['Team name', 'Mean optic cup Dice', 'Mean optic disc Dice', 'MAE cup to disc ratio', 'AUC', 'Reference Sensitivity', 'Mean Euclidean distance']
+        if not (resource_usages is None):
+            header = header + ['CPU seconds', 'Peak RSS (MB)', 'Bytes read']
+        table_writer.writerow(header)
         # write each row
         for i in range(len(team_names)):
             # retrieve current results
@@ -442,8 +808,33 @@ def export_table_of_results(table_filename, team_names, segmentation_results, cl
             current_classification_results = classification_results[i]
             current_fovea_detection_results = fovea_detection_results[i]
             # write a row of results
-            table_writer.writerow( [team_names[i], str(current_segmentation_results[0]), str(current_segmentation_results[1]), str(current_segmentation_results[2]),
-                                    str(current_classification_results[0]), str(current_classification_results[1]), str(current_fovea_detection_results)] )
+            row = [team_names[i], str(current_segmentation_results[0]), str(current_segmentation_results[1]), str(current_segmentation_results[2]),
+                   str(current_classification_results[0]), str(current_classification_results[1]), str(current_fovea_detection_results)]
+            # append the resource usage, if given
+            if not (resource_usages is None):
+                row = row + [ str(resource_usages[i]['cpu_seconds']), str(resource_usages[i]['peak_rss_mb']), str(resource_usages[i]['bytes_read']) ]
+            table_writer.writerow(row)
+
+
+
+def save_csv_validation_report(output_filename, report):
+    '''
+    Save the messages of a validation report in a CSV file
+
+    Input:
+        output_filename: a string with the full path and the output file name (with .csv extension)
+        report: a validation report, as retrieved by util.submission_validation.validate_submission
+    '''
+
+    # write the data
+    with open(output_filename, 'w') as csv_file:
+        # initialize the writer
+        table_writer = csv.writer(csv_file)
+        # write the column names
+        table_writer.writerow(['Level', 'Task', 'Message'])
+        # write each message
+        for level, task, message in report['messages']:
+            table_writer.writerow( [level, '' if task is None else task, message] )
 
 
 
@@ -476,38 +867,92 @@ def export_ranking(table_filename, header, team_names, scores):
 
 
 
-def read_table_of_results(table_filename):
+def get_binary_table_filename(table_filename):
     '''
-    Read the table of results (unsorted) as a CSV
+    Get the filename of the binary copy of a table of results
 
     Input:
         table_filename: filename of the CSV file with the table of results
     Output:
+        binary_filename: filename of the .npz file next to the CSV file
+    '''
+
+    return path.splitext(table_filename)[0] + '.npz'
+
+
+
+def save_binary_table_of_results(binary_filename, header, teams, results):
+    '''
+    Save the table of results as a binary .npz file, so it can be loaded without parsing the CSV file
+
+    Input:
+        binary_filename: filename of the .npz file
         header: a list of strings with the name of the evaluation metrics
         teams: a list of strings with the name of the teams
         results: a numpy matrix of evaluation metrics
     '''
 
+    # write in a temporary file first, so the readers never find a partial file
+    temporary_filename = binary_filename + '.tmp.npz'
+    np.savez(temporary_filename, header=np.asarray(header, dtype=str), teams=np.asarray(teams, dtype=str), results=results)
+    os.replace(temporary_filename, binary_filename)
+
+
+
+def read_binary_table_of_results(binary_filename):
+    '''
+    Read the table of results from a binary .npz file, as saved by save_binary_table_of_results
+
+    Input:
+        binary_filename: filename of the .npz file
+    Output:
+        header: a list of strings with the name of the evaluation metrics
+        teams: a list of strings with the name of the teams
+        results: a numpy matrix of evaluation metrics
+    '''
+
+    with np.load(binary_filename, allow_pickle=False) as data:
+        return data['header'].tolist(), data['teams'].tolist(), data['results']
+
+
+
+def read_table_of_results(table_filename, use_binary=False):
+    '''
+    Read the table of results (unsorted) as a CSV
+
+    Input:
+        table_filename: filename of the CSV file with the table of results
+        [use_binary]: a boolean indicating if a binary copy of the table (see get_binary_table_filename) should be used.
+                      If it is missing or older than the CSV file, the CSV file is parsed and the binary copy is updated
+    Output:
+        header: a list of strings with the name of the evaluation metrics
+        teams: a list of strings with the name of the teams
+        results: a (teams x metrics) numpy matrix of evaluation metrics
+    '''
+
+    # use the binary copy if it is up to date
+    binary_filename = get_binary_table_filename(table_filename)
+    if use_binary and path.exists(binary_filename) and os.stat(binary_filename).st_mtime >= os.stat(table_filename).st_mtime:
+        return read_binary_table_of_results(binary_filename)
+
     # open the file
     with open(table_filename, 'r') as csv_file:
         # initialize the reader
         csv_reader = csv.reader(csv_file)
         # get the first row
         header = next(csv_reader)[1:]
+        # collect all the rows, and convert them to a matrix at once
+        rows = [ row for row in csv_reader if len(row) > 0 ]
 
-        # initialize the list of teams
-        teams = []
-        # initialize a numpy matrix with all the other results
-        results = None
-        # and now, iterate and fill the arrays
-        for row in csv_reader:
-            # append the team name
-            teams = teams + [ row[0] ]
-            # append the results
-            current_results = np.asarray( row[1:], dtype=np.float )
-            if results is None:
-                results = current_results
-            else:
-                results = np.vstack( (results, current_results))
+    # separate the team names from the results
+    teams = [ row[0] for row in rows ]
+    results = np.asarray([ row[1:] for row in rows ], dtype=float).reshape((len(rows), len(header)))
+
+    # update the binary copy (it is only a cache, so it doesn't matter if it can't be written)
+    if use_binary:
+        try:
+            save_binary_table_of_results(binary_filename, header, teams, results)
+        except (IOError, OSError):
+            pass
 
-    return header, teams, results
\ No newline at end of file
+    return header, teams, results
@@ -0,0 +1,235 @@
+
+import warnings
+import numpy as np
+
+from util.per_image_results import get_classification_labels
+
+
+# direction of each field of the results per image (True if the highest values are the best ones)
+HIGHER_IS_BETTER = { 'Cup-Dice': True, 'Disc-Dice': True, 'AE-CDR': False, 'Euclidean distance': False, 'Misranking': False }
+# value beyond which the result of a team on an image is considered a failure
+FAILURE_THRESHOLDS = { 'Cup-Dice': 0.5, 'Disc-Dice': 0.75, 'AE-CDR': 0.2, 'Euclidean distance': 100.0, 'Misranking': 0.5 }
+# robust z-score beyond which the result of a team on an image is considered an outlier
+OUTLIER_Z = 3.0
+# columns of the tables of image difficulty and outlier teams
+DIFFICULTY_COLUMNS = ['Difficulty rank', 'Teams', 'Mean', 'Median', 'Std', 'Best', 'Worst', 'Failure rate', 'Consensus failure']
+OUTLIER_COLUMNS = ['Images', 'Mean', 'Mean robust z', 'Outlier images', 'Outlier rate', 'Mean correlation']
+
+
+def get_misranking_rates(scores, labels):
+    '''
+    Measure how badly each image is ranked by the classification scores of each team: the fraction of the images of the
+    other class that are ranked on the wrong side of it (ties count as half). The mean rate of the glaucomatous images
+    (or of the healthy ones) is 1 - AUC, so it is the contribution of each image to the AUC
+
+    Input:
+        scores: a (teams x images) numpy array with the scores (NaN for the images without results)
+        labels: a 1D numpy array with the gt label of each image (0: healthy, 1: glaucomatous, NaN if unknown)
+    Output:
+        rates: a (teams x images) numpy array with the misranking rate of each image (NaN for the images without results)
+    '''
+
+    rates = np.full(scores.shape, np.nan)
+    is_positive = labels == 1
+    is_negative = labels == 0
+
+    for i in range(scores.shape[0]):
+        is_known = np.logical_not(np.isnan(scores[i]))
+        positive_scores = np.sort(scores[i, is_known & is_positive])
+        negative_scores = np.sort(scores[i, is_known & is_negative])
+        if len(positive_scores) == 0 or len(negative_scores) == 0:
+            continue
+        # negatives scored at least as high as each positive, and positives scored at most as high as each negative
+        current_positives = is_known & is_positive
+        current_negatives = is_known & is_negative
+        rates[i, current_positives] = (len(negative_scores) - 0.5 * (np.searchsorted(negative_scores, scores[i, current_positives], side='left') +
+                                       np.searchsorted(negative_scores, scores[i, current_positives], side='right'))) / len(negative_scores)
+        rates[i, current_negatives] = 0.5 * (np.searchsorted(positive_scores, scores[i, current_negatives], side='left') +
+                                             np.searchsorted(positive_scores, scores[i, current_negatives], side='right')) / len(positive_scores)
+
+    return rates
+
+
+
+def get_metric_values(per_image_results):
+    '''
+    Collect the results per image of each metric, as (teams x images) arrays. The classification scores are converted
+    to misranking rates (see get_misranking_rates), so they can be compared across images
+
+    Input:
+        per_image_results: the results per image, as retrieved by util.per_image_results.load_per_image_results
+    Output:
+        metric_values: a list of (task, field, images, values) tuples, with the keys of the images and a (teams x images) array
+    '''
+
+    metric_values = []
+    for task in ['segmentation', 'classification', 'fovea_location']:
+        results = per_image_results[task]
+        if len(results['images']) == 0:
+            continue
+        if task == 'classification':
+            scores = results['values'][:, :, results['fields'].index('Score')]
+            metric_values.append((task, 'Misranking', results['images'], get_misranking_rates(scores, get_classification_labels(per_image_results))))
+        else:
+            for j in range(len(results['fields'])):
+                metric_values.append((task, results['fields'][j], results['images'], results['values'][:, :, j]))
+
+    return metric_values
+
+
+
+def get_errors(values, field):
+    '''
+    Orient the results of a metric so the highest values are the worst ones
+
+    Input:
+        values: a numpy array with the results
+        field: the name of the metric (see HIGHER_IS_BETTER)
+    Output:
+        errors: the same array, negated if the highest values are the best ones
+    '''
+
+    return -np.asarray(values, dtype=float) if HIGHER_IS_BETTER[field] else np.asarray(values, dtype=float)
+
+
+
+def get_image_difficulty(values, field, consensus=0.5):
+    '''
+    Measure the difficulty of each image from the results of all the teams
+
+    Input:
+        values: a (teams x images) numpy array with the results of a metric (NaN for the images without results)
+        field: the name of the metric (see HIGHER_IS_BETTER and FAILURE_THRESHOLDS)
+        [consensus]: fraction of the teams that must fail on an image to consider it a consensus failure
+    Output:
+        difficulty: an (images x len(DIFFICULTY_COLUMNS)) numpy array with the rank of the image (1 for the hardest one),
+                    the number of teams with results, the mean, median, standard deviation, best and worst values,
+                    the fraction of teams that fail and if it is a consensus failure (1) or not (0)
+    '''
+
+    values = np.asarray(values, dtype=float)
+    errors = get_errors(values, field)
+    is_known = np.logical_not(np.isnan(values))
+    n_teams = np.sum(is_known, axis=0)
+
+    # statistics across teams (NaN for the images without results)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        mean_values = np.nanmean(values, axis=0)
+        median_values = np.nanmedian(values, axis=0)
+        std_values = np.nanstd(values, axis=0)
+        worst_errors = np.nanmax(errors, axis=0)
+        best_errors = np.nanmin(errors, axis=0)
+    sign = -1.0 if HIGHER_IS_BETTER[field] else 1.0
+
+    # fraction of the teams beyond the failure threshold
+    with np.errstate(invalid='ignore', divide='ignore'):
+        failure_rates = np.sum(errors > sign * FAILURE_THRESHOLDS[field], axis=0) / n_teams.astype(float)
+    is_consensus_failure = np.where(n_teams > 0, failure_rates >= consensus, np.nan)
+
+    # the hardest images (highest mean error) are ranked first
+    difficulty_ranks = np.full(len(n_teams), np.nan)
+    sorted_indices = np.argsort(-sign * mean_values, kind='mergesort')
+    sorted_indices = sorted_indices[np.logical_not(np.isnan(mean_values[sorted_indices]))]
+    difficulty_ranks[sorted_indices] = np.arange(1, len(sorted_indices) + 1)
+
+    return np.stack((difficulty_ranks, n_teams, mean_values, median_values, std_values, sign * best_errors, sign * worst_errors,
+                     failure_rates, is_consensus_failure), axis=1)
+
+
+
+def get_robust_z_scores(values, field):
+    '''
+    Measure how far the result of each team is from the results of the other teams on the same image, with a
+    robust z-score (the distance to the median of the image, divided by the scaled median absolute deviation)
+
+    Input:
+        values: a (teams x images) numpy array with the results of a metric (NaN for the images without results)
+        field: the name of the metric (see HIGHER_IS_BETTER)
+    Output:
+        z_scores: a (teams x images) numpy array, positive for the results worse than the median of the image
+    '''
+
+    errors = get_errors(values, field)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        medians = np.nanmedian(errors, axis=0)
+        deviations = 1.4826 * np.nanmedian(np.abs(errors - medians[np.newaxis,:]), axis=0)
+
+    # the images where most teams agree exactly are not informative
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z_scores = (errors - medians[np.newaxis,:]) / deviations[np.newaxis,:]
+    z_scores[:, np.logical_not(deviations > 0)] = np.nan
+
+    return z_scores
+
+
+
+def get_team_correlations(values):
+    '''
+    Compute the Pearson correlation between the results per image of each pair of teams, using only the images that
+    both of them have results for. All the pairs are computed at once with matrix products
+
+    Input:
+        values: a (teams x images) numpy array with the results of a metric (NaN for the images without results)
+    Output:
+        correlations: a (teams x teams) numpy matrix with the correlations (NaN if a pair has less than two common images)
+    '''
+
+    values = np.asarray(values, dtype=float)
+    is_known = np.logical_not(np.isnan(values)).astype(float)
+
+    # center the values of each team first, for numerical stability
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        centered = np.where(is_known > 0, values - np.nanmean(values, axis=1)[:,np.newaxis], 0.0)
+
+    # sums over the common images of each pair
+    n_common = np.dot(is_known, is_known.T)
+    sums = np.dot(centered, is_known.T)
+    sums_of_squares = np.dot(centered ** 2, is_known.T)
+    cross_products = np.dot(centered, centered.T)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariances = cross_products - sums * sums.T / n_common
+        variances = sums_of_squares - sums ** 2 / n_common
+        correlations = covariances / np.sqrt(variances * variances.T)
+    correlations[n_common < 2] = np.nan
+
+    return np.clip(correlations, -1.0, 1.0)
+
+
+
+def get_outlier_teams(values, field, z_threshold=OUTLIER_Z, correlations=None):
+    '''
+    Summarize how each team deviates from the consensus of the other teams
+
+    Input:
+        values: a (teams x images) numpy array with the results of a metric (NaN for the images without results)
+        field: the name of the metric (see HIGHER_IS_BETTER)
+        [z_threshold]: robust z-score beyond which a result is an outlier (see get_robust_z_scores)
+        [correlations]: the correlations between the teams (see get_team_correlations). If not provided, they are computed
+    Output:
+        outliers: a (teams x len(OUTLIER_COLUMNS)) numpy array with the number of images with results, the mean value, the
+                  mean robust z-score, the number and the fraction of outlier images and the mean correlation with the other teams
+    '''
+
+    values = np.asarray(values, dtype=float)
+    z_scores = get_robust_z_scores(values, field)
+    if correlations is None:
+        correlations = get_team_correlations(values)
+    n_images = np.sum(np.logical_not(np.isnan(values)), axis=1)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        mean_values = np.nanmean(values, axis=1)
+        mean_z_scores = np.nanmean(z_scores, axis=1)
+        # mean correlation with the other teams
+        other_correlations = np.where(np.eye(len(values), dtype=bool), np.nan, correlations)
+        mean_correlations = np.nanmean(other_correlations, axis=1) if len(values) > 1 else np.full(len(values), np.nan)
+    n_outliers = np.sum(z_scores > z_threshold, axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        outlier_rates = n_outliers / n_images.astype(float)
+
+    return np.stack((n_images, mean_values, mean_z_scores, n_outliers, outlier_rates, mean_correlations), axis=1)
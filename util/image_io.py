@@ -0,0 +1,306 @@
+
+import struct
+import numpy as np
+
+from PIL import Image
+
+
+# number of bytes needed to identify the format and read the BMP headers
+IMAGE_HEADER_SIZE = 64
+# bits per pixel of the uncompressed BMP files that can be read by bands
+BAND_BITS_PER_PIXEL = [8, 24, 32]
+
+
+def read_image(filename):
+    '''
+    Read an image with the same values than scipy.misc.imread (which is not available in the recent versions of scipy):
+    the images with a palette are expanded to RGB (or RGBA, if they have a transparent color) and the binary ones to 8 bits
+
+    Input:
+        filename: full path to the image file, or a file object (e.g. an io.BytesIO with the file in memory)
+    Output:
+        image: a (height x width) or (height x width x channels) numpy array
+    '''
+
+    with Image.open(filename) as image:
+        if image.mode == 'P':
+            return np.array(image.convert('RGBA' if 'transparency' in image.info else 'RGB'))
+        if image.mode == '1':
+            return np.array(image.convert('L'))
+        return np.array(image)
+
+
+
+def identify_image_format(header_bytes):
+    '''
+    Identify the format of an image file from its first bytes
+
+    Input:
+        header_bytes: a bytes object with the first bytes of the file
+    Output:
+        image_format: a string with the format ('bmp', 'png', 'tiff', 'jpeg', 'gif') or None if unknown
+    '''
+
+    if header_bytes[:2] == b'BM':
+        return 'bmp'
+    elif header_bytes[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    elif header_bytes[:4] in [b'II*\x00', b'MM\x00*']:
+        return 'tiff'
+    elif header_bytes[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    elif header_bytes[:6] in [b'GIF87a', b'GIF89a']:
+        return 'gif'
+    else:
+        return None
+
+
+
+def read_bmp_header(header_bytes):
+    '''
+    Parse the file and DIB headers of a BMP file
+
+    Input:
+        header_bytes: a bytes object with (at least) the first 54 bytes of the BMP file
+    Output:
+        header: a dictionary with the width, height, bits_per_pixel, compression, data_offset, top_down,
+                dib_header_size and colors_used fields
+    '''
+
+    if identify_image_format(header_bytes) != 'bmp' or len(header_bytes) < 26:
+        raise ValueError('The file is not a valid BMP file.')
+
+    # offset of the pixel array and size of the DIB header
+    data_offset, dib_header_size = struct.unpack('<II', header_bytes[10:18])
+
+    if dib_header_size == 12:
+        # old OS/2 header (BITMAPCOREHEADER)
+        width, height, _, bits_per_pixel = struct.unpack('<HHHH', header_bytes[18:26])
+        compression = 0
+        colors_used = 0
+    else:
+        if len(header_bytes) < 34:
+            raise ValueError('The file is not a valid BMP file.')
+        # BITMAPINFOHEADER and its extensions
+        width, height, _, bits_per_pixel, compression = struct.unpack('<iiHHI', header_bytes[18:34])
+        # number of colors of the palette (0 means all of them)
+        colors_used = struct.unpack('<I', header_bytes[46:50])[0] if len(header_bytes) >= 50 else 0
+
+    # a negative height means that the rows are stored from top to bottom
+    top_down = height < 0
+
+    return { 'width': abs(width), 'height': abs(height), 'bits_per_pixel': bits_per_pixel,
+             'compression': compression, 'data_offset': data_offset, 'top_down': top_down,
+             'dib_header_size': dib_header_size, 'colors_used': colors_used }
+
+
+
+def read_image_header(filename):
+    '''
+    Read the format and (for BMP files) the header of an image file, without decoding it
+
+    Input:
+        filename: full path to the image file
+    Output:
+        image_format: a string with the image format (see identify_image_format)
+        header: the BMP header (see read_bmp_header), or None if the file is not a BMP file
+    '''
+
+    with open(filename, 'rb') as image_file:
+        header_bytes = image_file.read(IMAGE_HEADER_SIZE)
+
+    image_format = identify_image_format(header_bytes)
+    if image_format == 'bmp':
+        return image_format, read_bmp_header(header_bytes)
+    else:
+        return image_format, None
+
+
+
+def can_read_bmp_bands(header):
+    '''
+    Check if a BMP file can be read by bands (see read_bmp_rows), i.e. if it is uncompressed with 8, 24 or 32 bits per pixel
+
+    Input:
+        header: the BMP header (see read_bmp_header), or None if the file is not a BMP file
+    Output:
+        a boolean value
+    '''
+
+    return not (header is None) and header['compression'] == 0 and header['bits_per_pixel'] in BAND_BITS_PER_PIXEL and header['width'] > 0
+
+
+
+def read_bmp_palette(filename, header):
+    '''
+    Read the red component of the palette of an 8-bit BMP file, which is the value of the first channel of each index
+
+    Input:
+        filename: full path to the BMP file
+        header: the BMP header (see read_bmp_header)
+    Output:
+        lookup: a numpy array of 256 uint8 values with the first channel of each palette index
+    '''
+
+    with open(filename, 'rb') as image_file:
+        image_file.seek(14 + header['dib_header_size'])
+        palette_bytes = image_file.read(get_bmp_palette_size(header))
+
+    return get_bmp_palette_lookup(palette_bytes, header)
+
+
+
+def get_bmp_palette_size(header):
+    '''
+    Get the number of bytes of the palette of an 8-bit BMP file, which is stored right after the DIB header
+
+    Input:
+        header: the BMP header (see read_bmp_header)
+    Output:
+        palette_size: the number of bytes of the palette
+    '''
+
+    # the OS/2 palettes have 3 bytes per color, and the rest 4 (blue, green, red and reserved)
+    color_size = 3 if header['dib_header_size'] == 12 else 4
+    n_colors = header['colors_used'] if header['colors_used'] > 0 else 256
+
+    return n_colors * color_size
+
+
+
+def get_bmp_palette_lookup(palette_bytes, header):
+    '''
+    Get the red component of each index of the palette of an 8-bit BMP file
+
+    Input:
+        palette_bytes: a bytes-like object with the palette (see get_bmp_palette_size)
+        header: the BMP header (see read_bmp_header)
+    Output:
+        lookup: a numpy array of 256 uint8 values with the first channel of each palette index
+    '''
+
+    color_size = 3 if header['dib_header_size'] == 12 else 4
+    palette = np.frombuffer(palette_bytes, dtype=np.uint8)
+
+    lookup = np.zeros(256, dtype=np.uint8)
+    red_values = palette[2::color_size]
+    lookup[:len(red_values)] = red_values
+
+    return lookup
+
+
+
+def read_bmp_rows(filename, first_row, last_row, header=None, lookup=None):
+    '''
+    Read a range of rows of the first channel of an uncompressed BMP file, mapping only the needed part of the file
+    (so the memory used does not depend on the size of the image). The values are the same than in the first
+    channel of the full image read by read_image
+
+    Input:
+        filename: full path to the BMP file
+        first_row, last_row: the range of rows to read (from top to bottom, without including last_row)
+        [header]: the BMP header (see read_bmp_header). If not provided, it is read from the file
+        [lookup]: the palette of an 8-bit file (see read_bmp_palette). If not provided, it is read from the file
+    Output:
+        band: a (last_row - first_row) x width numpy array of uint8
+    '''
+
+    if header is None:
+        _, header = read_image_header(filename)
+    if not can_read_bmp_bands(header):
+        raise ValueError('{} is not an uncompressed BMP file with {} bits per pixel.'.format(filename, BAND_BITS_PER_PIXEL))
+    width, height, bytes_per_pixel = header['width'], header['height'], header['bits_per_pixel'] // 8
+    first_row, last_row = max(0, first_row), min(height, last_row)
+    if last_row <= first_row:
+        return np.zeros((0, width), dtype=np.uint8)
+
+    # each row is padded to a multiple of 4 bytes, and they are stored from bottom to top unless the height is negative
+    row_size = ((header['bits_per_pixel'] * width + 31) // 32) * 4
+    first_stored_row = first_row if header['top_down'] else height - last_row
+    pixels = np.memmap(filename, dtype=np.uint8, mode='r', offset=header['data_offset'] + first_stored_row * row_size,
+                       shape=(last_row - first_row, row_size))
+    if not header['top_down']:
+        pixels = pixels[::-1]
+
+    if bytes_per_pixel == 1 and lookup is None:
+        lookup = read_bmp_palette(filename, header)
+    band = get_first_channel(pixels, width, bytes_per_pixel, lookup)
+    del pixels
+
+    return band
+
+
+
+def get_first_channel(pixels, width, bytes_per_pixel, lookup=None):
+    '''
+    Get the first channel of some rows of the pixel array of a BMP file
+
+    Input:
+        pixels: a (rows x padded row size) numpy array of uint8 with the stored rows, from top to bottom
+        width: the width of the image
+        bytes_per_pixel: 1, 3 or 4
+        [lookup]: the palette of an 8-bit file (see get_bmp_palette_lookup)
+    Output:
+        channel: a (rows x width) numpy array of uint8, which does not share memory with pixels
+    '''
+
+    # the pixels are stored as blue, green and red, so the first channel is the third byte of each pixel
+    if bytes_per_pixel == 1:
+        return lookup[pixels[:, :width]]
+    return np.array(pixels[:, 2:bytes_per_pixel * width:bytes_per_pixel])
+
+
+
+def read_bmp_buffer(buffer):
+    '''
+    Decode the first channel of an uncompressed BMP file already loaded in memory (e.g. a member of a zip file), with the
+    same values than the first channel of the image read by read_image
+
+    Input:
+        buffer: a bytes-like object with the whole BMP file
+    Output:
+        image: a (height x width) numpy array of uint8, or None if the buffer is not an uncompressed BMP file with
+               8, 24 or 32 bits per pixel (so it has to be decoded by other means)
+    '''
+
+    try:
+        header = read_bmp_header(bytes(buffer[:IMAGE_HEADER_SIZE]))
+    except ValueError:
+        return None
+    if not can_read_bmp_bands(header):
+        return None
+    width, height, bytes_per_pixel = header['width'], header['height'], header['bits_per_pixel'] // 8
+
+    # view the stored rows without copying them (from bottom to top, unless the height is negative)
+    row_size = ((header['bits_per_pixel'] * width + 31) // 32) * 4
+    pixels = np.frombuffer(buffer, dtype=np.uint8, count=height * row_size, offset=header['data_offset']).reshape((height, row_size))
+    if not header['top_down']:
+        pixels = pixels[::-1]
+
+    lookup = None
+    if bytes_per_pixel == 1:
+        palette_offset = 14 + header['dib_header_size']
+        lookup = get_bmp_palette_lookup(buffer[palette_offset:palette_offset + get_bmp_palette_size(header)], header)
+
+    return get_first_channel(pixels, width, bytes_per_pixel, lookup)
+
+
+
+def read_bmp_bands(filename, band_height, header=None):
+    '''
+    Iterate over the horizontal bands of the first channel of an uncompressed BMP file, from top to bottom
+
+    Input:
+        filename: full path to the BMP file
+        band_height: number of rows of each band (the last one can be smaller)
+        [header]: the BMP header (see read_bmp_header). If not provided, it is read from the file
+    Output:
+        bands: an iterator of (first_row, band) pairs, with band as retrieved by read_bmp_rows
+    '''
+
+    if header is None:
+        _, header = read_image_header(filename)
+    lookup = read_bmp_palette(filename, header) if header['bits_per_pixel'] == 8 else None
+
+    for first_row in range(0, header['height'], band_height):
+        yield first_row, read_bmp_rows(filename, first_row, first_row + band_height, header, lookup)
@@ -2,7 +2,299 @@
 import numpy as np
 
 
-def segmentation_leaderboard(metrics, teams, results):
+# policies to assign ranks to tied values
+TIE_POLICIES = ['min', 'max', 'average', 'dense', 'ordinal']
+
+# declarative specification of the leaderboard criteria. Each entry ranks the teams according to a metric
+# (or according to the score of another criterion, with the lowest score being the best), and the score of
+# the criterion is the weighted sum of those ranks
+SEGMENTATION_CRITERION = [
+    { 'name': 'Optic cup rank', 'metric': 'Mean optic cup Dice', 'direction': 'highest', 'weight': 0.35 },
+    { 'name': 'Optic disc rank', 'metric': 'Mean optic disc Dice', 'direction': 'highest', 'weight': 0.25 },
+    { 'name': 'CDR rank', 'metric': 'MAE cup to disc ratio', 'direction': 'lowest', 'weight': 0.4 },
+]
+CLASSIFICATION_CRITERION = [
+    { 'name': 'AUC rank', 'metric': 'AUC', 'direction': 'highest', 'weight': 1.0 },
+]
+FOVEA_LOCATION_CRITERION = [
+    { 'name': 'Euclidean distance rank', 'metric': 'Mean Euclidean distance', 'direction': 'lowest', 'weight': 1.0 },
+]
+FINAL_CRITERION = [
+    { 'name': 'Segmentation rank', 'criterion': SEGMENTATION_CRITERION, 'weight': 0.6 },
+    { 'name': 'Classification rank', 'criterion': CLASSIFICATION_CRITERION, 'weight': 0.4 },
+]
+CRITERIA = { 'segmentation': SEGMENTATION_CRITERION, 'classification': CLASSIFICATION_CRITERION,
+             'fovea_location': FOVEA_LOCATION_CRITERION, 'final': FINAL_CRITERION }
+
+
+def rank_values(values, higher_is_better=False, ties='min'):
+    '''
+    Rank values along the last axis using the inverse of the sorting permutation. NaN values are not ranked.
+
+    Input:
+        values: a numpy array (1D, or ND to rank each row independently)
+        [higher_is_better]: a boolean indicating if the highest value gets the first rank
+        [ties]: policy for tied values: 'min' (1, 2, 2, 4), 'max' (1, 3, 3, 4), 'average' (1, 2.5, 2.5, 4),
+                'dense' (1, 2, 2, 3) or 'ordinal' (1, 2, 3, 4, following the original order)
+    Output:
+        ranks: a numpy array with the same shape than values, with the ranks (starting at 1), or NaN for NaN values
+    '''
+
+    if not (ties in TIE_POLICIES):
+        raise ValueError('Unknown tie policy {}. Use one of {}.'.format(ties, TIE_POLICIES))
+
+    values = np.asarray(values, dtype=float)
+    original_shape = values.shape
+    # work with a 2D matrix, ranking each row
+    values = values.reshape((-1, original_shape[-1]))
+    n_rows, n = values.shape
+
+    # sort in ascending order (NaNs are moved to the end). A stable sort keeps the original order of the ties
+    keys = -values if higher_is_better else values
+    order = np.argsort(keys, axis=1, kind='mergesort')
+    rows = np.arange(n_rows)[:, np.newaxis]
+    sorted_keys = keys[rows, order]
+
+    # identify the first and the last element of each group of tied values
+    positions = np.tile(np.arange(n), (n_rows, 1))
+    is_first = np.ones((n_rows, n), dtype=bool)
+    is_first[:, 1:] = sorted_keys[:, 1:] != sorted_keys[:, :-1]
+    is_last = np.ones((n_rows, n), dtype=bool)
+    is_last[:, :-1] = is_first[:, 1:]
+
+    # assign the ranks to the sorted values
+    if ties == 'ordinal':
+        sorted_ranks = positions + 1.0
+    elif ties == 'dense':
+        sorted_ranks = np.cumsum(is_first, axis=1).astype(float)
+    else:
+        first = np.maximum.accumulate(np.where(is_first, positions, 0), axis=1)
+        last = np.minimum.accumulate(np.where(is_last, positions, n - 1)[:, ::-1], axis=1)[:, ::-1]
+        if ties == 'min':
+            sorted_ranks = first + 1.0
+        elif ties == 'max':
+            sorted_ranks = last + 1.0
+        else:
+            sorted_ranks = (first + last) / 2.0 + 1.0
+
+    # move the ranks back to the original order (inverse permutation)
+    ranks = np.empty((n_rows, n))
+    ranks[rows, order] = sorted_ranks
+    ranks[np.isnan(values)] = np.nan
+
+    return ranks.reshape(original_shape)
+
+
+
+def sort_by_score(scores):
+    '''
+    Get the indices that sort the teams by score (lowest first), ignoring the teams with NaN scores.
+    Ties keep the original order of the teams, so the output is deterministic.
+
+    Input:
+        scores: a 1D numpy array with the scores
+    Output:
+        sorted_indices: a 1D numpy array of indices
+    '''
+
+    scores = np.asarray(scores, dtype=float)
+    sorted_indices = np.argsort(scores, kind='mergesort')
+
+    return sorted_indices[np.logical_not(np.isnan(scores[sorted_indices]))]
+
+
+
+def get_criterion_weights(criterion):
+    '''
+    Get the default weights of a criterion
+
+    Input:
+        criterion: a list of entries, as in SEGMENTATION_CRITERION
+    Output:
+        weights: a 1D numpy array with the weight of each entry
+    '''
+
+    return np.asarray([ entry['weight'] for entry in criterion ], dtype=float)
+
+
+
+def compile_criterion(criterion, metrics, ties='min'):
+    '''
+    Compile a declarative criterion into a vectorized scoring function
+
+    Input:
+        criterion: a list of entries, as in SEGMENTATION_CRITERION. Each entry has a weight and either a metric and
+                   a direction ('highest' or 'lowest' is the best), or a nested criterion
+        metrics: a list of the metrics in results, in the same order than the columns of results
+        [ties]: policy for tied values (see rank_values)
+    Output:
+        scorer: a function that receives the matrix of results and (optionally) the weights, and returns:
+            scores: the weighted sum of the ranks of each team (NaN for the teams that are not ranked). If weights
+                    is a 2D matrix (one weight vector per row), scores is a (weights x teams) matrix
+            ranks: a (entries x teams) matrix with the rank of each team for each entry
+        The results can also be a (... x teams x metrics) array (e.g. one matrix of results per bootstrap resample),
+        in which case the leading dimensions are kept in scores and ranks
+    '''
+
+    # compile the nested criteria and identify the columns of the metrics only once
+    compiled_entries = []
+    for entry in criterion:
+        if 'criterion' in entry:
+            compiled_entries = compiled_entries + [ (compile_criterion(entry['criterion'], metrics, ties), None, False) ]
+        else:
+            if not (entry['direction'] in ['highest', 'lowest']):
+                raise ValueError('Unknown direction {} for metric {}. Use highest or lowest.'.format(entry['direction'], entry['metric']))
+            compiled_entries = compiled_entries + [ (None, metrics.index(entry['metric']), entry['direction'] == 'highest') ]
+    default_weights = get_criterion_weights(criterion)
+
+    def scorer(results, weights=None):
+
+        # collect the metrics to rank
+        is_metric = np.asarray([ nested_scorer is None for nested_scorer, _, _ in compiled_entries ], dtype=bool)
+        values = np.full((len(compiled_entries),) + results.shape[:-1], np.nan)
+        for i in np.where(is_metric)[0]:
+            values[i,...] = results[...,compiled_entries[i][1]]
+        # only the teams with all the metrics are ranked
+        values[:, np.any(np.isnan(values[is_metric,...]), axis=0)] = np.nan
+
+        # rank the teams for each entry
+        ranks = np.zeros(values.shape)
+        for i in range(len(compiled_entries)):
+            nested_scorer, _, higher_is_better = compiled_entries[i]
+            if nested_scorer is None:
+                ranks[i,...] = rank_values(values[i,...], higher_is_better=higher_is_better, ties=ties)
+            else:
+                # nested criteria are ranked among all the teams they accept, as in their own leaderboards
+                ranks[i,...] = rank_values(nested_scorer(results)[0], higher_is_better=False, ties=ties)
+        # the score is only given to the teams ranked in every entry
+        ranks[:, np.any(np.isnan(ranks), axis=0)] = np.nan
+
+        # the score is a weighted sum of the ranks (the lowest, the best). It is rounded so that equal
+        # combinations of ranks are recognized as ties despite floating point errors
+        if weights is None:
+            weights = default_weights
+        weights = np.asarray(weights, dtype=float)
+        scores = np.round(np.tensordot(weights, ranks, axes=([weights.ndim - 1], [0])), 10)
+
+        return scores, ranks
+
+    return scorer
+
+
+
+def sample_criterion_weights(criterion, n_samples, concentration=None, seed=None):
+    '''
+    Draw random weight vectors for a criterion, with non-negative weights that sum up to 1
+
+    Input:
+        criterion: a list of entries, as in SEGMENTATION_CRITERION
+        n_samples: number of weight vectors
+        [concentration]: if provided, the weights are drawn from a Dirichlet distribution centered at the
+                         default weights, being more concentrated around them for higher values. Otherwise,
+                         they are drawn uniformly from all the possible weightings
+        [seed]: seed for the random number generator
+    Output:
+        weights: a (n_samples x entries) matrix of weights
+    '''
+
+    random_state = np.random.RandomState(seed)
+
+    if concentration is None:
+        alpha = np.ones(len(criterion))
+    else:
+        default_weights = get_criterion_weights(criterion)
+        alpha = concentration * default_weights / np.sum(default_weights)
+
+    return random_state.dirichlet(alpha, n_samples)
+
+
+
+def weight_sensitivity(criterion, metrics, results, weights, ties='min', batch_size=1000):
+    '''
+    Analyze how the ranking of a criterion changes under different weightings. All the weight vectors are
+    evaluated at once as a (weights x teams) matrix product, in batches to bound the memory usage.
+
+    Input:
+        criterion: a list of entries, as in SEGMENTATION_CRITERION
+        metrics: a list of the metrics in results, in the same order than the columns of results
+        results: a 2D numpy matrix with all the evaluation metrics
+        weights: a (n_weights x entries) matrix of weights, as retrieved by sample_criterion_weights
+        [ties]: policy for tied values (see rank_values)
+        [batch_size]: number of weight vectors evaluated at the same time
+    Output:
+        statistics: a (teams x 7) matrix with the rank of each team under the default weights and the mean,
+                    standard deviation, minimum and maximum rank under the given weights, the fraction of
+                    weightings that change the rank of the team, and the fraction in which the team is first
+        header: the names of the columns of statistics
+    '''
+
+    weights = np.asarray(weights, dtype=float)
+    n_weights = weights.shape[0]
+    scorer = compile_criterion(criterion, metrics, ties)
+
+    # rank with the default weights
+    default_scores, ranks = scorer(results)
+    default_ranks = rank_values(default_scores, higher_is_better=False, ties=ties)
+
+    # initialize the accumulators
+    rank_sum = np.zeros(len(default_ranks))
+    rank_squared_sum = np.zeros(len(default_ranks))
+    rank_min = np.full(len(default_ranks), np.inf)
+    rank_max = np.full(len(default_ranks), -np.inf)
+    n_changes = np.zeros(len(default_ranks))
+    n_first = np.zeros(len(default_ranks))
+
+    # the ranks of each entry don't depend on the weights, so each batch is just a matrix product
+    for i in range(0, n_weights, batch_size):
+        current_scores = np.round(np.dot(weights[i:i+batch_size,:], ranks), 10)
+        current_ranks = rank_values(current_scores, higher_is_better=False, ties=ties)
+        rank_sum = rank_sum + np.sum(current_ranks, axis=0)
+        rank_squared_sum = rank_squared_sum + np.sum(current_ranks ** 2, axis=0)
+        rank_min = np.minimum(rank_min, np.min(current_ranks, axis=0))
+        rank_max = np.maximum(rank_max, np.max(current_ranks, axis=0))
+        n_changes = n_changes + np.sum(current_ranks != default_ranks, axis=0)
+        n_first = n_first + np.sum(current_ranks == 1, axis=0)
+
+    # compute the statistics
+    statistics = np.zeros((len(default_ranks), 7))
+    statistics[:,0] = default_ranks
+    statistics[:,1] = rank_sum / n_weights
+    statistics[:,2] = np.sqrt(np.maximum(rank_squared_sum / n_weights - statistics[:,1] ** 2, 0))
+    statistics[:,3] = rank_min
+    statistics[:,4] = rank_max
+    statistics[:,5] = n_changes / n_weights
+    statistics[:,6] = n_first / n_weights
+    # the teams that are not ranked get NaN statistics
+    statistics[np.isnan(default_ranks),:] = np.nan
+
+    return statistics, ['Rank', 'Mean rank', 'Std rank', 'Min rank', 'Max rank', 'Fraction of rank changes', 'Fraction ranked first']
+
+
+
+def segmentation_scores(metrics, results, ties='min'):
+    '''
+    Compute the segmentation score of each team, without sorting them
+
+    Input:
+        metrics: a list of the metrics in results, in the same order than the columns of results
+        results: a 2D numpy matrix with all the evaluation metrics
+        [ties]: policy for tied values (see rank_values)
+    Output:
+        scores: a 1D numpy array with the weighted sum of the ranks (NaN for the teams without segmentation results)
+        ranking_for_optic_cup: a 1D numpy array with the ranks for the optic cup Dice
+        ranking_for_optic_disc: a 1D numpy array with the ranks for the optic disc Dice
+        ranking_for_cup_to_disc_ratio: a 1D numpy array with the ranks for the cup to disc ratio error
+    '''
+
+    # rank the teams according to the segmentation criterion
+    scores, ranks = compile_criterion(SEGMENTATION_CRITERION, metrics, ties)(results)
+    ranking_for_optic_cup, ranking_for_optic_disc, ranking_for_cup_to_disc_ratio = ranks[0,:], ranks[1,:], ranks[2,:]
+
+    return scores, ranking_for_optic_cup, ranking_for_optic_disc, ranking_for_cup_to_disc_ratio
+
+
+
+def segmentation_leaderboard(metrics, teams, results, ties='min'):
     '''
     Sort the teams according to the segmentation leaderboard criterion
 
@@ -10,66 +302,37 @@ def segmentation_leaderboard(metrics, teams, results):
         metrics: a list of the metrics in results, in the same order than the columns of results
         teams: a list of strings with the names of the teams participating
         results: a 2D numpy matrix with all the evaluation metrics
+        [ties]: policy for tied values (see rank_values)
     Output:
         teams: the list of the teams, but sorted
         scores: a numpy matrix with 4 columns: overall segmentation score, ranking for optic cup, ranking for optic disc and ranking for cup to disc ratio
         header: the names for the 4 columns
     '''
 
-    # identify indices of elements with NaNs
-    idx = np.where(np.logical_not(np.isnan(results[:,metrics.index('Mean optic cup Dice')])))[0]
-    # delete them from teams
-    teams = np.asarray(teams)[idx]
-    # delete rows
-    results = results[idx,:]
-
-    # rank for each segmentation metric
-    ranking_for_optic_cup, optic_cup_dice = best_is_highest(metrics, results, 'Mean optic cup Dice')
-    ranking_for_optic_disc, optic_disc_dice = best_is_highest(metrics, results, 'Mean optic disc Dice')
-    ranking_for_cup_to_disc_ratio, cdr = best_is_lowest(metrics, results, 'MAE cup to disc ratio')
-
-    # sum all the rankings and rank as the best the one with the highest sum
-    scores = np.zeros(len(teams))
-    scores_optic_cup = np.zeros(len(teams))
-    scores_optic_disc = np.zeros(len(teams))
-    scores_cup_to_disc_ratio = np.zeros(len(teams))
-    for i in range(0, len(teams)):
-        scores_optic_cup[i] = ranking_for_optic_cup.index(i)
-        scores_optic_disc[i] = ranking_for_optic_disc.index(i)
-        scores_cup_to_disc_ratio[i] = ranking_for_cup_to_disc_ratio.index(i) 
-    scores = 0.35 * scores_optic_cup + 0.25 * scores_optic_disc + 0.4 * scores_cup_to_disc_ratio
-    
-    # sort them
-    sorted_indices = list((np.argsort(scores.tolist())))
-
-    # sort everything
-    teams = np.asarray(teams, dtype=np.str)[sorted_indices].tolist()
-
-    scores = np.asarray(scores)[sorted_indices]
-
-    scores_optic_cup = np.asarray(scores_optic_cup)[sorted_indices]
-    scores_optic_disc = np.asarray(scores_optic_disc)[sorted_indices]
-    scores_cup_to_disc_ratio = np.asarray(scores_cup_to_disc_ratio)[sorted_indices]
+    # compute the scores and the ranks of each metric
+    scores, scores_optic_cup, scores_optic_disc, scores_cup_to_disc_ratio = segmentation_scores(metrics, results, ties)
 
-    sorted_optic_cup_dice = np.asarray(get_metric(metrics, results, 'Mean optic cup Dice'))[sorted_indices]
-    sorted_optic_disc_dice = np.asarray(get_metric(metrics, results, 'Mean optic disc Dice'))[sorted_indices]
-    sorted_cdr = np.asarray(get_metric(metrics, results, 'MAE cup to disc ratio'))[sorted_indices]
+    # sort them, removing the teams without segmentation results
+    sorted_indices = sort_by_score(scores)
 
     # join all the scores in a single matrix
-    all_scores = np.zeros( (len(teams), 7) )
-    all_scores[:,0] = scores+1
-    all_scores[:,1] = scores_optic_cup+1
-    all_scores[:,2] = scores_optic_disc+1
-    all_scores[:,3] = scores_cup_to_disc_ratio+1
-    all_scores[:,4] = sorted_optic_cup_dice
-    all_scores[:,5] = sorted_optic_disc_dice
-    all_scores[:,6] = sorted_cdr
+    all_scores = np.zeros( (len(sorted_indices), 7) )
+    all_scores[:,0] = scores[sorted_indices]
+    all_scores[:,1] = scores_optic_cup[sorted_indices]
+    all_scores[:,2] = scores_optic_disc[sorted_indices]
+    all_scores[:,3] = scores_cup_to_disc_ratio[sorted_indices]
+    all_scores[:,4] = get_metric(metrics, results, 'Mean optic cup Dice')[sorted_indices]
+    all_scores[:,5] = get_metric(metrics, results, 'Mean optic disc Dice')[sorted_indices]
+    all_scores[:,6] = get_metric(metrics, results, 'MAE cup to disc ratio')[sorted_indices]
+
+    # sort the teams
+    teams = [ teams[i] for i in sorted_indices ]
 
     return teams, all_scores, ['Team', 'Score', 'Optic cup rank', 'Optic disc rank', 'CDR rank', 'Mean optic cup Dice', 'Mean optic disc Dice', 'MAE cup to disc ratio']
 
 
 
-def classification_leaderboard(metrics, teams, results):
+def classification_leaderboard(metrics, teams, results, ties='min'):
     '''
     Sort the teams according to the classification leaderboard criterion (highest AUC)
 
@@ -77,36 +340,29 @@ def classification_leaderboard(metrics, teams, results):
         metrics: a list of the metrics in results, in the same order than the columns of results
         teams: a list of strings with the names of the teams participating
         results: a 2D numpy matrix with all the evaluation metrics
+        [ties]: policy for tied values (see rank_values)
     Output:
         teams: the list of the teams, but sorted
         scores: a numpy array with the AUC values sorted in descending order
         header: the names for the 2 columns
     '''
 
-    # identify indices of elements with NaNs
-    idx = np.where(np.logical_not(np.isnan(results[:,metrics.index('AUC')])))[0]
-    # delete them from teams
-    teams = np.asarray(teams)[idx]
-    # delete rows
-    results = results[idx,:]
+    # score the teams according to the classification criterion, removing the teams without classification results
+    scores, _ = compile_criterion(CLASSIFICATION_CRITERION, metrics, ties)(results)
+    sorted_indices = sort_by_score(scores)
 
-    # rank for the auc
-    sorted_indices, scores = best_is_highest(metrics, results, 'AUC')
+    all_scores = np.zeros( (len(sorted_indices), 2) )
+    all_scores[:,0] = get_metric(metrics, results, 'AUC')[sorted_indices]
+    all_scores[:,1] = get_metric(metrics, results, 'Reference Sensitivity')[sorted_indices]
 
-    # sort everything
-    teams = np.asarray(teams, dtype=np.str)[sorted_indices].tolist()
-
-    reference_sensitivity = np.asarray(results[:, metrics.index('Reference Sensitivity')])[sorted_indices]
-
-    all_scores = np.zeros( (len(teams), 2) )
-    all_scores[:,0] = scores
-    all_scores[:,1] = reference_sensitivity
+    # sort the teams
+    teams = [ teams[i] for i in sorted_indices ]
 
     return teams, all_scores, ['Team', 'AUC', 'Reference Sensitivity']
 
 
 
-def fovea_location_leaderboard(metrics, teams, results):
+def fovea_location_leaderboard(metrics, teams, results, ties='min'):
     '''
     Sort the teams according to the fovea location leaderboard criterion (lowest distance)
 
@@ -114,30 +370,27 @@ def fovea_location_leaderboard(metrics, teams, results):
         metrics: a list of the metrics in results, in the same order than the columns of results
         teams: a list of strings with the names of the teams participating
         results: a 2D numpy matrix with all the evaluation metrics
+        [ties]: policy for tied values (see rank_values)
     Output:
         teams: the list of the teams, but sorted
         scores: a numpy array with the Euclidean distances to the gt fovea sorted in descending order
         header: the names for the 2 columns
     '''
 
-    # identify indices of elements with NaNs
-    idx = np.where(np.logical_not(np.isnan(results[:,metrics.index('Mean Euclidean distance')])))[0]
-    # delete them from teams
-    teams = np.asarray(teams)[idx]
-    # delete rows
-    results = results[idx,:]
+    # score the teams according to the fovea location criterion, removing the teams without fovea location results
+    criterion_scores, _ = compile_criterion(FOVEA_LOCATION_CRITERION, metrics, ties)(results)
+    sorted_indices = sort_by_score(criterion_scores)
 
-    # rank for the auc
-    sorted_indices, scores = best_is_lowest(metrics, results, 'Mean Euclidean distance')
+    scores = get_metric(metrics, results, 'Mean Euclidean distance')[sorted_indices]
 
-    # sort everything
-    teams = np.asarray(teams, dtype=np.str)[sorted_indices].tolist()
+    # sort the teams
+    teams = [ teams[i] for i in sorted_indices ]
 
     return teams, scores, ['Team', 'Mean Euclidean distance']
 
 
 
-def final_leaderboard(metrics, teams, results):
+def final_leaderboard(metrics, teams, results, ties='min'):
     '''
     Sort the teams for the final leaderboard
 
@@ -145,59 +398,121 @@ def final_leaderboard(metrics, teams, results):
         metrics: a list of the metrics in results, in the same order than the columns of results
         teams: a list of strings with the names of the teams participating
         results: a 2D numpy matrix with all the evaluation metrics
+        [ties]: policy for tied values (see rank_values)
     Output:
         teams: the list of the teams, but sorted
         scores: a numpy array with the scores
         header: the names for the 2 columns
     '''
 
-    # get the ranks for segmentation and classification
-    teams_segmentation, _, _ = segmentation_leaderboard(metrics, teams, results)
-    scores_segmentation = list(range(1, len(teams_segmentation)+1))
-    teams_classification, _, _ = classification_leaderboard(metrics, teams, results)
-    scores_classification = list(range(1, len(teams_classification)+1))
-
-    # check if the size is different
-    if not ( len(teams_segmentation) == len(teams_classification) ):
-        # remove those that didn't participated in everything
-        if len(teams_segmentation) < len(teams_classification):
-            to_remove = list(set(teams_classification) - set(teams_segmentation))
-            for i in range(len(to_remove)):
-                idx = teams_classification.index(to_remove[i])
-                del teams_classification[idx]
-                del scores_classification[idx]
-            teams = teams_segmentation
-        else:
-            to_remove = list(set(teams_segmentation) - set(teams_classification))
-            for i in range(len(to_remove)):
-                idx = teams_segmentation.index(to_remove[i])
-                del teams_segmentation[idx]
-                del scores_segmentation[idx]
-            teams = teams_classification
-
-    scores_segmentation = np.asarray(scores_segmentation)
-    scores_classification = np.asarray(scores_classification)
-
-    # compute the scores
-    scores = np.zeros(len(teams))
-    for i in range(len(teams)):
-        idx_segm = teams_segmentation.index(teams[i])
-        idx_class = teams_classification.index(teams[i])
-        scores[i] = 0.6 * scores_segmentation[idx_segm] + 0.4 * scores_classification[idx_class]
+    # compute the scores from the ranks for segmentation and classification (NaN for those that didn't participate in everything)
+    scores, ranks = compile_criterion(FINAL_CRITERION, metrics, ties)(results)
+    scores_segmentation, scores_classification = ranks[0,:], ranks[1,:]
     # sort the scores in ascending order
-    sorted_indices = list((np.argsort(scores.tolist())))
-    # sort everything
-    teams = np.asarray(teams, dtype=np.str)[sorted_indices].tolist()
-    final_scores = np.zeros((len(teams),3))
+    sorted_indices = sort_by_score(scores)
+
+    final_scores = np.zeros((len(sorted_indices),3))
     final_scores[:,0] = scores[sorted_indices]
-    for i in range(len(teams)):
-        final_scores[i,1] = scores_segmentation[teams_segmentation.index(teams[i])]
-        final_scores[i,2] = scores_classification[teams_classification.index(teams[i])]
-        
+    final_scores[:,1] = scores_segmentation[sorted_indices]
+    final_scores[:,2] = scores_classification[sorted_indices]
+
+    # sort the teams
+    teams = [ teams[i] for i in sorted_indices ]
+
     return teams, final_scores, ['Team', 'Scores', 'Segmentation rank', 'Classification rank']
 
 
 
+# leaderboards that can be generated, in the order in which they are generated by default
+LEADERBOARD_NAMES = ['segmentation', 'classification', 'fovea_location', 'final']
+LEADERBOARDS = { 'segmentation': segmentation_leaderboard, 'classification': classification_leaderboard,
+                 'fovea_location': fovea_location_leaderboard, 'final': final_leaderboard }
+
+# policies to choose the submission of each team that appears in a leaderboard
+SELECTION_POLICIES = ['best', 'latest']
+
+
+
+def select_team_submissions(scores, team_indices, n_teams, policy='best', order=None):
+    '''
+    Choose one submission per team, with a single sort of all the submissions
+
+    Input:
+        scores: a 1D numpy array with the score of each submission (lowest is best, NaN if it can't be ranked)
+        team_indices: a 1D numpy array with the index of the team of each submission
+        n_teams: number of teams
+        [policy]: 'best' to choose the submission with the lowest score, or 'latest' to choose the last one
+                  (according to order) among the submissions with a valid score
+        [order]: a 1D numpy array with the submission order (higher is later). If not provided, the position
+                 of each submission is used. It also breaks the ties between the best submissions, in favor of the earliest one
+    Output:
+        selected: a 1D numpy array with the index of the chosen submission of each team (-1 if it has no valid submission)
+    '''
+
+    scores = np.asarray(scores, dtype=float)
+    team_indices = np.asarray(team_indices, dtype=int)
+    if order is None:
+        order = np.arange(len(scores))
+    order = np.asarray(order, dtype=float)
+
+    # only the submissions with a valid score can be chosen
+    valid_indices = np.nonzero(np.logical_not(np.isnan(scores)))[0]
+
+    # sort by team and then by preference (np.lexsort uses the last key as the primary one)
+    if policy == 'best':
+        sorted_indices = valid_indices[np.lexsort((order[valid_indices], scores[valid_indices], team_indices[valid_indices]))]
+    elif policy == 'latest':
+        sorted_indices = valid_indices[np.lexsort((-order[valid_indices], team_indices[valid_indices]))]
+    else:
+        raise ValueError('Unknown selection policy "{}". Use one of {}'.format(policy, SELECTION_POLICIES))
+
+    # the first submission of each team is the chosen one
+    sorted_teams = team_indices[sorted_indices]
+    is_first = np.ones(len(sorted_teams), dtype=bool)
+    is_first[1:] = sorted_teams[1:] != sorted_teams[:-1]
+
+    selected = np.full(n_teams, -1, dtype=int)
+    selected[sorted_teams[is_first]] = sorted_indices[is_first]
+
+    return selected
+
+
+
+def team_leaderboard(leaderboard_name, metrics, results, team_names, team_indices, policy='best', order=None, ties='min'):
+    '''
+    Generate a leaderboard with one submission per team. The submissions are scored all together to choose
+    the best (or latest) one of each team, and then the chosen ones are ranked by the leaderboard criterion
+
+    Input:
+        leaderboard_name: name of the leaderboard (a key of LEADERBOARDS and CRITERIA)
+        metrics: a list of the metrics in results, in the same order than the columns of results
+        results: a (submissions x metrics) numpy matrix with all the evaluation metrics
+        team_names: a list of strings with the names of the teams
+        team_indices: a 1D numpy array with the index (in team_names) of the team of each submission
+        [policy]: policy to choose the submission of each team (see select_team_submissions)
+        [order]: a 1D numpy array with the submission order (higher is later)
+        [ties]: policy for tied values (see rank_values)
+    Output:
+        teams: the list of the teams, but sorted
+        scores: a numpy matrix with the columns of the leaderboard
+        header: the names of the columns
+        selected: a 1D numpy array with the index of the chosen submission of each team (-1 if none)
+    '''
+
+    # score all the submissions with the criterion of the leaderboard
+    scores, _ = compile_criterion(CRITERIA[leaderboard_name], metrics, ties)(results)
+
+    # choose a submission per team
+    selected = select_team_submissions(scores, team_indices, len(team_names), policy, order)
+    teams_with_submissions = np.nonzero(selected >= 0)[0]
+
+    # rank the chosen submissions
+    teams, scores, header = LEADERBOARDS[leaderboard_name](metrics, [ team_names[i] for i in teams_with_submissions ], results[selected[teams_with_submissions],:], ties=ties)
+
+    return teams, scores, header, selected
+
+
+
 def get_metric(metrics, results, selected_metric):
     '''
     Retrieve the selected metric from a table of results
@@ -0,0 +1,224 @@
+
+import os
+import numpy as np
+
+from os import path
+
+from util.file_management import read_csv_table
+
+
+# tables with the results per image of each task, as saved in the folder of each team, and their fields
+PER_IMAGE_TABLES = {
+    'segmentation': ('evaluation_table_segmentation.csv', ['Cup-Dice', 'Disc-Dice', 'AE-CDR']),
+    'classification': ('evaluation_table_classification.csv', ['Score', 'Label']),
+    'fovea_location': ('evaluation_table_fovea_location.csv', ['Euclidean distance']),
+}
+
+
+def get_image_key(image_filename):
+    '''
+    Get a key to identify an image regardless of the extension and the capitalization of its name
+    (e.g. the segmentation tables use .bmp names while the classification tables use .jpg names)
+
+    Input:
+        image_filename: name of the image
+    Output:
+        key: the name of the image in upper case and without extension
+    '''
+
+    return path.splitext(image_filename)[0].upper()
+
+
+
+def load_per_image_results(uncompressed_files_folder, teams, cache_folder=None):
+    '''
+    Load the results per image of all the teams into (teams x images x fields) arrays
+
+    Input:
+        uncompressed_files_folder: folder with a subfolder per team, as generated by evaluate_multiple_submissions
+        teams: a list of strings with the names of the teams
+        [cache_folder]: a folder where a binary copy of the arrays is kept (see save_per_image_cache). If it is up to date,
+                        the arrays are memory-mapped instead of parsing the tables of all the teams. Otherwise, it is updated
+    Output:
+        per_image_results: a dictionary with an entry per task (segmentation, classification, fovea_location), each of them
+                           a dictionary with the following fields:
+            images: a sorted list with the keys of the images (see get_image_key)
+            fields: a list with the names of the fields
+            values: a (teams x images x fields) numpy array, with NaN for the images without results
+    '''
+
+    # use the binary copy if it is up to date (the tables are identified before parsing them, so a table that changes
+    # in the meantime invalidates the next copy)
+    if not (cache_folder is None):
+        table_stamps = get_per_image_table_stamps(uncompressed_files_folder, teams)
+        per_image_results = read_per_image_cache(cache_folder, uncompressed_files_folder, teams, table_stamps)
+        if not (per_image_results is None):
+            return per_image_results
+
+    per_image_results = dict()
+
+    for task in sorted(PER_IMAGE_TABLES.keys()):
+        table_filename, fields = PER_IMAGE_TABLES[task]
+
+        # read the tables of all the teams
+        tables = [ None ] * len(teams)
+        for i in range(len(teams)):
+            current_filename = path.join(uncompressed_files_folder, teams[i], table_filename)
+            if path.exists(current_filename):
+                header, image_filenames, values = read_csv_table(current_filename)
+                tables[i] = ([ get_image_key(filename) for filename in image_filenames ], values[:, [ header.index(field) for field in fields ]])
+
+        # collect the images with results from any of the teams
+        images = sorted(set([ key for table in tables if not (table is None) for key in table[0] ]))
+        image_indices = dict(zip(images, range(len(images))))
+
+        # fill the array of values
+        values = np.full((len(teams), len(images), len(fields)), np.nan)
+        for i in range(len(teams)):
+            if not (tables[i] is None):
+                values[i, [ image_indices[key] for key in tables[i][0] ], :] = tables[i][1]
+
+        per_image_results[task] = { 'images': images, 'fields': fields, 'values': values }
+
+    # update the binary copy (it is only a cache, so it doesn't matter if it can't be written)
+    if not (cache_folder is None):
+        try:
+            save_per_image_cache(cache_folder, per_image_results, teams, uncompressed_files_folder, table_stamps)
+        except (IOError, OSError):
+            pass
+
+    return per_image_results
+
+
+
+def get_per_image_table_stamps(uncompressed_files_folder, teams):
+    '''
+    Identify the version of the tables of results per image of all the teams, to check if a binary copy is up to date
+
+    Input:
+        uncompressed_files_folder: folder with a subfolder per team, as generated by evaluate_multiple_submissions
+        teams: a list of strings with the names of the teams
+    Output:
+        table_filenames: a list with the full path of the table of each team and task
+        stamps: a (tables x 2) numpy array with the modification time (in nanoseconds) and the size of each table (-1 if it does not exist)
+    '''
+
+    table_filenames = [ path.join(uncompressed_files_folder, team, PER_IMAGE_TABLES[task][0]) for team in teams for task in sorted(PER_IMAGE_TABLES.keys()) ]
+    stamps = np.full((len(table_filenames), 2), -1, dtype=np.int64)
+    for i in range(len(table_filenames)):
+        if path.exists(table_filenames[i]):
+            table_stat = os.stat(table_filenames[i])
+            stamps[i,:] = [ table_stat.st_mtime_ns, table_stat.st_size ]
+
+    return table_filenames, stamps
+
+
+
+def get_per_image_cache_filenames(cache_folder):
+    '''
+    Get the filenames of the binary copy of the results per image
+
+    Input:
+        cache_folder: the folder with the binary copy
+    Output:
+        index_filename: filename of the .npz file with the names of the teams, the images and the fields
+        values_filenames: a dictionary mapping each task to the filename of the .npy file with its values
+    '''
+
+    values_filenames = dict([ (task, path.join(cache_folder, 'per_image_' + task + '.npy')) for task in PER_IMAGE_TABLES.keys() ])
+
+    return path.join(cache_folder, 'per_image_index.npz'), values_filenames
+
+
+
+def save_per_image_cache(cache_folder, per_image_results, teams, uncompressed_files_folder, table_stamps):
+    '''
+    Save a binary copy of the results per image, with a .npy file per task that can be memory-mapped. The index keeps
+    the folder and the version of every table the copy was built from
+
+    Input:
+        cache_folder: the folder where the binary copy is saved
+        per_image_results: the results per image, as retrieved by load_per_image_results
+        teams: a list of strings with the names of the teams
+        uncompressed_files_folder: folder with the tables the results were read from
+        table_stamps: the version of the tables when they were read, as retrieved by get_per_image_table_stamps
+    '''
+
+    if not path.exists(cache_folder):
+        os.makedirs(cache_folder)
+    index_filename, values_filenames = get_per_image_cache_filenames(cache_folder)
+
+    # write in temporary files first, so the readers never find a partial file
+    index = { 'teams': np.asarray(teams, dtype=str), 'folder': np.asarray(path.abspath(uncompressed_files_folder), dtype=str),
+              'tables': np.asarray(table_stamps[0], dtype=str), 'stamps': table_stamps[1] }
+    for task in per_image_results.keys():
+        temporary_filename = values_filenames[task] + '.tmp.npy'
+        np.save(temporary_filename, per_image_results[task]['values'])
+        os.replace(temporary_filename, values_filenames[task])
+        index[task + '_images'] = np.asarray(per_image_results[task]['images'], dtype=str)
+    # the index is written last, since it validates the whole copy
+    temporary_filename = index_filename + '.tmp.npz'
+    np.savez(temporary_filename, **index)
+    os.replace(temporary_filename, index_filename)
+
+
+
+def read_per_image_cache(cache_folder, uncompressed_files_folder, teams, table_stamps=None):
+    '''
+    Read the binary copy of the results per image, if it is up to date: it has the same teams, it was built from the
+    same folder, and the modification time and the size of every table (including the missing ones) did not change
+
+    Input:
+        cache_folder: the folder with the binary copy
+        uncompressed_files_folder: folder with a subfolder per team, as generated by evaluate_multiple_submissions
+        teams: a list of strings with the names of the teams
+        [table_stamps]: the current version of the tables (see get_per_image_table_stamps). If not provided, it is read here
+    Output:
+        per_image_results: the results per image (see load_per_image_results), with the values memory-mapped, or None if the
+                           binary copy is missing or outdated
+    '''
+
+    index_filename, values_filenames = get_per_image_cache_filenames(cache_folder)
+    if not path.exists(index_filename) or not all([ path.exists(filename) for filename in values_filenames.values() ]):
+        return None
+
+    if table_stamps is None:
+        table_stamps = get_per_image_table_stamps(uncompressed_files_folder, teams)
+
+    with np.load(index_filename, allow_pickle=False) as index:
+        # the copies saved without the version of the tables are outdated
+        if not all([ key in index.files for key in ['teams', 'folder', 'tables', 'stamps'] ]):
+            return None
+        # check that the copy was built from the same tables, and that none of them changed
+        if index['teams'].tolist() != list(teams) or str(index['folder']) != path.abspath(uncompressed_files_folder):
+            return None
+        if index['tables'].tolist() != list(table_stamps[0]) or not np.array_equal(index['stamps'], table_stamps[1]):
+            return None
+        per_image_results = dict()
+        for task in sorted(PER_IMAGE_TABLES.keys()):
+            values = np.load(values_filenames[task], mmap_mode='r')
+            per_image_results[task] = { 'images': index[task + '_images'].tolist(), 'fields': PER_IMAGE_TABLES[task][1], 'values': values }
+
+    return per_image_results
+
+
+
+def get_classification_labels(per_image_results):
+    '''
+    Get the gt label of each image of the classification task, which is the same in the tables of all the teams
+
+    Input:
+        per_image_results: the results per image, as retrieved by load_per_image_results
+    Output:
+        labels: a 1D numpy array with the gt label of each image (0: healthy, 1: glaucomatous, NaN if no team has results for it)
+    '''
+
+    classification_results = per_image_results['classification']
+    labels = classification_results['values'][:, :, classification_results['fields'].index('Label')]
+
+    # take the label from any team with results for each image
+    is_known = np.logical_not(np.isnan(labels))
+    first_known = np.argmax(is_known, axis=0)
+    known_labels = labels[first_known, np.arange(labels.shape[1])] if labels.shape[0] > 0 else np.full(labels.shape[1], np.nan)
+
+    return np.where(np.any(is_known, axis=0), known_labels, np.nan)
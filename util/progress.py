@@ -0,0 +1,174 @@
+
+import json
+import math
+import time
+
+import numpy as np
+
+
+def create_progress_stream(filename=None, callback=None, min_interval=1.0, **context):
+    '''
+    Create a stream of progress events. Each event is a dictionary, that is appended as a JSON line to a file
+    (so several processes can write to the same file) and/or passed to a callback
+
+    Input:
+        [filename]: full path and filename of the JSON lines file. If not provided, the events are not saved
+        [callback]: a function that receives each event. If not provided, the events are not passed to any function
+        [min_interval]: minimum time (in seconds) between two consecutive events of progress of the same task
+        [context]: fields added to all the events (e.g. team='BestTeam')
+    Output:
+        stream: a dictionary with the state of the stream, or None if there is no filename nor callback
+    '''
+
+    if filename is None and callback is None:
+        return None
+
+    return { 'filename': filename, 'callback': callback, 'min_interval': min_interval, 'context': context, 'tasks': dict() }
+
+
+
+def get_json_value(value):
+    '''
+    Convert a value to a type that can be saved in a JSON file (NaN and infinite values are saved as null)
+
+    Input:
+        value: a number, a string, a numpy array or a list
+    Output:
+        json_value: the converted value
+    '''
+
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [ get_json_value(element) for element in value ]
+    if isinstance(value, (np.integer, np.floating, np.bool_)):
+        value = value.item()
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+
+    return value
+
+
+
+def emit_event(stream, event, **fields):
+    '''
+    Emit an event in a progress stream
+
+    Input:
+        stream: a stream, as retrieved by create_progress_stream (if None, nothing is done)
+        event: the type of event (e.g. 'progress', 'task_done', 'submission_done')
+        [fields]: the fields of the event
+    '''
+
+    if stream is None:
+        return
+
+    # collect the fields of the event
+    record = dict(stream['context'])
+    record.update(fields)
+    record['event'] = event
+    record['time'] = time.time()
+    record = dict([ (key, get_json_value(record[key])) for key in record.keys() ])
+
+    # a single write per event, so the lines of different processes don't get mixed
+    if not (stream['filename'] is None):
+        with open(stream['filename'], 'a') as stream_file:
+            stream_file.write(json.dumps(record, sort_keys=True) + '\n')
+    if not (stream['callback'] is None):
+        stream['callback'](record)
+
+
+
+def create_running_means(n_values):
+    '''
+    Create an online accumulator of mean values, that ignores the NaN values
+
+    Input:
+        n_values: number of values accumulated at each update
+    Output:
+        accumulator: a dictionary with the number of values and the mean of each of them
+    '''
+
+    return { 'counts': np.zeros(n_values), 'means': np.zeros(n_values) }
+
+
+
+def update_running_means(accumulator, values):
+    '''
+    Add new values to an online accumulator of mean values
+
+    Input:
+        accumulator: an accumulator, as retrieved by create_running_means
+        values: a list or a 1D numpy array with a value for each mean
+    Output:
+        means: a 1D numpy array with the current means (NaN if no value was accumulated yet)
+    '''
+
+    values = np.asarray(values, dtype=float)
+    is_valid = np.logical_not(np.isnan(values))
+
+    # incremental update of the means, which doesn't need to keep the past values
+    accumulator['counts'][is_valid] += 1
+    accumulator['means'][is_valid] += (values[is_valid] - accumulator['means'][is_valid]) / accumulator['counts'][is_valid]
+
+    return np.where(accumulator['counts'] > 0, accumulator['means'], np.nan)
+
+
+
+def start_task_progress(stream, task, n_items, value_names):
+    '''
+    Start tracking the progress of a task that processes several items (e.g. the images of a submission)
+
+    Input:
+        stream: a stream, as retrieved by create_progress_stream (if None, nothing is done)
+        task: name of the task
+        n_items: number of items to process
+        value_names: names of the values reported for each item, whose running means are included in the events
+    '''
+
+    if stream is None:
+        return
+
+    stream['tasks'][task] = { 'n_items': n_items, 'value_names': value_names, 'start_time': time.time(), 'last_time': None,
+                              'accumulator': create_running_means(len(value_names)) }
+    emit_event(stream, 'task_started', task=task, n_items=n_items)
+
+
+
+def report_item_progress(stream, task, item, index, values):
+    '''
+    Report that an item of a task was processed. The running means are always updated, but the events are emitted
+    at most every min_interval seconds (and always for the last item)
+
+    Input:
+        stream: a stream, as retrieved by create_progress_stream (if None, nothing is done)
+        task: name of the task, as given to start_task_progress
+        item: name of the item (e.g. the filename of the image)
+        index: position of the item (starting at 0)
+        values: a list with the values of the item, in the same order than value_names
+    '''
+
+    if stream is None:
+        return
+
+    progress = stream['tasks'][task]
+    means = update_running_means(progress['accumulator'], values)
+
+    # throttle the events
+    current_time = time.time()
+    is_last = index + 1 >= progress['n_items']
+    if not is_last and not (progress['last_time'] is None) and current_time - progress['last_time'] < stream['min_interval']:
+        return
+    progress['last_time'] = current_time
+
+    # speed and remaining time
+    elapsed_time = current_time - progress['start_time']
+    items_per_second = (index + 1) / elapsed_time if elapsed_time > 0 else np.nan
+    eta_seconds = (progress['n_items'] - index - 1) / items_per_second if items_per_second > 0 else np.nan
+
+    fields = { 'task': task, 'item': item, 'index': index, 'n_items': progress['n_items'],
+               'items_per_second': items_per_second, 'eta_seconds': eta_seconds }
+    for j in range(len(progress['value_names'])):
+        fields[progress['value_names'][j]] = values[j]
+        fields['Mean ' + progress['value_names'][j]] = means[j]
+    emit_event(stream, 'progress', **fields)
@@ -0,0 +1,233 @@
+
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+from util.leaderboard_criteria import compile_criterion, rank_values
+from util.per_image_results import get_classification_labels
+
+
+# columns of the table of results that can be recomputed from the results per image, with their task and field
+PER_IMAGE_METRICS = {
+    'Mean optic cup Dice': ('segmentation', 'Cup-Dice'),
+    'Mean optic disc Dice': ('segmentation', 'Disc-Dice'),
+    'MAE cup to disc ratio': ('segmentation', 'AE-CDR'),
+    'AUC': ('classification', 'Score'),
+    'Mean Euclidean distance': ('fovea_location', 'Euclidean distance'),
+}
+
+
+def draw_bootstrap_counts(n_images, n_resamples, random_state):
+    '''
+    Draw bootstrap resamples of the images, represented by the number of times that each image is drawn
+
+    Input:
+        n_images: number of images
+        n_resamples: number of resamples
+        random_state: a numpy RandomState
+    Output:
+        counts: a (resamples x images) matrix with the number of times that each image appears in each resample
+    '''
+
+    # draw the indices of the images of each resample
+    indices = random_state.randint(0, n_images, (n_resamples, n_images))
+    # count them with a single bincount, shifting the indices of each resample
+    offsets = np.arange(n_resamples)[:, np.newaxis] * n_images
+    counts = np.bincount((indices + offsets).ravel(), minlength=n_resamples * n_images)
+
+    return counts.reshape((n_resamples, n_images)).astype(float)
+
+
+
+def bootstrap_means(counts, values):
+    '''
+    Compute the mean value of each team on each resample, ignoring the images without results
+
+    Input:
+        counts: a (resamples x images) matrix, as retrieved by draw_bootstrap_counts
+        values: a (teams x images) matrix with the results per image (NaN for the images without results)
+    Output:
+        means: a (resamples x teams) matrix with the mean values
+    '''
+
+    is_valid = np.logical_not(np.isnan(values))
+
+    # weighted sums as matrix products
+    sums = np.dot(counts, np.where(is_valid, values, 0).T)
+    n_values = np.dot(counts, is_valid.T.astype(float))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / n_values
+    means[n_values == 0] = np.nan
+
+    return means
+
+
+
+def bootstrap_auc(counts, scores, labels):
+    '''
+    Compute the area under the ROC curve of each team on each resample. The AUC is computed as the Mann-Whitney
+    statistic, sorting the scores of each team only once and weighting each image by its count in the resample.
+
+    Input:
+        counts: a (resamples x images) matrix, as retrieved by draw_bootstrap_counts
+        scores: a (teams x images) matrix with the predicted scores (NaN for the images without results)
+        labels: a 1D numpy array with the gt label of each image (0: healthy, 1: glaucomatous)
+    Output:
+        aucs: a (resamples x teams) matrix with the AUC values
+    '''
+
+    aucs = np.full((counts.shape[0], scores.shape[0]), np.nan)
+
+    for i in range(scores.shape[0]):
+
+        # use only the images with results
+        is_valid = np.logical_and(np.logical_not(np.isnan(scores[i,:])), np.logical_not(np.isnan(labels)))
+        if not np.any(is_valid):
+            continue
+
+        # sort the scores and group the tied ones
+        order = np.argsort(scores[i, is_valid], kind='mergesort')
+        sorted_scores = scores[i, is_valid][order]
+        sorted_labels = labels[is_valid][order] > 0
+        sorted_counts = counts[:, is_valid][:, order]
+        group_starts = np.concatenate(([0], np.nonzero(np.diff(sorted_scores))[0] + 1))
+
+        # number of positive and negative samples with each score, on each resample
+        positives = np.add.reduceat(sorted_counts * sorted_labels, group_starts, axis=1)
+        negatives = np.add.reduceat(sorted_counts * np.logical_not(sorted_labels), group_starts, axis=1)
+
+        # each positive beats the negatives with lower scores, and half of the negatives with the same score
+        negatives_below = np.cumsum(negatives, axis=1) - negatives
+        u_statistic = np.sum(positives * (negatives_below + 0.5 * negatives), axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            aucs[:, i] = u_statistic / (np.sum(positives, axis=1) * np.sum(negatives, axis=1))
+
+    return aucs
+
+
+
+def bootstrap_table_of_results(counts, metrics, per_image_results, image_columns):
+    '''
+    Recompute the table of results on each resample
+
+    Input:
+        counts: a (resamples x images) matrix, as retrieved by draw_bootstrap_counts
+        metrics: a list of the metrics in the table of results
+        per_image_results: the results per image, as retrieved by util.per_image_results.load_per_image_results
+        image_columns: a dictionary mapping each task to the columns of counts that correspond to its images
+    Output:
+        results: a (resamples x teams x metrics) array, with NaN for the metrics that can't be recomputed
+    '''
+
+    n_teams = per_image_results['segmentation']['values'].shape[0]
+    results = np.full((counts.shape[0], n_teams, len(metrics)), np.nan)
+
+    for metric in PER_IMAGE_METRICS.keys():
+        if not (metric in metrics):
+            continue
+        task, field = PER_IMAGE_METRICS[metric]
+        task_counts = counts[:, image_columns[task]]
+        values = per_image_results[task]['values'][:, :, per_image_results[task]['fields'].index(field)]
+        if metric == 'AUC':
+            results[:, :, metrics.index(metric)] = bootstrap_auc(task_counts, values, get_classification_labels(per_image_results))
+        else:
+            results[:, :, metrics.index(metric)] = bootstrap_means(task_counts, values)
+
+    return results
+
+
+
+def bootstrap_rankings(metrics, per_image_results, criteria, n_resamples=1000, seed=None, n_jobs=1, batch_size=100, ties='min'):
+    '''
+    Rank the teams on bootstrap resamples of the images. All the teams and all the tasks share the same resamples,
+    and each batch of resamples is ranked at once.
+
+    Input:
+        metrics: a list of the metrics in the table of results
+        per_image_results: the results per image, as retrieved by util.per_image_results.load_per_image_results
+        criteria: a dictionary mapping names to declarative criteria (as util.leaderboard_criteria.CRITERIA)
+        [n_resamples]: number of bootstrap resamples
+        [seed]: seed for the random number generator
+        [n_jobs]: number of batches processed in parallel
+        [batch_size]: number of resamples per batch
+        [ties]: policy for tied values (see util.leaderboard_criteria.rank_values)
+    Output:
+        ranks: a dictionary mapping each criterion name to a (resamples x teams) matrix of ranks
+    '''
+
+    # identify all the images, so every task uses the same resamples
+    images = sorted(set([ key for task in per_image_results.keys() for key in per_image_results[task]['images'] ]))
+    image_indices = dict(zip(images, range(len(images))))
+    image_columns = dict()
+    for task in per_image_results.keys():
+        image_columns[task] = np.asarray([ image_indices[key] for key in per_image_results[task]['images'] ], dtype=int)
+
+    # compile the criteria only once
+    scorers = dict()
+    for name in criteria.keys():
+        scorers[name] = compile_criterion(criteria[name], metrics, ties)
+
+    # draw a seed per batch, so the output doesn't depend on the number of jobs
+    batch_sizes = [ min(batch_size, n_resamples - i) for i in range(0, n_resamples, batch_size) ]
+    batch_seeds = np.random.RandomState(seed).randint(0, 2 ** 31 - 1, len(batch_sizes))
+
+    def rank_batch(batch_index):
+        counts = draw_bootstrap_counts(len(images), batch_sizes[batch_index], np.random.RandomState(batch_seeds[batch_index]))
+        results = bootstrap_table_of_results(counts, metrics, per_image_results, image_columns)
+        batch_ranks = dict()
+        for name in scorers.keys():
+            batch_ranks[name] = rank_values(scorers[name](results)[0], higher_is_better=False, ties=ties)
+        return batch_ranks
+
+    # rank all the batches (numpy releases the GIL in the heavy operations, so threads are enough)
+    if n_jobs > 1:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            batches = list(executor.map(rank_batch, range(len(batch_sizes))))
+    else:
+        batches = [ rank_batch(i) for i in range(len(batch_sizes)) ]
+
+    ranks = dict()
+    for name in criteria.keys():
+        ranks[name] = np.concatenate([ batch[name] for batch in batches ], axis=0)
+
+    return ranks
+
+
+
+def summarize_rankings(ranks, confidence=0.95):
+    '''
+    Summarize the distribution of the ranks of each team
+
+    Input:
+        ranks: a (resamples x teams) matrix of ranks, as retrieved by bootstrap_rankings
+        [confidence]: confidence level of the band of ranks
+    Output:
+        statistics: a (teams x 5) matrix with the mean rank, the median rank, the lower and the upper limits of
+                    the confidence band, and the probability of being ranked first
+        header: the names of the columns of statistics
+        distribution: a (teams x teams) matrix with the probability of each team (rows) to get each rank (columns)
+    '''
+
+    n_teams = ranks.shape[1]
+    statistics = np.full((n_teams, 5), np.nan)
+
+    is_ranked = np.any(np.logical_not(np.isnan(ranks)), axis=0)
+    if np.any(is_ranked):
+        with np.errstate(invalid='ignore'):
+            statistics[is_ranked, 0] = np.nanmean(ranks[:, is_ranked], axis=0)
+            statistics[is_ranked, 1] = np.nanmedian(ranks[:, is_ranked], axis=0)
+            statistics[is_ranked, 2] = np.nanpercentile(ranks[:, is_ranked], 100 * (1 - confidence) / 2, axis=0)
+            statistics[is_ranked, 3] = np.nanpercentile(ranks[:, is_ranked], 100 * (1 + confidence) / 2, axis=0)
+
+    # the probabilities are given over the resamples in which each team could be ranked
+    n_ranked = np.maximum(np.sum(np.logical_not(np.isnan(ranks)), axis=0), 1).astype(float)
+    statistics[is_ranked, 4] = np.sum(ranks[:, is_ranked] == 1, axis=0) / n_ranked[is_ranked]
+
+    # histogram of the ranks of each team, with a single bincount (fractional ranks are rounded down)
+    team_indices, resample_indices = np.nonzero(np.logical_not(np.isnan(ranks.T)))
+    integer_ranks = np.floor(ranks.T[team_indices, resample_indices]).astype(int) - 1
+    histogram = np.bincount(team_indices * n_teams + integer_ranks, minlength=n_teams * n_teams)
+    distribution = histogram.reshape((n_teams, n_teams)) / n_ranked[:, np.newaxis]
+
+    return statistics, ['Mean rank', 'Median rank', 'Lower rank ({:g}%)'.format(100 * confidence), 'Upper rank ({:g}%)'.format(100 * confidence), 'Probability of being first'], distribution
@@ -0,0 +1,223 @@
+
+import multiprocessing
+import sys
+import time
+import zipfile
+
+import numpy as np
+
+from queue import Empty
+
+try:
+    import resource
+except ImportError:
+    # the resource module is not available on Windows
+    resource = None
+
+
+
+def get_archive_size(submission_file):
+    '''
+    Get the uncompressed size and the number of files of a zip file from its central directory
+
+    Input:
+        submission_file: full path and filename of the .zip file
+    Output:
+        uncompressed_size: total size (in bytes) of the files after extraction
+        n_files: number of files in the zip file
+    '''
+
+    with zipfile.ZipFile(submission_file, 'r') as zip_ref:
+        infos = [ info for info in zip_ref.infolist() if not info.filename.endswith('/') ]
+
+    return sum([ info.file_size for info in infos ]), len(infos)
+
+
+
+def check_archive_limits(submission_file, max_uncompressed_size=None, max_files=None):
+    '''
+    Check if a zip file can be extracted without exceeding the given limits (e.g. to avoid zip bombs)
+
+    Input:
+        submission_file: full path and filename of the .zip file
+        [max_uncompressed_size]: maximum size (in MB) of the extracted files. If not provided, the size is not checked
+        [max_files]: maximum number of files. If not provided, the number of files is not checked
+    Output:
+        error: None if the zip file is within the limits, or a string describing the problem otherwise
+    '''
+
+    uncompressed_size, n_files = get_archive_size(submission_file)
+
+    if not (max_uncompressed_size is None) and uncompressed_size > max_uncompressed_size * 1024 * 1024:
+        return 'The uncompressed size of the submission ({:.1f} MB) exceeds the limit of {} MB.'.format(uncompressed_size / (1024.0 * 1024.0), max_uncompressed_size)
+    if not (max_files is None) and n_files > max_files:
+        return 'The submission has {} files, which exceeds the limit of {} files.'.format(n_files, max_files)
+
+    return None
+
+
+
+def get_bytes_read():
+    '''
+    Get the number of bytes read by the current process
+
+    Output:
+        bytes_read: bytes read from files and sockets, or NaN if it can't be measured
+    '''
+
+    # on Linux, use the I/O accounting of the process
+    try:
+        with open('/proc/self/io', 'r') as io_file:
+            for line in io_file:
+                if line.startswith('rchar:'):
+                    return float(line.split()[1])
+    except (IOError, OSError):
+        pass
+    # otherwise, use the number of blocks read from the disk
+    if not (resource is None):
+        return float(resource.getrusage(resource.RUSAGE_SELF).ru_inblock * 512)
+
+    return np.nan
+
+
+
+def get_resource_usage():
+    '''
+    Get the CPU time, the peak resident set size and the bytes read by the current process
+
+    Output:
+        resource_usage: a dictionary with the fields cpu_seconds, peak_rss_mb and bytes_read
+    '''
+
+    if resource is None:
+        return { 'cpu_seconds': time.process_time(), 'peak_rss_mb': np.nan, 'bytes_read': get_bytes_read() }
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is given in bytes on MacOS and in kilobytes on Linux
+    if sys.platform == 'darwin':
+        peak_rss_mb = usage.ru_maxrss / (1024.0 * 1024.0)
+    else:
+        peak_rss_mb = usage.ru_maxrss / 1024.0
+
+    return { 'cpu_seconds': usage.ru_utime + usage.ru_stime, 'peak_rss_mb': peak_rss_mb, 'bytes_read': get_bytes_read() }
+
+
+
+def run_and_measure(function, args=(), kwargs=None, isolated=False):
+    '''
+    Run a function in the current process and measure the resources that it used
+
+    Input:
+        function: the function to run
+        [args]: a tuple with the positional arguments of the function
+        [kwargs]: a dictionary with the keyword arguments of the function
+        [isolated]: a boolean indicating if the current process is a worker that only runs this function. Otherwise, the peak
+                    memory is the peak of the whole process since it started, not of the function, so it is not measured (NaN)
+    Output:
+        result: the output of the function, or None if it failed
+        resource_usage: a dictionary with the fields cpu_seconds, peak_rss_mb and bytes_read
+        error: None if the function succeeded, or a string describing the problem otherwise
+    '''
+
+    if kwargs is None:
+        kwargs = dict()
+
+    # measure the resources before running the function
+    usage_before = get_resource_usage()
+
+    # run the function
+    try:
+        result = function(*args, **kwargs)
+        error = None
+    except MemoryError:
+        result = None
+        error = 'The memory limit was exceeded.'
+    except Exception as e:
+        result = None
+        error = 'Unexpected error: {}'.format(str(e))
+
+    # the cpu time and the bytes read are given relative to the beginning, the peak memory is absolute
+    resource_usage = get_resource_usage()
+    resource_usage['cpu_seconds'] = resource_usage['cpu_seconds'] - usage_before['cpu_seconds']
+    resource_usage['bytes_read'] = resource_usage['bytes_read'] - usage_before['bytes_read']
+    if not isolated:
+        resource_usage['peak_rss_mb'] = np.nan
+
+    return result, resource_usage, error
+
+
+
+def run_and_measure_in_worker(queue, function, args, kwargs, max_memory):
+    '''
+    Entry point of the isolated workers: set the memory limit, run the function and send back the outputs
+
+    Input:
+        queue: a multiprocessing queue to send back the outputs of run_and_measure
+        function: the function to run
+        args: a tuple with the positional arguments of the function
+        kwargs: a dictionary with the keyword arguments of the function
+        max_memory: maximum size (in MB) of the address space of the worker, or None
+    '''
+
+    # limit the memory of the worker
+    if not (max_memory is None) and not (resource is None):
+        limit = int(max_memory * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    queue.put(run_and_measure(function, args, kwargs, isolated=True))
+
+
+
+def run_with_resource_limits(function, args=(), kwargs=None, timeout=None, max_memory=None):
+    '''
+    Run a function in an isolated worker process, with a limit on its wall-clock time and memory
+
+    Input:
+        function: the function to run. It must be defined at the module level, and its output must be picklable
+        [args]: a tuple with the positional arguments of the function
+        [kwargs]: a dictionary with the keyword arguments of the function
+        [timeout]: maximum wall-clock time (in seconds). If not provided, the function can run forever
+        [max_memory]: maximum size (in MB) of the address space of the worker. If not provided, the memory is not limited
+    Output:
+        result: the output of the function, or None if it failed
+        resource_usage: a dictionary with the fields cpu_seconds, peak_rss_mb and bytes_read
+        error: None if the function succeeded, or a string describing the problem otherwise
+    '''
+
+    # initialize the worker
+    queue = multiprocessing.Queue()
+    worker = multiprocessing.Process(target=run_and_measure_in_worker, args=(queue, function, args, kwargs, max_memory))
+    start_time = time.time()
+    if not (resource is None):
+        children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        children_cpu_seconds = children_usage.ru_utime + children_usage.ru_stime
+    worker.start()
+
+    # wait for the outputs, checking from time to time if the worker is still alive
+    outputs = None
+    while outputs is None:
+        try:
+            outputs = queue.get(timeout=1.0)
+        except Empty:
+            if not worker.is_alive():
+                # the worker could have sent the outputs right before finishing
+                try:
+                    outputs = queue.get(timeout=1.0)
+                except Empty:
+                    error = 'The worker died unexpectedly (exit code {}). It probably ran out of memory.'.format(worker.exitcode)
+                    break
+            elif not (timeout is None) and time.time() - start_time > timeout:
+                error = 'The evaluation was stopped after {} seconds.'.format(timeout)
+                worker.terminate()
+                break
+    worker.join()
+
+    if outputs is None:
+        # the worker didn't finish, so we can only measure its cpu time from the parent process
+        resource_usage = { 'cpu_seconds': np.nan, 'peak_rss_mb': np.nan, 'bytes_read': np.nan }
+        if not (resource is None):
+            children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            resource_usage['cpu_seconds'] = children_usage.ru_utime + children_usage.ru_stime - children_cpu_seconds
+        return None, resource_usage, error
+
+    return outputs
@@ -0,0 +1,261 @@
+
+import csv
+import numpy as np
+
+from os import path
+
+from util.file_management import get_filenames
+from util.image_io import read_image
+
+
+# name of the CSV file with the run-length encoded segmentations, at the root of a submission
+SEGMENTATION_RLE_FILENAMES = ['segmentation_rle.csv']
+# columns of the CSV file with the run-length encoded segmentations
+SEGMENTATION_RLE_COLUMNS = ['FileName', 'Height', 'Width', 'Cup', 'Disc']
+
+
+def merge_runs(starts, ends):
+    '''
+    Sort a list of runs and merge the ones that overlap or touch each other
+
+    Input:
+        starts: a 1D numpy array with the first pixel of each run
+        ends: a 1D numpy array with the pixel after the last one of each run
+    Output:
+        starts, ends: the sorted and disjoint runs
+    '''
+
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    if len(starts) == 0:
+        return starts, ends
+
+    # sort the runs, and get the furthest end reached so far
+    order = np.argsort(starts, kind='mergesort')
+    starts, ends = starts[order], np.maximum.accumulate(ends[order])
+    # a new run begins when it starts after the end of all the previous runs
+    is_first = np.ones(len(starts), dtype=bool)
+    is_first[1:] = starts[1:] > ends[:-1]
+    is_last = np.ones(len(starts), dtype=bool)
+    is_last[:-1] = is_first[1:]
+
+    return starts[is_first], ends[is_last]
+
+
+
+def parse_rle_string(rle_string, n_pixels):
+    '''
+    Parse a run-length encoded mask, given as a string of 'start length' pairs separated by spaces. The pixels are
+    numbered from top to bottom and then from left to right, starting at 1 (as in the RLE format used by Kaggle)
+
+    Input:
+        rle_string: the encoded mask (an empty string for an empty mask)
+        n_pixels: number of pixels of the image
+    Output:
+        starts, ends: two 1D numpy arrays with the sorted and disjoint runs of the mask, numbered from 0 and
+                      with ends being the pixel after the last one of each run
+    '''
+
+    values = np.array(rle_string.split(), dtype=np.int64)
+    if len(values) % 2 != 0:
+        raise ValueError('The RLE mask has an odd number of values.')
+    starts = values[0::2] - 1
+    lengths = values[1::2]
+    if np.any(lengths <= 0) or np.any(starts < 0) or np.any(starts + lengths > n_pixels):
+        raise ValueError('The RLE mask has runs with non positive lengths or outside the image.')
+
+    return merge_runs(starts, starts + lengths)
+
+
+
+def encode_rle_mask(binary_mask):
+    '''
+    Encode a binary mask as a string of runs (see parse_rle_string)
+
+    Input:
+        binary_mask: a binary 2D numpy array
+    Output:
+        rle_string: the encoded mask
+    '''
+
+    starts, ends = get_mask_runs(binary_mask)
+
+    return ' '.join([ '{} {}'.format(start + 1, length) for start, length in zip(starts.tolist(), (ends - starts).tolist()) ])
+
+
+
+def get_mask_runs(binary_mask):
+    '''
+    Get the runs of a binary mask, traversing the pixels from top to bottom and then from left to right
+
+    Input:
+        binary_mask: a binary 2D numpy array
+    Output:
+        starts, ends: the runs of the mask (see parse_rle_string)
+    '''
+
+    # traverse the mask by columns, with a zero at both ends to close all the runs
+    pixels = np.concatenate(([False], np.asarray(binary_mask, dtype=bool).T.ravel(), [False]))
+    changes = np.flatnonzero(pixels[1:] != pixels[:-1])
+
+    return changes[0::2].astype(np.int64), changes[1::2].astype(np.int64)
+
+
+
+def decode_rle_mask(starts, ends, height, width):
+    '''
+    Expand the runs of a mask to a full binary mask
+
+    Input:
+        starts, ends: the runs of the mask (see parse_rle_string)
+        height, width: the size of the image
+    Output:
+        binary_mask: a boolean 2D numpy array
+    '''
+
+    # mark the beginning and the end of each run, and accumulate
+    changes = np.zeros(height * width + 1, dtype=np.int32)
+    np.add.at(changes, starts, 1)
+    np.add.at(changes, ends, -1)
+
+    return (np.cumsum(changes[:-1]) > 0).reshape((width, height)).T
+
+
+
+def get_run_coverage(starts, ends, positions):
+    '''
+    Count the pixels of a mask before each position, using only its runs
+
+    Input:
+        starts, ends: the runs of the mask (see parse_rle_string)
+        positions: a 1D numpy array with pixel positions
+    Output:
+        coverage: a 1D numpy array with the number of pixels of the mask before each position
+    '''
+
+    positions = np.asarray(positions, dtype=np.int64)
+    cumulative_lengths = np.concatenate(([0], np.cumsum(ends - starts)))
+    if len(starts) == 0:
+        return np.zeros(len(positions), dtype=np.int64)
+
+    # number of runs that start before each position, and part of the last of them beyond the position
+    n_runs = np.searchsorted(starts, positions, side='left')
+    exceeding = np.where(n_runs > 0, np.maximum(ends[np.maximum(n_runs - 1, 0)] - positions, 0), 0)
+
+    return cumulative_lengths[n_runs] - exceeding
+
+
+
+def count_run_intersection(starts, ends, other_starts, other_ends):
+    '''
+    Count the pixels in the intersection of two masks, using only their runs
+
+    Input:
+        starts, ends: the runs of the first mask (see parse_rle_string)
+        other_starts, other_ends: the runs of the second mask
+    Output:
+        intersection: the number of pixels in both masks
+    '''
+
+    # pixels of the second mask covered by each run of the first one
+    return int(np.sum(get_run_coverage(other_starts, other_ends, ends) - get_run_coverage(other_starts, other_ends, starts)))
+
+
+
+def get_run_vertical_diameter(starts, ends, height, width):
+    '''
+    Get the vertical diameter (the maximum number of pixels in a column) of a mask, using only its runs
+
+    Input:
+        starts, ends: the runs of the mask (see parse_rle_string)
+        height, width: the size of the image
+    Output:
+        diameter: the vertical diameter of the mask
+    '''
+
+    # the columns are consecutive in the order of the runs, so each column is a range of positions
+    column_counts = np.diff(get_run_coverage(starts, ends, np.arange(width + 1) * height))
+
+    return int(np.max(column_counts))
+
+
+
+def count_rle_segmentation_pixels(cup_runs, disc_runs, gt_cup_runs, gt_disc_runs, height, width):
+    '''
+    Count the pixels needed to evaluate a segmentation (as in segmentation_kernels.SEGMENTATION_COUNTS), using only runs
+
+    Input:
+        cup_runs, disc_runs: tuples (starts, ends) with the runs of the segmented optic cup and disc (including the cup)
+        gt_cup_runs, gt_disc_runs: same for the ground truth
+        height, width: the size of the image
+    Output:
+        counts: a 1D numpy array of integers with the areas of the optic cups and discs and of their intersections,
+                and their vertical diameters
+    '''
+
+    return np.array([ count_run_intersection(cup_runs[0], cup_runs[1], gt_cup_runs[0], gt_cup_runs[1]),
+                      np.sum(cup_runs[1] - cup_runs[0]), np.sum(gt_cup_runs[1] - gt_cup_runs[0]),
+                      count_run_intersection(disc_runs[0], disc_runs[1], gt_disc_runs[0], gt_disc_runs[1]),
+                      np.sum(disc_runs[1] - disc_runs[0]), np.sum(gt_disc_runs[1] - gt_disc_runs[0]),
+                      get_run_vertical_diameter(cup_runs[0], cup_runs[1], height, width),
+                      get_run_vertical_diameter(disc_runs[0], disc_runs[1], height, width),
+                      get_run_vertical_diameter(gt_cup_runs[0], gt_cup_runs[1], height, width),
+                      get_run_vertical_diameter(gt_disc_runs[0], gt_disc_runs[1], height, width) ], dtype=np.int64)
+
+
+
+def read_csv_rle_segmentations(csv_filename):
+    '''
+    Read a CSV file with run-length encoded segmentations, with the columns FileName, Height, Width, Cup and Disc
+    (see parse_rle_string). The pixels of the cup are also part of the disc, even if they are not in its runs
+
+    Input:
+        csv_filename: full path and filename to a CSV file with the segmentations
+    Output:
+        segmentations: a dictionary mapping each image filename to a tuple (height, width, cup_runs, disc_runs),
+                       with the runs given as (starts, ends) tuples
+    '''
+
+    segmentations = dict()
+
+    # open the file
+    with open(csv_filename, 'r') as csv_file:
+        # initialize the reader
+        csv_reader = csv.reader(csv_file)
+        # skip the header
+        next(csv_reader)
+        # and now, iterate and fill the dictionary
+        for row in csv_reader:
+            if len(row) == 0:
+                continue
+            if len(row) != len(SEGMENTATION_RLE_COLUMNS):
+                raise ValueError('The row of {} does not have the columns {}.'.format(row[0], SEGMENTATION_RLE_COLUMNS))
+            height, width = int(row[1]), int(row[2])
+            cup_runs = parse_rle_string(row[3], height * width)
+            disc_starts, disc_ends = parse_rle_string(row[4], height * width)
+            # the cup is inside the disc, as in the BMP masks
+            disc_runs = merge_runs(np.concatenate((disc_starts, cup_runs[0])), np.concatenate((disc_ends, cup_runs[1])))
+            segmentations[row[0].strip()] = (height, width, cup_runs, disc_runs)
+
+    return segmentations
+
+
+
+def convert_segmentations_to_rle(segmentation_folder, csv_filename):
+    '''
+    Encode the BMP segmentations of a folder in a single CSV file of runs, that can be submitted instead of them
+
+    Input:
+        segmentation_folder: full path to the folder with the BMP segmentations (0: optic cup, 128: optic disc, 255: elsewhere)
+        csv_filename: full path and filename of the output CSV file
+    '''
+
+    with open(csv_filename, 'w') as csv_file:
+        table_writer = csv.writer(csv_file)
+        table_writer.writerow(SEGMENTATION_RLE_COLUMNS)
+        for image_filename in get_filenames(segmentation_folder, 'bmp'):
+            segmentation = read_image(path.join(segmentation_folder, image_filename))
+            if len(segmentation.shape) > 2:
+                segmentation = segmentation[:,:,0]
+            table_writer.writerow([ image_filename, segmentation.shape[0], segmentation.shape[1],
+                                    encode_rle_mask(segmentation==0), encode_rle_mask(segmentation<255) ])
@@ -0,0 +1,240 @@
+
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from scipy.stats import norm
+
+from util.leaderboard_criteria import rank_values
+from util.per_image_results import get_classification_labels
+
+
+# policies to compare the results per image of two teams
+SIGNIFICANCE_TESTS = ['wilcoxon', 'permutation']
+
+# metrics compared for each leaderboard, with the task and the field of the results per image (see util.per_image_results),
+# and the suffix of the output files. The AUC is compared with the DeLong test, and the rest with a paired test
+LEADERBOARD_SIGNIFICANCE_METRICS = {
+    'segmentation': [ ('segmentation', 'Cup-Dice', 'optic_cup_dice'), ('segmentation', 'Disc-Dice', 'optic_disc_dice'), ('segmentation', 'AE-CDR', 'cdr_error') ],
+    'classification': [ ('classification', 'Score', 'auc') ],
+    'fovea_location': [ ('fovea_location', 'Euclidean distance', 'euclidean_distance') ],
+    'final': [ ('segmentation', 'Cup-Dice', 'optic_cup_dice'), ('segmentation', 'Disc-Dice', 'optic_disc_dice'), ('segmentation', 'AE-CDR', 'cdr_error'), ('classification', 'Score', 'auc') ],
+}
+
+
+def delong_test(scores, labels):
+    '''
+    Compare the AUC of all the pairs of teams with the DeLong test, using the fast algorithm of Sun and Xu
+    (the structural components are computed from midranks, so each team is sorted only once).
+    Only the images scored by all the teams with results are used.
+
+    Input:
+        scores: a (teams x images) numpy matrix with the predicted scores (NaN for the images without results)
+        labels: a 1D numpy array with the gt label of each image (0: healthy, 1: glaucomatous)
+    Output:
+        aucs: a 1D numpy array with the AUC of each team on the common images
+        p_values: a (teams x teams) numpy matrix with the two-sided p-value of each pair of teams
+    '''
+
+    scores = np.asarray(scores, dtype=float)
+    labels = np.ravel(labels)
+    n_teams = scores.shape[0]
+    aucs = np.full(n_teams, np.nan)
+    p_values = np.full((n_teams, n_teams), np.nan)
+
+    # use the teams with results, and the images scored by all of them
+    has_results = np.any(np.logical_not(np.isnan(scores)), axis=1)
+    common_images = np.all(np.logical_not(np.isnan(scores[has_results,:])), axis=0)
+    positives = scores[has_results,:][:, np.logical_and(common_images, labels > 0)]
+    negatives = scores[has_results,:][:, np.logical_and(common_images, labels <= 0)]
+    m, n = positives.shape[1], negatives.shape[1]
+    if m < 2 or n < 2:
+        return aucs, p_values
+
+    # midranks within the positives, within the negatives and within all the samples
+    tx = rank_values(positives, ties='average')
+    ty = rank_values(negatives, ties='average')
+    tz = rank_values(np.concatenate((positives, negatives), axis=1), ties='average')
+
+    # AUC and structural components of each team
+    aucs[has_results] = (np.sum(tz[:, :m], axis=1) - m * (m + 1) / 2.0) / (m * n)
+    v01 = (tz[:, :m] - tx) / n
+    v10 = 1.0 - (tz[:, m:] - ty) / m
+
+    # covariance of the AUCs of all the teams
+    covariance = np.atleast_2d(np.cov(v01)) / m + np.atleast_2d(np.cov(v10)) / n
+
+    # variance of the difference of each pair of teams, and its z score
+    variances = np.diag(covariance)[:, np.newaxis] + np.diag(covariance)[np.newaxis, :] - 2 * covariance
+    differences = aucs[has_results][:, np.newaxis] - aucs[has_results][np.newaxis, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.abs(differences) / np.sqrt(variances)
+    # identical AUCs with no variance are not different at all
+    z[np.logical_and(variances <= 0, differences == 0)] = 0
+
+    p_values[np.ix_(has_results, has_results)] = 2 * norm.sf(z)
+
+    return aucs, p_values
+
+
+
+def wilcoxon_signed_rank_test(differences):
+    '''
+    Wilcoxon signed-rank test of many paired samples at once, using the normal approximation with the correction for ties.
+    Zero differences are discarded.
+
+    Input:
+        differences: a (pairs x images) numpy matrix with the paired differences (NaN for the images that can't be compared)
+    Output:
+        p_values: a 1D numpy array with the two-sided p-value of each pair (NaN if there are no images to compare)
+    '''
+
+    differences = np.asarray(differences, dtype=float)
+    n_pairs, n_images = differences.shape
+    is_comparable = np.any(np.logical_not(np.isnan(differences)), axis=1)
+
+    # discard the zero differences, and rank the absolute values of the others
+    absolute_differences = np.abs(np.where(differences == 0, np.nan, differences))
+    ranks = rank_values(absolute_differences, ties='average')
+    is_valid = np.logical_not(np.isnan(ranks))
+    n = np.sum(is_valid, axis=1).astype(float)
+
+    # sum of the ranks of the positive differences
+    positive_rank_sum = np.sum(np.where(np.logical_and(is_valid, differences > 0), ranks, 0), axis=1)
+
+    # size of each group of tied values, from the sorted values of each row
+    sorted_values = np.sort(absolute_differences, axis=1)
+    is_first = np.ones((n_pairs, n_images), dtype=bool)
+    is_first[:, 1:] = sorted_values[:, 1:] != sorted_values[:, :-1]
+    group_ids = np.cumsum(is_first, axis=1) - 1 + np.arange(n_pairs)[:, np.newaxis] * n_images
+    is_sorted_valid = np.logical_not(np.isnan(sorted_values))
+    group_sizes = np.bincount(group_ids[is_sorted_valid], minlength=n_pairs * n_images).astype(float)
+    tie_correction = np.sum((group_sizes ** 3 - group_sizes).reshape((n_pairs, n_images)), axis=1)
+
+    # normal approximation
+    mean = n * (n + 1) / 4.0
+    variance = n * (n + 1) * (2 * n + 1) / 24.0 - tie_correction / 48.0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.abs(positive_rank_sum - mean) / np.sqrt(variance)
+    # all the differences are zero: the samples are identical
+    z[variance <= 0] = 0
+
+    p_values = 2 * norm.sf(z)
+    p_values[np.logical_not(is_comparable)] = np.nan
+
+    return p_values
+
+
+
+def permutation_test(differences, signs):
+    '''
+    Paired permutation test (randomly flipping the sign of the differences) of many paired samples at once.
+    All the pairs share the same random signs, so the test is a single matrix product.
+
+    Input:
+        differences: a (pairs x images) numpy matrix with the paired differences (NaN for the images that can't be compared)
+        signs: a (permutations x images) numpy matrix of random signs (-1 or 1)
+    Output:
+        p_values: a 1D numpy array with the two-sided p-value of each pair (NaN if there are no images to compare)
+    '''
+
+    differences = np.asarray(differences, dtype=float)
+    is_comparable = np.any(np.logical_not(np.isnan(differences)), axis=1)
+    filled_differences = np.where(np.isnan(differences), 0, differences)
+
+    # the sum of the differences is equivalent to the mean, since the images of each pair are fixed
+    observed = np.abs(np.sum(filled_differences, axis=1))
+    permuted = np.abs(np.dot(filled_differences, signs.T))
+
+    # count the permutations at least as extreme as the observed one (with a tolerance for rounding errors)
+    tolerance = 1e-12 * np.maximum(observed, 1.0)
+    n_extreme = np.sum(permuted >= (observed - tolerance)[:, np.newaxis], axis=1)
+
+    p_values = (n_extreme + 1.0) / (signs.shape[0] + 1.0)
+    p_values[np.logical_not(is_comparable)] = np.nan
+
+    return p_values
+
+
+
+def paired_significance(values, test='wilcoxon', n_permutations=10000, seed=None, n_jobs=1, batch_size=500):
+    '''
+    Compare the results per image of all the pairs of teams with a paired test.
+    The pairs are processed in batches, each of them vectorized, and the batches are processed in parallel.
+
+    Input:
+        values: a (teams x images) numpy matrix with the results per image (NaN for the images without results)
+        [test]: 'wilcoxon' (signed-rank test) or 'permutation' (sign-flip permutation test on the mean difference)
+        [n_permutations]: number of random permutations of the permutation test
+        [seed]: seed for the random number generator of the permutation test
+        [n_jobs]: number of batches processed in parallel
+        [batch_size]: number of pairs per batch
+    Output:
+        p_values: a (teams x teams) numpy matrix with the two-sided p-value of each pair of teams
+    '''
+
+    if not (test in SIGNIFICANCE_TESTS):
+        raise ValueError('Unknown significance test "{}". Use one of {}'.format(test, SIGNIFICANCE_TESTS))
+
+    values = np.asarray(values, dtype=float)
+    n_teams = values.shape[0]
+
+    # all the pairs of different teams
+    first_teams, second_teams = np.triu_indices(n_teams, 1)
+
+    # the permutation test shares the same signs for all the pairs
+    if test == 'permutation':
+        signs = np.where(np.random.RandomState(seed).rand(n_permutations, values.shape[1]) < 0.5, -1.0, 1.0)
+
+    def test_batch(start):
+        differences = values[first_teams[start:start + batch_size], :] - values[second_teams[start:start + batch_size], :]
+        if test == 'wilcoxon':
+            return wilcoxon_signed_rank_test(differences)
+        return permutation_test(differences, signs)
+
+    # test all the batches (numpy releases the GIL in the heavy operations, so threads are enough)
+    starts = range(0, len(first_teams), batch_size)
+    if n_jobs > 1:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            batches = list(executor.map(test_batch, starts))
+    else:
+        batches = [ test_batch(start) for start in starts ]
+
+    # fill the symmetric matrix of p-values
+    p_values = np.ones((n_teams, n_teams))
+    if len(batches) > 0:
+        pair_p_values = np.concatenate(batches)
+        p_values[first_teams, second_teams] = pair_p_values
+        p_values[second_teams, first_teams] = pair_p_values
+    # a team without results can't be compared, not even with itself
+    has_results = np.any(np.logical_not(np.isnan(values)), axis=1)
+    p_values[np.logical_not(has_results), :] = np.nan
+    p_values[:, np.logical_not(has_results)] = np.nan
+
+    return p_values
+
+
+
+def leaderboard_significance(leaderboard_name, per_image_results, rows, test='wilcoxon', n_permutations=10000, seed=None, n_jobs=1):
+    '''
+    Compare all the pairs of teams of a leaderboard on each of its metrics
+
+    Input:
+        leaderboard_name: name of the leaderboard (a key of LEADERBOARD_SIGNIFICANCE_METRICS)
+        per_image_results: the results per image, as retrieved by util.per_image_results.load_per_image_results
+        rows: a list with the row of per_image_results of each team of the leaderboard, in the order of the leaderboard
+        [test], [n_permutations], [seed], [n_jobs]: parameters of the paired test (see paired_significance)
+    Output:
+        matrices: a list of tuples (suffix, p_values), with suffix identifying the metric and p_values a (teams x teams) matrix
+    '''
+
+    matrices = []
+    for task, field, suffix in LEADERBOARD_SIGNIFICANCE_METRICS[leaderboard_name]:
+        fields = per_image_results[task]['fields']
+        values = per_image_results[task]['values'][rows, :, fields.index(field)]
+        if field == 'Score':
+            _, p_values = delong_test(values, get_classification_labels(per_image_results))
+        else:
+            p_values = paired_significance(values, test, n_permutations, seed, n_jobs)
+        matrices.append((suffix, p_values))
+
+    return matrices
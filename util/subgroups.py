@@ -0,0 +1,148 @@
+
+import re
+import numpy as np
+
+from evaluation_metrics.evaluation_metrics_for_classification import get_roc_curve, get_sensitivity_at_given_specificity
+from util.per_image_results import get_image_key, get_classification_labels
+
+
+# subgroups defined by the gt labels of the classification task (1: glaucomatous, 0: healthy)
+LABEL_GROUPS = [ ('Glaucoma', 1), ('Non-Glaucoma', 0) ]
+# columns of the results of each subgroup, in the order of the table of results
+SUBGROUP_COLUMNS = ['Mean optic cup Dice', 'Mean optic disc Dice', 'MAE cup to disc ratio', 'AUC', 'Reference Sensitivity', 'Mean Euclidean distance']
+# columns with the number of images of each subgroup
+SUBGROUP_SIZE_COLUMNS = ['Segmentation images', 'Classification images', 'Glaucoma images', 'Fovea location images']
+
+
+def get_subgroups(per_image_results, image_tags=None, label_groups=True):
+    '''
+    Collect the images of each subgroup
+
+    Input:
+        per_image_results: the results per image, as retrieved by util.per_image_results.load_per_image_results
+        [image_tags]: a list of (image filename, list of tags) pairs, as retrieved by util.file_management.read_subgroup_spec
+        [label_groups]: a boolean indicating if the glaucomatous and the healthy images are added as subgroups (see LABEL_GROUPS)
+    Output:
+        groups: a list of (name, set of image keys) pairs, with the label groups first and the tags in order of appearance
+    '''
+
+    groups = []
+
+    # subgroups of the gt labels
+    if label_groups:
+        images = per_image_results['classification']['images']
+        labels = get_classification_labels(per_image_results)
+        if len(images) == 0:
+            print('> There are no classification results, so the images can not be grouped by their labels')
+        else:
+            for name, label in LABEL_GROUPS:
+                groups.append((name, set([ images[i] for i in np.flatnonzero(labels == label) ])))
+
+    # subgroups of the tags
+    if not (image_tags is None):
+        tag_images = dict()
+        for image_filename, tags in image_tags:
+            for tag in tags:
+                if not (tag in tag_images):
+                    tag_images[tag] = set()
+                    groups.append((tag, tag_images[tag]))
+                tag_images[tag].add(get_image_key(image_filename))
+
+    if len(set([ name for name, _ in groups ])) != len(groups):
+        raise ValueError('The names of the subgroups are repeated.')
+
+    return groups
+
+
+
+def get_group_masks(images, groups):
+    '''
+    Get the boolean masks of the images of each subgroup
+
+    Input:
+        images: a list with the keys of the images of a task
+        groups: a list of (name, set of image keys) pairs, as retrieved by get_subgroups
+    Output:
+        masks: a (groups x images) boolean numpy array
+    '''
+
+    masks = np.zeros((len(groups), len(images)), dtype=bool)
+    for g in range(len(groups)):
+        masks[g, :] = [ key in groups[g][1] for key in images ]
+
+    return masks
+
+
+
+def get_masked_means(values, masks):
+    '''
+    Compute the mean of the results of each team on the images of each subgroup, ignoring the images without results
+
+    Input:
+        values: a (teams x images x fields) numpy array with the results per image (NaN for the images without results)
+        masks: a (groups x images) boolean numpy array
+    Output:
+        means: a (groups x teams x fields) numpy array (NaN if a team has no results on the images of a subgroup)
+    '''
+
+    values = np.asarray(values, dtype=float)
+    is_known = np.logical_not(np.isnan(values))
+
+    # sums and number of images of all the subgroups at once
+    masks = masks.astype(float)
+    sums = np.einsum('gi,tif->gtf', masks, np.where(is_known, values, 0.0))
+    counts = np.einsum('gi,tif->gtf', masks, is_known.astype(float))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+
+def get_subgroup_results(per_image_results, groups):
+    '''
+    Compute the metrics of the challenge on each subgroup, from the results per image of all the teams (the predictions
+    are not evaluated again)
+
+    Input:
+        per_image_results: the results per image, as retrieved by util.per_image_results.load_per_image_results
+        groups: a list of (name, set of image keys) pairs, as retrieved by get_subgroups
+    Output:
+        results: a (groups x teams x len(SUBGROUP_COLUMNS)) numpy array with the metrics of each team on each subgroup
+        sizes: a (groups x len(SUBGROUP_SIZE_COLUMNS)) numpy array with the number of images of each subgroup
+    '''
+
+    n_teams = per_image_results['segmentation']['values'].shape[0]
+    results = np.full((len(groups), n_teams, len(SUBGROUP_COLUMNS)), np.nan)
+    sizes = np.zeros((len(groups), len(SUBGROUP_SIZE_COLUMNS)))
+
+    # mean values of the segmentation and the fovea location
+    for task, columns, size_column in [ ('segmentation', [0, 1, 2], 0), ('fovea_location', [5], 3) ]:
+        masks = get_group_masks(per_image_results[task]['images'], groups)
+        results[:, :, columns] = get_masked_means(per_image_results[task]['values'], masks)
+        sizes[:, size_column] = np.sum(masks, axis=1)
+
+    # AUC and reference sensitivity of the classification
+    classification_results = per_image_results['classification']
+    masks = get_group_masks(classification_results['images'], groups)
+    scores = classification_results['values'][:, :, classification_results['fields'].index('Score')]
+    labels = get_classification_labels(per_image_results)
+    sizes[:, 1] = np.sum(masks, axis=1)
+    sizes[:, 2] = np.sum(masks & (labels == 1)[np.newaxis,:], axis=1)
+    for g in range(len(groups)):
+        for t in range(n_teams):
+            # the curve needs images of both classes
+            is_selected = masks[g] & np.logical_not(np.isnan(scores[t])) & np.logical_not(np.isnan(labels))
+            if len(np.unique(labels[is_selected])) < 2:
+                continue
+            sensitivity, fpr, auc = get_roc_curve(scores[t, is_selected], labels[is_selected])
+            results[g, t, 3:5] = [ auc, get_sensitivity_at_given_specificity(sensitivity, 1 - fpr) ]
+
+    return results, sizes
+
+
+
+def get_group_folder_name(name):
+    '''
+    Get a name that can be used as a folder for a subgroup (e.g. 'Device_Zeiss' for 'Device/Zeiss')
+    '''
+    return re.sub(r'[^A-Za-z0-9_.=-]+', '_', name)
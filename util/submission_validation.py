@@ -0,0 +1,617 @@
+
+import csv
+import io
+import time
+import zipfile
+
+import numpy as np
+
+from os import path
+
+from util.file_management import get_filenames, get_labels_from_training_data, read_gt_labels, read_gt_fovea_location, FOVEA_HEATMAP_FILENAMES, FOVEA_HEATMAP_DTYPES
+from util.image_io import IMAGE_HEADER_SIZE, identify_image_format, read_bmp_header, read_image_header
+from util.rle_masks import SEGMENTATION_RLE_FILENAMES, SEGMENTATION_RLE_COLUMNS, parse_rle_string
+
+
+# names of the tasks of the challenge, as used in the validation reports
+TASKS = ['segmentation', 'classification', 'fovea_location']
+
+# names of the result files that are expected at the root of a submission
+CLASSIFICATION_FILENAMES = ['classification_results.csv']
+FOVEA_LOCATION_FILENAMES = ['fovea_location_results.csv', 'fovea_localization_results.csv']
+
+# bit depths of the segmentation masks that the evaluation code is able to process
+SUPPORTED_BIT_DEPTHS = [8, 24, 32]
+
+
+def build_gt_index(gt_folder, is_training=False):
+    '''
+    Collect the names of the ground truth files and the sizes of the ground truth masks, so they can be
+    used to validate many submissions without reading the ground truth again
+
+    Input:
+        gt_folder: full path to the ground truth files
+        [is_training]: a boolean value indicating if the evaluation is performed on training data or not
+    Output:
+        gt_index: a dictionary with the following fields (None if the ground truth of the task is not available):
+            segmentation: a dictionary mapping each mask filename to its (width, height)
+            classification: a set with the upper case filenames of the images with classification labels
+            fovea_location: a set with the filenames of the images with fovea location labels
+    '''
+
+    gt_index = { 'segmentation': None, 'classification': None, 'fovea_location': None }
+
+    # index the segmentation masks
+    gt_segmentation_folder = path.join(gt_folder, 'Disc_Cup_Masks')
+    if is_training:
+        gt_segmentation_folders = [ path.join(gt_segmentation_folder, 'Glaucoma'), path.join(gt_segmentation_folder, 'Non-Glaucoma') ]
+    else:
+        gt_segmentation_folders = [ gt_segmentation_folder ]
+    if all([ path.exists(folder) for folder in gt_segmentation_folders ]):
+        gt_index['segmentation'] = dict()
+        for folder in gt_segmentation_folders:
+            for filename in get_filenames(folder, 'bmp'):
+                # read only the header of the mask
+                _, header = read_image_header(path.join(folder, filename))
+                gt_index['segmentation'][filename] = None if header is None else (header['width'], header['height'])
+
+    # index the classification labels
+    try:
+        if is_training:
+            gt_filenames, _ = get_labels_from_training_data(gt_segmentation_folder)
+        else:
+            gt_filenames, _ = read_gt_labels(path.join(gt_folder, 'GT.xlsx'))
+        gt_index['classification'] = set([ filename.upper() for filename in gt_filenames ])
+    except (IOError, OSError):
+        pass
+
+    # index the fovea location labels
+    try:
+        if is_training:
+            gt_filenames, _ = read_gt_fovea_location(path.join(gt_folder, 'Fovea_location.xlsx'), is_training)
+        else:
+            gt_filenames, _ = read_gt_fovea_location(path.join(gt_folder, 'Fovea_locations.xlsx'), is_training)
+        gt_index['fovea_location'] = set(gt_filenames)
+    except (IOError, OSError):
+        pass
+
+    return gt_index
+
+
+
+def merge_gt_indexes(gt_indexes):
+    '''
+    Merge the indexes of several ground truth sets, to validate the submissions that are evaluated against all of them
+
+    Input:
+        gt_indexes: a list of ground truth indexes, as retrieved by build_gt_index
+    Output:
+        gt_index: an index with the images of all the sets (None for the tasks without ground truth in any set)
+    '''
+
+    gt_index = { 'segmentation': None, 'classification': None, 'fovea_location': None }
+    for current_index in gt_indexes:
+        if not (current_index['segmentation'] is None):
+            gt_index['segmentation'] = dict(gt_index['segmentation'] or dict(), **current_index['segmentation'])
+        for task in ['classification', 'fovea_location']:
+            if not (current_index[task] is None):
+                gt_index[task] = (gt_index[task] or set()) | current_index[task]
+
+    return gt_index
+
+
+
+def validate_submission(submission_file, gt_index):
+    '''
+    Validate the format of a submission using only the central directory of the zip file, the headers of
+    the segmentation masks and the rows of the CSV files. Nothing is extracted to the disk.
+
+    Input:
+        submission_file: full path and filename of the .zip file
+        gt_index: the ground truth index, as retrieved by build_gt_index
+    Output:
+        report: a dictionary with the following fields:
+            submission: the filename of the submission
+            is_zip: a boolean indicating if the file is a valid zip file
+            root_folder: the folder inside the zip file that contains the results ('' if they are at the root)
+            tasks: a dictionary with an entry per task, with the fields present, valid, n_files and n_expected
+            messages: a list of (level, task, message) tuples, with level being 'error' or 'warning'
+            elapsed_time: time (in seconds) spent validating the submission
+    '''
+
+    start_time = time.time()
+
+    # initialize the report
+    report = { 'submission': path.basename(submission_file), 'is_zip': False, 'root_folder': '', 'tasks': dict(), 'messages': [] }
+    for task in TASKS:
+        report['tasks'][task] = { 'present': False, 'valid': False, 'n_files': 0, 'n_expected': None if gt_index[task] is None else len(gt_index[task]) }
+
+    # check the compression format
+    if not zipfile.is_zipfile(submission_file):
+        with open(submission_file, 'rb') as input_file:
+            magic_number = input_file.read(8)
+        if magic_number.startswith(b'Rar!'):
+            add_message(report, 'error', None, 'The submission is a RAR file. Please, use ZIP compression.')
+        elif magic_number.startswith(b'7z'):
+            add_message(report, 'error', None, 'The submission is a 7z file. Please, use ZIP compression.')
+        else:
+            add_message(report, 'error', None, 'The submission is not a valid ZIP file.')
+        report['elapsed_time'] = time.time() - start_time
+        return report
+    report['is_zip'] = True
+
+    with zipfile.ZipFile(submission_file, 'r') as zip_ref:
+
+        # get the list of files from the central directory, ignoring the folders and the MacOS metadata
+        members = dict()
+        for info in zip_ref.infolist():
+            if not info.filename.endswith('/') and not info.filename.startswith('__MACOSX'):
+                members[info.filename] = info
+
+        # identify the folder with the results
+        report['root_folder'] = find_root_folder(members.keys())
+        if report['root_folder'] != '':
+            add_message(report, 'warning', None, 'The results are inside the folder "{}" instead of the root of the ZIP file.'.format(report['root_folder'][:-1]))
+
+        # validate each task
+        validate_segmentation_members(zip_ref, members, report, gt_index['segmentation'])
+        validate_classification_member(zip_ref, members, report, gt_index['classification'])
+        validate_fovea_location_member(zip_ref, members, report, gt_index['fovea_location'])
+
+    if not any([ report['tasks'][task]['present'] for task in TASKS ]):
+        add_message(report, 'error', None, 'The submission does not contain results for any task.')
+
+    report['elapsed_time'] = time.time() - start_time
+
+    return report
+
+
+
+def get_valid_tasks(report):
+    '''
+    Get the list of tasks that passed the validation
+
+    Input:
+        report: a validation report, as retrieved by validate_submission
+    Output:
+        tasks: a list with the names of the tasks that are present in the submission and have no errors
+    '''
+
+    return [ task for task in TASKS if report['tasks'][task]['present'] and report['tasks'][task]['valid'] ]
+
+
+
+def add_message(report, level, task, message):
+    '''
+    Add a message to a validation report, and mark the task as invalid in case of an error
+
+    Input:
+        report: a validation report
+        level: 'error' or 'warning'
+        task: the name of the task, or None if the message refers to the whole submission
+        message: a string with the message
+    '''
+
+    report['messages'] = report['messages'] + [ (level, task, message) ]
+    if level == 'error' and not (task is None):
+        report['tasks'][task]['valid'] = False
+
+
+
+def find_root_folder(member_names):
+    '''
+    Identify the folder that contains the results, following the same rules than evaluate_single_submission
+
+    Input:
+        member_names: the names of the files inside the zip file
+    Output:
+        root_folder: '' if the results are at the root of the zip file, or the name of the folder (ending with /)
+    '''
+
+    member_names = list(member_names)
+    expected_names = [ 'segmentation/', 'segmentation_probabilities/' ] + SEGMENTATION_RLE_FILENAMES + CLASSIFICATION_FILENAMES + FOVEA_LOCATION_FILENAMES + FOVEA_HEATMAP_FILENAMES[:1]
+
+    # check if there are results at the root
+    for name in member_names:
+        for expected_name in expected_names:
+            if name == expected_name or (expected_name.endswith('/') and name.startswith(expected_name)):
+                return ''
+
+    # otherwise, look for them inside the first level of folders
+    for name in sorted(member_names):
+        parts = name.split('/')
+        if len(parts) > 1:
+            current_folder = parts[0] + '/'
+            for expected_name in expected_names:
+                if name == current_folder + expected_name or (expected_name.endswith('/') and name.startswith(current_folder + expected_name)):
+                    return current_folder
+
+    return ''
+
+
+
+def validate_segmentation_members(zip_ref, members, report, gt_masks):
+    '''
+    Validate the segmentation masks of a submission from their names and headers
+
+    Input:
+        zip_ref: the opened zip file
+        members: a dictionary mapping the names of the files inside the zip file to their ZipInfo
+        report: the validation report to fill
+        gt_masks: a dictionary mapping each gt mask filename to its (width, height), or None if not available
+    '''
+
+    task = 'segmentation'
+    segmentation_folder = report['root_folder'] + 'segmentation/'
+
+    # get the files inside the segmentation folder (only the first level, as get_filenames does)
+    filenames = [ name[len(segmentation_folder):] for name in members.keys() if name.startswith(segmentation_folder) ]
+    if len(filenames) == 0:
+        # the masks might be run-length encoded or probability maps instead
+        validate_segmentation_rle_member(zip_ref, members, report, gt_masks)
+        if not report['tasks'][task]['present']:
+            validate_probability_map_members(members, report, gt_masks)
+        return
+    report['tasks'][task]['present'] = True
+    report['tasks'][task]['valid'] = True
+
+    # classify the files according to their extensions
+    bmp_filenames = [ filename for filename in filenames if filename.endswith('.bmp') and not '/' in filename ]
+    capitalized_filenames = [ filename for filename in filenames if filename.lower().endswith('.bmp') and not filename.endswith('.bmp') ]
+    other_image_filenames = [ filename for filename in filenames if filename.lower().endswith(('.tif', '.tiff', '.png', '.jpg', '.jpeg', '.gif')) ]
+    useless_filenames = [ filename for filename in filenames if not filename.lower().endswith(('.bmp', '.tif', '.tiff', '.png', '.jpg', '.jpeg', '.gif')) or '/' in filename ]
+    report['tasks'][task]['n_files'] = len(bmp_filenames)
+
+    if len(capitalized_filenames) > 0:
+        add_message(report, 'warning', task, '{} segmentation files have the extension in capital letters (e.g. {}). They will be ignored.'.format(len(capitalized_filenames), capitalized_filenames[0]))
+    if len(other_image_filenames) > 0:
+        add_message(report, 'warning', task, '{} segmentation files are not in BMP format (e.g. {}). They will be ignored.'.format(len(other_image_filenames), other_image_filenames[0]))
+    if len(useless_filenames) > 0:
+        add_message(report, 'warning', task, 'The segmentation folder contains {} useless files or folders (e.g. {}).'.format(len(useless_filenames), useless_filenames[0]))
+    if len(bmp_filenames) == 0:
+        add_message(report, 'error', task, 'The segmentation folder does not include any bmp file. Check the files extension and resubmit your results.')
+        return
+
+    # check the coverage with respect to the ground truth
+    if not (gt_masks is None):
+        unknown_filenames = [ filename for filename in bmp_filenames if not (filename in gt_masks) ]
+        missing_filenames = [ filename for filename in gt_masks.keys() if not (filename in bmp_filenames) ]
+        if len(unknown_filenames) > 0:
+            add_message(report, 'error', task, '{} segmentation files do not correspond to any ground truth image (e.g. {}).'.format(len(unknown_filenames), unknown_filenames[0]))
+        if len(missing_filenames) > 0:
+            add_message(report, 'warning', task, '{} ground truth images have no segmentation (e.g. {}).'.format(len(missing_filenames), missing_filenames[0]))
+
+    # check the headers of the masks
+    wrong_sizes = []
+    wrong_formats = []
+    wrong_bit_depths = []
+    rgb_filenames = []
+    for filename in bmp_filenames:
+        # decompress only the first bytes of the file
+        with zip_ref.open(members[segmentation_folder + filename], 'r') as image_file:
+            header_bytes = image_file.read(IMAGE_HEADER_SIZE)
+        image_format = identify_image_format(header_bytes)
+        if image_format != 'bmp':
+            wrong_formats = wrong_formats + [ (filename, image_format) ]
+            continue
+        try:
+            header = read_bmp_header(header_bytes)
+        except ValueError:
+            wrong_formats = wrong_formats + [ (filename, 'corrupted BMP') ]
+            continue
+        # check the size
+        if not (gt_masks is None) and (filename in gt_masks) and not (gt_masks[filename] is None):
+            if (header['width'], header['height']) != gt_masks[filename]:
+                wrong_sizes = wrong_sizes + [ (filename, header['width'], header['height'], gt_masks[filename]) ]
+        # check the bit depth
+        if not (header['bits_per_pixel'] in SUPPORTED_BIT_DEPTHS):
+            wrong_bit_depths = wrong_bit_depths + [ (filename, header['bits_per_pixel']) ]
+        elif header['bits_per_pixel'] > 8:
+            rgb_filenames = rgb_filenames + [ filename ]
+
+    if len(wrong_formats) > 0:
+        add_message(report, 'warning', task, '{} segmentation files have a .bmp extension but are not BMP files (e.g. {} is {}).'.format(len(wrong_formats), wrong_formats[0][0], wrong_formats[0][1]))
+    if len(wrong_sizes) > 0:
+        add_message(report, 'error', task, '{} segmentation masks do not have the size of the original images (e.g. {} is {}x{} instead of {}x{}).'.format(len(wrong_sizes), wrong_sizes[0][0], wrong_sizes[0][1], wrong_sizes[0][2], wrong_sizes[0][3][0], wrong_sizes[0][3][1]))
+    if len(wrong_bit_depths) > 0:
+        add_message(report, 'error', task, '{} segmentation masks have an unsupported bit depth (e.g. {} has {} bits per pixel).'.format(len(wrong_bit_depths), wrong_bit_depths[0][0], wrong_bit_depths[0][1]))
+    if len(rgb_filenames) > 0:
+        add_message(report, 'warning', task, '{} segmentation masks were saved as RGB (e.g. {}). Only the first channel will be used.'.format(len(rgb_filenames), rgb_filenames[0]))
+
+
+
+def validate_segmentation_rle_member(zip_ref, members, report, gt_masks):
+    '''
+    Validate the CSV file with the run-length encoded segmentations (see util.rle_masks)
+
+    Input:
+        zip_ref: the opened zip file
+        members: a dictionary mapping the names of the files inside the zip file to their ZipInfo
+        report: the validation report to fill
+        gt_masks: a dictionary mapping each gt mask filename to its (width, height), or None if not available
+    '''
+
+    task = 'segmentation'
+    rows = read_csv_member(zip_ref, members, report, task, SEGMENTATION_RLE_FILENAMES)
+    if rows is None:
+        return
+    report['tasks'][task]['n_files'] = len(rows) - 1
+
+    # check the rows, parsing the runs
+    wrong_rows = []
+    sizes = dict()
+    for i in range(1, len(rows)):
+        try:
+            if len(rows[i]) != len(SEGMENTATION_RLE_COLUMNS):
+                raise ValueError()
+            height, width = int(rows[i][1]), int(rows[i][2])
+            parse_rle_string(rows[i][3], height * width)
+            parse_rle_string(rows[i][4], height * width)
+            sizes[rows[i][0].strip()] = (width, height)
+        except ValueError:
+            wrong_rows.append(i)
+    if len(wrong_rows) > 0:
+        add_message(report, 'error', task, '{} rows do not have a filename, a height, a width and two valid RLE masks (e.g. row {}).'.format(len(wrong_rows), wrong_rows[0] + 1))
+        return
+
+    # check the coverage and the sizes with respect to the ground truth
+    if not (gt_masks is None):
+        unknown_filenames = [ filename for filename in sizes.keys() if not (filename in gt_masks) ]
+        missing_filenames = [ filename for filename in gt_masks.keys() if not (filename in sizes) ]
+        wrong_sizes = [ filename for filename in sizes.keys() if filename in gt_masks and not (gt_masks[filename] is None) and sizes[filename] != gt_masks[filename] ]
+        if len(unknown_filenames) > 0:
+            add_message(report, 'error', task, '{} segmentations do not correspond to any ground truth image (e.g. {}).'.format(len(unknown_filenames), unknown_filenames[0]))
+        if len(missing_filenames) > 0:
+            add_message(report, 'warning', task, '{} ground truth images have no segmentation (e.g. {}).'.format(len(missing_filenames), missing_filenames[0]))
+        if len(wrong_sizes) > 0:
+            add_message(report, 'error', task, '{} segmentations do not have the size of the original images (e.g. {} is {}x{} instead of {}x{}).'.format(len(wrong_sizes), wrong_sizes[0], sizes[wrong_sizes[0]][0], sizes[wrong_sizes[0]][1], gt_masks[wrong_sizes[0]][0], gt_masks[wrong_sizes[0]][1]))
+
+
+
+def validate_probability_map_members(members, report, gt_masks):
+    '''
+    Validate the names of the probability maps of the optic cup and disc of a submission
+
+    Input:
+        members: a dictionary mapping the names of the files inside the zip file to their ZipInfo
+        report: the validation report to fill
+        gt_masks: a dictionary mapping each gt mask filename to its (width, height), or None if not available
+    '''
+
+    task = 'segmentation'
+    probability_folder = report['root_folder'] + 'segmentation_probabilities/'
+
+    # get the BMP files of each structure
+    filenames = dict()
+    for structure in ['cup', 'disc']:
+        structure_folder = probability_folder + structure + '/'
+        filenames[structure] = set([ name[len(structure_folder):] for name in members.keys() if name.startswith(structure_folder) and name.endswith('.bmp') and not '/' in name[len(structure_folder):] ])
+    if len(filenames['cup']) == 0 and len(filenames['disc']) == 0:
+        return
+    report['tasks'][task]['present'] = True
+    report['tasks'][task]['valid'] = True
+    report['tasks'][task]['n_files'] = len(filenames['cup'])
+
+    # both structures need a map for each image
+    unpaired_filenames = sorted(filenames['cup'].symmetric_difference(filenames['disc']))
+    if len(unpaired_filenames) > 0:
+        add_message(report, 'error', task, '{} images do not have both the cup and the disc probability maps (e.g. {}).'.format(len(unpaired_filenames), unpaired_filenames[0]))
+        return
+
+    # check the coverage with respect to the ground truth
+    if not (gt_masks is None):
+        unknown_filenames = sorted([ filename for filename in filenames['cup'] if not (filename in gt_masks) ])
+        missing_filenames = sorted([ filename for filename in gt_masks.keys() if not (filename in filenames['cup']) ])
+        if len(unknown_filenames) > 0:
+            add_message(report, 'error', task, '{} probability maps do not correspond to any ground truth image (e.g. {}).'.format(len(unknown_filenames), unknown_filenames[0]))
+        if len(missing_filenames) > 0:
+            add_message(report, 'warning', task, '{} ground truth images have no probability maps (e.g. {}).'.format(len(missing_filenames), missing_filenames[0]))
+
+
+
+def read_csv_member(zip_ref, members, report, task, candidate_filenames):
+    '''
+    Read the rows of a CSV file inside a zip file
+
+    Input:
+        zip_ref: the opened zip file
+        members: a dictionary mapping the names of the files inside the zip file to their ZipInfo
+        report: the validation report to fill
+        task: the name of the task
+        candidate_filenames: list of valid names for the CSV file
+    Output:
+        rows: a list with the rows of the CSV file (including the header), or None if the file is not available
+    '''
+
+    # find the file
+    member_name = None
+    for filename in candidate_filenames:
+        if (report['root_folder'] + filename) in members:
+            member_name = report['root_folder'] + filename
+            break
+    if member_name is None:
+        # check if it was submitted with a wrong extension or capitalization
+        for name in members.keys():
+            if path.basename(name).lower() in candidate_filenames:
+                add_message(report, 'warning', task, 'Found {} but it will be ignored. Make sure that the name and location of the file are correct.'.format(name))
+        return None
+    report['tasks'][task]['present'] = True
+    report['tasks'][task]['valid'] = True
+
+    # read and decode the content
+    try:
+        content = zip_ref.read(member_name).decode('utf-8')
+    except UnicodeDecodeError:
+        add_message(report, 'error', task, 'The file {} is not encoded in utf-8.'.format(member_name))
+        return None
+
+    rows = [ row for row in csv.reader(io.StringIO(content)) ]
+    if len(rows) < 2:
+        add_message(report, 'error', task, 'The file {} does not contain any results.'.format(member_name))
+        return None
+
+    return rows
+
+
+
+def validate_classification_member(zip_ref, members, report, gt_filenames):
+    '''
+    Validate the CSV file with the classification results
+
+    Input:
+        zip_ref: the opened zip file
+        members: a dictionary mapping the names of the files inside the zip file to their ZipInfo
+        report: the validation report to fill
+        gt_filenames: a set with the upper case names of the images with gt labels, or None if not available
+    '''
+
+    task = 'classification'
+    rows = read_csv_member(zip_ref, members, report, task, CLASSIFICATION_FILENAMES)
+    if rows is None:
+        return
+    report['tasks'][task]['n_files'] = len(rows) - 1
+
+    # check the header
+    if len(rows[0]) > 1 and is_float(rows[0][1]):
+        add_message(report, 'warning', task, 'The CSV file seems to have no header. The first row will be ignored.')
+
+    # check the rows
+    wrong_rows = [ i for i in range(1, len(rows)) if len(rows[i]) < 2 or not is_float(rows[i][1]) ]
+    if len(wrong_rows) > 0:
+        add_message(report, 'error', task, '{} rows do not have a valid score (e.g. row {}).'.format(len(wrong_rows), wrong_rows[0] + 1))
+        return
+
+    # check the coverage with respect to the ground truth
+    if not (gt_filenames is None):
+        predicted_filenames = [ rows[i][0].upper() for i in range(1, len(rows)) ]
+        unknown_filenames = [ filename for filename in predicted_filenames if not (filename in gt_filenames) ]
+        if len(unknown_filenames) > 0:
+            add_message(report, 'error', task, '{} rows do not correspond to any ground truth image (e.g. {}).'.format(len(unknown_filenames), unknown_filenames[0]))
+        if len(set(predicted_filenames)) < len(gt_filenames):
+            add_message(report, 'warning', task, 'The CSV file has results for {} images, but there are {} ground truth images.'.format(len(set(predicted_filenames)), len(gt_filenames)))
+
+
+
+def validate_fovea_location_member(zip_ref, members, report, gt_filenames):
+    '''
+    Validate the CSV file with the fovea location results
+
+    Input:
+        zip_ref: the opened zip file
+        members: a dictionary mapping the names of the files inside the zip file to their ZipInfo
+        report: the validation report to fill
+        gt_filenames: a set with the names of the images with gt labels, or None if not available
+    '''
+
+    task = 'fovea_location'
+    rows = read_csv_member(zip_ref, members, report, task, FOVEA_LOCATION_FILENAMES)
+    if rows is None:
+        # the fovea might be given as heatmaps instead
+        if not report['tasks'][task]['present']:
+            validate_fovea_heatmap_members(zip_ref, members, report, gt_filenames)
+        return
+    report['tasks'][task]['n_files'] = len(rows) - 1
+
+    # check the header
+    if len(rows[0]) > 2 and is_float(rows[0][1]) and is_float(rows[0][2]):
+        add_message(report, 'warning', task, 'The CSV file seems to have no header. The first row will be ignored.')
+
+    # check the rows
+    wrong_rows = [ i for i in range(1, len(rows)) if len(rows[i]) != 3 or not is_float(rows[i][1]) or not is_float(rows[i][2]) ]
+    if len(wrong_rows) > 0:
+        add_message(report, 'error', task, '{} rows do not have exactly a filename and two coordinates (e.g. row {}).'.format(len(wrong_rows), wrong_rows[0] + 1))
+        return
+
+    # check the coverage with respect to the ground truth
+    if not (gt_filenames is None):
+        predicted_filenames = [ rows[i][0] for i in range(1, len(rows)) ]
+        unknown_filenames = [ filename for filename in predicted_filenames if not (filename in gt_filenames) ]
+        if len(unknown_filenames) > 0:
+            add_message(report, 'error', task, '{} rows do not correspond to any ground truth image (e.g. {}).'.format(len(unknown_filenames), unknown_filenames[0]))
+        if len(set(predicted_filenames)) < len(gt_filenames):
+            add_message(report, 'warning', task, 'The CSV file has results for {} images, but there are {} ground truth images.'.format(len(set(predicted_filenames)), len(gt_filenames)))
+
+
+
+def validate_fovea_heatmap_members(zip_ref, members, report, gt_filenames):
+    '''
+    Validate the stack of fovea heatmaps and the file with their names (see util.file_management.FOVEA_HEATMAP_FILENAMES).
+    Only the header of the stack is decompressed
+
+    Input:
+        zip_ref: the opened zip file
+        members: a dictionary mapping the names of the files inside the zip file to their ZipInfo
+        report: the validation report to fill
+        gt_filenames: a set with the names of the images with gt labels, or None if not available
+    '''
+
+    task = 'fovea_location'
+    heatmap_member = report['root_folder'] + FOVEA_HEATMAP_FILENAMES[0]
+    if not (heatmap_member in members):
+        return
+    report['tasks'][task]['present'] = True
+    report['tasks'][task]['valid'] = True
+
+    # read the shape and the type of the stack
+    try:
+        with zip_ref.open(members[heatmap_member], 'r') as heatmap_file:
+            version = np.lib.format.read_magic(heatmap_file)
+            if version == (1, 0):
+                shape, _, dtype = np.lib.format.read_array_header_1_0(heatmap_file)
+            else:
+                shape, _, dtype = np.lib.format.read_array_header_2_0(heatmap_file)
+    except ValueError:
+        add_message(report, 'error', task, 'The file {} is not a valid .npy file.'.format(heatmap_member))
+        return
+    if len(shape) != 3 or not (dtype.name in FOVEA_HEATMAP_DTYPES):
+        add_message(report, 'error', task, 'The fovea heatmaps must be a (images x height x width) stack of 8 or 16-bit maps, not a {} array of {}.'.format(shape, dtype.name))
+        return
+
+    # read the names of the heatmaps
+    rows = read_csv_member(zip_ref, members, report, task, FOVEA_HEATMAP_FILENAMES[1:])
+    if rows is None:
+        if report['tasks'][task]['valid']:
+            add_message(report, 'error', task, 'The fovea heatmaps have no {} file with the filename of each map.'.format(FOVEA_HEATMAP_FILENAMES[1]))
+        return
+    report['tasks'][task]['n_files'] = len(rows) - 1
+    if len(rows) - 1 != shape[0]:
+        add_message(report, 'error', task, 'There are {} fovea heatmaps but {} filenames.'.format(shape[0], len(rows) - 1))
+        return
+
+    # check the coverage with respect to the ground truth
+    if not (gt_filenames is None):
+        predicted_filenames = [ rows[i][0] for i in range(1, len(rows)) if len(rows[i]) > 0 ]
+        unknown_filenames = [ filename for filename in predicted_filenames if not (filename in gt_filenames) ]
+        if len(unknown_filenames) > 0:
+            add_message(report, 'error', task, '{} heatmaps do not correspond to any ground truth image (e.g. {}).'.format(len(unknown_filenames), unknown_filenames[0]))
+        if len(set(predicted_filenames)) < len(gt_filenames):
+            add_message(report, 'warning', task, 'There are heatmaps for {} images, but there are {} ground truth images.'.format(len(set(predicted_filenames)), len(gt_filenames)))
+
+
+
+def is_float(value):
+    '''
+    Check if a string can be parsed as a float
+    '''
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+
+def print_validation_report(report):
+    '''
+    Print the messages of a validation report on screen
+
+    Input:
+        report: a validation report, as retrieved by validate_submission
+    '''
+
+    for level, task, message in report['messages']:
+        if level == 'error':
+            print('> *** {}{}'.format('' if task is None else '[' + task + '] ', message))
+        else:
+            print('> {}{}'.format('' if task is None else '[' + task + '] ', message))
+    print('> Validation took {:.3f} seconds'.format(report['elapsed_time']))
@@ -0,0 +1,133 @@
+
+import csv
+import numpy as np
+
+from os import path
+
+
+def get_submission_name(submission_filename):
+    '''
+    Get the name of a submission as it appears in the table of results (the name of the zip file, without extension)
+
+    Input:
+        submission_filename: name (or full path) of the submission, with or without extension
+    Output:
+        submission_name: the name of the submission
+    '''
+
+    submission_name = path.basename(submission_filename)
+    if submission_name.lower().endswith('.zip'):
+        submission_name = submission_name[:-4]
+
+    return submission_name
+
+
+
+def read_team_manifest(manifest_filename):
+    '''
+    Read a CSV file mapping each submission to its team. The file must have a header with the columns
+    Submission and Team, and optionally a Timestamp column used to order the submissions of each team
+    (either numbers or ISO 8601 strings, e.g. 2018-08-01 13:45:00)
+
+    Input:
+        manifest_filename: full path and filename of the CSV file
+    Output:
+        manifest: a dictionary mapping each submission name (see get_submission_name) to a tuple (team, timestamp),
+                  with timestamp being None if it is not given (or its cell is blank)
+    '''
+
+    manifest = dict()
+
+    # open the file
+    with open(manifest_filename, 'r') as csv_file:
+        # initialize the reader
+        csv_reader = csv.reader(csv_file)
+        # get the position of each column
+        header = [ column.strip().lower() for column in next(csv_reader) ]
+        submission_column = header.index('submission')
+        team_column = header.index('team')
+        timestamp_column = header.index('timestamp') if 'timestamp' in header else None
+        # and now, iterate and fill the dictionary
+        for row in csv_reader:
+            if len(row) == 0:
+                continue
+            timestamp = None
+            if not (timestamp_column is None) and timestamp_column < len(row):
+                timestamp = row[timestamp_column].strip()
+            # the blank cells are missing timestamps, otherwise they would break the numeric order of the rest
+            if timestamp == '':
+                timestamp = None
+            manifest[get_submission_name(row[submission_column].strip())] = (row[team_column].strip(), timestamp)
+
+    return manifest
+
+
+
+def get_submission_order(submissions, timestamps):
+    '''
+    Get the order of the submissions from their timestamps
+
+    Input:
+        submissions: a list of strings with the names of the submissions
+        timestamps: a list with the timestamp of each submission (string or None)
+    Output:
+        order: a 1D numpy array with the position of each submission in time (higher is later). Submissions without
+               timestamp are ordered by name, before the ones with timestamp
+    '''
+
+    # use numeric timestamps if all of them are numbers, and the lexicographic order (as in ISO 8601) otherwise
+    given_timestamps = [ timestamp for timestamp in timestamps if not (timestamp is None) ]
+    try:
+        keys = [ float(timestamp) for timestamp in given_timestamps ]
+    except ValueError:
+        keys = given_timestamps
+
+    # position of each timestamp among all of them
+    positions = np.zeros(len(submissions))
+    if len(keys) > 0:
+        _, inverse = np.unique(np.asarray(keys), return_inverse=True)
+        positions[[ i for i in range(len(submissions)) if not (timestamps[i] is None) ]] = inverse + 1
+
+    # break the ties (and order the submissions without timestamp) by name
+    _, name_positions = np.unique(np.asarray(submissions, dtype=str), return_inverse=True)
+
+    return positions * len(submissions) + name_positions
+
+
+
+def build_team_index(submissions, manifest_filename=None, separator=None):
+    '''
+    Map the submissions to their teams. By default, each submission is its own team
+
+    Input:
+        submissions: a list of strings with the names of the submissions (as in the table of results)
+        [manifest_filename]: a CSV file mapping the submissions to the teams (see read_team_manifest). Submissions
+                             missing in the manifest are their own team
+        [separator]: if given, the team of a submission that is not in the manifest is the part of its name before
+                     the separator (e.g. BestTeam for BestTeam__v2 with separator __)
+    Output:
+        team_names: a sorted list with the names of the teams
+        team_indices: a 1D numpy array with the index (in team_names) of the team of each submission
+        order: a 1D numpy array with the order of the submissions (higher is later), from the timestamps of the manifest
+               or, if not given, from the names of the submissions
+    '''
+
+    manifest = dict() if manifest_filename is None else read_team_manifest(manifest_filename)
+
+    # retrieve the team and the timestamp of each submission
+    teams = []
+    timestamps = []
+    for submission in submissions:
+        if submission in manifest:
+            team, timestamp = manifest[submission]
+        elif not (separator is None) and separator in submission:
+            team, timestamp = submission.split(separator)[0], None
+        else:
+            team, timestamp = submission, None
+        teams.append(team)
+        timestamps.append(timestamp)
+
+    # index the teams
+    team_names, team_indices = np.unique(np.asarray(teams, dtype=str), return_inverse=True)
+
+    return team_names.tolist(), team_indices, get_submission_order(submissions, timestamps)
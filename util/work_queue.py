@@ -0,0 +1,242 @@
+
+import csv
+import errno
+import os
+import socket
+import time
+
+from os import path, makedirs, listdir
+
+from util.file_management import export_table_of_results
+
+
+def initialize_work_queue(queue_folder):
+    '''
+    Create the folder structure of a work queue shared by several workers
+
+    Input:
+        queue_folder: full path to a folder visible by all the workers (e.g. a shared network drive)
+    '''
+
+    # create the folders for the claims, the finished submissions and the results shards
+    for subfolder in ['claims', 'done', 'shards']:
+        current_folder = path.join(queue_folder, subfolder)
+        if not path.exists(current_folder):
+            try:
+                makedirs(current_folder)
+            except OSError as e:
+                # another worker might have created it in the meantime
+                if e.errno != errno.EEXIST:
+                    raise
+
+
+
+def is_submission_done(queue_folder, submission_file):
+    '''
+    Check if a submission was already evaluated by any of the workers
+
+    Input:
+        queue_folder: full path to the work queue folder
+        submission_file: filename of the submission (e.g. BestTeam.zip)
+    Output:
+        a boolean indicating if the submission was already evaluated
+    '''
+
+    return path.exists(path.join(queue_folder, 'done', submission_file + '.done'))
+
+
+
+def claim_submission(queue_folder, submission_file):
+    '''
+    Try to claim a submission for the current worker. The owner of the claim is written in a temporary file, which is
+    then linked to the name of the lock. The link fails if the lock already exists, so only one worker will succeed even
+    if several of them try at the same time, and a lock is never empty nor modified once it exists.
+
+    Input:
+        queue_folder: full path to the work queue folder
+        submission_file: filename of the submission (e.g. BestTeam.zip)
+    Output:
+        a boolean indicating if the submission was claimed by the current worker
+    '''
+
+    # don't claim submissions that were already evaluated
+    if is_submission_done(queue_folder, submission_file):
+        return False
+
+    lock_filename = path.join(queue_folder, 'claims', submission_file + '.lock')
+
+    # release the claim if it belongs to a worker of this machine that is not running anymore
+    release_stale_claim(lock_filename)
+
+    # write who owns the claim, and link it to the lock, failing if it already exists
+    temporary_filename = lock_filename + '.{}.{}.tmp'.format(socket.gethostname(), os.getpid())
+    with open(temporary_filename, 'w') as lock_file:
+        lock_file.write('{} {} {}\n'.format(socket.gethostname(), os.getpid(), time.time()))
+    try:
+        os.link(temporary_filename, lock_filename)
+    except OSError as e:
+        if e.errno == errno.EEXIST:
+            return False
+        raise
+    finally:
+        os.remove(temporary_filename)
+
+    return True
+
+
+
+def read_claim_owner(lock_filename):
+    '''
+    Read the owner of a claim
+
+    Input:
+        lock_filename: full path to the lock file
+    Output:
+        owner: a list with the host, the process id and the time of the claim, or None if there is no lock
+    '''
+
+    try:
+        with open(lock_filename, 'r') as lock_file:
+            return lock_file.read().split()
+    except (IOError, OSError):
+        return None
+
+
+
+def release_stale_claim(lock_filename):
+    '''
+    Remove a lock file if it was created by a process of this machine that is not alive anymore.
+    Claims of other machines are never released, as we can't check if their owners are alive.
+
+    Input:
+        lock_filename: full path to the lock file
+    '''
+
+    # read the owner of the claim
+    owner = read_claim_owner(lock_filename)
+    if owner is None or len(owner) < 3 or owner[0] != socket.gethostname():
+        return
+
+    # check if the process is still alive
+    try:
+        os.kill(int(owner[1]), 0)
+        return
+    except OSError as e:
+        if e.errno == errno.EPERM:
+            return
+
+    remove_claim_of_owner(lock_filename, owner)
+
+
+
+def remove_claim_of_owner(lock_filename, owner):
+    '''
+    Remove a lock file only if it still belongs to the given owner. Several workers can find the same stale claim, and
+    one of them might have released it and claimed the submission again before the others try to release it. The
+    owner (host, process id and time) identifies a single claim, so only the worker that creates the release marker of
+    that claim can remove it, and it checks the owner again before doing it. The locks are never modified in place,
+    so nobody else can replace the checked lock in the meantime. If that worker dies before removing the lock, the
+    release marker (and the lock) have to be removed by hand.
+
+    Input:
+        lock_filename: full path to the lock file
+        owner: the owner of the stale claim, as retrieved by read_claim_owner
+    Output:
+        a boolean indicating if the lock was removed
+    '''
+
+    # get the right to release this claim
+    marker_filename = lock_filename + '.release.{}'.format('.'.join(owner))
+    try:
+        os.close(os.open(marker_filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except OSError as e:
+        if e.errno == errno.EEXIST:
+            return False
+        raise
+
+    # remove the lock if it is still the one that was checked
+    try:
+        if read_claim_owner(lock_filename) != owner:
+            return False
+        os.remove(lock_filename)
+        return True
+    finally:
+        os.remove(marker_filename)
+
+
+
+def write_results_shard(queue_folder, submission_file, team_name, segmentation_results, classification_results, fovea_detection_results, resource_usage=None):
+    '''
+    Save the results of a single submission in its own shard, and mark the submission as done
+
+    Input:
+        queue_folder: full path to the work queue folder
+        submission_file: filename of the submission (e.g. BestTeam.zip)
+        team_name: name of the team
+        segmentation_results: segmentation results of the team
+        classification_results: classification results of the team
+        fovea_detection_results: fovea detection results of the team
+        [resource_usage]: a dictionary with the resources used to evaluate the submission (cpu_seconds, peak_rss_mb, bytes_read)
+    '''
+
+    # export the shard in a temporary file and then move it, so other workers never see it half written
+    shard_filename = path.join(queue_folder, 'shards', team_name + '.csv')
+    temporary_filename = shard_filename + '.{}.{}.tmp'.format(socket.gethostname(), os.getpid())
+    export_table_of_results(temporary_filename, [ team_name ], [ segmentation_results ], [ classification_results ], [ fovea_detection_results ],
+                            None if resource_usage is None else [ resource_usage ])
+    os.replace(temporary_filename, shard_filename)
+
+    # mark the submission as done
+    with open(path.join(queue_folder, 'done', submission_file + '.done'), 'w') as done_file:
+        done_file.write('{} {} {}\n'.format(socket.gethostname(), os.getpid(), time.time()))
+
+
+
+def is_queue_complete(queue_folder, submission_files):
+    '''
+    Check if all the submissions in the queue were evaluated
+
+    Input:
+        queue_folder: full path to the work queue folder
+        submission_files: list of filenames of the submissions
+    Output:
+        a boolean indicating if all the submissions were evaluated
+    '''
+
+    return all([ is_submission_done(queue_folder, submission_file) for submission_file in submission_files ])
+
+
+
+def merge_results_shards(queue_folder, table_filename):
+    '''
+    Merge all the shards of results in a single table of results
+
+    Input:
+        queue_folder: full path to the work queue folder
+        table_filename: filename of the CSV file with the table of results
+    '''
+
+    # get the shards, sorted by team name so the output does not depend on the workers
+    shards_folder = path.join(queue_folder, 'shards')
+    shard_filenames = sorted([ file for file in listdir(shards_folder) if file.endswith('.csv') ])
+
+    # collect the header and the rows of every shard
+    header = None
+    rows = []
+    for shard_filename in shard_filenames:
+        with open(path.join(shards_folder, shard_filename), 'r') as csv_file:
+            csv_reader = csv.reader(csv_file)
+            current_header = next(csv_reader)
+            if header is None:
+                header = current_header
+            rows = rows + [ row for row in csv_reader if len(row) > 0 ]
+
+    # write the table in a temporary file and then move it, since several workers might merge at the same time
+    temporary_filename = table_filename + '.{}.{}.tmp'.format(socket.gethostname(), os.getpid())
+    with open(temporary_filename, 'w') as csv_file:
+        table_writer = csv.writer(csv_file)
+        if not (header is None):
+            table_writer.writerow(header)
+        for row in rows:
+            table_writer.writerow(row)
+    os.replace(temporary_filename, table_filename)